@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import flt
+from frappe.model.document import Document
+
+# GL Entries are summarized by company, account, cost center, finance book,
+# fiscal year, month, opening and period closing entries.
+# The name of the summary row is derived from these, so that balances can be upserted
+BALANCE_KEY = """concat_ws('::', gle.company, gle.account, ifnull(gle.cost_center, ''),
+	ifnull(gle.finance_book, ''), gle.fiscal_year, date_format(gle.posting_date, '%%Y-%%m'),
+	ifnull(gle.is_opening, 'No'), if(gle.voucher_type = 'Period Closing Voucher', 1, 0))"""
+
+class AccountPeriodBalance(Document):
+	pass
+
+def update_account_period_balances(gl_entries):
+	"""Add posted GL Entries (list of names) to the account period balances"""
+	if gl_entries:
+		upsert_account_period_balances("gle.name in ({0})".format(", ".join(["%(gle_{0})s".format(i)
+			for i in range(len(gl_entries))])), dict(("gle_{0}".format(i), d) for i, d in enumerate(gl_entries)))
+
+def reverse_account_period_balances(voucher_type, voucher_no):
+	"""Remove GL Entries of the voucher from the account period balances, before they are deleted"""
+	upsert_account_period_balances("gle.voucher_type=%(voucher_type)s and gle.voucher_no=%(voucher_no)s",
+		{"voucher_type": voucher_type, "voucher_no": voucher_no}, sign=-1)
+
+def upsert_account_period_balances(condition, values, sign=1):
+	values.update({"user": frappe.session.user})
+
+	frappe.db.sql("""insert into `tabAccount Period Balance`
+			(name, creation, modified, owner, modified_by, docstatus, company, account, cost_center,
+			finance_book, fiscal_year, period_start_date, is_opening, is_period_closing_voucher, debit, credit)
+		select md5({key}), now(), now(), %(user)s, %(user)s, 0, gle.company, gle.account, gle.cost_center,
+			gle.finance_book, gle.fiscal_year, date_format(gle.posting_date, '%%Y-%%m-01'),
+			ifnull(gle.is_opening, 'No'), if(gle.voucher_type = 'Period Closing Voucher', 1, 0),
+			{sign} * sum(gle.debit), {sign} * sum(gle.credit)
+		from `tabGL Entry` gle
+		where {condition}
+		group by md5({key})
+		on duplicate key update debit = debit + values(debit), credit = credit + values(credit),
+			modified = values(modified), modified_by = values(modified_by)
+	""".format(key=BALANCE_KEY, sign=sign, condition=condition), values)
+
+def rebuild_account_period_balances(company):
+	frappe.db.sql("delete from `tabAccount Period Balance` where company=%s", company)
+	upsert_account_period_balances("gle.company=%(company)s", {"company": company})
+
+def check_account_period_balances(company):
+	"""Returns list of account period balances that do not match the GL Entries,
+		as (name, debit and credit as per GL, debit and credit as per summary)"""
+	precision = frappe.get_precision("Account Period Balance", "debit")
+
+	expected = dict((d[0], d[1:]) for d in frappe.db.sql("""select md5({key}), sum(gle.debit), sum(gle.credit)
+		from `tabGL Entry` gle
+		where gle.company=%(company)s
+		group by md5({key})""".format(key=BALANCE_KEY), {"company": company}))
+
+	actual = dict((d[0], d[1:]) for d in frappe.db.sql("""select name, debit, credit
+		from `tabAccount Period Balance` where company=%s""", company))
+
+	mismatches = []
+	for name in set(expected) | set(actual):
+		gl_debit, gl_credit = expected.get(name, (0, 0))
+		debit, credit = actual.get(name, (0, 0))
+		if flt(gl_debit, precision) != flt(debit, precision) or flt(gl_credit, precision) != flt(credit, precision):
+			mismatches.append((name, gl_debit, gl_credit, debit, credit))
+
+	return mismatches
+
+def verify_account_period_balances():
+	"""Scheduled: rebuild account period balances of companies where they do not match the GL"""
+	for company in frappe.db.sql_list("select name from `tabCompany`"):
+		mismatches = check_account_period_balances(company)
+		if mismatches:
+			frappe.log_error(frappe.as_json(mismatches[:100]),
+				"Account Period Balances rebuilt for {0}".format(company))
+			rebuild_account_period_balances(company)
+			frappe.db.commit()
+
+def on_doctype_update():
+	frappe.db.add_index("Account Period Balance", ["company", "account", "period_start_date"])
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import flt, get_first_day, get_last_day, nowdate
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.doctype.account_period_balance.account_period_balance import (check_account_period_balances,
+	rebuild_account_period_balances)
+from erpnext.accounts.report.financial_statements import get_gl_entries, get_account_period_balances
+
+class TestAccountPeriodBalance(unittest.TestCase):
+	def setUp(self):
+		rebuild_account_period_balances("_Test Company")
+
+	def test_balances_on_submit_and_cancel(self):
+		jv = make_journal_entry("_Test Account Cost for Goods Sold - _TC",
+			"_Test Bank - _TC", 100, "_Test Cost Center - _TC", submit=True)
+		self.assertEqual(check_account_period_balances("_Test Company"), [])
+
+		jv.cancel()
+		self.assertEqual(check_account_period_balances("_Test Company"), [])
+
+	def test_balances_match_gl_entries(self):
+		make_journal_entry("_Test Account Cost for Goods Sold - _TC",
+			"_Test Bank - _TC", 100, "_Test Cost Center - _TC", submit=True)
+
+		accounts = ["_Test Account Cost for Goods Sold - _TC", "_Test Bank - _TC"]
+		from_date, to_date = get_first_day(nowdate()), get_last_day(nowdate())
+		filters = frappe._dict(company="_Test Company")
+
+		def get_totals(entries):
+			totals = {}
+			for d in entries:
+				totals[d.account] = flt(totals.get(d.account)) + flt(d.debit) - flt(d.credit)
+			return totals
+
+		self.assertEqual(
+			get_totals(get_account_period_balances("_Test Company", from_date, to_date, accounts, filters)),
+			get_totals(get_gl_entries("_Test Company", from_date, to_date, accounts, filters)))
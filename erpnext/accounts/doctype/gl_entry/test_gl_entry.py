@@ -23,3 +23,26 @@ class TestGLEntry(unittest.TestCase):
 			and debit = 0 and credit = '.01'""", jv.name)
 
 		self.assertTrue(round_off_entry)
+
+	def test_gl_entries_in_bulk(self):
+		fields = ["account", "debit", "credit", "cost_center", "fiscal_year", "account_currency", "docstatus"]
+
+		def get_gl_entries(voucher_no):
+			return frappe.get_all("GL Entry", fields=fields,
+				filters={"voucher_type": "Journal Entry", "voucher_no": voucher_no}, order_by="account")
+
+		jv = make_journal_entry("_Test Account Cost for Goods Sold - _TC",
+			"_Test Bank - _TC", 100, "_Test Cost Center - _TC", submit=True)
+		expected = get_gl_entries(jv.name)
+
+		frappe.db.set_value("Accounts Settings", None, "post_gl_entries_in_bulk", 1)
+		try:
+			jv = make_journal_entry("_Test Account Cost for Goods Sold - _TC",
+				"_Test Bank - _TC", 100, "_Test Cost Center - _TC", submit=True)
+			gl_entries = get_gl_entries(jv.name)
+		finally:
+			frappe.db.set_value("Accounts Settings", None, "post_gl_entries_in_bulk", 0)
+
+		self.assertEqual(gl_entries, expected)
+		for name in frappe.db.sql_list("select name from `tabGL Entry` where voucher_no=%s", jv.name):
+			self.assertTrue(name.startswith("ACC-GLE-"))
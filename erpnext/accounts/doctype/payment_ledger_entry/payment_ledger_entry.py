@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.model.document import Document
+
+class PaymentLedgerEntry(Document):
+	pass
+
+def make_payment_ledger_entries(gl_entries):
+	"""Make Payment Ledger Entries for the party GL Entries (list of names)"""
+	if gl_entries:
+		insert_payment_ledger_entries("gle.name in ({0})".format(", ".join(["%s"] * len(gl_entries))),
+			tuple(gl_entries))
+
+def delete_payment_ledger_entries(voucher_type, voucher_no):
+	frappe.db.sql("""delete from `tabPayment Ledger Entry`
+		where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
+
+def unlink_payment_ledger_entries(against_voucher_type, against_voucher):
+	"""Entries allocated against the voucher become unallocated, as in `unlink_ref_doc_from_payment_entries`"""
+	frappe.db.sql("""update `tabPayment Ledger Entry`
+		set against_voucher_type=voucher_type, against_voucher=voucher_no, allocated=0
+		where against_voucher_type=%s and against_voucher=%s and voucher_no != against_voucher""",
+		(against_voucher_type, against_voucher))
+
+def insert_payment_ledger_entries(condition, values):
+	"""Payment Ledger Entries have the same name as their GL Entry.
+		Entries not made against another voucher are against their own voucher"""
+	frappe.db.sql("""insert into `tabPayment Ledger Entry`
+			(name, creation, modified, owner, modified_by, docstatus, company, posting_date, account,
+			account_currency, cost_center, party_type, party, voucher_type, voucher_no,
+			against_voucher_type, against_voucher, allocated, amount, amount_in_account_currency)
+		select gle.name, gle.creation, gle.modified, gle.owner, gle.modified_by, 0, gle.company,
+			gle.posting_date, gle.account, gle.account_currency, gle.cost_center, gle.party_type, gle.party,
+			gle.voucher_type, gle.voucher_no,
+			if(ifnull(gle.against_voucher, '') = '', gle.voucher_type, gle.against_voucher_type),
+			if(ifnull(gle.against_voucher, '') = '', gle.voucher_no, gle.against_voucher),
+			if(ifnull(gle.against_voucher, '') = '', 0, 1),
+			gle.debit - gle.credit, gle.debit_in_account_currency - gle.credit_in_account_currency
+		from `tabGL Entry` gle
+		where ifnull(gle.party_type, '') != '' and ifnull(gle.party, '') != '' and {0}""".format(condition),
+		values)
+
+def backfill_payment_ledger(company=None):
+	"""Rebuild Payment Ledger Entries from the GL, one company and posting year at a time"""
+	companies = [company] if company else frappe.db.sql_list("select name from `tabCompany`")
+
+	for company in companies:
+		frappe.db.sql("delete from `tabPayment Ledger Entry` where company=%s", company)
+
+		for year in frappe.db.sql_list("""select distinct year(posting_date) from `tabGL Entry`
+			where company=%s and ifnull(party, '') != ''""", company):
+			insert_payment_ledger_entries("gle.company=%s and year(gle.posting_date)=%s", (company, year))
+			frappe.db.commit()
+
+def on_doctype_update():
+	frappe.db.add_index("Payment Ledger Entry", ["against_voucher", "against_voucher_type"])
+	frappe.db.add_index("Payment Ledger Entry", ["party", "party_type", "account"])
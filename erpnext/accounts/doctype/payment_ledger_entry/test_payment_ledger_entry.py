@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import flt
+from erpnext.accounts.utils import get_balance_on_voucher
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.accounts.doctype.payment_entry.payment_entry import get_payment_entry
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import backfill_payment_ledger
+
+class TestPaymentLedgerEntry(unittest.TestCase):
+	def test_outstanding_on_payment_and_cancel(self):
+		si = create_sales_invoice(rate=100)
+		self.assertEqual(get_balance_on_voucher(si.doctype, si.name, "Customer", si.customer, si.debit_to), 100)
+
+		pe = get_payment_entry(si.doctype, si.name, bank_account="_Test Bank - _TC")
+		pe.paid_amount = pe.received_amount = 40
+		pe.references[0].allocated_amount = 40
+		pe.insert()
+		pe.submit()
+
+		self.assertEqual(get_balance_on_voucher(si.doctype, si.name, "Customer", si.customer, si.debit_to), 60)
+		self.assertEqual(flt(frappe.db.get_value("Sales Invoice", si.name, "outstanding_amount")), 60)
+
+		pe.cancel()
+		self.assertFalse(frappe.db.exists("Payment Ledger Entry", {"voucher_no": pe.name}))
+		self.assertEqual(get_balance_on_voucher(si.doctype, si.name, "Customer", si.customer, si.debit_to), 100)
+
+	def test_backfill_matches_gl_entries(self):
+		si = create_sales_invoice(rate=100)
+		backfill_payment_ledger("_Test Company")
+
+		gl_amount = frappe.db.sql("""select sum(debit_in_account_currency - credit_in_account_currency)
+			from `tabGL Entry` where voucher_type=%s and voucher_no=%s and party=%s""",
+			(si.doctype, si.name, si.customer))[0][0]
+		ple_amount = frappe.db.sql("""select sum(amount_in_account_currency)
+			from `tabPayment Ledger Entry` where voucher_type=%s and voucher_no=%s""",
+			(si.doctype, si.name))[0][0]
+
+		self.assertEqual(flt(ple_amount), flt(gl_amount))
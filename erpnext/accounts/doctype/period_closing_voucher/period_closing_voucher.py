@@ -6,6 +6,7 @@ import frappe
 from frappe.utils import flt
 from frappe import _
 from erpnext.accounts.utils import get_account_currency
+from erpnext.accounts.doctype.account_period_balance.account_period_balance import reverse_account_period_balances
 from erpnext.controllers.accounts_controller import AccountsController
 
 class PeriodClosingVoucher(AccountsController):
@@ -17,6 +18,7 @@ class PeriodClosingVoucher(AccountsController):
 		self.make_gl_entries()
 
 	def on_cancel(self):
+		reverse_account_period_balances(self.doctype, self.name)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type = 'Period Closing Voucher' and voucher_no=%s""", self.name)
 
@@ -6,10 +6,11 @@
 from __future__ import unicode_literals
 import frappe
 import json
-import copy
 from frappe import throw, _
 from frappe.utils import flt, cint
 from frappe.model.document import Document
+from erpnext.accounts.doctype.pricing_rule.utils import (get_pricing_rule_index, clear_pricing_rule_index,
+	get_applicable_pricing_rules)
 
 from six import string_types
 
@@ -27,6 +28,12 @@ class PricingRule(Document):
 
 		if not self.margin_type: self.margin_rate_or_amount = 0.0
 
+	def on_update(self):
+		clear_pricing_rule_index()
+
+	def on_trash(self):
+		clear_pricing_rule_index()
+
 	def validate_mandatory(self):
 		for field in ["apply_on", "applicable_for"]:
 			tocheck = frappe.scrub(self.get(field) or "")
@@ -122,10 +129,13 @@ def apply_pricing_rule(args):
 	set_serial_nos_based_on_fifo = frappe.db.get_single_value("Stock Settings",
 		"automatically_set_serial_nos_based_on_fifo")
 
+	# match all items against the same index of pricing rules
+	pricing_rule_index = get_pricing_rule_index()
+
 	for item in item_list:
-		args_copy = copy.deepcopy(args)
+		args_copy = frappe._dict(args)
 		args_copy.update(item)
-		out.append(get_pricing_rule_for_item(args_copy))
+		out.append(get_pricing_rule_for_item(args_copy, pricing_rule_index))
 		if set_serial_nos_based_on_fifo and not args.get('is_return'):
 			out.append(get_serial_no_for_item(args_copy))
 	return out
@@ -142,7 +152,7 @@ def get_serial_no_for_item(args):
 		item_details.serial_no = get_serial_no(args)
 	return item_details
 
-def get_pricing_rule_for_item(args):
+def get_pricing_rule_for_item(args, pricing_rule_index=None):
 	if args.get("parenttype") == "Material Request": return {}
 
 	item_details = frappe._dict({
@@ -182,7 +192,7 @@ def get_pricing_rule_for_item(args):
 		args.supplier_group = frappe.get_cached_value("Supplier", args.supplier, "supplier_group")
 		args.customer = args.customer_group = args.territory = None
 
-	pricing_rules = get_pricing_rules(args)
+	pricing_rules = get_pricing_rules(args, pricing_rule_index)
 	pricing_rule = filter_pricing_rules(args, pricing_rules)
 
 	if pricing_rule:
@@ -240,79 +250,14 @@ def remove_pricing_rules(item_list):
 
 	return out
 
-def get_pricing_rules(args):
-	def _get_tree_conditions(parenttype, allow_blank=True):
-		field = frappe.scrub(parenttype)
-		condition = ""
-		if args.get(field):
-			if not frappe.flags.tree_conditions:
-				frappe.flags.tree_conditions = {}
-			key = (parenttype, args[field], )
-			if key in frappe.flags.tree_conditions:
-				return frappe.flags.tree_conditions[key]
-
-			try:
-				lft, rgt = frappe.db.get_value(parenttype, args[field], ["lft", "rgt"])
-			except TypeError:
-				frappe.throw(_("Invalid {0}").format(args[field]))
-
-			parent_groups = frappe.db.sql_list("""select name from `tab%s`
-				where lft<=%s and rgt>=%s""" % (parenttype, '%s', '%s'), (lft, rgt))
-
-			if parent_groups:
-				if allow_blank: parent_groups.append('')
-				condition = " ifnull("+field+", '') in ('" + \
-					"', '".join([frappe.db.escape(d) for d in parent_groups])+"')"
-			frappe.flags.tree_conditions[key] = condition
-
-		return condition
-
-
-	conditions = item_variant_condition = ""
-	values =  {"item_code": args.get("item_code"), "brand": args.get("brand")}
-
-	for field in ["company", "customer", "supplier", "supplier_group", "campaign", "sales_partner"]:
-		if args.get(field):
-			conditions += " and ifnull("+field+", '') in (%("+field+")s, '')"
-			values[field] = args.get(field)
-		else:
-			conditions += " and ifnull("+field+", '') = ''"
-
-	for parenttype in ["Customer Group", "Territory"]:
-		group_condition = _get_tree_conditions(parenttype)
-		if group_condition:
-			conditions += " and " + group_condition
-
+def get_pricing_rules(args, pricing_rule_index=None):
 	if not args.price_list: args.price_list = None
-	conditions += " and ifnull(for_price_list, '') in (%(price_list)s, '')"
-	values["price_list"] = args.get("price_list")
-
-	if args.get("transaction_date"):
-		conditions += """ and %(transaction_date)s between ifnull(valid_from, '2000-01-01')
-			and ifnull(valid_upto, '2500-12-31')"""
-		values['transaction_date'] = args.get('transaction_date')
-
-	item_group_condition = _get_tree_conditions("Item Group", False)
-	if item_group_condition:
-		item_group_condition = " or " + item_group_condition
 
 	# load variant of if not defined
 	if "variant_of" not in args:
 		args.variant_of = frappe.get_cached_value("Item", args.item_code, "variant_of")
 
-	if args.variant_of:
-		item_variant_condition = ' or item_code=%(variant_of)s '
-		values['variant_of'] = args.variant_of
-
-	return frappe.db.sql("""select * from `tabPricing Rule`
-		where (item_code=%(item_code)s {item_variant_condition} {item_group_condition} or brand=%(brand)s)
-			and docstatus < 2 and disable = 0
-			and {transaction_type} = 1 {conditions}
-		order by priority desc, name desc""".format(
-			item_group_condition = item_group_condition,
-			item_variant_condition = item_variant_condition,
-			transaction_type = args.transaction_type,
-			conditions = conditions), values, as_dict=1)
+	return get_applicable_pricing_rules(args, pricing_rule_index or get_pricing_rule_index())
 
 def filter_pricing_rules(args, pricing_rules):
 	# filter for qty
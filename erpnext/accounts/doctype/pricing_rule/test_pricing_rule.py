@@ -8,6 +8,7 @@ import frappe
 from erpnext.selling.doctype.sales_order.test_sales_order import make_sales_order
 from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
 from erpnext.stock.get_item_details import get_item_details
+from erpnext.accounts.doctype.pricing_rule.utils import clear_pricing_rule_index
 from frappe import MandatoryError
 
 class TestPricingRule(unittest.TestCase):
@@ -83,6 +84,7 @@ class TestPricingRule(unittest.TestCase):
 		self.assertEqual(details.get("discount_percentage"), 5)
 
 		frappe.db.sql("update `tabPricing Rule` set priority=NULL where campaign='_Test Campaign'")
+		clear_pricing_rule_index()
 		from erpnext.accounts.doctype.pricing_rule.pricing_rule	import MultiplePricingRuleConflict
 		self.assertRaises(MultiplePricingRuleConflict, get_item_details, args)
 
@@ -258,6 +260,31 @@ class TestPricingRule(unittest.TestCase):
 		self.assertEquals(item.discount_amount, 110)
 		self.assertEquals(item.rate, 990)
 
+	def test_pricing_rule_index_on_update(self):
+		args = frappe._dict({
+			"item_code": "_Test Item",
+			"company": "_Test Company",
+			"price_list": "_Test Price List",
+			"currency": "_Test Currency",
+			"doctype": "Sales Order",
+			"conversion_rate": 1,
+			"price_list_currency": "_Test Currency",
+			"plc_conversion_rate": 1,
+			"order_type": "Sales",
+			"customer": "_Test Customer",
+			"name": None
+		})
+
+		# applies through the ancestors of the item group
+		pricing_rule = make_pricing_rule(selling=1, apply_on="Item Group",
+			item_group="All Item Groups", discount_percentage=7)
+		self.assertEqual(get_item_details(args).get("discount_percentage"), 7)
+
+		pricing_rule.reload()
+		pricing_rule.disable = 1
+		pricing_rule.save()
+		self.assertFalse(get_item_details(args).get("pricing_rule"))
+
 def make_pricing_rule(**args):
 	args = frappe._dict(args)
 
@@ -287,3 +314,5 @@ def make_pricing_rule(**args):
 	applicable_for = doc.applicable_for.replace(' ', '_').lower()
 	if args.get(applicable_for):
 		doc.db_set(applicable_for, args.get(applicable_for))
+
+	return doc
@@ -0,0 +1,114 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import cstr, getdate
+
+# Pricing Rules applying on these fields are indexed by value
+INDEXED_FIELDS = ("item_code", "item_group", "brand")
+
+# a Pricing Rule for one of these applies if it is blank or equal to the transaction value
+PARTY_FIELDS = ("company", "customer", "supplier", "supplier_group", "campaign", "sales_partner")
+
+def get_pricing_rule_index():
+	"""Returns enabled Pricing Rules by transaction type (selling / buying),
+		indexed field and value. Cached until a Pricing Rule changes"""
+	fingerprint = get_pricing_rule_fingerprint()
+
+	index = frappe.cache().get_value("pricing_rule_index")
+	if not index or index.fingerprint != fingerprint:
+		index = build_pricing_rule_index(fingerprint)
+		frappe.cache().set_value("pricing_rule_index", index)
+
+	return index
+
+def clear_pricing_rule_index():
+	frappe.cache().delete_value("pricing_rule_index")
+
+def get_pricing_rule_fingerprint():
+	# also catches changes the index was not cleared for, like direct queries or rollbacks
+	count, modified = frappe.db.sql("select count(*), max(modified) from `tabPricing Rule`")[0]
+	return "{0}::{1}".format(count, cstr(modified))
+
+def build_pricing_rule_index(fingerprint):
+	index = frappe._dict(fingerprint=fingerprint, selling={}, buying={})
+
+	for rule in frappe.db.sql("""select * from `tabPricing Rule`
+		where docstatus < 2 and disable = 0""", as_dict=1):
+		for transaction_type in ("selling", "buying"):
+			if not rule.get(transaction_type):
+				continue
+
+			for field in INDEXED_FIELDS:
+				if rule.get(field):
+					index[transaction_type].setdefault(field, {}).setdefault(rule[field], []).append(rule)
+
+	return index
+
+def get_applicable_pricing_rules(args, index):
+	"""Returns copies of the Pricing Rules applicable for the item in args, ordered by priority"""
+	rules_by_field = index.get(args.transaction_type) or {}
+
+	keys = [("item_code", args.item_code), ("item_code", args.variant_of), ("brand", args.brand)]
+	if args.item_group:
+		keys += [("item_group", d) for d in get_tree_ancestors("Item Group", args.item_group)]
+
+	candidates = {}
+	for field, value in keys:
+		if value:
+			for rule in rules_by_field.get(field, {}).get(value, []):
+				candidates[rule.name] = rule
+
+	if not candidates:
+		return []
+
+	tree_values = {}
+	for doctype in ("Customer Group", "Territory"):
+		fieldname = frappe.scrub(doctype)
+		if args.get(fieldname):
+			tree_values[fieldname] = get_tree_ancestors(doctype, args.get(fieldname)) + [""]
+
+	transaction_date = getdate(args.transaction_date) if args.get("transaction_date") else None
+
+	pricing_rules = [frappe._dict(rule) for rule in candidates.values()
+		if is_applicable(rule, args, tree_values, transaction_date)]
+
+	# same order as `order by priority desc, name desc`, priority being a Select (text) field
+	return sorted(pricing_rules, key=lambda d: (cstr(d.priority), d.name), reverse=True)
+
+def is_applicable(rule, args, tree_values, transaction_date):
+	for field in PARTY_FIELDS:
+		if (rule.get(field) or "") not in (args.get(field) or "", ""):
+			return False
+
+	for field, values in tree_values.items():
+		if (rule.get(field) or "") not in values:
+			return False
+
+	if (rule.for_price_list or "") not in (args.price_list or "", ""):
+		return False
+
+	if transaction_date and not (getdate(rule.valid_from or "2000-01-01")
+		<= transaction_date <= getdate(rule.valid_upto or "2500-12-31")):
+		return False
+
+	return True
+
+def get_tree_ancestors(doctype, name):
+	"""Returns the node and its ancestors, cached for the request"""
+	if not frappe.flags.tree_ancestors:
+		frappe.flags.tree_ancestors = {}
+
+	key = (doctype, name)
+	if key not in frappe.flags.tree_ancestors:
+		try:
+			lft, rgt = frappe.db.get_value(doctype, name, ["lft", "rgt"])
+		except TypeError:
+			frappe.throw(_("Invalid {0}").format(name))
+
+		frappe.flags.tree_ancestors[key] = frappe.db.sql_list("""select name from `tab{0}`
+			where lft<=%s and rgt>=%s""".format(doctype), (lft, rgt))
+
+	return frappe.flags.tree_ancestors[key]
@@ -11,38 +11,25 @@ from erpnext.setup.utils import get_exchange_rate
 from erpnext.stock.get_item_details import get_pos_profile
 from frappe import _
 from frappe.core.doctype.communication.email import make
-from frappe.utils import nowdate, cint
+from frappe.utils import nowdate, now, cint, cstr, add_to_date, now_datetime
 
 from six import string_types, iteritems
 
 
+# version of the delta sync of `sync_pos_data`, data synced with another version is loaded again
+POS_SYNC_VERSION = 1
+POS_SYNC_DATASETS = ("items", "prices", "bins", "customers", "pricing_rules")
+
 @frappe.whitelist()
 def get_pos_data():
-	doc = frappe.new_doc('Sales Invoice')
-	doc.is_pos = 1
-	pos_profile = get_pos_profile(doc.company) or {}
-	if not pos_profile:
-		frappe.throw(_("POS Profile is required to use Point-of-Sale"))
-
-	if not doc.company:
-		doc.company = pos_profile.get('company')
-
-	doc.update_stock = pos_profile.get('update_stock')
-
-	if pos_profile.get('name'):
-		pos_profile = frappe.get_doc('POS Profile', pos_profile.get('name'))
-		pos_profile.validate()
+	doc, pos_profile = get_pos_doc()
 
-	company_data = get_company_data(doc.company)
-	update_pos_profile_data(doc, pos_profile, company_data)
 	update_multi_mode_option(doc, pos_profile)
 	default_print_format = pos_profile.get('print_format') or "Point of Sale"
 	print_template = frappe.db.get_value('Print Format', default_print_format, 'html')
 	items_list = get_items_list(pos_profile, doc.company)
 	customers = get_customers_list(pos_profile)
 
-	doc.plc_conversion_rate = update_plc_conversion_rate(doc, pos_profile)
-
 	return {
 		'doc': doc,
 		'default_customer': pos_profile.get('customer'),
@@ -64,6 +51,223 @@ def get_pos_data():
 		'meta': get_meta()
 	}
 
+def get_pos_doc():
+	"""Returns a new POS Sales Invoice with the values of the user's POS Profile, and the POS Profile"""
+	doc = frappe.new_doc('Sales Invoice')
+	doc.is_pos = 1
+	pos_profile = get_pos_profile(doc.company) or {}
+	if not pos_profile:
+		frappe.throw(_("POS Profile is required to use Point-of-Sale"))
+
+	if not doc.company:
+		doc.company = pos_profile.get('company')
+
+	doc.update_stock = pos_profile.get('update_stock')
+
+	if pos_profile.get('name'):
+		pos_profile = frappe.get_doc('POS Profile', pos_profile.get('name'))
+		pos_profile.validate()
+
+	company_data = get_company_data(doc.company)
+	update_pos_profile_data(doc, pos_profile, company_data)
+	doc.plc_conversion_rate = update_plc_conversion_rate(doc, pos_profile)
+
+	return doc, pos_profile
+
+@frappe.whitelist()
+def sync_pos_data(watermarks=None, datasets=None, page_length=500):
+	"""
+		Returns the records of the POS datasets changed since their watermark,
+		at most `page_length` records per dataset.
+
+		:param watermarks: {dataset: watermark returned by the previous call}, empty for the initial load
+		:param datasets: list of datasets to sync, default all of `POS_SYNC_DATASETS`
+		:return: {
+			"version": POS_SYNC_VERSION,
+			"datasets": {
+				dataset: {
+					"records": [...],  # added or changed records
+					"deleted": [...],  # names of deleted records, or not available for the POS Profile anymore
+					"watermark": {},  # to be sent back with the next call
+					"has_more": 0 / 1,  # call again for the next page
+					"reset": 0 / 1  # the client must drop its records of the dataset before adding these
+				}
+			}
+		}
+	"""
+	if isinstance(watermarks, string_types):
+		watermarks = json.loads(watermarks)
+	if isinstance(datasets, string_types):
+		datasets = json.loads(datasets)
+
+	doc, pos_profile = get_pos_doc()
+	page_length = cint(page_length) or 500
+
+	out = {}
+	for dataset in datasets or POS_SYNC_DATASETS:
+		if dataset not in POS_SYNC_DATASETS:
+			frappe.throw(_("Invalid POS dataset {0}").format(dataset))
+
+		out[dataset] = get_pos_dataset_changes(get_pos_dataset_query(dataset, doc, pos_profile),
+			(watermarks or {}).get(dataset), page_length)
+
+	return {"version": POS_SYNC_VERSION, "datasets": out}
+
+def get_pos_dataset_changes(query, watermark, page_length):
+	"""
+		Records are read in the order of (modified, name), from the last record of the previous page.
+		Deleted records are read from Deleted Document, records changed to not be available for
+		the POS (like disabled items) are also returned as deleted.
+
+		The dataset is loaded again when the POS Profile values it depends on change,
+		and every day for datasets depending on the date.
+	"""
+	sync_start = now()
+	watermark = frappe._dict(watermark or {})
+
+	reset = (watermark.version != POS_SYNC_VERSION or watermark.key != query.key
+		or (query.daily and watermark.date != nowdate()))
+	if reset:
+		watermark = frappe._dict(version=POS_SYNC_VERSION, key=query.key, date=nowdate(),
+			modified="1900-01-01", name="", deleted_since=sync_start, initial_load=1)
+
+	# the initial load does not need records not available for the POS
+	condition = "and ({0})".format(query.active_condition) if watermark.initial_load else ""
+
+	values = dict(query.values, modified=watermark.modified, name=watermark.name, limit=page_length + 1)
+	rows = frappe.db.sql("""select {fields}, ({active_condition}) as is_active, {alias}.modified as sync_modified
+		from {tables}
+		where ({alias}.modified > %(modified)s or ({alias}.modified = %(modified)s and {alias}.name > %(name)s))
+			{condition}
+		order by {alias}.modified, {alias}.name
+		limit %(limit)s""".format(fields=query.fields, active_condition=query.active_condition, alias=query.alias,
+			tables=query.tables, condition=condition), values, as_dict=1)
+
+	has_more = len(rows) > page_length
+	rows = rows[:page_length]
+	if rows:
+		watermark.modified, watermark.name = cstr(rows[-1].sync_modified), rows[-1].name
+
+	records = [d for d in rows if d.is_active]
+	deleted = [d.name for d in rows if not d.is_active]
+	for d in rows:
+		del d["is_active"], d["sync_modified"]
+
+	if not watermark.initial_load:
+		deleted += frappe.db.sql_list("""select deleted_name from `tabDeleted Document`
+			where deleted_doctype=%s and creation > %s""", (query.doctype, watermark.deleted_since))
+		watermark.deleted_since = sync_start
+
+	if not has_more:
+		watermark.initial_load = 0
+
+	if records and query.add_details:
+		query.add_details(records)
+
+	return {
+		"records": records,
+		"deleted": list(set(deleted)),
+		"watermark": watermark,
+		"has_more": cint(has_more),
+		"reset": cint(reset)
+	}
+
+def get_pos_dataset_query(dataset, doc, pos_profile):
+	"""Returns the tables and fields of the dataset, and the condition for records available for the POS"""
+	values = {"company": doc.company, "price_list": doc.selling_price_list, "date": nowdate(),
+		"conversion_rate": doc.plc_conversion_rate, "warehouse": pos_profile.get('warehouse')}
+
+	if dataset == "items":
+		item_groups = tuple(d.name for row in pos_profile.get('item_groups') or []
+			for d in get_child_nodes('Item Group', row.item_group))
+
+		query = frappe._dict(doctype="Item", alias="i", fields="""i.name, i.item_code, i.item_name,
+				i.description, i.item_group, i.has_batch_no, i.has_serial_no, i.is_stock_item, i.brand,
+				i.stock_uom, i.image, id.expense_account, id.selling_cost_center, id.default_warehouse,
+				i.sales_uom, c.conversion_factor""",
+			tables="""`tabItem` i
+				left join `tabItem Default` id on id.parent = i.name and id.company = %(company)s
+				left join `tabUOM Conversion Detail` c on i.name = c.parent and i.sales_uom = c.uom""",
+			active_condition="i.disabled = 0 and i.has_variants = 0 and i.is_sales_item = 1"
+				+ (" and i.item_group in %(item_groups)s" if item_groups else ""),
+			key_values=[doc.company, sorted(item_groups)], add_details=add_item_barcodes_and_taxes)
+		values["item_groups"] = item_groups
+
+	elif dataset == "prices":
+		query = frappe._dict(doctype="Item Price", alias="ip",
+			fields="ip.name, ip.item_code, ifnull(ip.price_list_rate, 0) * %(conversion_rate)s as price_list_rate",
+			tables="`tabItem Price` ip", active_condition="ip.price_list = %(price_list)s",
+			key_values=[doc.selling_price_list, doc.plc_conversion_rate])
+
+	elif dataset == "bins":
+		query = frappe._dict(doctype="Bin", alias="b", fields="b.name, b.item_code, b.warehouse, b.actual_qty",
+			tables="`tabBin` b", active_condition="b.actual_qty > 0"
+				+ (" and b.warehouse = %(warehouse)s" if pos_profile.get('warehouse') else ""),
+			key_values=[pos_profile.get('warehouse')])
+
+	elif dataset == "customers":
+		customer_groups = tuple(d.name for row in pos_profile.get('customer_groups') or []
+			for d in get_child_nodes('Customer Group', row.customer_group))
+
+		query = frappe._dict(doctype="Customer", alias="c",
+			fields="c.name, c.customer_name, c.customer_group, c.territory, c.customer_pos_id",
+			tables="`tabCustomer` c", active_condition="c.disabled = 0"
+				+ (" and c.customer_group in %(customer_groups)s" if customer_groups else ""),
+			key_values=[sorted(customer_groups)], add_details=add_customer_address_and_contact)
+		values["customer_groups"] = customer_groups
+
+	elif dataset == "pricing_rules":
+		# rules are valid between dates, the dataset is loaded again every day
+		query = frappe._dict(doctype="Pricing Rule", alias="pr", fields="pr.*", tables="`tabPricing Rule` pr",
+			active_condition="0" if doc.ignore_pricing_rule else """pr.docstatus < 2
+				and ifnull(pr.for_price_list, '') in (%(price_list)s, '') and pr.selling = 1
+				and ifnull(pr.company, '') in (%(company)s, '') and pr.disable = 0
+				and %(date)s between ifnull(pr.valid_from, '2000-01-01') and ifnull(pr.valid_upto, '2500-12-31')""",
+			key_values=[doc.company, doc.selling_price_list, doc.ignore_pricing_rule], daily=1)
+
+	query.values = values
+	query.key = frappe.generate_hash(json.dumps([dataset] + query.key_values, default=cstr))
+	return query
+
+def add_item_barcodes_and_taxes(items):
+	item_codes = [d.name for d in items]
+	barcodes = get_child_table_values("Item Barcode", "barcode", item_codes)
+	taxes = frappe.db.sql("""select parent, tax_type, tax_rate from `tabItem Tax`
+		where parenttype = 'Item' and parent in %s""", [item_codes], as_dict=1)
+
+	for d in items:
+		d.barcodes = barcodes.get(d.name, [])
+		d.taxes = dict((tax.tax_type, tax.tax_rate) for tax in taxes if tax.parent == d.name)
+
+def add_customer_address_and_contact(customers):
+	"""Primary address and contact of the customers, with one query each"""
+	customer_names = [d.name for d in customers]
+
+	addresses, contacts = {}, {}
+	for d in frappe.db.sql("""select dl.link_name as customer, a.name, a.address_line1, a.address_line2,
+			a.city, a.state, a.email_id, a.phone, a.fax, a.pincode
+		from `tabAddress` a, `tabDynamic Link` dl
+		where dl.parent = a.name and dl.parenttype = 'Address' and dl.link_doctype = 'Customer'
+			and dl.link_name in %s and a.is_primary_address = 1""", [customer_names], as_dict=1):
+		addresses.setdefault(d.pop("customer"), d)
+
+	for d in frappe.db.sql("""select dl.link_name as customer, c.email_id, c.phone, c.mobile_no
+		from `tabContact` c, `tabDynamic Link` dl
+		where dl.parent = c.name and dl.parenttype = 'Contact' and dl.link_doctype = 'Customer'
+			and dl.link_name in %s and c.is_primary_contact = 1""", [customer_names], as_dict=1):
+		contacts.setdefault(d.pop("customer"), d)
+
+	for d in customers:
+		d.address = addresses.get(d.name) or {}
+		d.contact = contacts.get(d.name)
+
+def get_child_table_values(doctype, fieldname, parents):
+	values = {}
+	for d in frappe.get_all(doctype, fields=["parent", fieldname], filters={"parent": ("in", parents)}, order_by="idx"):
+		values.setdefault(d.parent, []).append(d.get(fieldname))
+
+	return values
+
 def update_plc_conversion_rate(doc, pos_profile):
 	conversion_rate = 1.0
 
@@ -424,6 +628,202 @@ def make_invoice(doc_list={}, email_queue_list={}, customers_list={}):
 		'synced_contacts': get_contacts(customers)
 	}
 
+@frappe.whitelist()
+def upload_pos_invoices(doc_list={}, email_queue_list={}, customers_list={}, customers_watermark=None):
+	"""
+		Queues the offline invoices for submission in background jobs, `chunk_size` invoices per job.
+		Invoices are tracked in Offline POS Invoice, uploading an invoice again does not queue it again.
+
+		Returns the status of the uploaded invoices and the customers changed since `customers_watermark`,
+		as returned by `sync_pos_data`
+	"""
+	if isinstance(doc_list, string_types):
+		doc_list = json.loads(doc_list)
+
+	if isinstance(email_queue_list, string_types):
+		email_queue_list = json.loads(email_queue_list)
+
+	if isinstance(customers_list, string_types):
+		customers_list = json.loads(customers_list)
+
+	if isinstance(customers_watermark, string_types):
+		customers_watermark = json.loads(customers_watermark)
+
+	customers_list = make_customer_and_address(customers_list)
+
+	invoices = {}
+	for docs in doc_list:
+		invoices.update(docs)
+
+	queued = queue_offline_pos_invoices(invoices, email_queue_list)
+	status = get_offline_pos_invoice_status(list(invoices))
+
+	doc, pos_profile = get_pos_doc()
+	customers = get_pos_dataset_changes(get_pos_dataset_query("customers", doc, pos_profile),
+		customers_watermark, 500)
+
+	return {
+		'invoice': status,
+		'queued': queued,
+		'customers': customers_list,
+		'synced_customers': customers
+	}
+
+# Offline POS Invoices still Queued this long after they were queued have lost their job
+OFFLINE_POS_JOB_TIMEOUT = 1500
+STALE_OFFLINE_POS_SECONDS = OFFLINE_POS_JOB_TIMEOUT + 1800
+
+def queue_offline_pos_invoices(invoices, email_queue_list=None, chunk_size=100):
+	"""Makes Offline POS Invoices for the invoices not uploaded before and enqueues their submission"""
+	if not invoices:
+		return []
+
+	uploaded = set(frappe.db.sql_list("""select offline_pos_name from `tabOffline POS Invoice`
+		where offline_pos_name in %(names)s
+		union
+		select offline_pos_name from `tabSales Invoice` where offline_pos_name in %(names)s""",
+		{"names": list(invoices)}))
+
+	queued = []
+	for name, doc in iteritems(invoices):
+		if name in uploaded:
+			continue
+
+		log = frappe.get_doc({
+			"doctype": "Offline POS Invoice",
+			"offline_pos_name": name,
+			"status": "Queued",
+			"company": doc.get("company"),
+			"data": json.dumps(doc),
+			"email": (email_queue_list or {}).get(name)
+		})
+		try:
+			log.db_insert()
+		except frappe.DuplicateEntryError:
+			# uploaded at the same time by another request, its status is returned once committed
+			if frappe.message_log:
+				frappe.message_log.pop()
+			frappe.db.sql("""select name from `tabOffline POS Invoice` where name=%s for update""", name)
+			continue
+
+		queued.append(name)
+
+	frappe.db.commit()
+	enqueue_offline_pos_invoices(queued, chunk_size)
+
+	return queued
+
+def enqueue_offline_pos_invoices(names, chunk_size=100):
+	for i in range(0, len(names), chunk_size):
+		frappe.enqueue(submit_offline_pos_invoices, queue="long", timeout=OFFLINE_POS_JOB_TIMEOUT,
+			names=names[i:i + chunk_size], now=frappe.flags.in_test)
+
+def requeue_stale_offline_pos_invoices():
+	"""Scheduled: queues the Offline POS Invoices whose job was lost again"""
+	from frappe.utils.background_jobs import get_jobs
+
+	enqueued = set()
+	for d in get_jobs(site=frappe.local.site, queue="long", key="kwargs").get(frappe.local.site, []):
+		enqueued.update(d.get("names") or [])
+
+	names = [name for name in frappe.db.sql_list("""select name from `tabOffline POS Invoice`
+		where status='Queued' and modified < %s order by creation""",
+		add_to_date(now_datetime(), seconds=-STALE_OFFLINE_POS_SECONDS)) if name not in enqueued]
+
+	if not names:
+		return
+
+	# queued again from now
+	frappe.db.sql("""update `tabOffline POS Invoice` set modified=%s where name in %s""", (now(), names))
+	frappe.db.commit()
+
+	enqueue_offline_pos_invoices(names)
+
+def submit_offline_pos_invoices(names):
+	for name in names:
+		submit_offline_pos_invoice(name)
+
+def submit_offline_pos_invoice(name):
+	"""Submits the Sales Invoice of the Offline POS Invoice, or saves it as draft if submission fails"""
+	log = frappe.get_doc("Offline POS Invoice", name)
+	if not is_offline_pos_invoice_queued(name):
+		return
+
+	doc = json.loads(log.data)
+	status, sales_invoice, error = "Submitted", None, None
+
+	try:
+		validate_records(doc)
+		si_doc = make_offline_sales_invoice(name, doc)
+		si_doc.insert()
+		si_doc.submit()
+		sales_invoice = si_doc.name
+	except Exception:
+		if frappe.message_log:
+			frappe.message_log.pop()
+		frappe.db.rollback()
+		error = frappe.get_traceback()
+
+		if not is_offline_pos_invoice_queued(name):
+			return
+
+		try:
+			si_doc = make_offline_sales_invoice(name, doc)
+			si_doc.flags.ignore_mandatory = True
+			si_doc.insert(ignore_permissions=True)
+			status, sales_invoice = "Draft", si_doc.name
+		except Exception:
+			frappe.db.rollback()
+			status = "Failed"
+
+	frappe.db.set_value("Offline POS Invoice", name, {
+		"status": status,
+		"sales_invoice": sales_invoice,
+		"error": error
+	}, update_modified=False)
+	frappe.db.commit()
+
+	if log.email and status == "Submitted":
+		make_email_queue({name: log.email})
+
+def is_offline_pos_invoice_queued(name):
+	"""Locks the Offline POS Invoice, so that a job queued again waits for the one submitting it"""
+	status = frappe.db.sql("""select status from `tabOffline POS Invoice` where name=%s for update""", name)
+	return bool(status) and status[0][0] == "Queued"
+
+def make_offline_sales_invoice(name, doc):
+	si_doc = frappe.new_doc('Sales Invoice')
+	si_doc.update(doc)
+	si_doc.offline_pos_name = name
+	si_doc.set_posting_time = 1
+	si_doc.customer = get_customer_id(doc)
+	si_doc.due_date = doc.get('posting_date')
+
+	return si_doc
+
+@frappe.whitelist()
+def get_offline_pos_invoice_status(names):
+	"""Returns {offline_pos_name: {"status", "sales_invoice", "error"}} of the uploaded invoices"""
+	if isinstance(names, string_types):
+		names = json.loads(names)
+
+	if not names:
+		return {}
+
+	status = dict((d.offline_pos_name, d) for d in frappe.get_all("Offline POS Invoice",
+		fields=["offline_pos_name", "status", "sales_invoice", "error"],
+		filters={"offline_pos_name": ("in", names)}))
+
+	# invoices uploaded with `make_invoice`
+	missing = [name for name in names if name not in status]
+	if missing:
+		for d in frappe.get_all("Sales Invoice", fields=["offline_pos_name", "name", "docstatus"],
+			filters={"offline_pos_name": ("in", missing)}):
+			status[d.offline_pos_name] = frappe._dict(offline_pos_name=d.offline_pos_name,
+				status="Draft" if d.docstatus == 0 else "Submitted", sales_invoice=d.name, error=None)
+
+	return status
+
 
 def validate_records(doc):
 	validate_item(doc)
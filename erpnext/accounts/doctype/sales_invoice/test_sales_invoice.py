@@ -813,6 +813,53 @@ class TestSalesInvoice(unittest.TestCase):
 
 		self.pos_gl_entry(si, pos, 330)
 
+	def test_upload_pos_invoices(self):
+		import json
+		from frappe.utils import add_to_date, now_datetime
+		from erpnext.accounts.doctype.sales_invoice.pos import upload_pos_invoices, \
+			requeue_stale_offline_pos_invoices, STALE_OFFLINE_POS_SECONDS
+
+		set_perpetual_inventory()
+
+		make_pos_profile()
+		self._insert_purchase_receipt()
+
+		pos = copy.deepcopy(test_records[1])
+		pos["is_pos"] = 1
+		pos["update_stock"] = 1
+		pos["payments"] = [{'mode_of_payment': 'Bank Draft', 'account': '_Test Bank - _TC', 'amount': 300},
+							{'mode_of_payment': 'Cash', 'account': 'Cash - _TC', 'amount': 330}]
+
+		offline_pos_name = '24102019152137'
+		out = upload_pos_invoices([{offline_pos_name: pos}])
+		self.assertEqual(out['queued'], [offline_pos_name])
+		self.assertEqual(out['invoice'][offline_pos_name].status, 'Submitted')
+
+		si = frappe.get_doc('Sales Invoice', out['invoice'][offline_pos_name].sales_invoice)
+		self.assertEqual(si.offline_pos_name, offline_pos_name)
+		self.assertEqual(si.grand_total, 630.0)
+
+		# uploading again does not make another invoice
+		out = upload_pos_invoices([{offline_pos_name: pos}])
+		self.assertEqual(out['queued'], [])
+		self.assertEqual(frappe.db.count('Sales Invoice', {'offline_pos_name': offline_pos_name}), 1)
+
+		# invoices whose job was lost are queued again
+		offline_pos_name = '24102019152138'
+		frappe.get_doc({
+			"doctype": "Offline POS Invoice",
+			"offline_pos_name": offline_pos_name,
+			"status": "Queued",
+			"company": pos.get("company"),
+			"data": json.dumps(pos)
+		}).db_insert()
+		frappe.db.set_value("Offline POS Invoice", offline_pos_name, "modified",
+			add_to_date(now_datetime(), seconds=-STALE_OFFLINE_POS_SECONDS - 60), update_modified=False)
+
+		requeue_stale_offline_pos_invoices()
+		self.assertEqual(frappe.db.get_value("Offline POS Invoice", offline_pos_name, "status"), "Submitted")
+		self.assertEqual(frappe.db.count('Sales Invoice', {'offline_pos_name': offline_pos_name}), 1)
+
 	def test_make_pos_invoice_in_draft(self):
 		from erpnext.accounts.doctype.sales_invoice.pos import make_invoice
 		from erpnext.stock.doctype.item.test_item import make_item
@@ -901,6 +948,39 @@ class TestSalesInvoice(unittest.TestCase):
 
 		frappe.db.sql("delete from `tabPOS Profile`")
 
+	def test_sync_pos_data(self):
+		from erpnext.accounts.doctype.sales_invoice.pos import sync_pos_data
+		from erpnext.stock.doctype.item.test_item import make_item
+
+		make_pos_profile()
+		item = make_item("_Test POS Sync Item", {"is_sales_item": 1})
+
+		# initial load, in pages
+		watermark, items = None, []
+		while True:
+			data = sync_pos_data({"items": watermark}, ["items"], page_length=5)["datasets"]["items"]
+			items += [d.name for d in data["records"]]
+			watermark = data["watermark"]
+			if not data["has_more"]:
+				break
+
+		self.assertTrue(item.name in items)
+		self.assertEqual(len(items), len(set(items)))
+
+		data = sync_pos_data({"items": watermark}, ["items"])["datasets"]["items"]
+		self.assertEqual((data["records"], data["deleted"], data["reset"]), ([], [], 0))
+
+		# disabled items are deleted for the POS
+		item.reload()
+		item.disabled = 1
+		item.save()
+
+		data = sync_pos_data({"items": data["watermark"]}, ["items"])["datasets"]["items"]
+		self.assertEqual(data["deleted"], [item.name])
+
+		item.disabled = 0
+		item.save()
+
 	def test_pos_si_without_payment(self):
 		set_perpetual_inventory()
 		make_pos_profile()
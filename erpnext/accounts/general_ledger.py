@@ -3,10 +3,15 @@
 
 from __future__ import unicode_literals
 import frappe, erpnext
-from frappe.utils import flt, cstr, cint
+from frappe.utils import flt, cstr, cint, now
 from frappe import _
 from frappe.model.meta import get_field_precision
 from erpnext.accounts.doctype.budget.budget import validate_expense_against_budget
+from erpnext.accounts.doctype.account_period_balance.account_period_balance import (update_account_period_balances,
+	reverse_account_period_balances)
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import (make_payment_ledger_entries,
+	delete_payment_ledger_entries)
+from erpnext.accounts.utils import get_fiscal_year
 
 
 class ClosedAccountingPeriod(frappe.ValidationError): pass
@@ -70,12 +75,18 @@ def process_gl_map(gl_map, merge_entries=True):
 
 	return gl_map
 
+# GL Entries with the same values for these fields are merged into one
+MERGE_FIELDS = ("account", "party_type", "party", "against_voucher", "against_voucher_type",
+	"cost_center", "project", "remarks", "reference_no", "reference_date")
+
 def merge_similar_entries(gl_map):
 	merged_gl_map = []
+	merged_entries = {}
 	for entry in gl_map:
 		# if there is already an entry in this account then just add it
 		# to that entry
-		same_head = check_if_in_list(entry, merged_gl_map)
+		key = get_merge_key(entry)
+		same_head = merged_entries.get(key)
 		if same_head:
 			same_head.debit	= flt(same_head.debit) + flt(entry.debit)
 			same_head.debit_in_account_currency	= \
@@ -84,6 +95,7 @@ def merge_similar_entries(gl_map):
 			same_head.credit_in_account_currency = \
 				flt(same_head.credit_in_account_currency) + flt(entry.credit_in_account_currency)
 		else:
+			merged_entries[key] = entry
 			merged_gl_map.append(entry)
 
 	# filter zero debit and credit entries
@@ -92,19 +104,14 @@ def merge_similar_entries(gl_map):
 
 	return merged_gl_map
 
+def get_merge_key(gle):
+	return tuple(cstr(gle.get(fieldname)) for fieldname in MERGE_FIELDS)
+
 def check_if_in_list(gle, gl_map):
+	key = get_merge_key(gle)
 	for e in gl_map:
-		if e.account == gle.account \
-			and cstr(e.get('party_type'))==cstr(gle.get('party_type')) \
-			and cstr(e.get('party'))==cstr(gle.get('party')) \
-			and cstr(e.get('against_voucher'))==cstr(gle.get('against_voucher')) \
-			and cstr(e.get('against_voucher_type')) == cstr(gle.get('against_voucher_type')) \
-			and cstr(e.get('cost_center')) == cstr(gle.get('cost_center')) \
-			and cstr(e.get('project')) == cstr(gle.get('project')) \
-			and cstr(e.get('remarks')) == cstr(gle.get('remarks')) \
-			and cstr(e.get('reference_no')) == cstr(gle.get('reference_no')) \
-			and cstr(e.get('reference_date')) == cstr(gle.get('reference_date')):
-				return e
+		if get_merge_key(e) == key:
+			return e
 
 def save_entries(gl_map, adv_adj, update_outstanding, from_repost=False):
 	if not from_repost:
@@ -112,14 +119,26 @@ def save_entries(gl_map, adv_adj, update_outstanding, from_repost=False):
 
 	round_off_debit_credit(gl_map)
 
-	vouchers_for_balance_update = set()
-	for entry in gl_map:
-		make_entry(entry, adv_adj, from_repost)
+	if cint(frappe.db.get_single_value("Accounts Settings", "post_gl_entries_in_bulk")):
+		gl_entries = make_entries_in_bulk(gl_map, adv_adj, from_repost)
 
 		# check against budget
 		if not from_repost:
-			validate_expense_against_budget(entry)
+			validate_expense_against_budget_for_gl_map(gl_map)
+	else:
+		gl_entries = []
+		for entry in gl_map:
+			gl_entries.append(make_entry(entry, adv_adj, from_repost))
+
+			# check against budget
+			if not from_repost:
+				validate_expense_against_budget(entry)
+
+	update_account_period_balances([d.name for d in gl_entries])
+	make_payment_ledger_entries([d.name for d in gl_entries if d.party_type and d.party])
 
+	vouchers_for_balance_update = set()
+	for entry in gl_map:
 		if update_outstanding and not from_repost and entry.get("party_type") and entry.get("party"):
 			if entry.get("against_voucher_type") and entry.get("against_voucher"):
 				vouchers_for_balance_update.add((entry.get("against_voucher_type"), entry.get("against_voucher"),
@@ -141,6 +160,217 @@ def make_entry(args, adv_adj, from_repost=False):
 	gle.run_method("on_update_with_args", adv_adj, from_repost)
 	gle.submit()
 
+	return gle
+
+def make_entries_in_bulk(gl_map, adv_adj, from_repost=False):
+	"""
+		Validate the gl_map as a set, with accounts, cost centers, parties and settings
+		fetched once, and insert all GL Entries with a single statement.
+		Same validations as `GLEntry.validate` and `GLEntry.on_update_with_args`
+	"""
+	from erpnext.accounts.doctype.gl_entry.gl_entry import (check_freezing_date,
+		validate_frozen_account, validate_balance_type)
+	from erpnext.accounts.party import validate_party_frozen_disabled, validate_party_gle_currency
+
+	company = gl_map[0].company
+	company_currency = erpnext.get_company_currency(company)
+	precision = get_field_precision(frappe.get_meta("GL Entry").get_field("debit"), currency=company_currency)
+
+	account_details = get_account_details_for_gl_map(gl_map)
+	cost_center_company = get_cost_center_company_for_gl_map(gl_map)
+
+	gl_entries, fiscal_years = [], {}
+	for args in gl_map:
+		gle = frappe.get_doc(dict(args, doctype="GL Entry"))
+		account = account_details.get(gle.account) or frappe._dict()
+
+		validate_gl_entry_mandatory(gle, account, precision)
+
+		if not gle.fiscal_year:
+			if gle.posting_date not in fiscal_years:
+				fiscal_years[gle.posting_date] = get_fiscal_year(gle.posting_date, company=gle.company)[0]
+			gle.fiscal_year = fiscal_years[gle.posting_date]
+
+		validate_gl_entry_cost_center(gle, account, cost_center_company)
+
+		if not from_repost:
+			validate_gl_entry_account(gle, account, company_currency)
+
+		gl_entries.append(gle)
+
+	parties = set((d.party_type, d.party) for d in gl_entries if d.party_type and d.party)
+	if not from_repost:
+		for posting_date in set(d.posting_date for d in gl_entries):
+			check_freezing_date(posting_date, adv_adj)
+
+		for party_type, party in parties:
+			validate_party_frozen_disabled(party_type, party)
+
+		for party_type, party, account_currency in set((d.party_type, d.party, d.account_currency)
+			for d in gl_entries if d.party_type and d.party):
+			validate_party_gle_currency(party_type, party, company, account_currency)
+
+	for account in account_details:
+		validate_frozen_account(account, adv_adj)
+
+	insert_gl_entries(gl_entries)
+
+	for account in account_details:
+		validate_balance_type(account, adv_adj)
+
+	return gl_entries
+
+def get_account_details_for_gl_map(gl_map):
+	accounts = list(set(d.account for d in gl_map if d.account))
+	if not accounts:
+		return {}
+
+	return dict((d.name, d) for d in frappe.db.sql("""select name, account_type, report_type, root_type,
+			is_group, docstatus, company, account_currency
+		from `tabAccount` where name in ({0})""".format(", ".join(["%s"] * len(accounts))),
+		tuple(accounts), as_dict=1))
+
+def get_cost_center_company_for_gl_map(gl_map):
+	cost_centers = list(set(d.get("cost_center") for d in gl_map if d.get("cost_center")))
+	if not cost_centers:
+		return {}
+
+	return dict(frappe.db.sql("""select name, company from `tabCost Center`
+		where name in ({0})""".format(", ".join(["%s"] * len(cost_centers))), tuple(cost_centers)))
+
+def validate_gl_entry_mandatory(gle, account, precision):
+	for k in ('account', 'voucher_type', 'voucher_no', 'company'):
+		if not gle.get(k):
+			frappe.throw(_("{0} is required").format(_(gle.meta.get_label(k))))
+
+	if gle.party and not gle.party_type:
+		frappe.throw(_("Party is set but Party Type is not provided"))
+	if gle.party_type and not gle.party:
+		frappe.throw(_("Party Type is set but Party is not provided"))
+	if bool(gle.against_voucher) != bool(gle.against_voucher_type):
+		frappe.throw(_("Against Voucher is set but Against Voucher Type is not provided"))
+
+	if not (gle.party_type and gle.party):
+		if account.account_type == "Receivable":
+			frappe.throw(_("{0} {1}: Party is required against Receivable account {2}")
+				.format(gle.voucher_type, gle.voucher_no, gle.account))
+		elif account.account_type == "Payable":
+			frappe.throw(_("{0} {1}: Party is required against Payable account {2}")
+				.format(gle.voucher_type, gle.voucher_no, gle.account))
+
+	if gle.party and account.account_type not in ('Receivable', 'Payable'):
+		frappe.throw(_("{0} {1}: Party cannot be set for Account {2} because it is neither a Receivable or Payable account")
+			.format(gle.voucher_type, gle.voucher_no, gle.account))
+
+	# Zero value transaction is not allowed
+	if not (flt(gle.debit, precision) or flt(gle.credit, precision)):
+		frappe.throw(_("{0} {1}: Either debit or credit amount is required for {2}")
+			.format(gle.voucher_type, gle.voucher_no, gle.account))
+
+def validate_gl_entry_cost_center(gle, account, cost_center_company):
+	from erpnext.accounts.utils import (get_allow_cost_center_in_entry_of_bs_account,
+		get_allow_project_in_entry_of_bs_account)
+
+	if account.report_type == "Profit and Loss":
+		if not gle.cost_center and gle.voucher_type != 'Period Closing Voucher':
+			frappe.throw(_("{0} {1}: Cost Center is required for 'Profit and Loss' account {2}. Please set up a default Cost Center for the Company.")
+				.format(gle.voucher_type, gle.voucher_no, gle.account))
+	else:
+		if not get_allow_cost_center_in_entry_of_bs_account() and gle.cost_center:
+			gle.cost_center = None
+		if not get_allow_project_in_entry_of_bs_account() and gle.project:
+			gle.project = None
+
+	if gle.cost_center and cost_center_company.get(gle.cost_center) != gle.company:
+		frappe.throw(_("{0} {1}: Cost Center {2} does not belong to Company {3}")
+			.format(gle.voucher_type, gle.voucher_no, gle.cost_center, gle.company))
+
+def validate_gl_entry_account(gle, account, company_currency):
+	from erpnext.exceptions import InvalidAccountCurrency
+
+	if gle.is_opening == 'Yes' and account.report_type == "Profit and Loss" \
+		and gle.voucher_type not in ['Purchase Invoice', 'Sales Invoice']:
+		frappe.throw(_("{0} {1}: 'Profit and Loss' type account {2} not allowed in Opening Entry")
+			.format(gle.voucher_type, gle.voucher_no, gle.account))
+
+	if account.is_group == 1:
+		frappe.throw(_("{0} {1}: Account {2} cannot be a Group")
+			.format(gle.voucher_type, gle.voucher_no, gle.account))
+
+	if account.docstatus == 2:
+		frappe.throw(_("{0} {1}: Account {2} is inactive")
+			.format(gle.voucher_type, gle.voucher_no, gle.account))
+
+	if account.company != gle.company:
+		frappe.throw(_("{0} {1}: Account {2} does not belong to Company {3}")
+			.format(gle.voucher_type, gle.voucher_no, gle.account, gle.company))
+
+	if not gle.account_currency:
+		gle.account_currency = company_currency
+
+	if (account.account_currency or company_currency) != gle.account_currency:
+		frappe.throw(_("{0} {1}: Accounting Entry for {2} can only be made in currency: {3}")
+			.format(gle.voucher_type, gle.voucher_no, gle.account,
+			(account.account_currency or company_currency)), InvalidAccountCurrency)
+
+def insert_gl_entries(gl_entries):
+	"""insert submitted GL Entries with one multi-row statement"""
+	names = make_gl_entry_names(len(gl_entries))
+	timestamp, user = now(), frappe.session.user
+
+	rows = []
+	for name, gle in zip(names, gl_entries):
+		gle.update({
+			"name": name,
+			"creation": timestamp,
+			"modified": timestamp,
+			"owner": user,
+			"modified_by": user,
+			"docstatus": 1
+		})
+		rows.append(gle.get_valid_dict())
+
+	columns = list(rows[0])
+	frappe.db.sql("""insert into `tabGL Entry` ({columns}) values {values}""".format(
+		columns=", ".join("`{0}`".format(c) for c in columns),
+		values=", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(rows))),
+		tuple(row.get(c) for row in rows for c in columns))
+
+def make_gl_entry_names(count):
+	"""reserve names for GL Entries from the naming series with a single series update"""
+	from frappe.model.naming import make_autoname, parse_naming_series
+
+	autoname = frappe.get_meta("GL Entry").autoname or ""
+	prefix, _dot, hashes = autoname.rpartition(".")
+
+	if not (prefix and hashes and hashes == "#" * len(hashes)):
+		return [make_autoname(autoname, "GL Entry") for i in range(count)]
+
+	series = parse_naming_series(prefix)
+	current = frappe.db.sql("select `current` from `tabSeries` where name=%s for update", series)
+	if current:
+		current = cint(current[0][0])
+		frappe.db.sql("update `tabSeries` set `current` = `current` + %s where name=%s", (count, series))
+	else:
+		current = 0
+		frappe.db.sql("insert into `tabSeries` (name, `current`) values (%s, %s)", (series, count))
+
+	return [series + ("%0" + str(len(hashes)) + "d") % (current + i) for i in range(1, count + 1)]
+
+def validate_expense_against_budget_for_gl_map(gl_map):
+	"""budget is checked once per expense account, cost center and project"""
+	accounts = list(set(d.account for d in gl_map))
+	expense_accounts = frappe.db.sql_list("""select name from `tabAccount`
+		where root_type = 'Expense' and name in ({0})""".format(", ".join(["%s"] * len(accounts))),
+		tuple(accounts))
+
+	checked = set()
+	for entry in gl_map:
+		key = (entry.account, entry.get("cost_center"), entry.get("project"))
+		if entry.account in expense_accounts and key not in checked:
+			checked.add(key)
+			validate_expense_against_budget(entry)
+
 def validate_account_for_perpetual_inventory(gl_map):
 	if cint(erpnext.is_perpetual_inventory_enabled(gl_map[0].company)) \
 		and gl_map[0].voucher_type=="Journal Entry":
@@ -241,8 +471,13 @@ def delete_gl_entries(gl_entries=None, voucher_type=None, voucher_no=None,
 	if gl_entries:
 		check_freezing_date(gl_entries[0]["posting_date"], adv_adj)
 
+	voucher_type = voucher_type or gl_entries[0]["voucher_type"]
+	voucher_no = voucher_no or gl_entries[0]["voucher_no"]
+
+	reverse_account_period_balances(voucher_type, voucher_no)
+	delete_payment_ledger_entries(voucher_type, voucher_no)
 	frappe.db.sql("""delete from `tabGL Entry` where voucher_type=%s and voucher_no=%s""",
-		(voucher_type or gl_entries[0]["voucher_type"], voucher_no or gl_entries[0]["voucher_no"]))
+		(voucher_type, voucher_no))
 
 	vouchers_for_balance_update = set()
 	for entry in gl_entries:
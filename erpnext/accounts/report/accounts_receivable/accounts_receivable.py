@@ -9,6 +9,9 @@ from frappe.desk.query_report import group_report_data, hide_columns_if_filtered
 from erpnext.accounts.utils import get_allow_cost_center_in_entry_of_bs_account, get_allow_project_in_entry_of_bs_account
 from erpnext.accounts.report.financial_statements import get_cost_centers_with_children
 
+# GL Entries are fetched and allocated for these many parties at a time
+PARTY_CHUNK_SIZE = 500
+
 class ReceivablePayableReport(object):
 	def __init__(self, filters=None):
 		self.filters = frappe._dict(filters or {})
@@ -309,42 +312,90 @@ class ReceivablePayableReport(object):
 		return columns
 
 	def get_data(self):
+		# rows are generated party chunk by party chunk, sort them as per posting date and party
+		return sorted(self.get_rows(), key=lambda d: (getdate(d.posting_date), cstr(d.party)))
+
+	def get_rows(self):
+		"""Yields report rows. GL Entries are fetched and allocated for a chunk of parties at a time"""
+		self.set_report_defaults()
+
+		for parties in self.get_party_chunks(self.filters.get("party_type")):
+			self.build_ledger(self.filters.get("party_type"), parties)
+
+			for row in self.get_rows_from_ledger():
+				yield row
+
+	def set_report_defaults(self):
 		from erpnext.accounts.utils import get_currency_precision
 		self.currency_precision = get_currency_precision() or 2
 		self.dr_or_cr = "debit" if erpnext.get_party_account_type(self.filters.get("party_type")) == "Receivable" else "credit"
 		if self.filters.get("party_type") == "Employee":
 			self.dr_or_cr = "debit"
 
-		future_vouchers = self.get_entries_after(self.filters.report_date, self.filters.get("party_type"))
-
 		if not self.filters.get("company"):
 			self.filters["company"] = frappe.db.get_single_value('Global Defaults', 'default_company')
 
 		self.company_currency = frappe.get_cached_value('Company',  self.filters.get("company"), "default_currency")
 
-		return_entries = self.get_return_entries(self.filters.get("party_type"))
-		employee_advances_already_added = []
+		if self.filters.get("cost_center"):
+			self.filters.cost_center = get_cost_centers_with_children(self.filters.get("cost_center"))
 
-		data = []
+		if self.filters.get("project") and not isinstance(self.filters.get("project"), list):
+			self.filters.project = [d.strip() for d in cstr(self.filters.project).strip().split(',') if d]
+
+		self.return_entries = self.get_return_entries(self.filters.get("party_type"))
 		self.pdc_details = get_pdc_details(self.filters.get("party_type"), self.filters.report_date)
-		gl_entries_data = self.get_entries_till(self.filters.report_date, self.filters.get("party_type"))
+		self.employee_advances_already_added = set()
 
-		if gl_entries_data:
-			voucher_nos = [d.voucher_no for d in gl_entries_data] or []
-			dn_details = get_dn_details(self.filters.get("party_type"), voucher_nos)
-			self.voucher_details = get_voucher_details(self.filters.get("party_type"), voucher_nos, dn_details)
+	def get_party_chunks(self, party_type):
+		conditions, values = self.prepare_conditions(party_type)
 
-		if self.filters.party_type == "Employee":
-			employee_advances = list(set([d.against_voucher for d in gl_entries_data or [] if d.against_voucher_type == "Employee Advance"]))
+		parties = frappe.db.sql_list("""
+			select distinct gle.party
+			from `tabGL Entry` gle
+			where
+				gle.docstatus < 2 and gle.party_type=%s and (gle.party is not null and gle.party != '') {conditions}
+			order by gle.party""".format(conditions=conditions), values)  # nosec
+
+		for i in range(0, len(parties), PARTY_CHUNK_SIZE):
+			yield parties[i:i + PARTY_CHUNK_SIZE]
+
+	def build_ledger(self, party_type, parties):
+		"""Fetch all GL Entries of the parties once and index them:
+			- `gl_entries`: entries till the report date
+			- `future_vouchers`: vouchers posted after the report date
+			- `ledger`: entries till the report date by party and against voucher,
+				to allocate payments and returns to invoices"""
+		self.gl_entries, self.future_vouchers, self.ledger = [], set(), {}
+
+		for gle in self.get_gl_entries(party_type, parties):
+			if getdate(gle.posting_date) > self.filters.report_date:
+				self.future_vouchers.add((gle.voucher_type, gle.voucher_no))
+				continue
+
+			self.gl_entries.append(gle)
+			if gle.against_voucher_type and gle.against_voucher:
+				self.ledger.setdefault((gle.party, gle.against_voucher_type, gle.against_voucher), []).append(gle)
+
+		voucher_nos = list(set([d.voucher_no for d in self.gl_entries]))
+		self.voucher_details = {}
+		if voucher_nos:
+			dn_details = get_dn_details(party_type, voucher_nos)
+			self.voucher_details = get_voucher_details(party_type, voucher_nos, dn_details)
+
+		if party_type == "Employee":
+			employee_advances = list(set([d.against_voucher for d in self.gl_entries if d.against_voucher_type == "Employee Advance"]))
 			self.employee_advance_details = get_employee_advance_details(employee_advances)
 
-		if self.filters.based_on_payment_terms and gl_entries_data:
+		self.payment_term_map = {}
+		if self.filters.based_on_payment_terms and voucher_nos:
 			self.payment_term_map = self.get_payment_term_detail(voucher_nos)
 
-		for gle in gl_entries_data:
-			if self.is_receivable_or_payable(gle, self.dr_or_cr, future_vouchers, return_entries) and self.is_in_cost_center(gle) and self.is_in_project(gle):
+	def get_rows_from_ledger(self):
+		for gle in self.gl_entries:
+			if self.is_receivable_or_payable(gle, self.dr_or_cr, self.future_vouchers, self.return_entries) and self.is_in_cost_center(gle) and self.is_in_project(gle):
 				outstanding_amount, credit_note_amount, payment_amount = self.get_outstanding_amount(
-					gle, self.filters.report_date, self.dr_or_cr, return_entries)
+					gle, self.filters.report_date, self.dr_or_cr, self.return_entries)
 
 				temp_outstanding_amt = outstanding_amount
 				temp_credit_note_amt = credit_note_amount
@@ -367,23 +418,20 @@ class ReceivablePayableReport(object):
 							d.pdc_details, d.pdc_amount = self.allocate_pdc_amount_in_fifo(gle, row_outstanding)
 
 							if term_outstanding_amount > 0:
-								row = self.prepare_row(gle, term_outstanding_amount,
+								yield self.prepare_row(gle, term_outstanding_amount,
 									d.credit_note_amount, d.due_date, d.payment_amount , d.payment_term_amount,
 									d.description, d.pdc_amount, d.pdc_details)
-								data.append(row)
 
 						if credit_note_amount:
-							row = self.prepare_row_without_payment_terms(gle, temp_outstanding_amt, temp_credit_note_amt)
-							data.append(row)
+							yield self.prepare_row_without_payment_terms(gle, temp_outstanding_amt, temp_credit_note_amt)
 
 					else:
-						row = self.prepare_row_without_payment_terms(gle, outstanding_amount, credit_note_amount)
-						data.append(row)
+						yield self.prepare_row_without_payment_terms(gle, outstanding_amount, credit_note_amount)
 
 			elif self.filters.party_type == "Employee" and gle.against_voucher_type == "Employee Advance":
 				ea_details = self.employee_advance_details.get(gle.against_voucher, frappe._dict())
-				if gle.against_voucher not in employee_advances_already_added and self.is_in_cost_center(ea_details) and self.is_in_project(ea_details):
-					employee_advances_already_added.append(gle.against_voucher)
+				if gle.against_voucher not in self.employee_advances_already_added and self.is_in_cost_center(ea_details) and self.is_in_project(ea_details):
+					self.employee_advances_already_added.add(gle.against_voucher)
 					outstanding_amount, return_amount, payment_amount = self.get_employee_advance_outstanding(gle,
 						self.filters.report_date)
 
@@ -397,10 +445,7 @@ class ReceivablePayableReport(object):
 						ea.remarks = ea_details.purpose
 						ea.cost_center = ea_details.cost_center
 						ea.project = ea_details.project
-						row = self.prepare_row_without_payment_terms(ea, outstanding_amount, return_amount)
-						data.append(row)
-
-		return data
+						yield self.prepare_row_without_payment_terms(ea, outstanding_amount, return_amount)
 
 	def get_grouped_data(self, columns, data):
 		level1 = self.filters.get("group_by", "").replace("Group by ", "")
@@ -662,14 +707,6 @@ class ReceivablePayableReport(object):
 
 		return row
 
-	def get_entries_after(self, report_date, party_type):
-		# returns a distinct list
-		return list(set([(e.voucher_type, e.voucher_no) for e in self.get_gl_entries(party_type, report_date, for_future=True)]))
-
-	def get_entries_till(self, report_date, party_type):
-		# returns a generator
-		return self.get_gl_entries(party_type, report_date)
-
 	@staticmethod
 	def is_receivable_or_payable(gle, dr_or_cr, future_vouchers, return_entries):
 		return (
@@ -691,16 +728,13 @@ class ReceivablePayableReport(object):
 
 	def is_in_cost_center(self, gle):
 		if self.filters.get("cost_center"):
-			self.filters.cost_center = get_cost_centers_with_children(self.filters.get("cost_center"))
 			return gle.cost_center and gle.cost_center in self.filters.cost_center
 		else:
 			return True
 
 	def is_in_project(self, gle):
 		if self.filters.get("project"):
-			if not isinstance(self.filters.get("project"), list):
-				self.filters.project = [d.strip() for d in cstr(self.filters.project).strip().split(',') if d]
-			return gle.project and gle.project in self.filters.cost_center
+			return gle.project and gle.project in self.filters.project
 		else:
 			return True
 
@@ -722,8 +756,8 @@ class ReceivablePayableReport(object):
 		payment_amount, credit_note_amount = 0.0, 0.0
 		reverse_dr_or_cr = "credit" if dr_or_cr=="debit" else "debit"
 
-		for e in self.get_gl_entries_for(gle.party, gle.party_type, gle.voucher_type, gle.voucher_no):
-			if getdate(e.posting_date) <= report_date and e.name!=gle.name:
+		for e in self.get_ledger_entries(gle.party, gle.voucher_type, gle.voucher_no):
+			if e.name!=gle.name:
 				amount = flt(e.get(reverse_dr_or_cr), self.currency_precision) - flt(e.get(dr_or_cr), self.currency_precision)
 				if e.voucher_no not in return_entries:
 					payment_amount += amount
@@ -747,14 +781,13 @@ class ReceivablePayableReport(object):
 	def get_employee_advance_outstanding(self, gle, report_date):
 		claimed_amount, payment_amount, return_amount = 0.0, 0.0, 0.0
 
-		for e in self.get_gl_entries_for(gle.party, gle.party_type, gle.against_voucher_type, gle.against_voucher):
-			if getdate(e.posting_date) <= report_date:
-				payment_amount += flt(e.debit, self.currency_precision)
+		for e in self.get_ledger_entries(gle.party, gle.against_voucher_type, gle.against_voucher):
+			payment_amount += flt(e.debit, self.currency_precision)
 
-				if e.voucher_type == "Expense Claim":
-					claimed_amount += flt(e.credit, self.currency_precision)
-				else:
-					return_amount += flt(e.credit, self.currency_precision)
+			if e.voucher_type == "Expense Claim":
+				claimed_amount += flt(e.credit, self.currency_precision)
+			else:
+				return_amount += flt(e.credit, self.currency_precision)
 
 		outstanding_amount = payment_amount - claimed_amount - return_amount
 		return outstanding_amount, return_amount, payment_amount
@@ -807,7 +840,7 @@ class ReceivablePayableReport(object):
 
 		return self.party_map
 
-	def get_gl_entries(self, party_type, date=None, for_future=False):
+	def get_gl_entries(self, party_type, parties):
 		conditions, values = self.prepare_conditions(party_type)
 
 		if self.filters.get(scrub(party_type)) or self.filters.get("account"):
@@ -815,13 +848,10 @@ class ReceivablePayableReport(object):
 		else:
 			select_fields = "sum(gle.debit) as debit, sum(gle.credit) as credit"
 
-		if date and not for_future:
-			conditions += " and gle.posting_date <= '%s'" % date
+		conditions += " and gle.party in ({0})".format(", ".join(["%s"] * len(parties)))
+		values += parties
 
-		if date and for_future:
-			conditions += " and gle.posting_date > '%s'" % date
-
-		self.gl_entries = frappe.db.sql("""
+		return frappe.db.sql("""
 			select
 				gle.name, gle.posting_date, gle.account, gle.party_type, gle.party, gle.voucher_type, gle.voucher_no,
 				gle.against_voucher_type, gle.against_voucher, gle.account_currency, gle.remarks, gle.cost_center, gle.project,
@@ -835,8 +865,6 @@ class ReceivablePayableReport(object):
 			select_fields=select_fields,
 			conditions=conditions), values, as_dict=True)
 
-		return self.gl_entries
-
 	def prepare_conditions(self, party_type):
 		conditions = [""]
 		values = [party_type]
@@ -925,19 +953,8 @@ class ReceivablePayableReport(object):
 
 		return " and ".join(conditions), values
 
-	def get_gl_entries_for(self, party, party_type, against_voucher_type, against_voucher):
-		if not hasattr(self, "gl_entries_map"):
-			self.gl_entries_map = {}
-			for gle in self.get_gl_entries(party_type):
-				if gle.against_voucher_type and gle.against_voucher:
-					self.gl_entries_map.setdefault(gle.party, {})\
-						.setdefault(gle.against_voucher_type, {})\
-						.setdefault(gle.against_voucher, [])\
-						.append(gle)
-
-		return self.gl_entries_map.get(party, {})\
-			.get(against_voucher_type, {})\
-			.get(against_voucher, [])
+	def get_ledger_entries(self, party, against_voucher_type, against_voucher):
+		return self.ledger.get((party, against_voucher_type, against_voucher), [])
 
 	def get_payment_term_detail(self, voucher_nos):
 		payment_term_map = frappe._dict()
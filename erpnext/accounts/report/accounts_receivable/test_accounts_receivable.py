@@ -54,6 +54,21 @@ class TestAccountsReceivable(unittest.TestCase):
 			for col, value in iteritems(row):
 				self.assertEqual(value, report[1][i][col])
 
+	def test_accounts_receivable_in_party_chunks(self):
+		from erpnext.accounts.report.accounts_receivable import accounts_receivable
+
+		filters = {'company': '_Test Company'}
+		expected = execute(filters)[1]
+
+		party_chunk_size = accounts_receivable.PARTY_CHUNK_SIZE
+		accounts_receivable.PARTY_CHUNK_SIZE = 1
+		try:
+			report = execute(filters)[1]
+		finally:
+			accounts_receivable.PARTY_CHUNK_SIZE = party_chunk_size
+
+		self.assertEqual(sorted((d.voucher_no, d.outstanding_amount) for d in report),
+			sorted((d.voucher_no, d.outstanding_amount) for d in expected))
 
 def make_sales_invoice():
 	frappe.set_user("Administrator")
@@ -210,8 +210,12 @@ class AccountsReceivableSummary(ReceivablePayableReport):
 		return party_total
 
 	def get_voucherwise_data(self, party_naming_by, args):
-		voucherwise_data = ReceivablePayableReport(self.filters).run(args)[1]
-		return voucherwise_data
+		# voucherwise rows are only totalled by party, no need to hold all of them
+		report = ReceivablePayableReport(self.filters)
+		report.filters.party_type = args.get('party_type')
+		report.party_naming_by = party_naming_by
+
+		return report.get_rows()
 
 def execute(filters=None):
 	args = {
@@ -343,6 +343,12 @@ def set_gl_entries_by_account(from_date, to_date, root_lft, root_rgt, filters, g
 	})
 
 	for d in companies:
+		if not filters.get('presentation_currency') or filters.get('presentation_currency') == d.default_currency:
+			# no conversion of individual entries, aggregate by account in the query
+			set_account_balances_by_account(from_date, to_date, root_lft, root_rgt, d.name, filters,
+				gl_entries_by_account, accounts_by_name, additional_conditions)
+			continue
+
 		gl_entries = frappe.db.sql("""select gl.posting_date, gl.account, gl.debit, gl.credit, gl.is_opening, gl.company,
 			gl.fiscal_year, gl.debit_in_account_currency, gl.credit_in_account_currency, gl.account_currency,
 			acc.account_name, acc.account_number
@@ -372,6 +378,31 @@ def set_gl_entries_by_account(from_date, to_date, root_lft, root_rgt, filters, g
 
 	return gl_entries_by_account
 
+def set_account_balances_by_account(from_date, to_date, root_lft, root_rgt, company, filters,
+	gl_entries_by_account, accounts_by_name, additional_conditions):
+	"""Adds one row of total debit and credit per account, and separately before `from_date`,
+		instead of individual GL Entries"""
+	balances = frappe.db.sql("""select gl.account, min(gl.posting_date) as posting_date, gl.company,
+		sum(gl.debit) as debit, sum(gl.credit) as credit, acc.account_name, acc.account_number
+		from `tabGL Entry` gl, `tabAccount` acc where acc.name = gl.account and gl.company = %(company)s
+		{additional_conditions} and gl.posting_date <= %(to_date)s and acc.lft >= %(lft)s and acc.rgt <= %(rgt)s
+		group by gl.account, gl.posting_date < %(from_date)s""".format(additional_conditions=additional_conditions),
+		{
+			"from_date": from_date,
+			"to_date": to_date,
+			"lft": root_lft,
+			"rgt": root_rgt,
+			"company": company,
+			"finance_book": filters.get("finance_book"),
+			"company_fb": frappe.db.get_value("Company", company, 'default_finance_book')
+		},
+		as_dict=True)
+
+	for entry in balances:
+		key = entry.account_number or entry.account_name
+		validate_entries(key, entry, accounts_by_name)
+		gl_entries_by_account.setdefault(key, []).append(entry)
+
 def validate_entries(key, entry, accounts_by_name):
 	if key not in accounts_by_name:
 		field = "Account number" if entry.account_number else "Account name"
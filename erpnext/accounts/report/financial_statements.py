@@ -13,7 +13,7 @@ import frappe, erpnext
 from erpnext.accounts.report.utils import get_currency, convert_to_presentation_currency
 from erpnext.accounts.utils import get_fiscal_year
 from frappe import _
-from frappe.utils import (flt, getdate, get_first_day, add_months, add_days, formatdate)
+from frappe.utils import (flt, getdate, get_first_day, get_last_day, add_months, add_days, formatdate)
 
 from six import itervalues
 
@@ -135,21 +135,35 @@ def get_data(
 	accounts, accounts_by_name, parent_children_map = filter_accounts(accounts)
 
 	company_currency = get_appropriate_currency(company, filters)
+	from_date = period_list[0]["year_start_date"] if only_current_fiscal_year else None
 
-	gl_entries_by_account = {}
-	for root in frappe.db.sql("""select lft, rgt from tabAccount
-			where root_type=%s and ifnull(parent_account, '') = ''""", root_type, as_dict=1):
+	roots = frappe.db.sql("""select lft, rgt from tabAccount
+			where root_type=%s and ifnull(parent_account, '') = ''""", root_type, as_dict=1)
 
-		set_gl_entries_by_account(
-			company,
-			period_list[0]["year_start_date"] if only_current_fiscal_year else None,
-			period_list[-1]["to_date"],
-			root.lft, root.rgt, filters,
-			gl_entries_by_account, ignore_closing_entries=ignore_closing_entries
-		)
+	if company_currency == frappe.get_cached_value('Company',  company,  "default_currency"):
+		# no conversion of individual entries, aggregate by period in the query
+		for root in roots:
+			period_balances = get_period_balances(company, from_date, period_list, root.lft, root.rgt,
+				filters, ignore_closing_entries=ignore_closing_entries,
+				group_by_fiscal_year=ignore_accumulated_values_for_fy)
+
+			calculate_period_values(accounts_by_name, period_balances, period_list,
+				accumulated_values, ignore_accumulated_values_for_fy)
+	else:
+		gl_entries_by_account = {}
+		for root in roots:
+			set_gl_entries_by_account(
+				company,
+				from_date,
+				period_list[-1]["to_date"],
+				root.lft, root.rgt, filters,
+				gl_entries_by_account, ignore_closing_entries=ignore_closing_entries,
+				period_list=period_list
+			)
+
+		calculate_values(
+			accounts_by_name, gl_entries_by_account, period_list, accumulated_values, ignore_accumulated_values_for_fy)
 
-	calculate_values(
-		accounts_by_name, gl_entries_by_account, period_list, accumulated_values, ignore_accumulated_values_for_fy)
 	accumulate_values_into_parents(accounts, accounts_by_name, period_list, accumulated_values)
 	out = prepare_data(accounts, balance_must_be, period_list, company_currency)
 	out = filter_out_zero_value_rows(out, parent_children_map)
@@ -190,6 +204,27 @@ def calculate_values(
 				d["opening_balance"] = d.get("opening_balance", 0.0) + flt(entry.debit) - flt(entry.credit)
 
 
+def calculate_period_values(
+		accounts_by_name, period_balances, period_list, accumulated_values, ignore_accumulated_values_for_fy):
+	"""Same as `calculate_values`, for balances already grouped by period in `get_period_balances`"""
+	for entry in period_balances:
+		d = accounts_by_name.get(entry.account)
+		if not d:
+			frappe.msgprint(
+				_("Could not retrieve information for {0}.".format(entry.account)), title="Error",
+				raise_exception=1
+			)
+		for i, period in enumerate(period_list):
+			if entry.period_index <= i:
+				if (accumulated_values or entry.period_index == i) and \
+					(not ignore_accumulated_values_for_fy or
+						entry.fiscal_year == period.to_date_fiscal_year):
+					d[period.key] = d.get(period.key, 0.0) + flt(entry.balance)
+
+		if entry.before_year_start:
+			d["opening_balance"] = d.get("opening_balance", 0.0) + flt(entry.balance)
+
+
 def accumulate_values_into_parents(accounts, accounts_by_name, period_list, accumulated_values):
 	"""accumulate children's values in parent accounts"""
 	for d in reversed(accounts):
@@ -338,13 +373,26 @@ def sort_accounts(accounts, is_root=False, key="name"):
 	accounts.sort(key = functools.cmp_to_key(compare_accounts))
 
 def set_gl_entries_by_account(
-		company, from_date, to_date, root_lft, root_rgt, filters, gl_entries_by_account, ignore_closing_entries=False):
+		company, from_date, to_date, root_lft, root_rgt, filters, gl_entries_by_account, ignore_closing_entries=False,
+		period_list=None):
 	"""Returns a dict like { "account": [gl entries], ... }"""
 
-	additional_conditions = get_additional_conditions(from_date, ignore_closing_entries, filters)
-
 	accounts = frappe.db.sql_list("""select name from `tabAccount`
 		where lft >= %s and rgt <= %s""", (root_lft, root_rgt))
+
+	if can_use_account_period_balances(from_date, to_date, filters, period_list):
+		gl_entries = get_account_period_balances(company, from_date, to_date, accounts,
+			filters, ignore_closing_entries)
+	else:
+		gl_entries = get_gl_entries(company, from_date, to_date, accounts, filters, ignore_closing_entries)
+
+	for entry in gl_entries:
+		gl_entries_by_account.setdefault(entry.account, []).append(entry)
+
+	return gl_entries_by_account
+
+def get_gl_entries(company, from_date, to_date, accounts, filters, ignore_closing_entries=False):
+	additional_conditions = get_additional_conditions(from_date, ignore_closing_entries, filters)
 	additional_conditions += " and account in ('{}')"\
 		.format("', '".join([frappe.db.escape(d) for d in accounts]))
 
@@ -367,11 +415,115 @@ def set_gl_entries_by_account(
 	if filters and filters.get('presentation_currency'):
 		convert_to_presentation_currency(gl_entries, get_currency(filters))
 
-	for entry in gl_entries:
-		gl_entries_by_account.setdefault(entry.account, []).append(entry)
+	return gl_entries
 
-	return gl_entries_by_account
+def get_period_balances(company, from_date, period_list, root_lft, root_rgt, filters,
+		ignore_closing_entries=False, group_by_fiscal_year=False):
+	"""Returns debit - credit of the accounts under the root, one row per account and period.
+		`period_index` is the index of the period in `period_list`, or -1 before the first period"""
+	to_date = period_list[-1]["to_date"]
+
+	if can_use_account_period_balances(from_date, to_date, filters, period_list):
+		table, date_field = "`tabAccount Period Balance`", "period_start_date"
+		conditions = get_account_period_balance_conditions(from_date, ignore_closing_entries, filters)
+	else:
+		table, date_field = "`tabGL Entry`", "posting_date"
+		conditions = get_additional_conditions(from_date, ignore_closing_entries, filters)
+
+	values = {
+		"company": company,
+		"from_date": from_date,
+		"to_date": to_date,
+		"lft": root_lft,
+		"rgt": root_rgt,
+		"first_period_start_date": period_list[0]["from_date"],
+		"year_start_date": period_list[0]["year_start_date"],
+		"cost_center": filters.cost_center,
+		"project": filters.project,
+		"finance_book": filters.get("finance_book"),
+		"company_fb": frappe.db.get_value("Company", company, 'default_finance_book')
+	}
+
+	period_conditions = []
+	for i, period in enumerate(period_list):
+		values["period_end_date_{0}".format(i)] = period["to_date"]
+		period_conditions.append("when {0} <= %(period_end_date_{1})s then {1}".format(date_field, i))
+
+	return frappe.db.sql("""select account, {fiscal_year} as fiscal_year,
+			case when {date_field} < %(first_period_start_date)s then -1 {period_conditions} end as period_index,
+			{date_field} < %(year_start_date)s as before_year_start,
+			sum(debit) - sum(credit) as balance
+		from {table}
+		where company=%(company)s
+			and account in (select name from `tabAccount` where lft >= %(lft)s and rgt <= %(rgt)s)
+			{conditions}
+			and {date_field} <= %(to_date)s
+		group by account, period_index, before_year_start{group_by_fiscal_year}""".format(
+			table=table, date_field=date_field, conditions=conditions,
+			period_conditions=" ".join(period_conditions),
+			fiscal_year="fiscal_year" if group_by_fiscal_year else "null",
+			group_by_fiscal_year=", fiscal_year" if group_by_fiscal_year else ""),
+		values, as_dict=True)
+
+def can_use_account_period_balances(from_date, to_date, filters, period_list=None):
+	"""Account Period Balances are summarized by month, so they can be used if the report
+		periods are whole months and no filter needs individual GL Entries"""
+	if filters and (filters.get("project") or filters.get("presentation_currency")):
+		return False
+
+	start_dates, end_dates = [from_date], [to_date]
+	for period in (period_list or []):
+		start_dates += [period.from_date, period.year_start_date]
+		end_dates.append(period.to_date)
+
+	return all(getdate(d).day == 1 for d in start_dates if d) \
+		and all(getdate(d) == get_last_day(d) for d in end_dates if d)
+
+def get_account_period_balances(company, from_date, to_date, accounts, filters, ignore_closing_entries=False):
+	"""Returns monthly debit and credit of the accounts from Account Period Balance,
+		in the same format as GL Entries posted on the first day of the month"""
+	conditions = get_account_period_balance_conditions(from_date, ignore_closing_entries, filters)
+
+	return frappe.db.sql("""select period_start_date as posting_date, account, sum(debit) as debit,
+			sum(credit) as credit, is_opening, fiscal_year
+		from `tabAccount Period Balance`
+		where company=%(company)s and account in %(accounts)s
+		{conditions}
+		and period_start_date <= %(to_date)s
+		group by account, period_start_date, fiscal_year, is_opening
+		order by account, period_start_date""".format(conditions=conditions),
+		{
+			"company": company,
+			"accounts": accounts or [""],
+			"from_date": from_date,
+			"to_date": to_date,
+			"cost_center": filters.cost_center,
+			"finance_book": filters.get("finance_book"),
+			"company_fb": frappe.db.get_value("Company", company, 'default_finance_book')
+		},
+		as_dict=True)
+
+def get_account_period_balance_conditions(from_date, ignore_closing_entries, filters):
+	conditions = []
+
+	if ignore_closing_entries:
+		conditions.append("is_period_closing_voucher = 0")
+
+	if from_date:
+		conditions.append("period_start_date >= %(from_date)s")
+
+	if filters:
+		if filters.get("cost_center"):
+			filters.cost_center = get_cost_centers_with_children(filters.cost_center)
+			conditions.append("cost_center in %(cost_center)s")
+
+		if filters.get("finance_book"):
+			if filters.get("include_default_book_entries"):
+				conditions.append("finance_book in (%(finance_book)s, %(company_fb)s)")
+			else:
+				conditions.append("finance_book in (%(finance_book)s)")
 
+	return " and {}".format(" and ".join(conditions)) if conditions else ""
 
 def get_additional_conditions(from_date, ignore_closing_entries, filters):
 	additional_conditions = []
@@ -0,0 +1,73 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Benchmark for posting GL Entries, one by one and in bulk.
+
+Run on a test site (all changes are rolled back):
+
+	bench --site test_site execute erpnext.accounts.test.benchmark_general_ledger.run
+	bench --site test_site execute erpnext.accounts.test.benchmark_general_ledger.run --kwargs "{'vouchers': 100, 'lines': 50}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import time
+import frappe
+from frappe.utils import nowdate
+from erpnext.accounts.general_ledger import make_gl_entries
+
+COMPANY = "_Test Company"
+DEBIT_ACCOUNT = "_Test Account Cost for Goods Sold - _TC"
+CREDIT_ACCOUNT = "_Test Bank - _TC"
+COST_CENTER = "_Test Cost Center - _TC"
+
+def run(vouchers=200, lines=20):
+	results = []
+	post_in_bulk = frappe.db.get_single_value("Accounts Settings", "post_gl_entries_in_bulk")
+	for bulk in (0, 1):
+		try:
+			frappe.db.set_value("Accounts Settings", None, "post_gl_entries_in_bulk", bulk)
+			results.append(benchmark_posting(vouchers, lines, bulk))
+		finally:
+			frappe.db.rollback()
+
+	frappe.db.set_value("Accounts Settings", None, "post_gl_entries_in_bulk", post_in_bulk)
+
+	for d in results:
+		print("{0:>5} vouchers x {1:>3} lines | {2:<10} | {3:8.2f}s | {4:8.1f} vouchers/s | {5:8.0f} entries/s".format(
+			d.vouchers, d.lines, "bulk" if d.bulk else "one by one", d.seconds,
+			d.vouchers_per_second, d.entries_per_second))
+
+	return results
+
+def benchmark_posting(vouchers, lines, bulk):
+	gl_maps = [get_gl_map("_T-BENCH-{0:05d}".format(i), lines) for i in range(vouchers)]
+
+	start = time.time()
+	for gl_map in gl_maps:
+		# merging would collapse the lines into a single debit entry
+		make_gl_entries(gl_map, merge_entries=False)
+	seconds = time.time() - start
+
+	return frappe._dict(vouchers=vouchers, lines=lines, bulk=bulk, seconds=seconds,
+		vouchers_per_second=vouchers / seconds if seconds else 0,
+		entries_per_second=vouchers * (lines + 1) / seconds if seconds else 0)
+
+def get_gl_map(voucher_no, lines):
+	common = {
+		"company": COMPANY,
+		"posting_date": nowdate(),
+		"voucher_type": "Journal Entry",
+		"voucher_no": voucher_no,
+		"remarks": "GL Entry benchmark"
+	}
+
+	gl_map = [frappe._dict(common, account=DEBIT_ACCOUNT, against=CREDIT_ACCOUNT,
+		cost_center=COST_CENTER, debit=i + 1, debit_in_account_currency=i + 1) for i in range(lines)]
+
+	total = sum(d.debit for d in gl_map)
+	gl_map.append(frappe._dict(common, account=CREDIT_ACCOUNT, against=DEBIT_ACCOUNT,
+		credit=total, credit_in_account_currency=total))
+
+	return gl_map
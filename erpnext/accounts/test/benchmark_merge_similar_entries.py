@@ -0,0 +1,74 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Benchmark for merging GL maps of large Journal Entries and stock-heavy invoices.
+Does not touch the database.
+
+	bench --site test_site execute erpnext.accounts.test.benchmark_merge_similar_entries.run
+	bench --site test_site execute erpnext.accounts.test.benchmark_merge_similar_entries.run --kwargs "{'sizes': [5000, 20000]}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import time
+import frappe
+from frappe.utils import flt
+from erpnext.accounts.general_ledger import merge_similar_entries, check_if_in_list
+
+def run(sizes=(5000,), distinct_ratios=(0.01, 0.5, 1)):
+	results = []
+	for size in sizes:
+		for distinct_ratio in distinct_ratios:
+			merge_by_scan_seconds, merged_by_scan = time_merge(merge_by_scan, size, distinct_ratio)
+			merge_by_key_seconds, merged_by_key = time_merge(merge_similar_entries, size, distinct_ratio)
+
+			if [get_values(d) for d in merged_by_scan] != [get_values(d) for d in merged_by_key]:
+				frappe.throw("Merged GL maps do not match for {0} lines".format(size))
+
+			results.append(frappe._dict(size=size, merged=len(merged_by_key),
+				merge_by_scan_seconds=merge_by_scan_seconds, merge_by_key_seconds=merge_by_key_seconds))
+
+	for d in results:
+		print("{0:>6} lines -> {1:>6} | scan {2:8.3f}s | key {3:8.3f}s | {4:6.1f}x".format(d.size, d.merged,
+			d.merge_by_scan_seconds, d.merge_by_key_seconds,
+			d.merge_by_scan_seconds / d.merge_by_key_seconds if d.merge_by_key_seconds else 0))
+
+	return results
+
+def time_merge(merge, size, distinct_ratio):
+	gl_map = get_gl_map(size, distinct_ratio)
+	start = time.time()
+	merged = merge(gl_map)
+	return time.time() - start, merged
+
+def merge_by_scan(gl_map):
+	"""previous quadratic implementation, as reference"""
+	merged_gl_map = []
+	for entry in gl_map:
+		same_head = check_if_in_list(entry, merged_gl_map)
+		if same_head:
+			same_head.debit = flt(same_head.debit) + flt(entry.debit)
+			same_head.debit_in_account_currency = \
+				flt(same_head.debit_in_account_currency) + flt(entry.debit_in_account_currency)
+			same_head.credit = flt(same_head.credit) + flt(entry.credit)
+			same_head.credit_in_account_currency = \
+				flt(same_head.credit_in_account_currency) + flt(entry.credit_in_account_currency)
+		else:
+			merged_gl_map.append(entry)
+
+	return [d for d in merged_gl_map if flt(d.debit, 9) != 0 or flt(d.credit, 9) != 0]
+
+def get_gl_map(size, distinct_ratio):
+	distinct = max(int(size * distinct_ratio), 1)
+	return [frappe._dict({
+		"account": "Stock In Hand - {0}".format(i % distinct % 50),
+		"cost_center": "Main - {0}".format(i % distinct // 50),
+		"project": "PROJ-{0}".format(i % distinct % 7),
+		"remarks": "Accounting Entry for Stock",
+		"debit": i % 100 + 1,
+		"debit_in_account_currency": i % 100 + 1
+	}) for i in range(size)]
+
+def get_values(gle):
+	return (gle.account, gle.cost_center, gle.project, gle.debit, gle.credit)
@@ -0,0 +1,122 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Benchmark for matching items against Pricing Rules, with one query per item
+and with the cached pricing rule index.
+
+Run on a test site (all changes are rolled back):
+
+	bench --site test_site execute erpnext.accounts.test.benchmark_pricing_rule.run
+	bench --site test_site execute erpnext.accounts.test.benchmark_pricing_rule.run --kwargs "{'rules': 5000, 'items': 1000}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import time
+import frappe
+from frappe.utils import nowdate
+from erpnext.accounts.doctype.pricing_rule.pricing_rule import get_pricing_rules
+from erpnext.accounts.doctype.pricing_rule.utils import (get_pricing_rule_index, clear_pricing_rule_index,
+	get_tree_ancestors)
+
+COMPANY = "_Test Company"
+ITEM_GROUP = "_Test Item Group"
+BRAND = "_Test Brand"
+CUSTOMER = "_Test Customer"
+
+def run(rules=1000, items=1000):
+	try:
+		make_pricing_rules(rules, items)
+		item_args = [get_item_args(i) for i in range(items)]
+
+		start = time.time()
+		by_query = [[d.name for d in get_pricing_rules_by_query(args)] for args in item_args]
+		query_seconds = time.time() - start
+
+		clear_pricing_rule_index()
+		start = time.time()
+		pricing_rule_index = get_pricing_rule_index()
+		by_index = [[d.name for d in get_pricing_rules(args, pricing_rule_index)] for args in item_args]
+		index_seconds = time.time() - start
+
+		if by_query != by_index:
+			frappe.throw("Pricing Rules matched by the index do not match the query")
+	finally:
+		frappe.db.rollback()
+		clear_pricing_rule_index()
+
+	result = frappe._dict(rules=rules, items=items, query_seconds=query_seconds, index_seconds=index_seconds,
+		matched=sum(len(d) for d in by_index))
+
+	print("{0:>6} rules x {1:>6} items | {2:>6} matches | query {3:8.3f}s | index {4:8.3f}s | {5:6.1f}x".format(
+		result.rules, result.items, result.matched, result.query_seconds, result.index_seconds,
+		result.query_seconds / result.index_seconds if result.index_seconds else 0))
+
+	return result
+
+def make_pricing_rules(rules, items):
+	for i in range(rules):
+		doc = frappe.get_doc({
+			"doctype": "Pricing Rule",
+			"name": "_T-BENCH-PRULE-{0:05d}".format(i),
+			"title": "_T-BENCH-PRULE-{0:05d}".format(i),
+			"selling": 1,
+			"company": COMPANY,
+			"priority": str(i % 20 + 1),
+			"rate_or_discount": "Discount Percentage",
+			"discount_percentage": i % 50
+		})
+
+		# mostly item rules, some by item group and brand, some only for a customer
+		if i % 10 == 0:
+			doc.update({"apply_on": "Item Group", "item_group": ITEM_GROUP})
+		elif i % 10 == 1:
+			doc.update({"apply_on": "Brand", "brand": BRAND})
+		else:
+			doc.update({"apply_on": "Item Code", "item_code": get_item_code(i % items)})
+
+		if i % 3 == 0:
+			doc.update({"applicable_for": "Customer", "customer": CUSTOMER})
+
+		doc.db_insert()
+
+def get_item_code(i):
+	return "_T-BENCH-ITEM-{0:05d}".format(i)
+
+def get_item_args(i):
+	return frappe._dict({
+		"item_code": get_item_code(i),
+		"item_group": ITEM_GROUP,
+		"brand": BRAND if i % 2 else None,
+		"variant_of": None,
+		"company": COMPANY,
+		"customer": CUSTOMER if i % 4 else None,
+		"transaction_type": "selling",
+		"transaction_date": nowdate(),
+		"price_list": "_Test Price List"
+	})
+
+def get_pricing_rules_by_query(args):
+	"""previous implementation, one query per item, as reference"""
+	conditions = ""
+	values = {"item_code": args.item_code, "brand": args.brand, "price_list": args.price_list,
+		"transaction_date": args.transaction_date}
+
+	for field in ["company", "customer", "supplier", "supplier_group", "campaign", "sales_partner"]:
+		if args.get(field):
+			conditions += " and ifnull("+field+", '') in (%("+field+")s, '')"
+			values[field] = args.get(field)
+		else:
+			conditions += " and ifnull("+field+", '') = ''"
+
+	item_groups = "', '".join([frappe.db.escape(d) for d in get_tree_ancestors("Item Group", args.item_group)])
+
+	return frappe.db.sql("""select * from `tabPricing Rule`
+		where (item_code=%(item_code)s or ifnull(item_group, '') in ('{item_groups}') or brand=%(brand)s)
+			and docstatus < 2 and disable = 0
+			and selling = 1 {conditions}
+			and ifnull(for_price_list, '') in (%(price_list)s, '')
+			and %(transaction_date)s between ifnull(valid_from, '2000-01-01') and ifnull(valid_upto, '2500-12-31')
+		order by priority desc, name desc""".format(item_groups=item_groups, conditions=conditions),
+		values, as_dict=1)
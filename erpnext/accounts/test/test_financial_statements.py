@@ -0,0 +1,46 @@
+from __future__ import unicode_literals
+import unittest
+import frappe
+from erpnext.accounts.utils import get_fiscal_year
+from erpnext.accounts.doctype.journal_entry.test_journal_entry import make_journal_entry
+from erpnext.accounts.report.financial_statements import (get_period_list, get_accounts, filter_accounts,
+	get_gl_entries, calculate_values, get_period_balances, calculate_period_values)
+
+
+class TestFinancialStatements(unittest.TestCase):
+	def test_period_balances_match_gl_entries(self):
+		make_journal_entry("_Test Account Cost for Goods Sold - _TC",
+			"_Test Bank - _TC", 100, "_Test Cost Center - _TC", submit=True)
+
+		fiscal_year = get_fiscal_year(frappe.utils.nowdate(), company="_Test Company")[0]
+		period_list = get_period_list(fiscal_year, fiscal_year, "Monthly", company="_Test Company")
+
+		for accumulated_values in (0, 1):
+			self.assertEqual(get_values_from_period_balances(period_list, accumulated_values),
+				get_values_from_gl_entries(period_list, accumulated_values))
+
+def get_root_and_accounts(root_type="Expense"):
+	root = frappe.db.sql("""select lft, rgt from tabAccount
+		where root_type=%s and ifnull(parent_account, '') = '' and company='_Test Company'""", root_type, as_dict=1)[0]
+	accounts, accounts_by_name, parent_children_map = filter_accounts(get_accounts("_Test Company", root_type))
+	return root, accounts_by_name
+
+def get_values(accounts_by_name, period_list):
+	return dict((name, [round(d.get(p.key, 0.0), 2) for p in period_list])
+		for name, d in accounts_by_name.items())
+
+def get_values_from_period_balances(period_list, accumulated_values):
+	root, accounts_by_name = get_root_and_accounts()
+	period_balances = get_period_balances("_Test Company", period_list[0].year_start_date, period_list,
+		root.lft, root.rgt, frappe._dict())
+	calculate_period_values(accounts_by_name, period_balances, period_list, accumulated_values, False)
+	return get_values(accounts_by_name, period_list)
+
+def get_values_from_gl_entries(period_list, accumulated_values):
+	root, accounts_by_name = get_root_and_accounts()
+	gl_entries_by_account = {}
+	for entry in get_gl_entries("_Test Company", period_list[0].year_start_date, period_list[-1].to_date,
+		list(accounts_by_name), frappe._dict()):
+		gl_entries_by_account.setdefault(entry.account, []).append(entry)
+	calculate_values(accounts_by_name, gl_entries_by_account, period_list, accumulated_values, False)
+	return get_values(accounts_by_name, period_list)
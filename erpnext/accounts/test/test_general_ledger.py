@@ -0,0 +1,29 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+import unittest
+import frappe
+from frappe.utils import flt
+from erpnext.accounts.general_ledger import merge_similar_entries
+
+
+class TestGeneralLedger(unittest.TestCase):
+	def test_merge_similar_entries(self):
+		gl_map = [
+			frappe._dict(account="Debtors", party_type="Customer", party="A", debit=100, debit_in_account_currency=100),
+			frappe._dict(account="Sales", cost_center="Main", credit=60, credit_in_account_currency=60),
+			frappe._dict(account="Debtors", party_type="Customer", party="B", debit=10, debit_in_account_currency=10),
+			frappe._dict(account="Sales", cost_center="Main", credit=50, credit_in_account_currency=50),
+			frappe._dict(account="Debtors", party_type="Customer", party="A", debit=0),
+			frappe._dict(account="Round Off", debit=0, credit=0)
+		]
+
+		merged = merge_similar_entries(gl_map)
+
+		self.assertEqual([(d.account, d.get("party"), flt(d.debit), flt(d.credit)) for d in merged], [
+			("Debtors", "A", 100, 0),
+			("Sales", None, 0, 110),
+			("Debtors", "B", 10, 0)
+		])
+		self.assertEqual(merged[1].credit_in_account_currency, 110)
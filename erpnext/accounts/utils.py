@@ -12,6 +12,7 @@ from frappe.utils import formatdate, get_number_format_info
 from six import iteritems
 # imported to enable erpnext.accounts.utils.get_account_currency
 from erpnext.accounts.doctype.account.account import get_account_currency
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import unlink_payment_ledger_entries
 
 class FiscalYearError(frappe.ValidationError): pass
 
@@ -184,25 +185,29 @@ def get_balance_on(account=None, date=None, party_type=None, party=None, company
 		return flt(bal)
 
 def get_balance_on_voucher(voucher_type, voucher_no, party_type, party, account, dr_or_cr=None):
+	"""Returns the balance against the voucher from the Payment Ledger.
+		`dr_or_cr` is the sign of the balance: debit minus credit or credit minus debit"""
 	if not dr_or_cr:
 		if erpnext.get_party_account_type(party_type) == 'Receivable':
 			dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
 		else:
 			dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
 
+	amount = "-amount_in_account_currency" if dr_or_cr.startswith("credit") else "amount_in_account_currency"
+
 	if isinstance(account, list):
 		account = ["'{0}'".format(frappe.db.escape(d)) for d in account]
 		account_condition = "account in ({0})".format(", ".join(account))
 	else:
 		account_condition = "account = '{0}'".format(frappe.db.escape(account))
 
+	# entries not made against another voucher are against their own voucher in the Payment Ledger
 	res = frappe.db.sql("""
-		select ifnull(sum({dr_or_cr}), 0)
-		from `tabGL Entry`
-		where party_type=%(party_type)s and party=%(party)s and {account_condition}
-			and ((voucher_type=%(voucher_type)s and voucher_no=%(voucher_no)s and (against_voucher is null or against_voucher=''))
-				or (against_voucher_type=%(voucher_type)s and against_voucher=%(voucher_no)s))
-	""".format(dr_or_cr=dr_or_cr, account_condition=account_condition),
+		select ifnull(sum({amount}), 0)
+		from `tabPayment Ledger Entry`
+		where against_voucher_type=%(voucher_type)s and against_voucher=%(voucher_no)s
+			and party_type=%(party_type)s and party=%(party)s and {account_condition}
+	""".format(amount=amount, account_condition=account_condition),
 	{"voucher_type": voucher_type, "voucher_no": voucher_no, "party_type": party_type, "party": party})
 
 	return flt(res[0][0]) if res else 0.0
@@ -571,6 +576,7 @@ def unlink_ref_doc_from_payment_entries(ref_doc, validate_permission=False):
 		where against_voucher_type=%s and against_voucher=%s
 		and voucher_no != ifnull(against_voucher, '')""",
 		(now(), frappe.session.user, ref_doc.doctype, ref_doc.name))
+	unlink_payment_ledger_entries(ref_doc.doctype, ref_doc.name)
 
 	if ref_doc.doctype in ("Sales Invoice", "Purchase Invoice", "Landed Cost Voucher", "Expense Claim"):
 		ref_doc.set("advances", [])
@@ -718,26 +724,26 @@ def get_outstanding_invoices(party_type, party, account, condition=None, include
 	precision = frappe.get_precision("Sales Invoice", "outstanding_amount") or 2
 
 	if erpnext.get_party_account_type(party_type) == 'Receivable':
-		dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
-		payment_dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
+		amount = "amount_in_account_currency"
+		payment_amount = "-amount_in_account_currency"
 	else:
-		dr_or_cr = "credit_in_account_currency - debit_in_account_currency"
-		payment_dr_or_cr = "debit_in_account_currency - credit_in_account_currency"
+		amount = "-amount_in_account_currency"
+		payment_amount = "amount_in_account_currency"
 
 	held_invoices = get_held_invoices(party_type, party)
 
 	invoice_list = frappe.db.sql("""
 		select
-			voucher_no, voucher_type, posting_date, ifnull(sum({dr_or_cr}), 0) as invoice_amount
+			voucher_no, voucher_type, posting_date, ifnull(sum({amount}), 0) as invoice_amount
 		from
-			`tabGL Entry`
+			`tabPayment Ledger Entry`
 		where
 			party_type = %(party_type)s and party = %(party)s and account = %(account)s
-			and (against_voucher = '' or against_voucher is null) and voucher_type != 'Payment Entry'
+			and allocated = 0 and voucher_type != 'Payment Entry'
 			{condition}
 		group by voucher_type, voucher_no
 		order by posting_date, name
-	""".format(dr_or_cr=dr_or_cr, condition=condition or ""), {
+	""".format(amount=amount, condition=condition or ""), {
 		"party_type": party_type,
 		"party": party,
 		"account": account
@@ -745,14 +751,14 @@ def get_outstanding_invoices(party_type, party, account, condition=None, include
 
 	payment_entries = frappe.db.sql("""
 		select
-			against_voucher_type, against_voucher, ifnull(sum({payment_dr_or_cr}), 0) as payment_amount
+			against_voucher_type, against_voucher, ifnull(sum({payment_amount}), 0) as payment_amount
 		from
-			`tabGL Entry`
+			`tabPayment Ledger Entry`
 		where
 			party_type = %(party_type)s and party = %(party)s and account = %(account)s
-			and against_voucher is not null and against_voucher != ''
+			and allocated = 1
 		group by against_voucher_type, against_voucher
-	""".format(payment_dr_or_cr=payment_dr_or_cr), {
+	""".format(payment_amount=payment_amount), {
 		"party_type": party_type,
 		"party": party,
 		"account": account,
@@ -44,6 +44,74 @@ def make_demo(context, site, domain='Manufacturing', days=100,
 			from erpnext.demo import demo
 			demo.make(domain, days)
 
+@click.command('backfill-payment-ledger')
+@click.option('--site', help='site name')
+@click.option('--company', help='Backfill only this company')
+@pass_context
+def backfill_payment_ledger(context, site=None, company=None):
+	"Rebuild the Payment Ledger from GL Entries"
+	from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import backfill_payment_ledger
+
+	site = get_site(context)
+	with frappe.init_site(site):
+		frappe.connect()
+		try:
+			backfill_payment_ledger(company)
+		finally:
+			frappe.destroy()
+
+@click.command('repair-bin-qty')
+@click.option('--site', help='site name')
+@click.option('--verify-only', default=False, is_flag=True, help='Only log Bins that do not match')
+@click.option('--chunk-size', default=500, help='Bins per background job')
+@pass_context
+def repair_bin_qty(context, site=None, verify_only=False, chunk_size=500):
+	"Recompute reserved, ordered, indented and planned qty of all Bins in background jobs"
+	from erpnext.stock.stock_balance import enqueue_bin_qty_repair
+
+	site = get_site(context)
+	with frappe.init_site(site):
+		frappe.connect()
+		try:
+			enqueue_bin_qty_repair(verify_only, chunk_size)
+		finally:
+			frappe.destroy()
+
+@click.command('repost-stock-balance')
+@click.option('--site', help='site name')
+@click.option('--from-date', help='Only items with stock transactions posted or made since this date')
+@click.option('--only-actual', default=False, is_flag=True, help='Only repost actual qty and valuation')
+@click.option('--only-bin', default=False, is_flag=True, help='Only update Bin quantities')
+@click.option('--allow-negative-stock', default=False, is_flag=True)
+@click.option('--allow-zero-rate', default=False, is_flag=True)
+@click.option('--partition-size', default=50, help='Item and warehouse pairs per background job')
+@click.option('--resume', help='Stock Balance Repost to resume after an interruption')
+@pass_context
+def repost_stock_balance(context, site=None, from_date=None, only_actual=False, only_bin=False,
+	allow_negative_stock=False, allow_zero_rate=False, partition_size=50, resume=None):
+	"Repost stock balance of all items and warehouses in parallel background jobs"
+	from erpnext.stock.doctype.stock_balance_repost.stock_balance_repost import (start_stock_balance_repost,
+		resume_stock_balance_repost)
+
+	site = get_site(context)
+	with frappe.init_site(site):
+		frappe.connect()
+		try:
+			if resume:
+				resume_stock_balance_repost(resume)
+				name = resume
+			else:
+				name = start_stock_balance_repost(from_date, only_actual, only_bin, allow_negative_stock,
+					allow_zero_rate, partition_size).name
+
+			# the partitions are reposted by the workers of the long queue
+			print("Stock Balance Repost {0} queued, follow its progress in the Stock Balance Repost list".format(name))
+		finally:
+			frappe.destroy()
+
 commands = [
-	make_demo
+	make_demo,
+	backfill_payment_ledger,
+	repair_bin_qty,
+	repost_stock_balance
 ]
\ No newline at end of file
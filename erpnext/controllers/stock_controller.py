@@ -8,10 +8,15 @@ from frappe import _
 import frappe.defaults
 from erpnext.accounts.utils import get_fiscal_year
 from erpnext.accounts.general_ledger import make_gl_entries, delete_gl_entries, process_gl_map
+from erpnext.accounts.doctype.account_period_balance.account_period_balance import reverse_account_period_balances
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import delete_payment_ledger_entries
 from erpnext.controllers.accounts_controller import AccountsController
-from erpnext.stock.stock_ledger import get_valuation_rate
+from erpnext.stock.stock_ledger import get_valuation_rate, repost_future_sle_in_background
 from erpnext.stock import get_warehouse_account_map
 
+# stock vouchers of which the GL Entries are compared and reposted together
+GL_REPOST_BATCH_SIZE = 500
+
 class QualityInspectionRequiredError(frappe.ValidationError): pass
 class QualityInspectionRejectedError(frappe.ValidationError): pass
 class QualityInspectionNotSubmittedError(frappe.ValidationError): pass
@@ -33,7 +38,7 @@ class StockController(AccountsController):
 					gl_entries = self.get_gl_entries(warehouse_account)
 				make_gl_entries(gl_entries, from_repost=from_repost)
 
-			if repost_future_gle:
+			if repost_future_gle and not repost_future_sle_in_background():
 				items, warehouses = self.get_items_and_warehouses()
 				update_gl_entries_after(self.posting_date, self.posting_time, warehouses, items,
 					warehouse_account, company=self.company)
@@ -421,8 +426,14 @@ class StockController(AccountsController):
 			frappe.get_doc("Blanket Order", blanket_order).update_ordered_qty()
 
 def update_gl_entries_after(posting_date, posting_time, for_warehouses=None, for_items=None,
-		warehouse_account=None, company=None):
+		warehouse_account=None, company=None, bulk=False):
+	"""Reposts GL Entries of the stock vouchers posted after the timestamp.
+
+	In bulk mode the stock account postings of the vouchers are compared in batches with
+	their stock value difference, and only the vouchers that do not match are reposted."""
 	def _delete_gl_entries(voucher_type, voucher_no):
+		reverse_account_period_balances(voucher_type, voucher_no)
+		delete_payment_ledger_entries(voucher_type, voucher_no)
 		frappe.db.sql("""delete from `tabGL Entry`
 			where voucher_type=%s and voucher_no=%s""", (voucher_type, voucher_no))
 
@@ -430,18 +441,65 @@ def update_gl_entries_after(posting_date, posting_time, for_warehouses=None, for
 		warehouse_account = get_warehouse_account_map(company)
 
 	future_stock_vouchers = get_future_stock_vouchers(posting_date, posting_time, for_warehouses, for_items)
-	gle = get_voucherwise_gl_entries(future_stock_vouchers, posting_date)
-
-	for voucher_type, voucher_no in future_stock_vouchers:
-		existing_gle = gle.get((voucher_type, voucher_no), [])
-		voucher_obj = frappe.get_doc(voucher_type, voucher_no)
-		expected_gle = voucher_obj.get_gl_entries(warehouse_account)
-		if expected_gle:
-			if not existing_gle or not compare_existing_and_expected_gle(existing_gle, expected_gle):
+	if bulk:
+		future_stock_vouchers = get_vouchers_with_unmatched_stock_gle(future_stock_vouchers, posting_date,
+			warehouse_account)
+
+	for i in range(0, len(future_stock_vouchers), GL_REPOST_BATCH_SIZE):
+		vouchers = future_stock_vouchers[i:i + GL_REPOST_BATCH_SIZE]
+		gle = get_voucherwise_gl_entries(vouchers, posting_date)
+
+		for voucher_type, voucher_no in vouchers:
+			existing_gle = gle.get((voucher_type, voucher_no), [])
+			voucher_obj = frappe.get_doc(voucher_type, voucher_no)
+			expected_gle = voucher_obj.get_gl_entries(warehouse_account)
+			if expected_gle:
+				if not existing_gle or not compare_existing_and_expected_gle(existing_gle, expected_gle):
+					_delete_gl_entries(voucher_type, voucher_no)
+					voucher_obj.make_gl_entries(gl_entries=expected_gle, repost_future_gle=False, from_repost=True)
+			else:
 				_delete_gl_entries(voucher_type, voucher_no)
-				voucher_obj.make_gl_entries(gl_entries=expected_gle, repost_future_gle=False, from_repost=True)
-		else:
-			_delete_gl_entries(voucher_type, voucher_no)
+
+def get_vouchers_with_unmatched_stock_gle(vouchers, posting_date, warehouse_account):
+	"""Returns the vouchers whose GL Entries on stock accounts do not add up to the
+	stock value difference of their Stock Ledger Entries, by warehouse account"""
+	stock_accounts = list(set(d.account for d in warehouse_account.values()))
+	unmatched = []
+
+	for i in range(0, len(vouchers), GL_REPOST_BATCH_SIZE):
+		batch = vouchers[i:i + GL_REPOST_BATCH_SIZE]
+		values = {
+			"voucher_nos": list(set(d[1] for d in batch)),
+			"accounts": stock_accounts or [""],
+			"posting_date": posting_date
+		}
+
+		expected = {}
+		for d in frappe.db.sql("""select voucher_type, voucher_no, warehouse,
+				sum(round(stock_value_difference, 2)) as stock_value_difference
+			from `tabStock Ledger Entry`
+			where voucher_no in %(voucher_nos)s and ifnull(is_cancelled, 'No')='No'
+			group by voucher_type, voucher_no, warehouse""", values, as_dict=1):
+			if warehouse_account.get(d.warehouse):
+				balances = expected.setdefault((d.voucher_type, d.voucher_no), {})
+				account = warehouse_account[d.warehouse]["account"]
+				balances[account] = balances.get(account, 0) + flt(d.stock_value_difference)
+
+		existing = {}
+		for d in frappe.db.sql("""select voucher_type, voucher_no, account, sum(debit) - sum(credit) as balance
+			from `tabGL Entry`
+			where voucher_no in %(voucher_nos)s and account in %(accounts)s and posting_date >= %(posting_date)s
+			group by voucher_type, voucher_no, account""", values, as_dict=1):
+			existing.setdefault((d.voucher_type, d.voucher_no), {})[d.account] = flt(d.balance)
+
+		for voucher in batch:
+			expected_balances = expected.get(tuple(voucher), {})
+			existing_balances = existing.get(tuple(voucher), {})
+			if any(abs(flt(expected_balances.get(account)) - flt(existing_balances.get(account))) >= 0.005
+				for account in set(expected_balances) | set(existing_balances)):
+				unmatched.append(voucher)
+
+	return unmatched
 
 def compare_existing_and_expected_gle(existing_gle, expected_gle):
 	matched = True
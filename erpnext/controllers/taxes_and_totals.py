@@ -37,6 +37,7 @@ class calculate_taxes_and_totals(object):
 		self.validate_conversion_rate()
 		self.calculate_item_values()
 		self.initialize_taxes()
+		self.set_tax_rates()
 		self.determine_exclusive_rate()
 		self.calculate_net_total()
 		self.calculate_taxes()
@@ -156,24 +157,17 @@ class calculate_taxes_and_totals(object):
 		for item in self.doc.get("items"):
 			item.cumulated_tax_fraction = 0
 
-		if not any((cint(tax.included_in_print_rate) for tax in self.doc.get("taxes"))):
+		taxes = self.doc.get("taxes")
+		if not any((cint(tax.included_in_print_rate) for tax in taxes)):
 			return
 
-		for item in self.doc.get("items"):
+		tax_fractions = grand_total_fractions = []
+		for item, tax_rates in zip(self.doc.get("items"), self.tax_rates):
 			has_margin_field = item.doctype in ['Quotation Item', 'Sales Order Item', 'Delivery Note Item', 'Sales Invoice Item']
-			item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
-
-			for i, tax in enumerate(self.doc.get("taxes")):
-				tax.tax_fraction_for_current_item = self.get_current_tax_fraction(tax, item_tax_map)
+			tax_fractions, grand_total_fractions = self.get_tax_fractions(tax_rates)
 
-				if i==0:
-					tax.grand_total_fraction_for_current_item = 1 + tax.tax_fraction_for_current_item
-				else:
-					tax.grand_total_fraction_for_current_item = \
-						self.doc.get("taxes")[i-1].grand_total_fraction_for_current_item \
-						+ tax.tax_fraction_for_current_item
-
-				item.cumulated_tax_fraction += tax.tax_fraction_for_current_item
+			for tax_fraction in tax_fractions:
+				item.cumulated_tax_fraction += tax_fraction
 
 			if item.cumulated_tax_fraction and not self.discount_amount_applied:
 				item.tax_exclusive_amount = flt(item.amount / (1 + item.cumulated_tax_fraction))
@@ -211,39 +205,59 @@ class calculate_taxes_and_totals(object):
 					"tax_exclusive_price_list_rate", "tax_exclusive_rate", "tax_exclusive_amount",
 					"tax_exclusive_amount_before_discount", "tax_exclusive_total_discount"])
 
+		# fractions of the last item are kept in the taxes, as when calculated item by item
+		for tax, tax_fraction, grand_total_fraction in zip(taxes, tax_fractions, grand_total_fractions):
+			tax.tax_fraction_for_current_item = tax_fraction
+			tax.grand_total_fraction_for_current_item = grand_total_fraction
+
 	def _load_item_tax_rate(self, item_tax_rate):
 		return json.loads(item_tax_rate) if item_tax_rate else {}
 
-	def get_current_tax_fraction(self, tax, item_tax_map):
+	def set_tax_rates(self):
+		"""Set the matrix of tax rates, one row per item and one column per tax.
+			`item_tax_rate` is parsed once per distinct value"""
+		taxes = self.doc.get("taxes")
+		precision = self.doc.precision("rate", taxes[0]) if taxes else None
+
+		tax_rates_by_item_tax_rate = {}
+		self.tax_rates = []
+		for item in self.doc.get("items"):
+			if item.item_tax_rate not in tax_rates_by_item_tax_rate:
+				item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
+				tax_rates_by_item_tax_rate[item.item_tax_rate] = [flt(item_tax_map.get(tax.account_head), precision)
+					if tax.account_head in item_tax_map else tax.rate for tax in taxes]
+
+			self.tax_rates.append(tax_rates_by_item_tax_rate[item.item_tax_rate])
+
+	def get_tax_fractions(self, tax_rates):
 		"""
-			Get tax fraction for calculating tax exclusive amount
-			from tax inclusive amount
+			Get tax fractions of an item for calculating tax exclusive amount
+			from tax inclusive amount, and their cumulative totals
 		"""
-		current_tax_fraction = 0
+		tax_fractions, grand_total_fractions = [], []
 
-		if cint(tax.included_in_print_rate):
-			tax_rate = self._get_tax_rate(tax, item_tax_map)
+		for i, tax in enumerate(self.doc.get("taxes")):
+			current_tax_fraction = 0
 
-			if tax.charge_type == "On Net Total":
-				current_tax_fraction = tax_rate / 100.0
+			if cint(tax.included_in_print_rate):
+				tax_rate = tax_rates[i]
 
-			elif tax.charge_type == "On Previous Row Amount":
-				current_tax_fraction = (tax_rate / 100.0) * \
-					self.doc.get("taxes")[cint(tax.row_id) - 1].tax_fraction_for_current_item
+				if tax.charge_type == "On Net Total":
+					current_tax_fraction = tax_rate / 100.0
 
-			elif tax.charge_type == "On Previous Row Total":
-				current_tax_fraction = (tax_rate / 100.0) * \
-					self.doc.get("taxes")[cint(tax.row_id) - 1].grand_total_fraction_for_current_item
+				elif tax.charge_type == "On Previous Row Amount":
+					current_tax_fraction = (tax_rate / 100.0) * tax_fractions[cint(tax.row_id) - 1]
 
-		if getattr(tax, "add_deduct_tax", None):
-			current_tax_fraction *= -1.0 if (tax.add_deduct_tax == "Deduct") else 1.0
-		return current_tax_fraction
+				elif tax.charge_type == "On Previous Row Total":
+					current_tax_fraction = (tax_rate / 100.0) * grand_total_fractions[cint(tax.row_id) - 1]
 
-	def _get_tax_rate(self, tax, item_tax_map):
-		if tax.account_head in item_tax_map:
-			return flt(item_tax_map.get(tax.account_head), self.doc.precision("rate", tax))
-		else:
-			return tax.rate
+			if getattr(tax, "add_deduct_tax", None):
+				current_tax_fraction *= -1.0 if (tax.add_deduct_tax == "Deduct") else 1.0
+
+			tax_fractions.append(current_tax_fraction)
+			grand_total_fractions.append((1 if i==0 else grand_total_fractions[i-1]) + current_tax_fraction)
+
+		return tax_fractions, grand_total_fractions
 
 	def calculate_net_total(self):
 		self.doc.total_qty = self.doc.total = self.doc.base_total = self.doc.net_total = self.doc.base_net_total = 0.0
@@ -299,41 +313,48 @@ class calculate_taxes_and_totals(object):
 
 	def calculate_taxes(self):
 		self.doc.rounding_adjustment = 0
+		items, taxes = self.doc.get("items"), self.doc.get("taxes")
+		round_transaction_currency = self.should_round_transaction_currency()
+
 		# maintain actual tax rate based on idx
-		actual_tax_dict = dict([[tax.idx,
-			flt(tax.tax_amount, tax.precision("tax_amount")) if self.should_round_transaction_currency() else tax.tax_amount]
-			for tax in self.doc.get("taxes") if tax.charge_type in ["Actual", "Weighted Distribution"]])
+		actual_tax_amounts = dict([[tax.idx,
+			flt(tax.tax_amount, tax.precision("tax_amount")) if round_transaction_currency else tax.tax_amount]
+			for tax in taxes if tax.charge_type in ["Actual", "Weighted Distribution"]])
+		actual_tax_dict = dict(actual_tax_amounts)
 
 		# Tax on Net Total for Weighted Distribution
 		weighted_distrubution_tax_on_net_total = {}
-		for n, item in enumerate(self.doc.get("items")):
-			item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
-			for i, tax in enumerate(self.doc.get("taxes")):
+		for item, tax_rates in zip(items, self.tax_rates):
+			for i, tax in enumerate(taxes):
 				if tax.charge_type == "Weighted Distribution":
 					weighted_distrubution_tax_on_net_total.setdefault(tax.idx, 0.0)
-					tax_rate = self._get_tax_rate(tax, item_tax_map)
-					weighted_distrubution_tax_on_net_total[tax.idx] += (tax_rate / 100) * item.net_amount
+					weighted_distrubution_tax_on_net_total[tax.idx] += (tax_rates[i] / 100) * item.net_amount
 
-		for n, item in enumerate(self.doc.get("items")):
-			item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
-			for i, tax in enumerate(self.doc.get("taxes")):
+		accumulate_tax_amount = not (self.discount_amount_applied and self.doc.apply_discount_on=="Grand Total")
+		last_item = len(items) - 1
+
+		# tax amounts and grand totals of the current item, by tax row
+		tax_amounts = grand_totals = []
+		for n, (item, tax_rates) in enumerate(zip(items, self.tax_rates)):
+			tax_amounts, grand_totals = [], []
+			for i, tax in enumerate(taxes):
 				# tax_amount represents the amount of tax for the current step
-				current_tax_amount = self.get_current_tax_amount(item, tax, item_tax_map, weighted_distrubution_tax_on_net_total)
+				current_tax_amount = self.get_current_tax_amount(item, tax, tax_rates[i], tax_amounts, grand_totals,
+					actual_tax_amounts, weighted_distrubution_tax_on_net_total)
 
 				# Adjust divisional loss to the last item
 				if tax.charge_type in ["Actual", "Weighted Distribution"]:
 					actual_tax_dict[tax.idx] -= current_tax_amount
-					if n == len(self.doc.get("items")) - 1:
+					if n == last_item:
 						current_tax_amount += actual_tax_dict[tax.idx]
 
 				# accumulate tax amount into tax.tax_amount
-				if tax.charge_type not in ["Actual", "Weighted Distribution"] and \
-					not (self.discount_amount_applied and self.doc.apply_discount_on=="Grand Total"):
-						tax.tax_amount += current_tax_amount
+				elif accumulate_tax_amount:
+					tax.tax_amount += current_tax_amount
 
 				# store tax_amount for current item as it will be used for
 				# charge type = 'On Previous Row Amount'
-				tax.tax_amount_for_current_item = current_tax_amount
+				tax_amounts.append(current_tax_amount)
 
 				# set tax after discount
 				tax.tax_amount_after_discount_amount += current_tax_amount
@@ -342,27 +363,27 @@ class calculate_taxes_and_totals(object):
 
 				# note: grand_total_for_current_item contains the contribution of
 				# item's amount, previously applied tax and the current tax on that item
-				if i==0:
-					tax.grand_total_for_current_item = flt(item.taxable_amount + current_tax_amount)
-				else:
-					tax.grand_total_for_current_item = \
-						flt(self.doc.get("taxes")[i-1].grand_total_for_current_item + current_tax_amount)
+				grand_totals.append(flt((item.taxable_amount if i==0 else grand_totals[i-1]) + current_tax_amount))
 
-				# set precision in the last item iteration
-				if n == len(self.doc.get("items")) - 1:
-					self.round_off_totals(tax)
-					self.set_cumulative_total(i, tax)
+		# set precision after the last item
+		for i, tax in enumerate(taxes):
+			if items:
+				tax.tax_amount_for_current_item = tax_amounts[i]
+				tax.grand_total_for_current_item = grand_totals[i]
 
-					self._set_in_company_currency(tax,
-						["total", "displayed_total", "tax_amount", "tax_amount_after_discount_amount"],
-						not self.should_round_transaction_currency())
+			self.round_off_totals(tax)
+			self.set_cumulative_total(i, tax)
 
-					# adjust Discount Amount loss in last tax iteration
-					if i == (len(self.doc.get("taxes")) - 1) and self.discount_amount_applied \
-						and self.doc.discount_amount and self.doc.apply_discount_on == "Grand Total":
-							self.doc.rounding_adjustment = flt(self.doc.total_after_taxes
-								- flt(self.doc.discount_amount) - tax.total,
-								self.doc.precision("rounding_adjustment"))
+			self._set_in_company_currency(tax,
+				["total", "displayed_total", "tax_amount", "tax_amount_after_discount_amount"],
+				not round_transaction_currency)
+
+			# adjust Discount Amount loss in last tax iteration
+			if i == (len(taxes) - 1) and self.discount_amount_applied \
+				and self.doc.discount_amount and self.doc.apply_discount_on == "Grand Total":
+					self.doc.rounding_adjustment = flt(self.doc.total_after_taxes
+						- flt(self.doc.discount_amount) - tax.total,
+						self.doc.precision("rounding_adjustment"))
 
 	def get_tax_amount_if_for_valuation_or_deduction(self, tax_amount, tax):
 		# if just for valuation, do not add the tax amount in total
@@ -398,14 +419,14 @@ class calculate_taxes_and_totals(object):
 			tax.total = flt(tax.total, tax.precision("total"))
 			tax.displayed_total = flt(tax.displayed_total, tax.precision("displayed_total"))
 
-	def get_current_tax_amount(self, item, tax, item_tax_map, weighted_distrubution_tax_on_net_total):
-		tax_rate = self._get_tax_rate(tax, item_tax_map)
+	def get_current_tax_amount(self, item, tax, tax_rate, tax_amounts, grand_totals,
+		actual_tax_amounts, weighted_distrubution_tax_on_net_total):
+		"""tax_amounts and grand_totals are of the previous tax rows, for the item"""
 		current_tax_amount = 0.0
 
 		if tax.charge_type in ["Actual", "Weighted Distribution"]:
 			# distribute the tax amount proportionally to each item row
-			actual = flt(tax.tax_amount, tax.precision("tax_amount")) if self.should_round_transaction_currency()\
-				else tax.tax_amount
+			actual = actual_tax_amounts[tax.idx]
 
 			if tax.charge_type == "Actual" or not weighted_distrubution_tax_on_net_total.get(tax.idx):
 				current_tax_amount = item.net_amount*actual / self.doc.net_total if self.doc.net_total else 0.0
@@ -417,11 +438,9 @@ class calculate_taxes_and_totals(object):
 		elif tax.charge_type == "On Net Total":
 			current_tax_amount = (tax_rate / 100.0) * item.taxable_amount
 		elif tax.charge_type == "On Previous Row Amount":
-			current_tax_amount = (tax_rate / 100.0) * \
-				self.doc.get("taxes")[cint(tax.row_id) - 1].tax_amount_for_current_item
+			current_tax_amount = (tax_rate / 100.0) * tax_amounts[cint(tax.row_id) - 1]
 		elif tax.charge_type == "On Previous Row Total":
-			current_tax_amount = (tax_rate / 100.0) * \
-				self.doc.get("taxes")[cint(tax.row_id) - 1].grand_total_for_current_item
+			current_tax_amount = (tax_rate / 100.0) * grand_totals[cint(tax.row_id) - 1]
 
 		self.set_item_wise_tax(item, tax, tax_rate, current_tax_amount)
 
@@ -457,11 +476,12 @@ class calculate_taxes_and_totals(object):
 					flt(diff), self.doc.precision("rounding_adjustment"))
 
 	def calculate_tax_inclusive_rate(self):
+		round_transaction_currency = self.should_round_transaction_currency()
 		for item in self.doc.items:
 			item.tax_inclusive_amount = flt(item.tax_exclusive_amount + item.item_taxes_and_charges)
 			item.tax_inclusive_rate = flt(item.tax_inclusive_amount / item.qty) if item.qty else 0
 			self._set_in_company_currency(item, ['item_taxes_and_charges', 'tax_inclusive_amount', 'tax_inclusive_rate'],
-				not self.should_round_transaction_currency())
+				not round_transaction_currency)
 
 	def calculate_totals(self):
 		self.doc.total_after_taxes = flt(self.doc.get("taxes")[-1].total) + flt(self.doc.rounding_adjustment) \
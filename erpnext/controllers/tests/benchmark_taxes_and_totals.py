@@ -0,0 +1,294 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Benchmark for calculating taxes and totals of large invoices, item by item
+(previous implementation) and with the matrix of tax rates. Checks that both
+give exactly the same values. Does not save anything.
+
+	bench --site test_site execute erpnext.controllers.tests.benchmark_taxes_and_totals.run
+	bench --site test_site execute erpnext.controllers.tests.benchmark_taxes_and_totals.run --kwargs "{'sizes': [2000, 10000]}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import json
+import time
+import frappe
+from frappe.utils import cint, flt
+from erpnext.controllers.taxes_and_totals import calculate_taxes_and_totals
+
+COMPANY = "_Test Company"
+INCOME_ACCOUNT = "Sales - _TC"
+COST_CENTER = "_Test Cost Center - _TC"
+
+def run(sizes=(2000,), repeat=3):
+	results = []
+	for size in sizes:
+		for inclusive in (0, 1):
+			item_by_item_seconds, item_by_item_doc = time_calculation(calculate_taxes_and_totals_item_by_item,
+				size, inclusive, repeat)
+			matrix_seconds, matrix_doc = time_calculation(calculate_taxes_and_totals, size, inclusive, repeat)
+
+			if get_values(item_by_item_doc) != get_values(matrix_doc):
+				frappe.throw("Taxes and totals do not match for {0} items".format(size))
+
+			results.append(frappe._dict(size=size, inclusive=inclusive, grand_total=matrix_doc.grand_total,
+				item_by_item_seconds=item_by_item_seconds, matrix_seconds=matrix_seconds))
+
+	for d in results:
+		print("{0:>6} items | {1:<9} | item by item {2:8.3f}s | matrix {3:8.3f}s | {4:6.1f}x".format(d.size,
+			"inclusive" if d.inclusive else "exclusive", d.item_by_item_seconds, d.matrix_seconds,
+			d.item_by_item_seconds / d.matrix_seconds if d.matrix_seconds else 0))
+
+	return results
+
+def time_calculation(calculate, size, inclusive, repeat):
+	seconds = []
+	for i in range(repeat):
+		doc = get_invoice(size, inclusive)
+		start = time.time()
+		calculate(doc)
+		seconds.append(time.time() - start)
+
+	return min(seconds), doc
+
+def get_values(doc):
+	return [doc.as_dict()] + [d.as_dict() for d in doc.items] + [d.as_dict() for d in doc.taxes]
+
+def get_invoice(size, inclusive):
+	doc = frappe.get_doc({
+		"doctype": "Sales Invoice",
+		"company": COMPANY,
+		"currency": "INR",
+		"conversion_rate": 1,
+		"customer": "_Test Customer",
+		"debit_to": "_Test Receivable - _TC"
+	})
+
+	# a few distinct item tax rates, as with item tax templates
+	item_tax_rates = [json.dumps({}), json.dumps({"_Test Account VAT - _TC": 5}),
+		json.dumps({"_Test Account VAT - _TC": 0, "_Test Account Service Tax - _TC": 4})]
+
+	for i in range(size):
+		doc.append("items", {
+			"item_code": "_Test Item {0}".format(i),
+			"item_name": "_Test Item {0}".format(i),
+			"qty": i % 7 + 1,
+			"rate": flt(10 + (i * 37) % 1000 / 7.0, 2),
+			"income_account": INCOME_ACCOUNT,
+			"cost_center": COST_CENTER,
+			"conversion_factor": 1,
+			"item_tax_rate": item_tax_rates[i % len(item_tax_rates)]
+		})
+
+	taxes = [
+		["On Net Total", "_Test Account VAT - _TC", 12.5, None],
+		["On Net Total", "_Test Account Service Tax - _TC", 10, None],
+		["On Previous Row Amount", "_Test Account Excise Duty - _TC", 2, 2],
+		["On Previous Row Total", "_Test Account Education Cess - _TC", 1, 3]
+	]
+	if not inclusive:
+		taxes.append(["Actual", "_Test Account Shipping Charges - _TC", 0, None])
+
+	for charge_type, account_head, rate, row_id in taxes:
+		doc.append("taxes", {
+			"charge_type": charge_type,
+			"account_head": account_head,
+			"description": account_head,
+			"rate": rate,
+			"row_id": row_id,
+			"tax_amount": 1000 if charge_type == "Actual" else 0,
+			"cost_center": COST_CENTER,
+			"included_in_print_rate": inclusive
+		})
+
+	return doc
+
+class calculate_taxes_and_totals_item_by_item(calculate_taxes_and_totals):
+	"""previous implementation, parsing item tax rates and calculating each item and tax, as reference"""
+	def set_tax_rates(self):
+		pass
+
+	def determine_exclusive_rate(self):
+		for item in self.doc.get("items"):
+			item.cumulated_tax_fraction = 0
+
+		if not any((cint(tax.included_in_print_rate) for tax in self.doc.get("taxes"))):
+			return
+
+		for item in self.doc.get("items"):
+			has_margin_field = item.doctype in ['Quotation Item', 'Sales Order Item', 'Delivery Note Item', 'Sales Invoice Item']
+			item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
+
+			for i, tax in enumerate(self.doc.get("taxes")):
+				tax.tax_fraction_for_current_item = self.get_current_tax_fraction(tax, item_tax_map)
+
+				if i==0:
+					tax.grand_total_fraction_for_current_item = 1 + tax.tax_fraction_for_current_item
+				else:
+					tax.grand_total_fraction_for_current_item = \
+						self.doc.get("taxes")[i-1].grand_total_fraction_for_current_item \
+						+ tax.tax_fraction_for_current_item
+
+				item.cumulated_tax_fraction += tax.tax_fraction_for_current_item
+
+			if item.cumulated_tax_fraction and not self.discount_amount_applied:
+				item.tax_exclusive_amount = flt(item.amount / (1 + item.cumulated_tax_fraction))
+				item.tax_exclusive_rate = flt(item.tax_exclusive_amount / item.qty) if item.qty \
+					else flt(item.rate / (1 + item.cumulated_tax_fraction))
+
+				item.tax_exclusive_amount_before_discount = flt(item.amount_before_discount / (1 + item.cumulated_tax_fraction))
+				item.tax_exclusive_total_discount = flt(item.tax_exclusive_amount_before_discount - item.tax_exclusive_amount,
+					item.precision("tax_exclusive_total_discount"))
+
+				if item.qty:
+					item.tax_exclusive_price_list_rate = flt(item.tax_exclusive_amount_before_discount / item.qty)
+				elif item.price_list_rate:
+					item.tax_exclusive_price_list_rate = flt(item.price_list_rate / (1 + item.cumulated_tax_fraction))
+				else:
+					item.tax_exclusive_price_list_rate = 0.0
+
+				if has_margin_field and flt(item.rate_with_margin) > 0:
+					item.tax_exclusive_rate_with_margin = flt(item.rate_with_margin / (1 + item.cumulated_tax_fraction))
+					item.base_tax_exclusive_rate_with_margin = flt(item.tax_exclusive_rate_with_margin * self.doc.conversion_rate)
+					item.tax_exclusive_discount_amount = flt(item.tax_exclusive_rate_with_margin - item.tax_exclusive_rate)
+				elif flt(item.tax_exclusive_price_list_rate) > 0:
+					item.tax_exclusive_discount_amount = flt(item.tax_exclusive_price_list_rate - item.tax_exclusive_rate)
+
+				item.taxable_amount = flt(item.taxable_amount / (1 + item.cumulated_tax_fraction))
+				item.taxable_rate = flt(item.taxable_amount / item.qty, item.precision("taxable_rate")) if item.qty else 0.0
+
+				item.net_amount = flt(item.net_amount / (1 + item.cumulated_tax_fraction))
+				item.net_rate = flt(item.net_amount / item.qty, item.precision("net_rate")) if item.qty else 0.0
+
+				item.discount_percentage = flt(item.discount_percentage,
+					item.precision("discount_percentage"))
+
+				self._set_in_company_currency(item, ["taxable_rate", "taxable_amount", "net_rate", "net_amount",
+					"tax_exclusive_price_list_rate", "tax_exclusive_rate", "tax_exclusive_amount",
+					"tax_exclusive_amount_before_discount", "tax_exclusive_total_discount"])
+
+	def get_current_tax_fraction(self, tax, item_tax_map):
+		current_tax_fraction = 0
+
+		if cint(tax.included_in_print_rate):
+			tax_rate = self._get_tax_rate(tax, item_tax_map)
+
+			if tax.charge_type == "On Net Total":
+				current_tax_fraction = tax_rate / 100.0
+
+			elif tax.charge_type == "On Previous Row Amount":
+				current_tax_fraction = (tax_rate / 100.0) * \
+					self.doc.get("taxes")[cint(tax.row_id) - 1].tax_fraction_for_current_item
+
+			elif tax.charge_type == "On Previous Row Total":
+				current_tax_fraction = (tax_rate / 100.0) * \
+					self.doc.get("taxes")[cint(tax.row_id) - 1].grand_total_fraction_for_current_item
+
+		if getattr(tax, "add_deduct_tax", None):
+			current_tax_fraction *= -1.0 if (tax.add_deduct_tax == "Deduct") else 1.0
+		return current_tax_fraction
+
+	def _get_tax_rate(self, tax, item_tax_map):
+		if tax.account_head in item_tax_map:
+			return flt(item_tax_map.get(tax.account_head), self.doc.precision("rate", tax))
+		else:
+			return tax.rate
+
+	def calculate_taxes(self):
+		self.doc.rounding_adjustment = 0
+		# maintain actual tax rate based on idx
+		actual_tax_dict = dict([[tax.idx,
+			flt(tax.tax_amount, tax.precision("tax_amount")) if self.should_round_transaction_currency() else tax.tax_amount]
+			for tax in self.doc.get("taxes") if tax.charge_type in ["Actual", "Weighted Distribution"]])
+
+		# Tax on Net Total for Weighted Distribution
+		weighted_distrubution_tax_on_net_total = {}
+		for n, item in enumerate(self.doc.get("items")):
+			item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
+			for i, tax in enumerate(self.doc.get("taxes")):
+				if tax.charge_type == "Weighted Distribution":
+					weighted_distrubution_tax_on_net_total.setdefault(tax.idx, 0.0)
+					tax_rate = self._get_tax_rate(tax, item_tax_map)
+					weighted_distrubution_tax_on_net_total[tax.idx] += (tax_rate / 100) * item.net_amount
+
+		for n, item in enumerate(self.doc.get("items")):
+			item_tax_map = self._load_item_tax_rate(item.item_tax_rate)
+			for i, tax in enumerate(self.doc.get("taxes")):
+				# tax_amount represents the amount of tax for the current step
+				current_tax_amount = self.get_current_tax_amount_for_item(item, tax, item_tax_map,
+					weighted_distrubution_tax_on_net_total)
+
+				# Adjust divisional loss to the last item
+				if tax.charge_type in ["Actual", "Weighted Distribution"]:
+					actual_tax_dict[tax.idx] -= current_tax_amount
+					if n == len(self.doc.get("items")) - 1:
+						current_tax_amount += actual_tax_dict[tax.idx]
+
+				# accumulate tax amount into tax.tax_amount
+				if tax.charge_type not in ["Actual", "Weighted Distribution"] and \
+					not (self.discount_amount_applied and self.doc.apply_discount_on=="Grand Total"):
+						tax.tax_amount += current_tax_amount
+
+				# store tax_amount for current item as it will be used for
+				# charge type = 'On Previous Row Amount'
+				tax.tax_amount_for_current_item = current_tax_amount
+
+				# set tax after discount
+				tax.tax_amount_after_discount_amount += current_tax_amount
+
+				current_tax_amount = self.get_tax_amount_if_for_valuation_or_deduction(current_tax_amount, tax)
+
+				# note: grand_total_for_current_item contains the contribution of
+				# item's amount, previously applied tax and the current tax on that item
+				if i==0:
+					tax.grand_total_for_current_item = flt(item.taxable_amount + current_tax_amount)
+				else:
+					tax.grand_total_for_current_item = \
+						flt(self.doc.get("taxes")[i-1].grand_total_for_current_item + current_tax_amount)
+
+				# set precision in the last item iteration
+				if n == len(self.doc.get("items")) - 1:
+					self.round_off_totals(tax)
+					self.set_cumulative_total(i, tax)
+
+					self._set_in_company_currency(tax,
+						["total", "displayed_total", "tax_amount", "tax_amount_after_discount_amount"],
+						not self.should_round_transaction_currency())
+
+					# adjust Discount Amount loss in last tax iteration
+					if i == (len(self.doc.get("taxes")) - 1) and self.discount_amount_applied \
+						and self.doc.discount_amount and self.doc.apply_discount_on == "Grand Total":
+							self.doc.rounding_adjustment = flt(self.doc.total_after_taxes
+								- flt(self.doc.discount_amount) - tax.total,
+								self.doc.precision("rounding_adjustment"))
+
+	def get_current_tax_amount_for_item(self, item, tax, item_tax_map, weighted_distrubution_tax_on_net_total):
+		tax_rate = self._get_tax_rate(tax, item_tax_map)
+		current_tax_amount = 0.0
+
+		if tax.charge_type in ["Actual", "Weighted Distribution"]:
+			# distribute the tax amount proportionally to each item row
+			actual = flt(tax.tax_amount, tax.precision("tax_amount")) if self.should_round_transaction_currency()\
+				else tax.tax_amount
+
+			if tax.charge_type == "Actual" or not weighted_distrubution_tax_on_net_total.get(tax.idx):
+				current_tax_amount = item.net_amount*actual / self.doc.net_total if self.doc.net_total else 0.0
+			else:
+				tax_on_net_amount = (tax_rate / 100.0) * item.net_amount
+				tax_on_net_total = weighted_distrubution_tax_on_net_total.get(tax.idx)
+				current_tax_amount = actual * (tax_on_net_amount / tax_on_net_total)
+
+		elif tax.charge_type == "On Net Total":
+			current_tax_amount = (tax_rate / 100.0) * item.taxable_amount
+		elif tax.charge_type == "On Previous Row Amount":
+			current_tax_amount = (tax_rate / 100.0) * \
+				self.doc.get("taxes")[cint(tax.row_id) - 1].tax_amount_for_current_item
+		elif tax.charge_type == "On Previous Row Total":
+			current_tax_amount = (tax_rate / 100.0) * \
+				self.doc.get("taxes")[cint(tax.row_id) - 1].grand_total_for_current_item
+
+		self.set_item_wise_tax(item, tax, tax_rate, current_tax_amount)
+
+		return current_tax_amount
@@ -0,0 +1,59 @@
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+
+from erpnext.controllers.taxes_and_totals import calculate_taxes_and_totals
+from erpnext.controllers.tests.benchmark_taxes_and_totals import get_invoice, get_values, \
+	calculate_taxes_and_totals_item_by_item
+
+class TestTaxesAndTotals(unittest.TestCase):
+	def test_same_values_as_item_by_item(self):
+		'''Taxes and totals from the matrix of tax rates are the same as calculated item by item'''
+		for inclusive in (0, 1):
+			reference = get_invoice(21, inclusive)
+			calculate_taxes_and_totals_item_by_item(reference)
+
+			doc = get_invoice(21, inclusive)
+			calculate_taxes_and_totals(doc)
+
+			self.assertEqual(get_values(doc), get_values(reference))
+
+	def test_taxes_without_items(self):
+		'''Taxes are totalled for a document without items, as a Delivery Note mapped from a delivered Sales Order'''
+		doc = get_invoice(0, 0)
+		calculate_taxes_and_totals(doc)
+
+		# the shipping charges are not distributed to any item
+		self.assertEqual([d.tax_amount for d in doc.taxes], [0, 0, 0, 0, 1000])
+		self.assertEqual([d.total for d in doc.taxes], [0, 0, 0, 0, 0])
+		self.assertEqual(doc.grand_total, 0)
+
+	def test_taxes_on_previous_row(self):
+		doc = get_invoice(1, 0)
+		doc.items[0].update({"qty": 1, "rate": 100, "item_tax_rate": "{}"})
+		doc.taxes[-1].tax_amount = 10
+		calculate_taxes_and_totals(doc)
+
+		# 12.5% VAT, 10% service tax, 2% of the service tax, 1% of the total after it, and shipping
+		self.assertEqual([d.tax_amount for d in doc.taxes], [12.5, 10, 0.2, 1.23, 10])
+		self.assertEqual(doc.grand_total, 133.93)
+
+	def test_taxes_included_in_rate(self):
+		doc = get_invoice(1, 1)
+		doc.items[0].update({"qty": 1, "rate": 123.93, "item_tax_rate": "{}"})
+		calculate_taxes_and_totals(doc)
+
+		# 100 net, with 12.5 + 10 + 0.2 + 1.227 of taxes included in the rate
+		self.assertEqual(doc.net_total, 100)
+		self.assertEqual([d.tax_amount for d in doc.taxes], [12.5, 10, 0.2, 1.23])
+		self.assertEqual(doc.grand_total, 123.93)
+
+		doc.items[0].item_tax_rate = frappe.as_json({"_Test Account VAT - _TC": 5})
+		doc.items[0].rate = 116.35
+		calculate_taxes_and_totals(doc)
+
+		# VAT at the rate of the item, 5 + 10 + 0.2 + 1.152
+		self.assertEqual(doc.net_total, 100)
+		self.assertEqual([d.tax_amount for d in doc.taxes], [5, 10, 0.2, 1.15])
+		self.assertEqual(doc.grand_total, 116.35)
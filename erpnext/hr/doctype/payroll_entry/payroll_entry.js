@@ -69,6 +69,18 @@ frappe.ui.form.on('Payroll Entry', {
 	},
 
 	add_context_buttons: function(frm) {
+		if(frm.doc.__onload && frm.doc.__onload.chunks_to_retry) {
+			frm.add_custom_button(__("Retry Failed Salary Slips"), function() {
+				frm.call({
+					doc: frm.doc,
+					method: "retry_failed_chunks",
+					freeze: true,
+					callback: function() {
+						frm.reload_doc();
+					}
+				});
+			});
+		}
 		if(frm.doc.salary_slips_submitted || (frm.doc.__onload && frm.doc.__onload.submitted_ss)) {
 			frm.events.add_bank_entry_button(frm);
 		} else if(frm.doc.salary_slips_created) {
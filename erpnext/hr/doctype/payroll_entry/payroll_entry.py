@@ -3,16 +3,31 @@
 # For license information, please see license.txt
 
 from __future__ import unicode_literals
+import json
 import frappe
 from frappe.model.document import Document
 from dateutil.relativedelta import relativedelta
-from frappe.utils import cint, flt, nowdate, add_days, getdate, fmt_money, add_to_date, DATE_FORMAT, date_diff
+from frappe.utils import cint, flt, nowdate, add_days, getdate, fmt_money, add_to_date, DATE_FORMAT, date_diff, \
+	now_datetime
 from frappe import _
 from erpnext.accounts.utils import get_fiscal_year
 from erpnext.hr.doctype.employee.employee import get_holiday_list_for_employee
+from erpnext.hr.salary_formula import set_payroll_context, clear_payroll_context
+
+# employees (or salary slips) per background job, and attempts of a job before its chunk is failed
+PAYROLL_CHUNK_SIZE = 50
+MAX_CHUNK_ATTEMPTS = 3
+
+# chunks record their progress after each employee, a chunk In Progress not updated for longer
+# than the timeout of its job has lost its worker
+CHUNK_JOB_TIMEOUT = 600
+STALE_CHUNK_SECONDS = CHUNK_JOB_TIMEOUT + 300
 
 class PayrollEntry(Document):
 	def onload(self):
+		if self.docstatus==1:
+			self.set_onload("chunks_to_retry", get_chunks_to_retry(self.name))
+
 		if not self.docstatus==1 or self.salary_slips_submitted:
 			return
 
@@ -109,21 +124,23 @@ class PayrollEntry(Document):
 		self.created = 1
 		emp_list = [d.employee for d in self.get_emp_list()]
 		if emp_list:
-			args = frappe._dict({
-				"salary_slip_based_on_timesheet": self.salary_slip_based_on_timesheet,
-				"payroll_frequency": self.payroll_frequency,
-				"start_date": self.start_date,
-				"end_date": self.end_date,
-				"company": self.company,
-				"posting_date": self.posting_date,
-				"deduct_tax_for_unclaimed_employee_benefits": self.deduct_tax_for_unclaimed_employee_benefits,
-				"deduct_tax_for_unsubmitted_tax_exemption_proof": self.deduct_tax_for_unsubmitted_tax_exemption_proof,
-				"payroll_entry": self.name
-			})
 			if len(emp_list) > 30:
-				frappe.enqueue(create_salary_slips_for_employees, timeout=600, employees=emp_list, args=args)
+				enqueue_payroll_entry_chunks(self.name, "Create Salary Slips", emp_list)
 			else:
-				create_salary_slips_for_employees(emp_list, args, publish_progress=False)
+				create_salary_slips_for_employees(emp_list, self.get_salary_slip_args(), publish_progress=False)
+
+	def get_salary_slip_args(self):
+		return frappe._dict({
+			"salary_slip_based_on_timesheet": self.salary_slip_based_on_timesheet,
+			"payroll_frequency": self.payroll_frequency,
+			"start_date": self.start_date,
+			"end_date": self.end_date,
+			"company": self.company,
+			"posting_date": self.posting_date,
+			"deduct_tax_for_unclaimed_employee_benefits": self.deduct_tax_for_unclaimed_employee_benefits,
+			"deduct_tax_for_unsubmitted_tax_exemption_proof": self.deduct_tax_for_unsubmitted_tax_exemption_proof,
+			"payroll_entry": self.name
+		})
 
 	def get_sal_slip_list(self, ss_status, as_dict=False):
 		"""
@@ -142,10 +159,14 @@ class PayrollEntry(Document):
 		self.check_permission('write')
 		ss_list = self.get_sal_slip_list(ss_status=0)
 		if len(ss_list) > 30:
-			frappe.enqueue(submit_salary_slips_for_employees, timeout=600, payroll_entry=self, salary_slips=ss_list)
+			enqueue_payroll_entry_chunks(self.name, "Submit Salary Slips", [d[0] for d in ss_list])
 		else:
 			submit_salary_slips_for_employees(self, ss_list, publish_progress=False)
 
+	def retry_failed_chunks(self):
+		self.check_permission('write')
+		resume_payroll_entry_chunks(self.name)
+
 	def email_salary_slip(self, submitted_ss):
 		if frappe.db.get_single_value("HR Settings", "email_salary_slip_to_employee"):
 			for ss in submitted_ss:
@@ -491,10 +512,13 @@ def payroll_entry_has_bank_entries(name):
 	return response
 
 def create_salary_slips_for_employees(employees, args, publish_progress=True):
-	salary_slips_exists_for = get_existing_salary_slips(employees, args)
-	count=0
-	for emp in employees:
-		if emp not in salary_slips_exists_for:
+	salary_slips_exists_for = set(get_existing_salary_slips(employees, args))
+	employees = [emp for emp in employees if emp not in salary_slips_exists_for]
+
+	set_payroll_context(employees)
+	try:
+		count=0
+		for emp in employees:
 			args.update({
 				"doctype": "Salary Slip",
 				"employee": emp
@@ -503,8 +527,9 @@ def create_salary_slips_for_employees(employees, args, publish_progress=True):
 			ss.insert()
 			count+=1
 			if publish_progress:
-				frappe.publish_progress(count*100/len(set(employees) - set(salary_slips_exists_for)),
-					title = _("Creating Salary Slips..."))
+				frappe.publish_progress(count*100/len(employees), title = _("Creating Salary Slips..."))
+	finally:
+		clear_payroll_context()
 
 	payroll_entry = frappe.get_doc("Payroll Entry", args.payroll_entry)
 	payroll_entry.db_set("salary_slips_created", 1)
@@ -524,21 +549,25 @@ def submit_salary_slips_for_employees(payroll_entry, salary_slips, publish_progr
 	not_submitted_ss = []
 	frappe.flags.via_payroll_entry = True
 
-	count = 0
-	for ss in salary_slips:
-		ss_obj = frappe.get_doc("Salary Slip",ss[0])
-		if ss_obj.net_pay<0:
-			not_submitted_ss.append(ss[0])
-		else:
-			try:
-				ss_obj.submit()
-				submitted_ss.append(ss_obj)
-			except frappe.ValidationError:
+	set_payroll_context(get_salary_slip_employees([d[0] for d in salary_slips]))
+	try:
+		count = 0
+		for ss in salary_slips:
+			ss_obj = frappe.get_doc("Salary Slip",ss[0])
+			if ss_obj.net_pay<0:
 				not_submitted_ss.append(ss[0])
+			else:
+				try:
+					ss_obj.submit()
+					submitted_ss.append(ss_obj)
+				except frappe.ValidationError:
+					not_submitted_ss.append(ss[0])
 
-		count += 1
-		if publish_progress:
-			frappe.publish_progress(count*100/len(salary_slips), title = _("Submitting Salary Slips..."))
+			count += 1
+			if publish_progress:
+				frappe.publish_progress(count*100/len(salary_slips), title = _("Submitting Salary Slips..."))
+	finally:
+		clear_payroll_context()
 
 	if submitted_ss:
 		payroll_entry.make_accrual_jv_entry()
@@ -556,6 +585,208 @@ def submit_salary_slips_for_employees(payroll_entry, salary_slips, publish_progr
 	if not_submitted_ss:
 		frappe.msgprint(_("Could not submit some Salary Slips"))
 
+def enqueue_payroll_entry_chunks(payroll_entry, action, names):
+	"""Splits the employees (or the Salary Slips to submit) in chunks, processed by parallel
+	background jobs. Each chunk records its progress, so that failed or interrupted chunks
+	can be resumed with `resume_payroll_entry_chunks`. Once all chunks are processed, the
+	Payroll Entry is updated (and the accrual Journal Entry made) by the last job."""
+	for i in range(0, len(names), PAYROLL_CHUNK_SIZE):
+		frappe.get_doc({
+			"doctype": "Payroll Entry Chunk",
+			"payroll_entry": payroll_entry,
+			"action": action,
+			"status": "Queued",
+			"total": len(names[i:i + PAYROLL_CHUNK_SIZE]),
+			"names": json.dumps(names[i:i + PAYROLL_CHUNK_SIZE])
+		}).db_insert()
+
+	# the chunks must be visible to the background jobs
+	frappe.db.commit()
+	enqueue_chunks(payroll_entry)
+
+def get_chunks_to_retry(payroll_entry):
+	"""Returns the number of failed chunks and of chunks whose worker was lost,
+	or 0 while any chunk is queued or being processed"""
+	failed, stale, running = frappe.db.sql("""select sum(status='Failed'),
+			sum(status='In Progress' and modified < %(stale_before)s),
+			sum(status='Queued' or (status='In Progress' and modified >= %(stale_before)s))
+		from `tabPayroll Entry Chunk` where payroll_entry=%(payroll_entry)s""",
+		{"payroll_entry": payroll_entry, "stale_before": get_stale_before()})[0]
+
+	return 0 if cint(running) else cint(failed) + cint(stale)
+
+def get_stale_before():
+	return add_to_date(now_datetime(), seconds=-STALE_CHUNK_SECONDS)
+
+def resume_payroll_entry_chunks(payroll_entry):
+	"""Queues the failed chunks, and the chunks In Progress whose worker was lost, again.
+	Interrupted chunks resume after the last employee done, failed chunks are retried from
+	the start, skipping the Salary Slips already made"""
+	values = {"payroll_entry": payroll_entry, "stale_before": get_stale_before()}
+
+	# the Payroll Entry is updated again once the chunks are processed
+	for action in frappe.db.sql_list("""select distinct action from `tabPayroll Entry Chunk`
+		where payroll_entry=%(payroll_entry)s
+			and (status='Failed' or (status='In Progress' and modified < %(stale_before)s))""", values):
+		frappe.db.set_value("Payroll Entry", payroll_entry, "salary_slips_created"
+			if action == "Create Salary Slips" else "salary_slips_submitted", 0, update_modified=False)
+
+	frappe.db.sql("""update `tabPayroll Entry Chunk` set status='Queued', attempts=0
+		where payroll_entry=%(payroll_entry)s and status='In Progress' and modified < %(stale_before)s""", values)
+	frappe.db.sql("""update `tabPayroll Entry Chunk`
+		set status='Queued', attempts=0, processed=0, failed=0, error_log=''
+		where payroll_entry=%s and status='Failed'""", payroll_entry)
+	frappe.db.commit()
+
+	enqueue_chunks(payroll_entry)
+
+def enqueue_chunks(payroll_entry):
+	for chunk in frappe.db.sql_list("""select name from `tabPayroll Entry Chunk`
+		where payroll_entry=%s and status='Queued' order by creation, name""", payroll_entry):
+		enqueue_chunk(chunk)
+
+def enqueue_chunk(name):
+	frappe.enqueue("erpnext.hr.doctype.payroll_entry.payroll_entry.process_payroll_entry_chunk",
+		timeout=CHUNK_JOB_TIMEOUT, now=frappe.flags.in_test, name=name)
+
+def process_payroll_entry_chunk(name):
+	if not claim_chunk(name):
+		return
+
+	chunk = frappe.get_doc("Payroll Entry Chunk", name)
+	payroll_entry = frappe.get_doc("Payroll Entry", chunk.payroll_entry)
+	args = payroll_entry.get_salary_slip_args()
+	email_salary_slip = frappe.db.get_single_value("HR Settings", "email_salary_slip_to_employee")
+	frappe.flags.via_payroll_entry = True
+
+	processed, failed, error_log = cint(chunk.processed), cint(chunk.failed), chunk.error_log or ""
+	names = json.loads(chunk.names)
+
+	# Salary Components, Employees and their assignments are loaded once for the chunk
+	set_payroll_context(names if chunk.action == "Create Salary Slips" else get_salary_slip_employees(names))
+
+	try:
+		# resumes after the employees already done
+		for d in names[processed:]:
+			try:
+				if chunk.action == "Create Salary Slips":
+					create_salary_slip(d, args)
+				else:
+					submit_salary_slip(d, email_salary_slip)
+			except frappe.ValidationError:
+				frappe.db.rollback()
+				failed += 1
+				error_log += "{0}:\n{1}\n".format(d, frappe.get_traceback())
+
+			# modified is the time of the last progress, to tell chunks with a lost worker
+			processed += 1
+			frappe.db.set_value("Payroll Entry Chunk", name, {
+				"processed": processed,
+				"failed": failed,
+				"error_log": error_log
+			})
+			frappe.db.commit()
+
+	except Exception:
+		# unexpected errors (lock timeouts, lost connections) are retried from the last employee done
+		frappe.db.rollback()
+		if cint(chunk.attempts) < MAX_CHUNK_ATTEMPTS:
+			frappe.db.set_value("Payroll Entry Chunk", name, "status", "Queued", update_modified=False)
+			frappe.db.commit()
+			enqueue_chunk(name)
+			return
+
+		failed = cint(chunk.total) - processed + failed
+		error_log += frappe.get_traceback()
+		frappe.db.set_value("Payroll Entry Chunk", name, {"failed": failed, "error_log": error_log},
+			update_modified=False)
+
+	finally:
+		clear_payroll_context()
+
+	frappe.db.set_value("Payroll Entry Chunk", name, "status", "Failed" if failed else "Completed",
+		update_modified=False)
+	frappe.db.commit()
+
+	update_payroll_entry_progress(chunk.payroll_entry, chunk.action)
+
+def claim_chunk(name):
+	"""Mark the chunk as In Progress if it is still queued"""
+	chunk = frappe.db.sql("""select status, attempts from `tabPayroll Entry Chunk`
+		where name=%s for update""", name, as_dict=1)
+
+	if not chunk or chunk[0].status != "Queued":
+		frappe.db.rollback()
+		return False
+
+	frappe.db.set_value("Payroll Entry Chunk", name, {
+		"status": "In Progress",
+		"attempts": cint(chunk[0].attempts) + 1
+	})
+	frappe.db.commit()
+
+	return True
+
+def get_salary_slip_employees(salary_slips):
+	if not salary_slips:
+		return []
+
+	return frappe.db.sql_list("""select distinct employee from `tabSalary Slip` where name in %s""",
+		[salary_slips])
+
+def create_salary_slip(employee, args):
+	if get_existing_salary_slips([employee], args):
+		return
+
+	frappe.get_doc(dict(args, doctype="Salary Slip", employee=employee)).insert()
+
+def submit_salary_slip(salary_slip, email_salary_slip=False):
+	ss = frappe.get_doc("Salary Slip", salary_slip)
+	if ss.docstatus != 0:
+		return
+
+	if ss.net_pay < 0:
+		frappe.throw(_("Net Pay cannot be negative"))
+
+	ss.submit()
+	if email_salary_slip:
+		ss.email_salary_slip()
+
+def update_payroll_entry_progress(payroll_entry, action):
+	"""Publishes the progress, and updates the Payroll Entry once all chunks of the action are processed"""
+	processed, total, pending = frappe.db.sql("""select sum(processed), sum(total),
+			sum(status in ('Queued', 'In Progress'))
+		from `tabPayroll Entry Chunk` where payroll_entry=%s and action=%s""", (payroll_entry, action))[0]
+
+	frappe.publish_progress(cint(processed) * 100 / (cint(total) or 1),
+		title=_("Creating Salary Slips...") if action == "Create Salary Slips" else _("Submitting Salary Slips..."),
+		doctype="Payroll Entry", docname=payroll_entry)
+
+	if cint(pending):
+		return
+
+	# Only one of the last jobs to finish updates the Payroll Entry (and makes the accrual Journal Entry).
+	# The lock is taken in a new transaction, so that the reads after it see what the other jobs committed
+	frappe.db.commit()
+	fieldname = "salary_slips_created" if action == "Create Salary Slips" else "salary_slips_submitted"
+	done = frappe.db.sql("""select {0} from `tabPayroll Entry` where name=%s for update""".format(fieldname),
+		payroll_entry)[0][0]
+	pending = frappe.db.sql("""select count(*) from `tabPayroll Entry Chunk`
+		where payroll_entry=%s and action=%s and status in ('Queued', 'In Progress')
+		for update""", (payroll_entry, action))[0][0]
+
+	if cint(done) or cint(pending):
+		frappe.db.rollback()
+		return
+
+	doc = frappe.get_doc("Payroll Entry", payroll_entry)
+	if action == "Submit Salary Slips" and doc.get_sal_slip_list(ss_status=1):
+		doc.make_accrual_jv_entry()
+
+	doc.db_set(fieldname, 1)
+	frappe.db.commit()
+	doc.notify_update()
+
 def get_payroll_entries_for_jv(doctype, txt, searchfield, start, page_len, filters):
 	return frappe.db.sql("""
 		select name from `tabPayroll Entry`
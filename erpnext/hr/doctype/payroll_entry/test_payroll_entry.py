@@ -5,8 +5,11 @@ import unittest
 import erpnext
 import frappe
 from dateutil.relativedelta import relativedelta
+from frappe.utils import add_to_date, now_datetime
 from erpnext.accounts.utils import get_fiscal_year, getdate, nowdate
-from erpnext.hr.doctype.payroll_entry.payroll_entry import get_start_end_dates, get_end_date
+from erpnext.hr.doctype.payroll_entry.payroll_entry import (get_start_end_dates, get_end_date,
+	enqueue_payroll_entry_chunks, resume_payroll_entry_chunks, update_payroll_entry_progress,
+	get_chunks_to_retry, STALE_CHUNK_SECONDS)
 from erpnext.hr.doctype.employee.test_employee import make_employee
 from erpnext.hr.doctype.salary_slip.test_salary_slip import get_salary_component_account, \
 		make_earning_salary_component, make_deduction_salary_component
@@ -15,7 +18,8 @@ from erpnext.hr.doctype.loan.test_loan import create_loan
 
 class TestPayrollEntry(unittest.TestCase):
 	def setUp(self):
-		for dt in ["Salary Slip", "Salary Component", "Salary Component Account", "Payroll Entry", "Loan"]:
+		for dt in ["Salary Slip", "Salary Component", "Salary Component Account", "Payroll Entry",
+			"Payroll Entry Chunk", "Loan"]:
 			frappe.db.sql("delete from `tab%s`" % dt)
 
 		make_earning_salary_component(setup=True)
@@ -36,6 +40,68 @@ class TestPayrollEntry(unittest.TestCase):
 		if not frappe.db.get_value("Salary Slip", {"start_date": dates.start_date, "end_date": dates.end_date}):
 			make_payroll_entry(start_date=dates.start_date, end_date=dates.end_date)
 
+	def test_payroll_entry_chunks(self):
+		company = erpnext.get_default_company()
+		for data in frappe.get_all('Salary Component', fields = ["name"]):
+			if not frappe.db.get_value('Salary Component Account',
+				{'parent': data.name, 'company': company}, 'name'):
+				get_salary_component_account(data.name)
+
+		employee = frappe.db.get_value("Employee", {'company': company})
+		make_salary_structure("_Test Salary Structure", "Monthly", employee)
+		dates = get_start_end_dates('Monthly', nowdate())
+
+		payroll_entry = frappe.new_doc("Payroll Entry")
+		payroll_entry.update({
+			"company": company,
+			"start_date": dates.start_date,
+			"end_date": dates.end_date,
+			"payment_account": get_payment_account(),
+			"posting_date": nowdate(),
+			"payroll_frequency": "Monthly"
+		})
+		payroll_entry.save()
+
+		enqueue_payroll_entry_chunks(payroll_entry.name, "Create Salary Slips", [employee])
+		self.assertEqual(frappe.db.get_value("Payroll Entry Chunk", {"payroll_entry": payroll_entry.name},
+			["status", "processed", "failed"]), ("Completed", 1, 0))
+		self.assertTrue(frappe.db.get_value("Payroll Entry", payroll_entry.name, "salary_slips_created"))
+
+		# resumed chunks do not make the Salary Slips again
+		frappe.db.sql("""update `tabPayroll Entry Chunk` set status='Failed', processed=0
+			where payroll_entry=%s""", payroll_entry.name)
+		resume_payroll_entry_chunks(payroll_entry.name)
+		salary_slips = frappe.get_all("Salary Slip", {"payroll_entry": payroll_entry.name})
+		self.assertEqual(len(salary_slips), 1)
+
+		# chunks being processed are not retried, chunks whose worker was lost are
+		chunk = frappe.db.get_value("Payroll Entry Chunk", {"payroll_entry": payroll_entry.name})
+		frappe.db.set_value("Payroll Entry Chunk", chunk, "status", "In Progress")
+		self.assertEqual(get_chunks_to_retry(payroll_entry.name), 0)
+		resume_payroll_entry_chunks(payroll_entry.name)
+		self.assertEqual(frappe.db.get_value("Payroll Entry Chunk", chunk, "status"), "In Progress")
+
+		frappe.db.set_value("Payroll Entry Chunk", chunk, "modified",
+			add_to_date(now_datetime(), seconds=-STALE_CHUNK_SECONDS - 60), update_modified=False)
+		self.assertEqual(get_chunks_to_retry(payroll_entry.name), 1)
+		resume_payroll_entry_chunks(payroll_entry.name)
+		self.assertEqual(frappe.db.get_value("Payroll Entry Chunk", chunk, "status"), "Completed")
+		self.assertEqual(len(frappe.get_all("Salary Slip", {"payroll_entry": payroll_entry.name})), 1)
+
+		enqueue_payroll_entry_chunks(payroll_entry.name, "Submit Salary Slips", [salary_slips[0].name])
+		self.assertEqual(frappe.db.get_value("Salary Slip", salary_slips[0].name, "docstatus"), 1)
+		self.assertTrue(frappe.db.get_value("Payroll Entry", payroll_entry.name, "salary_slips_submitted"))
+
+		# jobs finishing after the Payroll Entry is updated do not make another accrual Journal Entry
+		journal_entry = frappe.db.get_value("Salary Slip", salary_slips[0].name, "journal_entry")
+		self.assertTrue(journal_entry)
+
+		journal_entries = frappe.db.count("Journal Entry")
+		update_payroll_entry_progress(payroll_entry.name, "Submit Salary Slips")
+		update_payroll_entry_progress(payroll_entry.name, "Submit Salary Slips")
+		self.assertEqual(frappe.db.count("Journal Entry"), journal_entries)
+		self.assertEqual(frappe.db.get_value("Salary Slip", salary_slips[0].name, "journal_entry"), journal_entry)
+
 	def test_get_end_date(self):
 		self.assertEqual(get_end_date('2017-01-01', 'monthly'), {'end_date': '2017-01-31'})
 		self.assertEqual(get_end_date('2017-02-01', 'monthly'), {'end_date': '2017-02-28'})
@@ -3,7 +3,7 @@
 
 from __future__ import unicode_literals
 import frappe, erpnext
-import datetime, math
+import math
 
 from frappe.utils import add_days, cint, cstr, flt, getdate, rounded, date_diff, money_in_words
 from frappe.model.naming import make_autoname
@@ -17,19 +17,13 @@ from erpnext.hr.doctype.additional_salary.additional_salary import get_additiona
 from erpnext.hr.doctype.payroll_period.payroll_period import get_period_factor, get_payroll_period
 from erpnext.hr.doctype.employee_benefit_application.employee_benefit_application import get_benefit_component_amount
 from erpnext.hr.doctype.employee_benefit_claim.employee_benefit_claim import get_benefit_claim_amount, get_last_payroll_period_benefits
+from erpnext.hr.salary_formula import (evaluate, eval_compiled, get_compiled_row, get_payroll_context,
+	get_salary_component)
 
 class SalarySlip(TransactionBase):
 	def __init__(self, *args, **kwargs):
 		super(SalarySlip, self).__init__(*args, **kwargs)
 		self.series = 'Sal Slip/{0}/.#####'.format(self.employee)
-		self.whitelisted_globals = {
-			"int": int,
-			"float": float,
-			"long": int,
-			"round": round,
-			"date": datetime.date,
-			"getdate": getdate
-		}
 
 	def autoname(self):
 		self.name = make_autoname(self.series)
@@ -323,14 +317,19 @@ class SalarySlip(TransactionBase):
 		'''Returns data for evaluating formula'''
 		data = frappe._dict()
 
-		data.update(frappe.get_doc("Salary Structure Assignment",
+		# loaded once for all the slips of a payroll run
+		context = get_payroll_context(self.employee)
+		assignment = context.assignments.get((self.employee, self.salary_structure)) if context else None
+
+		data.update(assignment or frappe.get_doc("Salary Structure Assignment",
 			{"employee": self.employee, "salary_structure": self.salary_structure}).as_dict())
 
-		data.update(frappe.get_doc("Employee", self.employee).as_dict())
+		data.update(context.employees[self.employee] if context else frappe.get_doc("Employee", self.employee).as_dict())
 		data.update(self.as_dict())
 
 		# set values for components
-		salary_components = frappe.get_all("Salary Component", fields=["salary_component_abbr"])
+		salary_components = context.components.values() if context else \
+			frappe.get_all("Salary Component", fields=["salary_component_abbr"])
 		for sc in salary_components:
 			data.setdefault(sc.salary_component_abbr, 0)
 
@@ -342,15 +341,14 @@ class SalarySlip(TransactionBase):
 
 	def eval_condition_and_formula(self, d, data):
 		try:
-			condition = d.condition.strip() if d.condition else None
+			# compiled once per Salary Structure
+			condition, formula = get_compiled_row(d, getattr(self, '_salary_structure_doc', None))
 			if condition:
-				if not frappe.safe_eval(condition, self.whitelisted_globals, data):
+				if not eval_compiled(condition, data):
 					return None
 			amount = d.amount
-			if d.amount_based_on_formula:
-				formula = d.formula.strip() if d.formula else None
-				if formula:
-					amount = flt(frappe.safe_eval(formula, self.whitelisted_globals, data), d.precision("amount"))
+			if formula:
+				amount = flt(eval_compiled(formula, data), d.precision("amount"))
 			if amount:
 				data[d.abbr] = amount
 
@@ -367,7 +365,7 @@ class SalarySlip(TransactionBase):
 	def add_employee_benefits(self, payroll_period):
 		for struct_row in self._salary_structure_doc.get("earnings"):
 			if struct_row.is_flexible_benefit == 1:
-				if frappe.db.get_value("Salary Component", struct_row.salary_component, "pay_against_benefit_claim") != 1:
+				if (get_salary_component(struct_row.salary_component) or {}).get("pay_against_benefit_claim") != 1:
 					benefit_component_amount = get_benefit_component_amount(self.employee, self.start_date, self.end_date,
 						struct_row.salary_component, self._salary_structure_doc, self.payroll_frequency, payroll_period)
 					if benefit_component_amount:
@@ -409,8 +407,10 @@ class SalarySlip(TransactionBase):
 				other_deduction_components.append(d.salary_component)
 
 		if not tax_components:
-			tax_components = [d.name for d in frappe.get_all("Salary Component", filters={"variable_based_on_taxable_salary": 1})
-				if d.name not in other_deduction_components]
+			context = get_payroll_context(self.employee)
+			tax_components = [d for d in (context.tax_components if context else [d.name for d in
+				frappe.get_all("Salary Component", filters={"variable_based_on_taxable_salary": 1})])
+				if d not in other_deduction_components]
 
 		for d in tax_components:
 			tax_amount = self.calculate_variable_based_on_taxable_salary(d, payroll_period)
@@ -696,7 +696,7 @@ class SalarySlip(TransactionBase):
 		try:
 			condition = condition.strip()
 			if condition:
-				return frappe.safe_eval(condition, self.whitelisted_globals, data)
+				return evaluate(condition, data)
 		except NameError as err:
 			frappe.throw(_("Name error: {0}".format(err)))
 		except SyntaxError as err:
@@ -706,7 +706,7 @@ class SalarySlip(TransactionBase):
 			raise
 
 	def get_salary_slip_row(self, salary_component):
-		component = frappe.get_doc("Salary Component", salary_component)
+		component = get_salary_component(salary_component)
 		# Data for update_component_row
 		struct_row = frappe._dict()
 		struct_row['depends_on_payment_days'] = component.depends_on_payment_days
@@ -154,6 +154,23 @@ class TestSalarySlip(unittest.TestCase):
 		self.assertEqual(ss.total_loan_repayment, 582)
 		self.assertEqual(ss.net_pay, (flt(ss.gross_pay) - (flt(ss.total_deduction) + flt(ss.total_loan_repayment))))
 
+	def test_salary_slip_in_payroll_context(self):
+		from erpnext.hr.salary_formula import set_payroll_context, clear_payroll_context
+
+		make_employee("test_employee@salary.com")
+		ss = make_employee_salary_slip("test_employee@salary.com", "Monthly")
+
+		# same amounts with the data for the formulas loaded once for the payroll run
+		set_payroll_context([ss.employee])
+		try:
+			ss_in_context = frappe.get_doc("Salary Slip", ss.name)
+			ss_in_context.calculate_net_pay()
+		finally:
+			clear_payroll_context()
+
+		self.assertEqual(ss_in_context.gross_pay, ss.gross_pay)
+		self.assertEqual(ss_in_context.net_pay, ss.net_pay)
+
 	def test_payroll_frequency(self):
 		fiscal_year = get_fiscal_year(nowdate(), company=erpnext.get_default_company())[0]
 		month = "%02d" % getdate(nowdate()).month
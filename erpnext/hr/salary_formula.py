@@ -0,0 +1,131 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Salary formulas and conditions compiled once, and the context shared by the Salary Slips of
+a payroll run.
+
+Expressions are checked and compiled as `frappe.safe_eval` does, but only once per process,
+and the compiled conditions and formulas of a Salary Structure are kept until it is modified.
+
+Payroll Entry loads the Salary Components, the Employees and their Salary Structure Assignments
+of all the slips it makes in a few queries with `set_payroll_context`, instead of each slip
+loading them again. Slips made outside of a payroll run load them as before.
+"""
+
+from __future__ import unicode_literals
+import datetime
+import frappe
+from frappe import _
+from frappe.utils import cstr, getdate
+
+WHITELISTED_GLOBALS = {
+	"int": int,
+	"float": float,
+	"long": int,
+	"round": round,
+	"date": datetime.date,
+	"getdate": getdate
+}
+
+# compiled code by expression, and compiled rows by site and Salary Structure
+MAX_COMPILED_EXPRESSIONS = 10000
+compiled_expressions = {}
+compiled_structures = {}
+
+SALARY_COMPONENT_FIELDS = ("name", "salary_component_abbr", "depends_on_payment_days", "do_not_include_in_total",
+	"is_tax_applicable", "is_flexible_benefit", "variable_based_on_taxable_salary", "pay_against_benefit_claim")
+
+def compile_expression(expression):
+	"""Returns the compiled code of the formula or condition"""
+	code = compiled_expressions.get(expression)
+	if code is None:
+		if "__" in expression:
+			frappe.throw(_('Illegal rule {0}. Cannot use "__"').format(frappe.bold(expression)))
+
+		if len(compiled_expressions) >= MAX_COMPILED_EXPRESSIONS:
+			compiled_expressions.clear()
+
+		code = compile(expression, "<salary formula>", "eval")
+		compiled_expressions[expression] = code
+
+	return code
+
+def evaluate(expression, data):
+	"""Evaluates the formula or condition with the data, as `frappe.safe_eval`"""
+	return eval_compiled(compile_expression(expression), data)
+
+def eval_compiled(code, data):
+	eval_globals = dict(WHITELISTED_GLOBALS)
+	eval_globals["__builtins__"] = {}
+
+	return eval(code, eval_globals, data)
+
+def get_compiled_row(row, salary_structure=None):
+	"""Returns the compiled (condition, formula) of the Salary Detail row, from the
+		compiled Salary Structure if it is a row of the structure"""
+	if salary_structure and not salary_structure.get("__islocal") and salary_structure.modified:
+		return get_compiled_structure(salary_structure)[(row.parentfield, row.idx)]
+
+	condition = row.condition.strip() if row.condition else None
+	formula = row.formula.strip() if row.amount_based_on_formula and row.formula else None
+
+	return (compile_expression(condition) if condition else None,
+		compile_expression(formula) if formula else None)
+
+def get_compiled_structure(salary_structure):
+	"""Returns the compiled (condition, formula) of the earnings and deductions of the
+		Salary Structure document, by (parentfield, idx)"""
+	key = (frappe.local.site, salary_structure.name)
+	modified = cstr(salary_structure.modified)
+
+	cached = compiled_structures.get(key)
+	if not cached or cached[0] != modified:
+		rows = {}
+		for d in salary_structure.get("earnings") + salary_structure.get("deductions"):
+			rows[(d.parentfield, d.idx)] = get_compiled_row(d)
+
+		cached = compiled_structures[key] = (modified, rows)
+
+	return cached[1]
+
+def set_payroll_context(employees):
+	"""Loads the Salary Components, and the Employees with their Salary Structure Assignments,
+		for the Salary Slips of the employees"""
+	context = frappe._dict(components={}, tax_components=[], employees={}, assignments={})
+
+	for d in frappe.db.sql("""select {0} from `tabSalary Component`
+		order by modified desc""".format(", ".join(SALARY_COMPONENT_FIELDS)), as_dict=1):
+		context.components[d.name] = d
+		if d.variable_based_on_taxable_salary:
+			context.tax_components.append(d.name)
+
+	if employees:
+		for d in frappe.db.sql("""select * from `tabEmployee` where name in %s""", [employees], as_dict=1):
+			d.doctype = "Employee"
+			context.employees[d.name] = d
+
+		# the latest assignment of each employee and salary structure, as `frappe.get_doc` with filters
+		for d in frappe.db.sql("""select * from `tabSalary Structure Assignment`
+			where employee in %s order by creation desc""", [employees], as_dict=1):
+			d.doctype = "Salary Structure Assignment"
+			context.assignments.setdefault((d.employee, d.salary_structure), d)
+
+	frappe.flags.payroll_context = context
+
+def clear_payroll_context():
+	frappe.flags.payroll_context = None
+
+def get_payroll_context(employee=None):
+	"""Returns the context of the payroll run, if the employee is in it"""
+	context = frappe.flags.payroll_context
+	if context and (not employee or employee in context.employees):
+		return context
+
+def get_salary_component(salary_component):
+	"""Salary Component details, from the payroll context if set"""
+	context = get_payroll_context()
+	if context and salary_component in context.components:
+		return context.components[salary_component]
+
+	return frappe.db.get_value("Salary Component", salary_component, SALARY_COMPONENT_FIELDS, as_dict=1)
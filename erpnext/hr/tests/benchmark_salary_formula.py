@@ -0,0 +1,139 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Salary formula evaluation: `frappe.safe_eval` of the raw formulas and conditions for each slip
+vs the formulas compiled once per Salary Structure, on a synthetic structure of 40 components
+(formulas on the base, on other components, and conditions) evaluated for 10k slips.
+
+Also times loading the data for the formulas of each slip (Employee, Salary Structure Assignment
+and Salary Component abbreviations) vs loading it once for the payroll run, for the employees
+of the site (extrapolated to the number of slips).
+
+Run on a test site (nothing is written):
+
+	bench --site test_site execute erpnext.hr.tests.benchmark_salary_formula.run
+	bench --site test_site execute erpnext.hr.tests.benchmark_salary_formula.run --kwargs "{'slips': 1000}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import random
+import time
+import frappe
+from frappe.utils import flt
+from erpnext.hr.salary_formula import WHITELISTED_GLOBALS, eval_compiled, get_compiled_row, \
+	set_payroll_context, clear_payroll_context
+
+def run(slips=10000, components=40, employees=200, seed=1):
+	random.seed(seed)
+	rows = make_structure_rows(components)
+	slip_data = [make_slip_data(components) for i in range(slips)]
+
+	start = time.time()
+	reference = [eval_by_safe_eval(rows, data) for data in slip_data]
+	safe_eval_seconds = time.time() - start
+
+	start = time.time()
+	compiled_rows = [(d, get_compiled_row(d)) for d in rows]
+	compiled = [eval_compiled_rows(compiled_rows, data) for data in slip_data]
+	compiled_seconds = time.time() - start
+
+	assert compiled == reference
+
+	employee_names = frappe.db.sql_list("select name from `tabEmployee` limit %s", employees)
+	per_slip_seconds, per_run_seconds = time_data_loading(employee_names)
+	scale = float(slips) / (len(employee_names) or 1)
+
+	print("{0} slips x {1} components".format(slips, components))
+	print("formulas | safe_eval {0:8.2f}s | compiled {1:8.2f}s".format(safe_eval_seconds, compiled_seconds))
+	print("data     | per slip  {0:8.2f}s | per run  {1:8.2f}s (extrapolated from {2} employees)".format(
+		per_slip_seconds * scale, per_run_seconds * scale, len(employee_names)))
+
+	return frappe._dict(safe_eval_seconds=safe_eval_seconds, compiled_seconds=compiled_seconds)
+
+def make_structure_rows(components):
+	"""earnings on the base, on earlier components, and conditional allowances"""
+	rows = []
+	for i in range(components):
+		if i < 10:
+			formula, condition = "base * {0}".format(random.randint(1, 20) / 100.0), None
+		elif i < 30:
+			formula = "C{0:02d} * {1} + C{2:02d} * {3}".format(random.randint(0, i - 1), random.randint(1, 9) / 10.0,
+				random.randint(0, i - 1), random.randint(1, 9) / 10.0)
+			condition = None
+		else:
+			formula = "round(base * payment_days / total_working_days * {0})".format(random.randint(1, 5) / 100.0)
+			condition = "base > {0} and grade == 'G{1}'".format(random.randint(1000, 50000), random.randint(1, 3))
+
+		rows.append(frappe._dict({
+			"parentfield": "earnings",
+			"idx": i + 1,
+			"abbr": "C{0:02d}".format(i),
+			"amount_based_on_formula": 1,
+			"formula": formula,
+			"condition": condition
+		}))
+
+	return rows
+
+def make_slip_data(components):
+	data = frappe._dict({
+		"base": random.randint(1000, 100000),
+		"payment_days": random.randint(20, 31),
+		"total_working_days": 31,
+		"grade": "G{0}".format(random.randint(1, 3))
+	})
+
+	# fields of the Employee, Salary Structure Assignment and Salary Slip, and all abbreviations
+	for i in range(150):
+		data["field_{0}".format(i)] = i
+	for i in range(components):
+		data["C{0:02d}".format(i)] = 0
+
+	return data
+
+def eval_by_safe_eval(rows, data):
+	"""previous implementation of `SalarySlip.eval_condition_and_formula`, as reference"""
+	data, amounts = frappe._dict(data), []
+	for d in rows:
+		condition = d.condition.strip() if d.condition else None
+		if condition and not frappe.safe_eval(condition, dict(WHITELISTED_GLOBALS), data):
+			amounts.append(None)
+			continue
+
+		amount = flt(frappe.safe_eval(d.formula.strip(), dict(WHITELISTED_GLOBALS), data), 2)
+		if amount:
+			data[d.abbr] = amount
+		amounts.append(amount)
+
+	return amounts
+
+def eval_compiled_rows(compiled_rows, data):
+	data, amounts = frappe._dict(data), []
+	for d, (condition, formula) in compiled_rows:
+		if condition and not eval_compiled(condition, data):
+			amounts.append(None)
+			continue
+
+		amount = flt(eval_compiled(formula, data), 2)
+		if amount:
+			data[d.abbr] = amount
+		amounts.append(amount)
+
+	return amounts
+
+def time_data_loading(employees):
+	start = time.time()
+	for employee in employees:
+		frappe.get_doc("Employee", employee).as_dict()
+		frappe.db.get_value("Salary Structure Assignment", {"employee": employee}, "*")
+		frappe.get_all("Salary Component", fields=["salary_component_abbr"])
+	per_slip_seconds = time.time() - start
+
+	start = time.time()
+	set_payroll_context(employees)
+	per_run_seconds = time.time() - start
+	clear_payroll_context()
+
+	return per_slip_seconds, per_run_seconds
@@ -0,0 +1,283 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Cost rollup of all active BOMs, used to update the latest price in all BOMs.
+
+The BOM graph (BOM Items with their sub-assembly BOMs, and the exploded items) is loaded
+in a few queries and sorted once so that sub-assembly BOMs come before the BOMs they are
+used in. Raw material rates and costs are then computed in memory the way `BOM.update_cost`
+does, and only the values that changed are written, in batches.
+"""
+
+from __future__ import unicode_literals
+from collections import deque
+import frappe
+from frappe.utils import flt
+from erpnext.manufacturing.bom_explosion import clear_bom_explosion_cache
+
+BATCH_SIZE = 500
+
+BOM_COST_FIELDS = ("raw_material_cost", "base_raw_material_cost", "total_cost", "base_total_cost")
+BOM_ITEM_COST_FIELDS = ("rate", "base_rate", "amount", "base_amount")
+BOM_EXPLOSION_ITEM_COST_FIELDS = ("rate", "amount")
+
+def update_cost_of_all_boms():
+	"""Updates raw material rates and costs of all active BOMs.
+		Returns the number of BOMs, and of BOMs whose cost changed"""
+	boms = get_boms()
+	exploded_items = get_exploded_items()
+	order = get_bottom_up_order(boms)
+
+	rates = frappe._dict(
+		valuation_rate=get_valuation_rates(boms),
+		item=get_item_rates(boms),
+		bom_unit_cost=get_unit_cost_of_other_boms(boms),
+		price_list_rate={}
+	)
+	precision = frappe._dict(rate=frappe.get_precision("BOM Item", "rate"),
+		qty=frappe.get_precision("BOM Item", "qty"))
+
+	changed_boms, changed_items, changed_exploded_items, exploded_rates = [], [], [], {}
+	for name in order:
+		bom = boms[name]
+		changed_items += update_bom_item_costs(bom, boms, rates, precision)
+		if update_bom_costs(bom):
+			changed_boms.append((bom.name, bom))
+
+		exploded_rates[name] = get_exploded_rates(bom, exploded_items, exploded_rates)
+		for d in exploded_items.get(name, []):
+			if d.key in exploded_rates[name]:
+				values = {"rate": exploded_rates[name][d.key]}
+				values["amount"] = flt(d.stock_qty) * values["rate"]
+				if is_changed(d, values):
+					changed_exploded_items.append((d.name, values))
+
+	update_in_batches("BOM Item", changed_items, BOM_ITEM_COST_FIELDS)
+	update_in_batches("BOM", changed_boms, BOM_COST_FIELDS)
+	update_in_batches("BOM Explosion Item", changed_exploded_items, BOM_EXPLOSION_ITEM_COST_FIELDS)
+
+	if changed_items:
+		# flattened BOMs have the rates of the raw materials
+		clear_bom_explosion_cache()
+
+	return len(order), len(changed_boms)
+
+def get_boms():
+	"""Active submitted BOMs with their items"""
+	boms = {}
+	for d in frappe.db.sql("""select name, quantity, conversion_rate, rm_cost_as_per, buying_price_list,
+			company, currency, set_rate_of_sub_assembly_item_based_on_bom, operating_cost, base_operating_cost,
+			scrap_material_cost, base_scrap_material_cost, raw_material_cost, base_raw_material_cost,
+			total_cost, base_total_cost
+		from `tabBOM` where docstatus=1 and is_active=1""", as_dict=1):
+		d.items = []
+		boms[d.name] = d
+
+	for d in frappe.db.sql("""select parent, name, item_code, bom_no, operation, qty, uom, stock_uom,
+			conversion_factor, rate, base_rate, amount, base_amount
+		from `tabBOM Item` where parenttype='BOM' and docstatus=1
+		order by parent, idx""", as_dict=1):
+		if d.parent in boms:
+			boms[d.parent]["items"].append(d)
+
+	return boms
+
+def get_exploded_items():
+	"""Exploded items of the submitted BOMs, by BOM"""
+	exploded_items = {}
+	for d in frappe.db.sql("""select parent, name, item_code, operation, stock_qty, rate, amount
+		from `tabBOM Explosion Item` where docstatus=1
+		order by parent, idx""", as_dict=1):
+		d.key = (d.item_code, d.operation) if d.operation else d.item_code
+		exploded_items.setdefault(d.parent, []).append(d)
+
+	return exploded_items
+
+def get_bottom_up_order(boms):
+	"""Names of the BOMs, sub-assembly BOMs first"""
+	parents, pending = {}, {}
+	for bom in boms.values():
+		children = set(d.bom_no for d in bom["items"] if d.bom_no in boms)
+		pending[bom.name] = len(children)
+		for child in children:
+			parents.setdefault(child, []).append(bom.name)
+
+	queue = deque(sorted(name for name, count in pending.items() if not count))
+	order = []
+	while queue:
+		name = queue.popleft()
+		order.append(name)
+		for parent in parents.get(name, []):
+			pending[parent] -= 1
+			if not pending[parent]:
+				queue.append(parent)
+
+	if len(order) < len(boms):
+		frappe.log_error(", ".join(sorted(name for name, count in pending.items() if count)),
+			"BOM recursion, costs not updated")
+
+	return order
+
+def get_raw_material_codes(boms, rm_cost_as_per):
+	return list(set(d.item_code for bom in boms.values() if (bom.rm_cost_as_per or "Valuation Rate") in rm_cost_as_per
+		for d in bom["items"]))
+
+def get_valuation_rates(boms):
+	"""Valuation rate of the raw materials, as `BOM.get_valuation_rate`"""
+	item_codes = get_raw_material_codes(boms, ("Valuation Rate",))
+	valuation_rates = {}
+
+	for i in range(0, len(item_codes), BATCH_SIZE):
+		for item_code, actual_qty, stock_value in frappe.db.sql("""select item_code, sum(actual_qty), sum(stock_value)
+			from `tabBin` where item_code in %s group by item_code""", [item_codes[i:i + BATCH_SIZE]]):
+			if flt(actual_qty) and flt(stock_value) / flt(actual_qty) > 0:
+				valuation_rates[item_code] = flt(stock_value) / flt(actual_qty)
+
+	# last valuation rate of the items without stock value, usually only a few
+	for item_code in item_codes:
+		if item_code not in valuation_rates:
+			last_valuation_rate = frappe.db.sql("""select valuation_rate
+				from `tabStock Ledger Entry`
+				where item_code = %s and valuation_rate > 0
+				order by posting_date desc, posting_time desc, name desc limit 1""", item_code)
+
+			if last_valuation_rate:
+				valuation_rates[item_code] = flt(last_valuation_rate[0][0])
+
+	return valuation_rates
+
+def get_item_rates(boms):
+	"""Valuation rate and last purchase rate set in the raw material Items"""
+	item_codes = get_raw_material_codes(boms, ("Valuation Rate", "Last Purchase Rate"))
+	item_rates = {}
+
+	for i in range(0, len(item_codes), BATCH_SIZE):
+		for d in frappe.db.sql("""select name, valuation_rate, last_purchase_rate
+			from `tabItem` where name in %s""", [item_codes[i:i + BATCH_SIZE]], as_dict=1):
+			item_rates[d.name] = d
+
+	return item_rates
+
+def get_unit_cost_of_other_boms(boms):
+	"""Unit cost of the active sub-assembly BOMs that are not submitted, and so not in the rollup"""
+	bom_nos = list(set(d.bom_no for bom in boms.values() for d in bom["items"] if d.bom_no and d.bom_no not in boms))
+	if not bom_nos:
+		return {}
+
+	return dict(frappe.db.sql("""select name, base_total_cost/quantity from `tabBOM`
+		where is_active = 1 and name in %s""", [bom_nos]))
+
+def get_rm_rate(bom, item, boms, rates):
+	"""Rate of the BOM Item as per the selected method, as `BOM.get_rm_rate`"""
+	conversion_factor = flt(item.conversion_factor) or 1
+
+	if item.bom_no and bom.set_rate_of_sub_assembly_item_based_on_bom:
+		if item.bom_no in boms:
+			child = boms[item.bom_no]
+			rate = flt(child.base_total_cost) / flt(child.quantity) if flt(child.quantity) else 0
+		else:
+			rate = flt(rates.bom_unit_cost.get(item.bom_no))
+
+		rate *= conversion_factor
+
+	elif (bom.rm_cost_as_per or "Valuation Rate") == "Valuation Rate":
+		rate = rates.valuation_rate.get(item.item_code) \
+			or flt(rates.item.get(item.item_code, {}).get("valuation_rate"))
+		rate *= conversion_factor
+
+	elif bom.rm_cost_as_per == "Last Purchase Rate":
+		rate = flt(rates.item.get(item.item_code, {}).get("last_purchase_rate")) * conversion_factor
+
+	else:
+		# price list rules (uom, validity, currency) are applied by the BOM itself
+		key = (bom.rm_cost_as_per, bom.buying_price_list, bom.company, bom.currency, flt(bom.conversion_rate),
+			item.item_code, item.uom, flt(item.qty), conversion_factor)
+		if key not in rates.price_list_rate:
+			doc = frappe.get_doc({
+				"doctype": "BOM",
+				"rm_cost_as_per": bom.rm_cost_as_per,
+				"buying_price_list": bom.buying_price_list,
+				"company": bom.company,
+				"currency": bom.currency,
+				"conversion_rate": bom.conversion_rate
+			})
+			rates.price_list_rate[key] = doc.get_rm_rate({
+				"item_code": item.item_code,
+				"qty": item.qty,
+				"uom": item.uom,
+				"stock_uom": item.stock_uom,
+				"conversion_factor": item.conversion_factor
+			})
+
+		return rates.price_list_rate[key]
+
+	return flt(rate) / (flt(bom.conversion_rate) or 1)
+
+def update_bom_item_costs(bom, boms, rates, precision):
+	"""Sets the new rates and amounts of the BOM Items, returns those that changed"""
+	changed = []
+	for d in bom["items"]:
+		values = {"rate": get_rm_rate(bom, d, boms, rates) or flt(d.rate)}
+		values["base_rate"] = values["rate"] * flt(bom.conversion_rate)
+		values["amount"] = flt(values["rate"], precision.rate) * flt(d.qty, precision.qty)
+		values["base_amount"] = values["amount"] * flt(bom.conversion_rate)
+
+		if is_changed(d, values):
+			changed.append((d.name, values))
+		d.update(values)
+
+	return changed
+
+def update_bom_costs(bom):
+	"""Sets the new total cost of the BOM, returns True if it changed"""
+	raw_material_cost = sum(d.amount for d in bom["items"])
+	base_raw_material_cost = sum(d.base_amount for d in bom["items"])
+
+	values = {
+		"raw_material_cost": raw_material_cost,
+		"base_raw_material_cost": base_raw_material_cost,
+		"total_cost": flt(bom.operating_cost) + raw_material_cost - flt(bom.scrap_material_cost),
+		"base_total_cost": flt(bom.base_operating_cost) + base_raw_material_cost
+			- flt(bom.base_scrap_material_cost)
+	}
+
+	changed = is_changed(bom, values)
+	bom.update(values)
+
+	return changed
+
+def get_exploded_rates(bom, exploded_items, exploded_rates):
+	"""Rates of the exploded items of the BOM by item (and operation), as `BOM.get_exploded_items`"""
+	rates = {}
+	for d in bom["items"]:
+		if d.bom_no:
+			child_rates = exploded_rates.get(d.bom_no)
+			if child_rates is None:
+				child_rates = dict((e.key, flt(e.rate)) for e in exploded_items.get(d.bom_no, []))
+
+			for key, rate in child_rates.items():
+				rates.setdefault(key, rate)
+		else:
+			rates.setdefault((d.item_code, d.operation) if d.operation else d.item_code, d.base_rate)
+
+	return rates
+
+def is_changed(doc, values):
+	# currency and float columns are stored with 6 decimals
+	return any(flt(doc.get(fieldname), 6) != flt(value, 6) for fieldname, value in values.items())
+
+def update_in_batches(doctype, rows, fields):
+	"""Sets the values of the rows, (name, {fieldname: value}), with one query per batch"""
+	for i in range(0, len(rows), BATCH_SIZE):
+		batch = rows[i:i + BATCH_SIZE]
+
+		assignments, values = [], []
+		for fieldname in fields:
+			assignments.append("`{0}` = case name {1} end".format(fieldname,
+				" ".join(["when %s then %s"] * len(batch))))
+			for name, row in batch:
+				values += [name, row[fieldname]]
+
+		frappe.db.sql("""update `tab{0}` set {1} where name in ({2})""".format(doctype,
+			", ".join(assignments), ", ".join(["%s"] * len(batch))), tuple(values + [d[0] for d in batch]))
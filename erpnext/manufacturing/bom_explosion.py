@@ -0,0 +1,174 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Items of BOMs per unit of the BOM quantity, and flattened BOMs (the raw materials of all
+levels per unit), cached for the transaction and in Redis between requests.
+
+A BOM is flattened from its items, using the flattened BOMs of its submitted sub-assembly
+BOMs, so a sub-assembly shared by many BOMs is only exploded once. The caches of a BOM and
+of all BOMs using it are cleared whenever the BOM is updated, submitted or cancelled.
+
+The caches are cleared before the BOM is committed, so another request can cache the BOM
+as it was before the commit. Redis entries expire so such a value is not kept for long,
+and the request cache is dropped at each commit and rollback.
+"""
+
+from __future__ import unicode_literals
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+BOM_ITEM_FIELDS = ("item_code", "item_name", "bom_no", "operation", "source_warehouse", "description", "image",
+	"uom", "stock_uom", "conversion_factor", "idx", "include_item_in_manufacturing", "base_rate")
+
+CACHE_NAMES = ("bom_items_per_unit", "flat_bom")
+REDIS_EXPIRY = 600
+
+class BOMExplosionCacheObserver(object):
+	"""Clears the request cache when the transaction is rolled back. Observers are removed
+		on commit, so a missing observer means the request cache is of an earlier transaction"""
+	def on_rollback(self):
+		frappe.flags.bom_explosion_cache = None
+
+def get_bom_items_per_unit(bom_no):
+	"""Returns the BOM (`docstatus`, `quantity`) with its `items`, their `qty` and `stock_qty`
+		per unit of the BOM quantity"""
+	return get_cached_value("bom_items_per_unit", bom_no, _get_bom_items_per_unit)
+
+def _get_bom_items_per_unit(bom_no):
+	bom = frappe.db.get_value("BOM", bom_no, ["name", "docstatus", "quantity"], as_dict=1)
+	if not bom:
+		return None
+
+	quantity = flt(bom.quantity) or 1
+	bom["items"] = frappe.db.sql("""select {0}, qty / %(quantity)s as qty, stock_qty / %(quantity)s as stock_qty
+		from `tabBOM Item`
+		where parent = %(bom)s and parenttype = 'BOM' and docstatus < 2
+		order by idx""".format(", ".join(BOM_ITEM_FIELDS)), {"bom": bom_no, "quantity": quantity}, as_dict=1)
+
+	return bom
+
+def get_flat_bom(bom_no):
+	"""Returns the raw materials of all levels of the BOM, per unit of the BOM quantity,
+		by item (and operation) as in BOM Explosion Items"""
+	return get_cached_value("flat_bom", bom_no, _get_flat_bom)
+
+def _get_flat_bom(bom_no):
+	# BOMs being flattened, from the top
+	ancestors = frappe.flags.bom_explosion_ancestors or []
+	if bom_no in ancestors:
+		frappe.throw(_("BOM recursion: {0} cannot be parent or child of {1}").format(bom_no, ancestors[-1]))
+
+	bom = get_bom_items_per_unit(bom_no)
+	if not bom:
+		return []
+
+	flat_bom, keys = [], {}
+
+	def add(row):
+		key = (row.item_code, row.operation) if row.operation else row.item_code
+		if key in keys:
+			keys[key].stock_qty += row.stock_qty
+		else:
+			keys[key] = row
+			flat_bom.append(row)
+
+	frappe.flags.bom_explosion_ancestors = ancestors + [bom_no]
+	try:
+		for d in bom["items"]:
+			if not d.bom_no:
+				add(frappe._dict({
+					"item_code": d.item_code,
+					"item_name": d.item_name,
+					"operation": d.operation,
+					"source_warehouse": d.source_warehouse,
+					"description": d.description,
+					"image": d.image,
+					"stock_uom": d.stock_uom,
+					"stock_qty": flt(d.stock_qty),
+					"rate": flt(d.base_rate),
+					"include_item_in_manufacturing": d.include_item_in_manufacturing
+				}))
+
+			# only submitted sub-assembly BOMs are exploded
+			elif cint((get_bom_items_per_unit(d.bom_no) or {}).get("docstatus")) == 1:
+				for child in get_flat_bom(d.bom_no):
+					row = frappe._dict(child)
+					row.stock_qty = flt(child.stock_qty) * flt(d.stock_qty)
+					add(row)
+	finally:
+		frappe.flags.bom_explosion_ancestors = ancestors
+
+	return flat_bom
+
+def update_exploded_items(bom_no):
+	"""Rewrites the BOM Explosion Items of the BOM from its flattened BOM"""
+	bom = get_bom_items_per_unit(bom_no)
+	if not bom:
+		return
+
+	frappe.db.sql("""delete from `tabBOM Explosion Item` where parent=%s""", bom_no)
+
+	quantity = flt(bom.quantity) or 1
+	for idx, d in enumerate(sorted(get_flat_bom(bom_no), key=lambda d: d.item_code)):
+		row = frappe.get_doc(dict(d, doctype="BOM Explosion Item"))
+		row.update({
+			"parent": bom_no,
+			"parenttype": "BOM",
+			"parentfield": "exploded_items",
+			"idx": idx + 1,
+			"stock_qty": d.stock_qty * quantity,
+			"amount": d.stock_qty * quantity * flt(d.rate),
+			"qty_consumed_per_unit": d.stock_qty,
+			"docstatus": bom.docstatus
+		})
+		row.db_insert()
+
+def clear_bom_explosion_cache(bom_no=None):
+	"""Clears the cached BOM items and flattened BOM of the BOM and of all BOMs using it,
+		or of all BOMs"""
+	if not bom_no:
+		frappe.flags.bom_explosion_cache = None
+		for name in CACHE_NAMES:
+			frappe.cache().delete_keys(get_redis_key(name, ""))
+		return
+
+	bom_nos, parents = set([bom_no]), [bom_no]
+	while parents:
+		parents = [d for d in frappe.db.sql_list("""select distinct parent from `tabBOM Item`
+			where bom_no in %s and parenttype='BOM'""", [parents]) if d not in bom_nos]
+		bom_nos.update(parents)
+
+	for name in CACHE_NAMES:
+		cache = (frappe.flags.bom_explosion_cache or {}).get(name, {})
+		for d in bom_nos:
+			cache.pop(d, None)
+			frappe.cache().delete_value(get_redis_key(name, d))
+
+def get_cached_value(name, bom_no, generator):
+	cache = get_request_cache().setdefault(name, {})
+	if bom_no in cache:
+		return cache[bom_no]
+
+	value = frappe.cache().get_value(get_redis_key(name, bom_no))
+	if value is None:
+		value = generator(bom_no)
+
+		# values read after writes of this transaction are not committed yet, not shared through Redis
+		if not frappe.db.transaction_writes:
+			frappe.cache().set_value(get_redis_key(name, bom_no), value, expires_in_sec=REDIS_EXPIRY)
+
+	cache[bom_no] = value
+	return value
+
+def get_request_cache():
+	if frappe.flags.bom_explosion_cache is None or \
+		not any(isinstance(d, BOMExplosionCacheObserver) for d in frappe.local.rollback_observers):
+		frappe.flags.bom_explosion_cache = {}
+		frappe.local.rollback_observers.append(BOMExplosionCacheObserver())
+
+	return frappe.flags.bom_explosion_cache
+
+def get_redis_key(name, bom_no):
+	return "{0}:{1}".format(name, bom_no)
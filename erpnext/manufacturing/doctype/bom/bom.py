@@ -9,6 +9,8 @@ from erpnext.setup.utils import get_exchange_rate
 from frappe.website.website_generator import WebsiteGenerator
 from erpnext.stock.get_item_details import get_conversion_factor
 from erpnext.stock.get_item_details import get_price_list_rate
+from erpnext.manufacturing.bom_explosion import (get_bom_items_per_unit, get_flat_bom,
+	update_exploded_items, clear_bom_explosion_cache)
 
 import functools
 
@@ -62,22 +64,26 @@ class BOM(WebsiteGenerator):
 		context.parents = [{'name': 'boms', 'title': _('All BOMs') }]
 
 	def on_update(self):
+		clear_bom_explosion_cache(self.name)
 		self.check_recursion()
 		self.update_stock_qty()
 		self.update_exploded_items()
 
 	def on_submit(self):
+		clear_bom_explosion_cache(self.name)
 		self.manage_default_bom()
 
 	def on_cancel(self):
 		frappe.db.set(self, "is_active", 0)
 		frappe.db.set(self, "is_default", 0)
+		clear_bom_explosion_cache(self.name)
 
 		# check if used in any other bom
 		self.validate_bom_links()
 		self.manage_default_bom()
 
 	def on_update_after_submit(self):
+		clear_bom_explosion_cache(self.name)
 		self.validate_bom_links()
 		self.manage_default_bom()
 
@@ -255,6 +261,7 @@ class BOM(WebsiteGenerator):
 			frappe.db.sql("""update `tabBOM Item` set rate=%s, amount=stock_qty*%s
 				where bom_no = %s and docstatus < 2 and parenttype='BOM'""",
 				(cost, cost, self.name))
+			clear_bom_explosion_cache(self.name)
 
 	def get_bom_unitcost(self, bom_no):
 		bom = frappe.db.sql("""select name, base_total_cost/quantity as unit_cost from `tabBOM`
@@ -403,9 +410,8 @@ class BOM(WebsiteGenerator):
 	def update_cost_and_exploded_items(self, bom_list=[]):
 		bom_list = self.traverse_tree(bom_list)
 		for bom in bom_list:
-			bom_obj = frappe.get_doc("BOM", bom)
-			bom_obj.check_recursion()
-			bom_obj.update_exploded_items()
+			# sub-assemblies are flattened once, recursion is checked while flattening
+			update_exploded_items(bom)
 
 		return bom_list
 
@@ -528,15 +534,10 @@ class BOM(WebsiteGenerator):
 
 	def get_child_exploded_items(self, bom_no, stock_qty):
 		""" Add all items from Flat BOM of child BOM"""
-		# Did not use qty_consumed_per_unit in the query, as it leads to rounding loss
-		child_fb_items = frappe.db.sql("""select bom_item.item_code, bom_item.item_name,
-			bom_item.description, bom_item.source_warehouse, bom_item.operation,
-			bom_item.stock_uom, bom_item.stock_qty, bom_item.rate, bom_item.include_item_in_manufacturing,
-			bom_item.stock_qty / ifnull(bom.quantity, 1) as qty_consumed_per_unit
-			from `tabBOM Explosion Item` bom_item, tabBOM bom
-			where bom_item.parent = bom.name and bom.name = %s and bom.docstatus = 1""", bom_no, as_dict = 1)
-
-		for d in child_fb_items:
+		if cint((get_bom_items_per_unit(bom_no) or {}).get("docstatus")) != 1:
+			return
+
+		for d in get_flat_bom(bom_no):
 			self.add_to_cur_exploded_items(frappe._dict({
 				'item_code'				: d['item_code'],
 				'item_name'				: d['item_name'],
@@ -544,7 +545,7 @@ class BOM(WebsiteGenerator):
 				'operation'				: d['operation'],
 				'description'			: d['description'],
 				'stock_uom'				: d['stock_uom'],
-				'stock_qty'				: d['qty_consumed_per_unit'] * stock_qty,
+				'stock_qty'				: d['stock_qty'] * stock_qty,
 				'rate'					: flt(d['rate']),
 				'include_item_in_manufacturing': d.get('include_item_in_manufacturing', 0)
 			}))
@@ -589,54 +590,36 @@ def get_list_context(context):
 def get_bom_items_as_dict(bom, company, qty=1, fetch_exploded=1, fetch_scrap_items=0, include_non_stock_items=False, fetch_qty_in_stock_uom=True):
 	item_dict = {}
 
-	# Did not use qty_consumed_per_unit in the query, as it leads to rounding loss
-	query = """select
-				bom_item.item_code,
-				bom_item.idx,
-				item.item_name,
-				sum(bom_item.{qty_field}/ifnull(bom.quantity, 1)) * %(qty)s as qty,
-				item.description,
-				item.image,
-				item.stock_uom,
-				item.allow_alternative_item,
-				item_default.default_warehouse,
-				item_default.expense_account as expense_account,
-				item_default.buying_cost_center as cost_center
-				{select_columns}
-			from
-				`tab{table}` bom_item
-				JOIN `tabBOM` bom ON bom_item.parent = bom.name
-				JOIN `tabItem` item ON item.name = bom_item.item_code
-				LEFT JOIN `tabItem Default` item_default
-					ON item_default.parent = item.name and item_default.company = %(company)s
-			where
-				bom_item.docstatus < 2
-				and bom.name = %(bom)s
-				and item.is_stock_item in (1, {is_stock_item})
-				{where_conditions}
-				group by item_code, stock_uom {groupby_columns}
-				order by idx"""
-
-	is_stock_item = 0 if include_non_stock_items else 1
-	if cint(fetch_exploded):
-		query = query.format(table="BOM Explosion Item",
-			where_conditions="",
-			is_stock_item=is_stock_item,
-			qty_field="stock_qty",
-			select_columns = """, bom_item.source_warehouse, bom_item.operation, bom_item.include_item_in_manufacturing,
-				(Select idx from `tabBOM Item` where item_code = bom_item.item_code and parent = %(parent)s limit 1) as idx""",
-			groupby_columns = """, bom_item.operation""")
-
-		items = frappe.db.sql(query, { "parent": bom, "qty": qty, "bom": bom, "company": company }, as_dict=True)
-	elif fetch_scrap_items:
-		query = query.format(table="BOM Scrap Item", where_conditions="", select_columns=", bom_item.idx", is_stock_item=is_stock_item, qty_field="stock_qty", groupby_columns="")
-		items = frappe.db.sql(query, { "qty": qty, "bom": bom, "company": company }, as_dict=True)
+	if cint(fetch_exploded) or not fetch_scrap_items:
+		items = get_bom_items_with_item_details(bom, company, qty, fetch_exploded,
+			include_non_stock_items, fetch_qty_in_stock_uom)
 	else:
-		query = query.format(table="BOM Item", where_conditions="", is_stock_item=is_stock_item,
-			qty_field="stock_qty" if fetch_qty_in_stock_uom else "qty",
-			select_columns = ", bom_item.uom, bom_item.conversion_factor, bom_item.source_warehouse, bom_item.idx, bom_item.operation, bom_item.include_item_in_manufacturing",
-			groupby_columns = """, bom_item.operation""")
-		items = frappe.db.sql(query, { "qty": qty, "bom": bom, "company": company }, as_dict=True)
+		# Did not use qty_consumed_per_unit in the query, as it leads to rounding loss
+		items = frappe.db.sql("""select
+					bom_item.item_code,
+					bom_item.idx,
+					item.item_name,
+					sum(bom_item.stock_qty/ifnull(bom.quantity, 1)) * %(qty)s as qty,
+					item.description,
+					item.image,
+					item.stock_uom,
+					item.allow_alternative_item,
+					item_default.default_warehouse,
+					item_default.expense_account as expense_account,
+					item_default.buying_cost_center as cost_center
+				from
+					`tabBOM Scrap Item` bom_item
+					JOIN `tabBOM` bom ON bom_item.parent = bom.name
+					JOIN `tabItem` item ON item.name = bom_item.item_code
+					LEFT JOIN `tabItem Default` item_default
+						ON item_default.parent = item.name and item_default.company = %(company)s
+				where
+					bom_item.docstatus < 2
+					and bom.name = %(bom)s
+					and item.is_stock_item in (1, {is_stock_item})
+					group by item_code, stock_uom
+					order by idx""".format(is_stock_item=0 if include_non_stock_items else 1),
+			{ "qty": qty, "bom": bom, "company": company }, as_dict=True)
 
 	for item in items:
 		key = (item.item_code)
@@ -657,6 +640,69 @@ def get_bom_items_as_dict(bom, company, qty=1, fetch_exploded=1, fetch_scrap_ite
 
 	return item_dict
 
+def get_bom_items_with_item_details(bom, company, qty=1, fetch_exploded=1, include_non_stock_items=False,
+	fetch_qty_in_stock_uom=True):
+	"""Items (exploded from all levels, or of the BOM itself) for `qty` of the BOM, with their Item details"""
+	bom_items = (get_bom_items_per_unit(bom) or {}).get("items") or []
+
+	items = []
+	if cint(fetch_exploded):
+		# idx of the item in the BOM itself, if any
+		bom_item_idx = {}
+		for d in bom_items:
+			bom_item_idx.setdefault(d.item_code, d.idx)
+
+		for d in get_flat_bom(bom):
+			items.append(frappe._dict({
+				"item_code": d.item_code,
+				"idx": bom_item_idx.get(d.item_code),
+				"qty": flt(d.stock_qty) * flt(qty),
+				"source_warehouse": d.source_warehouse,
+				"operation": d.operation,
+				"include_item_in_manufacturing": d.include_item_in_manufacturing
+			}))
+	else:
+		for d in bom_items:
+			items.append(frappe._dict({
+				"item_code": d.item_code,
+				"idx": d.idx,
+				"qty": flt(d.stock_qty if fetch_qty_in_stock_uom else d.qty) * flt(qty),
+				"uom": d.uom,
+				"conversion_factor": d.conversion_factor,
+				"source_warehouse": d.source_warehouse,
+				"operation": d.operation,
+				"include_item_in_manufacturing": d.include_item_in_manufacturing
+			}))
+
+	if not items:
+		return []
+
+	item_details = {}
+	for d in frappe.db.sql("""select item.name, item.item_name, item.description, item.image, item.stock_uom,
+			item.allow_alternative_item, item.is_stock_item, item_default.default_warehouse,
+			item_default.expense_account as expense_account, item_default.buying_cost_center as cost_center
+		from
+			`tabItem` item
+			LEFT JOIN `tabItem Default` item_default
+				ON item_default.parent = item.name and item_default.company = %(company)s
+		where item.name in %(item_codes)s""", {
+			"company": company,
+			"item_codes": list(set(d.item_code for d in items))
+		}, as_dict=True):
+		item_details[d.name] = d
+
+	out = []
+	for d in items:
+		details = item_details.get(d.item_code)
+		if details and (details.is_stock_item or include_non_stock_items):
+			for fieldname in ("item_name", "description", "image", "stock_uom", "allow_alternative_item",
+				"default_warehouse", "expense_account", "cost_center"):
+				d[fieldname] = details[fieldname]
+			out.append(d)
+
+	out.sort(key=lambda d: d.idx or 0)
+	return out
+
 @frappe.whitelist()
 def get_bom_items(bom, company, qty=1, fetch_exploded=1):
 	items = get_bom_items_as_dict(bom, company, qty, fetch_exploded, include_non_stock_items=True).values()
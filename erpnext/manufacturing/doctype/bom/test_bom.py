@@ -5,7 +5,7 @@
 from __future__ import unicode_literals
 import unittest
 import frappe
-from frappe.utils import cstr
+from frappe.utils import cstr, flt
 from frappe.test_runner import make_test_records
 from erpnext.stock.doctype.stock_reconciliation.test_stock_reconciliation import create_stock_reconciliation
 from erpnext.manufacturing.doctype.bom_update_tool.bom_update_tool import update_cost
@@ -75,6 +75,52 @@ class TestBOM(unittest.TestCase):
 			where item_code='_Test Item 2' and docstatus=1 and parenttype='BOM'""", as_dict=1):
 				self.assertEqual(d.rate, rm_rate + 10)
 
+	def test_update_cost_rolls_up_sub_assembly_cost(self):
+		from erpnext.manufacturing.bom_cost_rollup import update_cost_of_all_boms
+
+		sub_assembly_bom = "BOM-_Test Item Home Desktop Manufactured-001"
+		rm_rate = frappe.db.get_value("BOM Item", {"parent": sub_assembly_bom, "item_code": "_Test Item 2",
+			"parenttype": "BOM"}, "rate")
+		reset_item_valuation_rate(item_code='_Test Item 2', qty=200, rate=flt(rm_rate) + 20)
+
+		update_cost()
+
+		unit_cost = frappe.db.sql("""select base_total_cost / quantity from `tabBOM`
+			where name=%s""", sub_assembly_bom)[0][0]
+		for d in frappe.db.sql("""select bom_item.rate, bom_item.conversion_factor, bom.conversion_rate,
+				bom.name as parent
+			from `tabBOM Item` bom_item, `tabBOM` bom
+			where bom_item.parent = bom.name and bom_item.bom_no=%s and bom_item.parenttype='BOM'
+				and bom.docstatus=1 and bom.is_active=1 and bom.set_rate_of_sub_assembly_item_based_on_bom=1""",
+			sub_assembly_bom, as_dict=1):
+			self.assertAlmostEqual(d.rate, flt(unit_cost) * flt(d.conversion_factor or 1)
+				/ flt(d.conversion_rate or 1), 4)
+
+			bom = frappe.get_doc("BOM", d.parent)
+			self.assertAlmostEqual(bom.raw_material_cost, sum(flt(i.amount) for i in bom.items), 4)
+
+		# nothing left to update
+		self.assertEqual(update_cost_of_all_boms()[1], 0)
+
+	def test_flat_bom(self):
+		from erpnext.manufacturing.bom_explosion import get_flat_bom, clear_bom_explosion_cache, get_redis_key
+
+		bom_no = get_default_bom()
+		quantity = frappe.db.get_value("BOM", bom_no, "quantity")
+		exploded_items = dict(frappe.db.sql("""select item_code, stock_qty from `tabBOM Explosion Item`
+			where parent=%s""", bom_no))
+
+		clear_bom_explosion_cache()
+		flat_bom = get_flat_bom(bom_no)
+		self.assertEqual(sorted(d.item_code for d in flat_bom), sorted(exploded_items))
+		for d in flat_bom:
+			self.assertAlmostEqual(d.stock_qty * quantity, exploded_items[d.item_code], 4)
+
+		# cleared with the sub-assembly BOM
+		clear_bom_explosion_cache("BOM-_Test Item Home Desktop Manufactured-001")
+		self.assertFalse(bom_no in (frappe.flags.bom_explosion_cache or {}).get("flat_bom", {}))
+		self.assertEqual(frappe.cache().get_value(get_redis_key("flat_bom", bom_no)), None)
+
 	def test_bom_cost(self):
 		bom = frappe.copy_doc(test_records[2])
 		bom.insert()
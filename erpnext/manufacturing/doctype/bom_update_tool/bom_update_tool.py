@@ -7,7 +7,8 @@ import frappe, json
 from frappe.utils import cstr, flt
 from frappe import _
 from six import string_types
-from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order
+from erpnext.manufacturing.bom_cost_rollup import update_cost_of_all_boms
+from erpnext.manufacturing.bom_explosion import clear_bom_explosion_cache
 from frappe.model.document import Document
 
 class BOMUpdateTool(Document):
@@ -50,6 +51,7 @@ class BOMUpdateTool(Document):
 		frappe.db.sql("""update `tabBOM Item` set bom_no=%s,
 			rate=%s, amount=stock_qty*%s where bom_no = %s and docstatus < 2 and parenttype='BOM'""",
 			(self.new_bom, new_bom_unitcost, new_bom_unitcost, self.current_bom))
+		clear_bom_explosion_cache(self.new_bom)
 
 	def get_parent_boms(self, bom, bom_list=None):
 		if not bom_list:
@@ -90,6 +92,4 @@ def replace_bom(args):
 	doc.replace_bom()
 
 def update_cost():
-	bom_list = get_boms_in_bottom_up_order()
-	for bom in bom_list:
-		frappe.get_doc("BOM", bom).update_cost(update_parent=False, from_child_bom=True)
\ No newline at end of file
+	update_cost_of_all_boms()
\ No newline at end of file
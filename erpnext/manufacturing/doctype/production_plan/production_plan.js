@@ -101,6 +101,7 @@ frappe.ui.form.on('Production Plan', {
 			doc: frm.doc,
 			callback: function() {
 				refresh_field('po_items');
+				refresh_field('mr_items');
 			}
 		});
 	},
@@ -7,6 +7,7 @@ import frappe, json
 from frappe import msgprint, _
 from frappe.model.document import Document
 from erpnext.manufacturing.doctype.bom.bom import validate_bom_no
+from erpnext.manufacturing.bom_explosion import get_bom_items_per_unit, get_flat_bom
 from frappe.utils import cstr, flt, cint, nowdate, add_days, comma_and, now_datetime, ceil
 from erpnext.manufacturing.doctype.work_order.work_order import get_item_details
 from six import string_types, iteritems
@@ -95,6 +96,8 @@ class ProductionPlan(Document):
 			self.get_so_items()
 		elif self.get_items_from == "Material Request":
 			self.get_mr_items()
+		elif self.get_items_from == "MRP":
+			self.enqueue_mrp()
 
 	def get_so_items(self):
 		so_list = [d.sales_order for d in self.get("sales_orders", []) if d.sales_order]
@@ -152,6 +155,59 @@ class ProductionPlan(Document):
 		self.add_items(items)
 		self.calculate_total_planned_qty()
 
+	def enqueue_mrp(self):
+		"""MRP plans all open demand of the company, so it runs in the background and
+			the job saves the planned orders to the Production Plan"""
+		if self.is_new():
+			frappe.throw(_("Please save the Production Plan before running MRP"))
+
+		frappe.enqueue("erpnext.manufacturing.doctype.production_plan.production_plan.run_mrp_for_production_plan",
+			queue="long", timeout=3600, production_plan=self.name, now=frappe.flags.in_test)
+
+		msgprint(_("MRP is queued, the Production Plan will be updated once it is complete"))
+
+	def get_mrp_items(self, publish_progress=False):
+		"""Sets the Work Orders and Material Requests planned by MRP for all open demand
+			in the warehouse, or all warehouses of the company"""
+		from erpnext.manufacturing.mrp import run_mrp
+
+		def progress(percent):
+			frappe.publish_progress(percent, title=_("Running MRP..."), doctype=self.doctype, docname=self.name)
+
+		plan = run_mrp(self.company, self.warehouse, self.posting_date,
+			progress=progress if publish_progress else None)
+
+		self.set('po_items', [])
+		for d in plan.work_orders:
+			self.append('po_items', {
+				'include_exploded_items': 0,
+				'warehouse': d.warehouse,
+				'item_code': d.item_code,
+				'description': d.description,
+				'stock_uom': d.stock_uom,
+				'bom_no': d.bom_no,
+				'planned_qty': d.qty,
+				'pending_qty': d.qty,
+				'planned_start_date': d.start_date
+			})
+
+		self.set('mr_items', [])
+		for d in plan.material_requests:
+			self.append('mr_items', {
+				'item_code': d.item_code,
+				'item_name': d.item_name,
+				'warehouse': d.warehouse,
+				'quantity': d.qty,
+				'actual_qty': d.actual_qty,
+				'min_order_qty': d.min_order_qty,
+				'schedule_date': d.due_date
+			})
+
+		if not (self.po_items or self.mr_items):
+			msgprint(_("All requirements are covered by stock and open orders"))
+
+		self.calculate_total_planned_qty()
+
 	def add_items(self, items):
 		self.set('po_items', [])
 		for data in items:
@@ -274,6 +330,13 @@ class ProductionPlan(Document):
 					"qty": d.planned_qty
 				})
 				item_dict[(d.item_code, d.material_request_item, d.warehouse)] = item_details
+			elif self.get_items_from == "MRP":
+				# one Work Order per planned order
+				item_details.update({
+					"qty": flt(d.planned_qty) - flt(d.ordered_qty),
+					"planned_start_date": d.planned_start_date
+				})
+				item_dict[d.name] = item_details
 			else:
 				item_details.update({
 					"qty": flt(item_dict.get((d.item_code, d.sales_order, d.warehouse),{})
@@ -327,7 +390,7 @@ class ProductionPlan(Document):
 
 			# key for Sales Order:Material Request Type
 			key = '{}:{}'.format(item.sales_order, item_doc.default_material_request_type)
-			schedule_date = add_days(nowdate(), cint(item_doc.lead_time_days))
+			schedule_date = item.schedule_date or add_days(nowdate(), cint(item_doc.lead_time_days))
 
 			if not key in material_request_map:
 				# make a new MR for the combination
@@ -373,57 +436,72 @@ class ProductionPlan(Document):
 			msgprint(_("No material request created"))
 
 def get_exploded_items(item_details, company, bom_no, include_non_stock_items, planned_qty=1):
-	for d in frappe.db.sql("""select bei.item_code, item.default_bom as bom,
-			ifnull(sum(bei.stock_qty/ifnull(bom.quantity, 1)), 0)*%s as qty, item.item_name,
-			bei.description, bei.stock_uom, item.min_order_qty, bei.source_warehouse,
-			item.default_material_request_type, item.min_order_qty, item_default.default_warehouse,
-			item.purchase_uom, item_uom.conversion_factor
-		from
-			`tabBOM Explosion Item` bei
-			JOIN `tabBOM` bom ON bom.name = bei.parent
-			JOIN `tabItem` item ON item.name = bei.item_code
-			LEFT JOIN `tabItem Default` item_default
-				ON item_default.parent = item.name and item_default.company=%s
-			LEFT JOIN `tabUOM Conversion Detail` item_uom
-				ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
-		where
-			bei.docstatus < 2
-			and bom.name=%s and item.is_stock_item in (1, {0})
-		group by bei.item_code, bei.stock_uom""".format(0 if include_non_stock_items else 1),
-		(planned_qty, company, bom_no), as_dict=1):
-			item_details.setdefault(d.get('item_code'), d)
+	flat_bom = get_flat_bom(bom_no)
+	item_data = get_item_details_for_planning([d.item_code for d in flat_bom], company)
+
+	items = frappe._dict()
+	for row in flat_bom:
+		item = item_data.get(row.item_code)
+		if not item or not (item.is_stock_item or include_non_stock_items):
+			continue
+
+		if row.item_code in items:
+			items[row.item_code].qty += flt(row.stock_qty) * flt(planned_qty)
+		else:
+			items[row.item_code] = frappe._dict({
+				'item_code': row.item_code,
+				'bom': item.default_bom,
+				'qty': flt(row.stock_qty) * flt(planned_qty),
+				'item_name': item.item_name,
+				'description': row.description,
+				'stock_uom': row.stock_uom,
+				'min_order_qty': item.min_order_qty,
+				'source_warehouse': row.source_warehouse,
+				'default_material_request_type': item.default_material_request_type,
+				'default_warehouse': item.default_warehouse,
+				'purchase_uom': item.purchase_uom,
+				'conversion_factor': item.conversion_factor
+			})
+
+	for d in items.values():
+		item_details.setdefault(d.get('item_code'), d)
 	return item_details
 
 def get_subitems(doc, data, item_details, bom_no, company, include_non_stock_items,
-	include_subcontracted_items, parent_qty, planned_qty=1):
-	items = frappe.db.sql("""
-		SELECT
-			bom_item.item_code, default_material_request_type, item.item_name,
-			ifnull(%(parent_qty)s * sum(bom_item.stock_qty/ifnull(bom.quantity, 1)) * %(planned_qty)s, 0) as qty,
-			item.is_sub_contracted_item as is_sub_contracted, bom_item.source_warehouse,
-			item.default_bom as default_bom, bom_item.description as description,
-			bom_item.stock_uom as stock_uom, item.min_order_qty as min_order_qty,
-			item_default.default_warehouse, item.purchase_uom, item_uom.conversion_factor
-		FROM
-			`tabBOM Item` bom_item
-			JOIN `tabBOM` bom ON bom.name = bom_item.parent
-			JOIN tabItem item ON bom_item.item_code = item.name
-			LEFT JOIN `tabItem Default` item_default
-				ON item.name = item_default.parent and item_default.company = %(company)s
-			LEFT JOIN `tabUOM Conversion Detail` item_uom
-				ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
-		where
-			bom.name = %(bom)s
-			and bom_item.docstatus < 2
-			and item.is_stock_item in (1, {0})
-		group by bom_item.item_code""".format(0 if include_non_stock_items else 1),{
-			'bom': bom_no,
-			'parent_qty': parent_qty,
-			'planned_qty': planned_qty,
-			'company': company
-		}, as_dict=1)
+	include_subcontracted_items, parent_qty, planned_qty=1, item_data=None):
+	bom = get_bom_items_per_unit(bom_no)
+	if not bom:
+		return item_details
+
+	item_data = get_item_details_for_planning([d.item_code for d in bom["items"]], company, item_data)
+
+	items = frappe._dict()
+	for row in bom["items"]:
+		item = item_data.get(row.item_code)
+		if not item or not (item.is_stock_item or include_non_stock_items):
+			continue
+
+		qty = flt(parent_qty) * flt(row.stock_qty) * flt(planned_qty)
+		if row.item_code in items:
+			items[row.item_code].qty += qty
+		else:
+			items[row.item_code] = frappe._dict({
+				'item_code': row.item_code,
+				'default_material_request_type': item.default_material_request_type,
+				'item_name': item.item_name,
+				'qty': qty,
+				'is_sub_contracted': item.is_sub_contracted,
+				'source_warehouse': row.source_warehouse,
+				'default_bom': item.default_bom,
+				'description': row.description,
+				'stock_uom': row.stock_uom,
+				'min_order_qty': item.min_order_qty,
+				'default_warehouse': item.default_warehouse,
+				'purchase_uom': item.purchase_uom,
+				'conversion_factor': item.conversion_factor
+			})
 
-	for d in items:
+	for d in items.values():
 		if not data.get('include_exploded_items') or not d.default_bom:
 			if d.item_code in item_details:
 				item_details[d.item_code].qty = item_details[d.item_code].qty + d.qty
@@ -435,9 +513,34 @@ def get_subitems(doc, data, item_details, bom_no, company, include_non_stock_ite
 				not d.is_sub_contracted) or (d.is_sub_contracted and include_subcontracted_items)):
 				if d.qty > 0:
 					get_subitems(doc, data, item_details, d.default_bom, company,
-						include_non_stock_items, include_subcontracted_items, d.qty)
+						include_non_stock_items, include_subcontracted_items, d.qty, item_data=item_data)
 	return item_details
 
+def get_item_details_for_planning(item_codes, company, item_data=None):
+	"""Returns the Item details used in material requests by item code, adding the items
+		not in `item_data` to it"""
+	if item_data is None:
+		item_data = {}
+
+	item_codes = list(set(d for d in item_codes if d not in item_data))
+	if item_codes:
+		for d in frappe.db.sql("""
+			SELECT
+				item.name, item.item_name, item.default_bom, item.min_order_qty, item.is_stock_item,
+				item.default_material_request_type, item.is_sub_contracted_item as is_sub_contracted,
+				item.purchase_uom, item_default.default_warehouse, item_uom.conversion_factor
+			FROM
+				tabItem item
+				LEFT JOIN `tabItem Default` item_default
+					ON item.name = item_default.parent and item_default.company = %(company)s
+				LEFT JOIN `tabUOM Conversion Detail` item_uom
+					ON item.name = item_uom.parent and item_uom.uom = item.purchase_uom
+			WHERE
+				item.name in %(item_codes)s""", {'item_codes': item_codes, 'company': company}, as_dict=1):
+			item_data.setdefault(d.name, d)
+
+	return item_data
+
 def get_material_request_items(row, sales_order, company, ignore_existing_ordered_qty, warehouse):
 	total_qty = row['qty']
 	projected_qty, actual_qty = get_bin_details(row)
@@ -513,6 +616,17 @@ def get_sales_orders(self):
 		}, as_dict=1)
 	return open_so
 
+def run_mrp_for_production_plan(production_plan):
+	"""Background job: sets the orders planned by MRP in the draft Production Plan"""
+	doc = frappe.get_doc("Production Plan", production_plan)
+	if doc.docstatus != 0 or doc.get_items_from != "MRP":
+		return
+
+	doc.get_mrp_items(publish_progress=True)
+	doc.save()
+
+	frappe.publish_progress(100, title=_("Running MRP..."), doctype=doc.doctype, docname=doc.name)
+
 @frappe.whitelist()
 def get_bin_details(row):
 	if isinstance(row, string_types):
@@ -5,7 +5,7 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
-from frappe.utils import nowdate, now_datetime, flt
+from frappe.utils import nowdate, now_datetime, flt, add_days, getdate
 from erpnext.stock.doctype.item.test_item import create_item
 from erpnext.manufacturing.doctype.production_plan.production_plan import get_sales_orders
 from erpnext.stock.doctype.stock_reconciliation.test_stock_reconciliation import create_stock_reconciliation
@@ -143,6 +143,90 @@ class TestProductionPlan(unittest.TestCase):
 
 		self.assertEqual(sales_orders, [])
 
+	def test_mrp_netting(self):
+		from erpnext.manufacturing.mrp import net_requirements, get_low_level_codes
+
+		# 8 available, 5 required on the 1st and 2nd, minimum order of 4
+		self.assertEqual(net_requirements({"2019-01-02": 5, "2019-01-01": 5}, 8, 4),
+			[("2019-01-02", 4)])
+		self.assertEqual(net_requirements({"2019-01-01": 2.5}, 0, whole_number=True), [("2019-01-01", 3)])
+		self.assertEqual(net_requirements({"2019-01-01": 5}, 10), [])
+
+		# RM is used directly in FG and in SA, so planned after SA
+		items = dict((d, frappe._dict()) for d in ("FG", "SA", "RM"))
+		boms = {"FG": frappe._dict(name="BOM-FG"), "SA": frappe._dict(name="BOM-SA")}
+		bom_items = {"BOM-FG": {"SA": 1, "RM": 1}, "BOM-SA": {"RM": 2}}
+		self.assertEqual(get_low_level_codes(items, boms, bom_items), {"FG": 0, "SA": 1, "RM": 2})
+
+		# A and B are components of each other, only they are left out and C below them is planned
+		items.update((d, frappe._dict()) for d in ("A", "B", "C"))
+		boms.update({"A": frappe._dict(name="BOM-A"), "B": frappe._dict(name="BOM-B")})
+		bom_items.update({"BOM-FG": {"SA": 1, "RM": 1, "A": 1}, "BOM-A": {"B": 1}, "BOM-B": {"A": 1, "C": 1}})
+		self.assertEqual(get_low_level_codes(items, boms, bom_items), {"FG": 0, "SA": 1, "RM": 2, "C": 0})
+
+	def test_production_plan_from_mrp(self):
+		fg_item, sa_item, rm_item = "_Test MRP FG Item", "_Test MRP Subassembly Item", "_Test MRP Raw Material"
+		for item in (fg_item, sa_item, rm_item):
+			create_item(item, valuation_rate=100)
+
+		for item, raw_materials in {sa_item: [rm_item], fg_item: [sa_item, rm_item]}.items():
+			if not frappe.db.get_value('BOM', {'item': item}):
+				make_bom(item = item, raw_materials = raw_materials)
+
+		frappe.db.set_value("Item", fg_item, "lead_time_days", 2)
+		frappe.db.set_value("Item", sa_item, "lead_time_days", 1)
+
+		sr = create_stock_reconciliation(item_code=sa_item, qty=3, rate=100)
+		so = make_sales_order(item_code=fg_item, qty=10)
+		delivery_date = getdate(so.delivery_date)
+
+		pln = frappe.get_doc({
+			'doctype': 'Production Plan',
+			'company': '_Test Company',
+			'posting_date': nowdate(),
+			'get_items_from': 'MRP',
+			'warehouse': '_Test Warehouse - _TC'
+		}).insert()
+		pln.get_items()
+		pln.reload()
+
+		# only the orders of the items of this test, MRP plans all open demand of the warehouse
+		pln.set('po_items', [d for d in pln.po_items if d.item_code in (fg_item, sa_item)])
+		pln.set('mr_items', [d for d in pln.mr_items if d.item_code == rm_item])
+		pln.save()
+		pln.submit()
+
+		# the FG, then the subassembly after its stock, starting before the FG
+		self.assertEqual(sorted((d.item_code, d.planned_qty, getdate(d.planned_start_date)) for d in pln.po_items),
+			[(fg_item, 10, add_days(delivery_date, -2)), (sa_item, 7, add_days(delivery_date, -3))])
+
+		# the raw material when the Work Orders of the subassembly and of the FG start
+		self.assertEqual(sorted((getdate(d.schedule_date), d.quantity) for d in pln.mr_items),
+			[(add_days(delivery_date, -3), 7), (add_days(delivery_date, -2), 10)])
+
+		pln.make_work_order()
+		work_orders = frappe.get_all('Work Order', fields=['name', 'production_item', 'qty', 'planned_start_date'],
+			filters={'production_plan': pln.name})
+		self.assertEqual(sorted((d.production_item, d.qty, getdate(d.planned_start_date)) for d in work_orders),
+			[(fg_item, 10, add_days(delivery_date, -2)), (sa_item, 7, add_days(delivery_date, -3))])
+
+		pln.make_material_request()
+		material_request_items = frappe.get_all('Material Request Item', fields=['parent', 'qty', 'schedule_date'],
+			filters={'production_plan': pln.name, 'item_code': rm_item})
+		self.assertEqual(sorted((getdate(d.schedule_date), d.qty) for d in material_request_items),
+			[(add_days(delivery_date, -3), 7), (add_days(delivery_date, -2), 10)])
+
+		for name in set(d.parent for d in material_request_items):
+			frappe.get_doc('Material Request', name).cancel()
+
+		for d in work_orders:
+			frappe.delete_doc('Work Order', d.name)
+
+		pln.reload()
+		pln.cancel()
+		so.cancel()
+		sr.cancel()
+
 def create_production_plan(**args):
 	args = frappe._dict(args)
 
@@ -14,7 +14,7 @@ from erpnext.manufacturing.doctype.workstation.workstation import WorkstationHol
 from erpnext.projects.doctype.timesheet.timesheet import OverlapError
 from erpnext.stock.doctype.stock_entry.stock_entry import get_additional_costs
 from erpnext.manufacturing.doctype.manufacturing_settings.manufacturing_settings import get_mins_between_operations
-from erpnext.stock.stock_balance import get_planned_qty, update_bin_qty
+from erpnext.stock.stock_balance import update_bin_qty_for_voucher
 from frappe.utils.csvutils import getlink
 from erpnext.stock.utils import get_bin, validate_warehouse_company, get_latest_stock_qty
 from erpnext.utilities.transaction_base import validate_uom_is_integer
@@ -257,9 +257,7 @@ class WorkOrder(Document):
 			frappe.throw(_("Cannot cancel because submitted Stock Entry {0} exists").format(stock_entry[0][0]))
 
 	def update_planned_qty(self):
-		update_bin_qty(self.production_item, self.fg_warehouse, {
-			"planned_qty": get_planned_qty(self.production_item, self.fg_warehouse)
-		})
+		update_bin_qty_for_voucher(self.doctype, self.name)
 
 		if self.material_request:
 			mr_obj = frappe.get_doc("Material Request", self.material_request)
@@ -0,0 +1,302 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Material requirements planning over all open demand of a company.
+
+Demand is taken from open Sales Orders (and their packed items), Material Requests for
+Manufacture and safety stock (warehouse reorder levels, or the Item's safety stock). Items are
+planned level by level of their low-level code (the deepest level an item is used at in the
+default BOMs), so the demand of an item from all the BOMs using it is known before it is netted.
+
+Each item is netted once against its projected stock and open supply in the planned warehouses,
+in the order of the dates demand is required. Shortages are planned as Work Orders for items
+with a default BOM, whose components then get demand at the start of the Work Order, and as
+Material Requests for the other items.
+"""
+
+from __future__ import unicode_literals
+import math
+import frappe
+from frappe.utils import add_days, cint, flt, getdate, nowdate
+
+BATCH_SIZE = 1000
+
+def run_mrp(company, warehouse=None, planning_date=None, include_safety_stock=True, progress=None):
+	"""Returns the planned Work Orders and Material Requests (`work_orders`, `material_requests`)
+		for the open demand of the company in the warehouse (or group), or all its warehouses.
+		`progress` is called with the percent of the levels planned, if set"""
+	planning_date = getdate(planning_date or nowdate())
+	warehouses = get_warehouses(company, warehouse)
+
+	demand = {}
+	add_sales_order_demand(demand, company, warehouses, planning_date)
+	manufacture_requests = add_material_request_demand(demand, company, warehouses, planning_date)
+
+	boms, bom_items = get_default_boms(company)
+	reorder_levels = get_reorder_levels(warehouses) if include_safety_stock else {}
+	items = get_items(company, set(demand) | set(reorder_levels), boms, bom_items)
+
+	if include_safety_stock:
+		for item_code, item in items.items():
+			safety_stock = reorder_levels.get(item_code) or flt(item.safety_stock)
+			if safety_stock > 0:
+				add_demand(demand, item_code, planning_date, safety_stock)
+
+	supply = get_supply(items, warehouses, manufacture_requests)
+	levels = get_low_level_codes(items, boms, bom_items)
+	default_warehouse = warehouse if warehouse and not frappe.db.get_value("Warehouse", warehouse, "is_group") \
+		else None
+	whole_number_uoms = set(frappe.db.sql_list("select name from `tabUOM` where must_be_whole_number=1"))
+
+	plan = frappe._dict(work_orders=[], material_requests=[])
+	planned_levels = sorted(set(levels.values()))
+	for i, level in enumerate(planned_levels):
+		if progress:
+			progress(i * 100.0 / len(planned_levels))
+
+		for item_code in sorted(d for d in levels if levels[d] == level):
+			item = items[item_code]
+			bom = boms.get(item_code) if not item.is_sub_contracted else None
+
+			for due_date, qty in net_requirements(demand.get(item_code, {}), supply.get(item_code, 0),
+				flt(item.min_order_qty), item.stock_uom in whole_number_uoms):
+				start_date = max(add_days(due_date, -cint(item.lead_time_days)), planning_date)
+				order = frappe._dict({
+					"item_code": item_code,
+					"item_name": item.item_name,
+					"description": item.description,
+					"stock_uom": item.stock_uom,
+					"qty": qty,
+					"due_date": due_date,
+					"start_date": start_date,
+					"warehouse": default_warehouse or item.default_warehouse,
+					"actual_qty": item.actual_qty,
+					"min_order_qty": flt(item.min_order_qty),
+					"low_level_code": level
+				})
+
+				if bom:
+					order.bom_no = bom.name
+					plan.work_orders.append(order)
+				else:
+					order.material_request_type = item.default_material_request_type or "Purchase"
+					plan.material_requests.append(order)
+
+				# components are required when the Work Order (or subcontracting) starts
+				if item_code in boms:
+					for component, qty_per_unit in bom_items.get(boms[item_code].name, {}).items():
+						if component in items:
+							add_demand(demand, component, start_date, qty * qty_per_unit)
+
+	return plan
+
+def net_requirements(requirements, available_qty, min_order_qty=0, whole_number=False):
+	"""Returns the planned orders [(date, qty)] covering the requirements {date: qty}
+		in the order of their dates, after the available qty"""
+	orders, balance = [], flt(available_qty)
+	for date in sorted(requirements):
+		balance -= flt(requirements[date])
+		if balance < 0:
+			qty = max(-balance, flt(min_order_qty))
+			if whole_number:
+				qty = math.ceil(qty)
+
+			orders.append((date, qty))
+			balance += qty
+
+	return orders
+
+def add_demand(demand, item_code, date, qty):
+	requirements = demand.setdefault(item_code, {})
+	requirements[date] = requirements.get(date, 0) + flt(qty)
+
+def get_warehouses(company, warehouse=None):
+	"""Non-group warehouses of the company, under the warehouse if set"""
+	condition, values = "", {"company": company}
+	if warehouse:
+		lft, rgt = frappe.db.get_value("Warehouse", warehouse, ["lft", "rgt"])
+		condition = " and lft >= %(lft)s and rgt <= %(rgt)s"
+		values.update({"lft": lft, "rgt": rgt})
+
+	return frappe.db.sql_list("""select name from `tabWarehouse`
+		where company = %(company)s and is_group = 0 {0}""".format(condition), values) or [""]
+
+def add_sales_order_demand(demand, company, warehouses, planning_date):
+	"""Qty to deliver of the open Sales Orders, by delivery date"""
+	values = {"company": company, "warehouses": warehouses}
+
+	for item_code, delivery_date, qty in frappe.db.sql("""
+		select so_item.item_code, so_item.delivery_date,
+			sum((so_item.qty - so_item.delivered_qty) * so_item.conversion_factor)
+		from `tabSales Order Item` so_item, `tabSales Order` so
+		where so_item.parent = so.name and so.docstatus = 1 and so.company = %(company)s
+			and so.status not in ('Stopped', 'Closed', 'Completed')
+			and so_item.qty > so_item.delivered_qty and so_item.warehouse in %(warehouses)s
+		group by so_item.item_code, so_item.delivery_date""", values):
+		add_demand(demand, item_code, max(getdate(delivery_date or planning_date), planning_date), qty)
+
+	for item_code, delivery_date, qty in frappe.db.sql("""
+		select pi.item_code, so_item.delivery_date,
+			sum(pi.qty * (so_item.qty - so_item.delivered_qty) / so_item.qty)
+		from `tabPacked Item` pi, `tabSales Order Item` so_item, `tabSales Order` so
+		where pi.parent = so.name and pi.parenttype = 'Sales Order' and pi.parent_detail_docname = so_item.name
+			and so_item.parent = so.name and so.docstatus = 1 and so.company = %(company)s
+			and so.status not in ('Stopped', 'Closed', 'Completed')
+			and so_item.qty > so_item.delivered_qty and pi.warehouse in %(warehouses)s
+		group by pi.item_code, so_item.delivery_date""", values):
+		add_demand(demand, item_code, max(getdate(delivery_date or planning_date), planning_date), qty)
+
+def add_material_request_demand(demand, company, warehouses, planning_date):
+	"""Qty to manufacture of the open Material Requests for Manufacture, by schedule date.
+		Returns the qty by item, which is part of the indented qty of the Bins"""
+	requested_qty = {}
+	for item_code, schedule_date, qty in frappe.db.sql("""
+		select mr_item.item_code, mr_item.schedule_date,
+			sum((mr_item.qty - mr_item.ordered_qty) * mr_item.conversion_factor)
+		from `tabMaterial Request Item` mr_item, `tabMaterial Request` mr
+		where mr_item.parent = mr.name and mr.docstatus = 1 and mr.company = %(company)s
+			and mr.status != 'Stopped' and mr.material_request_type = 'Manufacture'
+			and mr_item.qty > mr_item.ordered_qty and mr_item.warehouse in %(warehouses)s
+		group by mr_item.item_code, mr_item.schedule_date""", {"company": company, "warehouses": warehouses}):
+		add_demand(demand, item_code, max(getdate(schedule_date or planning_date), planning_date), qty)
+		requested_qty[item_code] = requested_qty.get(item_code, 0) + flt(qty)
+
+	return requested_qty
+
+def get_reorder_levels(warehouses):
+	return dict(frappe.db.sql("""select parent, sum(warehouse_reorder_level) from `tabItem Reorder`
+		where parenttype = 'Item' and warehouse in %s group by parent""", [warehouses]))
+
+def get_default_boms(company):
+	"""Returns the active default BOMs by item, and the qty of their items per unit by BOM"""
+	boms = {}
+	for d in frappe.db.sql("""select name, item, quantity from `tabBOM`
+		where is_active = 1 and is_default = 1 and docstatus = 1 and company = %s""", company, as_dict=1):
+		boms[d.item] = d
+
+	bom_items = {}
+	for parent, item_code, qty in frappe.db.sql("""
+		select bom_item.parent, bom_item.item_code, sum(bom_item.stock_qty / ifnull(bom.quantity, 1))
+		from `tabBOM Item` bom_item, `tabBOM` bom
+		where bom_item.parent = bom.name and bom_item.parenttype = 'BOM' and bom.is_active = 1
+			and bom.is_default = 1 and bom.docstatus = 1 and bom.company = %s
+		group by bom_item.parent, bom_item.item_code""", company):
+		bom_items.setdefault(parent, {})[item_code] = flt(qty)
+
+	return boms, bom_items
+
+def get_items(company, item_codes, boms, bom_items):
+	"""Stock items demanded and their components of all levels, with their details"""
+	items, pending = {}, list(item_codes)
+	while pending:
+		batch = list(set(pending[:BATCH_SIZE]) - set(items))
+		pending = pending[BATCH_SIZE:]
+		if not batch:
+			continue
+
+		for d in frappe.db.sql("""select item.name, item.item_name, item.description, item.stock_uom,
+				item.lead_time_days, item.min_order_qty, item.safety_stock, item.default_material_request_type,
+				item.is_sub_contracted_item as is_sub_contracted, item_default.default_warehouse
+			from `tabItem` item
+				left join `tabItem Default` item_default
+					on item_default.parent = item.name and item_default.company = %(company)s
+			where item.name in %(items)s and item.is_stock_item = 1 and item.disabled = 0""",
+			{"company": company, "items": batch}, as_dict=1):
+			d.actual_qty = 0
+			items[d.name] = d
+			if d.name in boms:
+				pending += [c for c in bom_items.get(boms[d.name].name, {}) if c not in items]
+
+	return items
+
+def get_supply(items, warehouses, manufacture_requests):
+	"""Stock, ordered, planned and requested qty less the qty reserved for open Work Orders
+		and subcontracting, by item. Sets the `actual_qty` of the items"""
+	supply, item_codes = {}, list(items)
+	for i in range(0, len(item_codes), BATCH_SIZE):
+		for item_code, actual_qty, qty in frappe.db.sql("""select item_code, sum(actual_qty),
+				sum(actual_qty + ordered_qty + planned_qty + indented_qty
+					- reserved_qty_for_production - reserved_qty_for_sub_contract)
+			from `tabBin` where item_code in %s and warehouse in %s
+			group by item_code""", [item_codes[i:i + BATCH_SIZE], warehouses]):
+			items[item_code].actual_qty = flt(actual_qty)
+			supply[item_code] = flt(qty) - flt(manufacture_requests.get(item_code))
+
+	return supply
+
+def get_low_level_codes(items, boms, bom_items):
+	"""Returns the deepest level each item is used at in the default BOMs, 0 if it is not a component.
+		Items in a cycle of the BOMs are logged and left out, the items below them are still planned"""
+	components = {}
+	for item_code in items:
+		if item_code in boms:
+			components[item_code] = [d for d in bom_items.get(boms[item_code].name, {}) if d in items]
+
+	recursive = get_recursive_items(components)
+	if recursive:
+		frappe.log_error(", ".join(sorted(recursive)), "BOM recursion, items not planned")
+		components = dict((item_code, [d for d in children if d not in recursive])
+			for item_code, children in components.items() if item_code not in recursive)
+
+	parents = dict((item_code, 0) for item_code in items if item_code not in recursive)
+	for item_code in components:
+		for d in components[item_code]:
+			parents[d] += 1
+
+	levels = dict((item_code, 0) for item_code in parents)
+	queue = [item_code for item_code, count in parents.items() if not count]
+	while queue:
+		item_code = queue.pop()
+		for d in components.get(item_code, []):
+			levels[d] = max(levels[d], levels[item_code] + 1)
+			parents[d] -= 1
+			if not parents[d]:
+				queue.append(d)
+
+	return levels
+
+def get_recursive_items(components):
+	"""Returns the items in a cycle of the BOMs {item: [components]}: the strongly connected
+		components of more than one item (Tarjan's algorithm), and the items that are their own component"""
+	index, lowlink, stack, on_stack, recursive = {}, {}, [], set(), set()
+
+	for root in components:
+		if root in index:
+			continue
+
+		index[root] = lowlink[root] = len(index)
+		stack.append(root)
+		on_stack.add(root)
+		work = [(root, iter(components.get(root, [])))]
+
+		while work:
+			item_code, children = work[-1]
+			for d in children:
+				if d not in index:
+					index[d] = lowlink[d] = len(index)
+					stack.append(d)
+					on_stack.add(d)
+					work.append((d, iter(components.get(d, []))))
+					break
+				elif d in on_stack:
+					lowlink[item_code] = min(lowlink[item_code], index[d])
+			else:
+				work.pop()
+				if work:
+					parent = work[-1][0]
+					lowlink[parent] = min(lowlink[parent], lowlink[item_code])
+
+				if lowlink[item_code] == index[item_code]:
+					cycle = []
+					while True:
+						d = stack.pop()
+						on_stack.discard(d)
+						cycle.append(d)
+						if d == item_code:
+							break
+
+					if len(cycle) > 1 or item_code in components.get(item_code, []):
+						recursive.update(cycle)
+
+	return recursive
@@ -0,0 +1,130 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Updating the latest price in all BOMs: the cost rollup over the whole BOM graph vs loading
+and saving every BOM bottom up (timed on a sample and extrapolated), on a synthetic BOM forest.
+
+Run on a test site (all changes are rolled back):
+
+	bench --site test_site execute erpnext.manufacturing.tests.benchmark_bom_cost_rollup.run
+	bench --site test_site execute erpnext.manufacturing.tests.benchmark_bom_cost_rollup.run --kwargs "{'boms': 5000}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import random
+import time
+import frappe
+import erpnext
+from frappe.utils import now
+from erpnext.manufacturing.bom_cost_rollup import update_cost_of_all_boms
+from erpnext.manufacturing.doctype.bom.bom import get_boms_in_bottom_up_order
+
+COMPANY = "_Test Company"
+
+# share of the BOMs at each level, level 0 BOMs only use raw materials
+# and the others two raw materials and two sub-assemblies of the level below
+LEVELS = (0.4, 0.3, 0.16, 0.1, 0.04)
+
+def run(boms=50000, raw_materials=2000, legacy_boms=200, seed=1):
+	random.seed(seed)
+
+	try:
+		start = time.time()
+		make_bom_forest(boms, raw_materials)
+		insert_seconds = time.time() - start
+
+		change_raw_material_rates(raw_materials)
+		start = time.time()
+		bom_count, changed_boms = update_cost_of_all_boms()
+		rollup_seconds = time.time() - start
+
+		change_raw_material_rates(raw_materials)
+		start = time.time()
+		legacy_count = update_cost_by_documents(legacy_boms)
+		legacy_seconds = time.time() - start
+	finally:
+		frappe.db.rollback()
+
+	legacy_rate = legacy_count / legacy_seconds if legacy_seconds else 0
+	print("{0} BOMs, {1} raw materials | insert {2:.1f}s".format(boms, raw_materials, insert_seconds))
+	print("rollup    | {0} BOMs, {1} changed | {2:8.2f}s | {3:8.0f} BOMs/s".format(bom_count, changed_boms,
+		rollup_seconds, bom_count / rollup_seconds if rollup_seconds else 0))
+	print("documents | {0} BOMs | {1:8.2f}s | {2:8.1f} BOMs/s | all BOMs in ~{3:.1f}h".format(legacy_count,
+		legacy_seconds, legacy_rate, boms / legacy_rate / 3600 if legacy_rate else 0))
+
+	return frappe._dict(rollup_seconds=rollup_seconds, legacy_boms_per_second=legacy_rate)
+
+def update_cost_by_documents(limit=None):
+	"""previous implementation of `bom_update_tool.update_cost`, as reference"""
+	bom_list = get_boms_in_bottom_up_order()
+	for bom in bom_list[:limit]:
+		frappe.get_doc("BOM", bom).update_cost(update_parent=False, from_child_bom=True)
+
+	return len(bom_list[:limit])
+
+def get_raw_material(i):
+	return "_T-BENCH-RM-{0:05d}".format(i)
+
+def make_bom_forest(boms, raw_materials):
+	timestamp, user = now(), frappe.session.user
+	currency = erpnext.get_company_currency(COMPANY)
+
+	items = [(get_raw_material(i), random.randint(10, 1000)) for i in range(raw_materials)]
+	bom_rows, bom_item_rows, explosion_rows, exploded = [], [], [], {}
+
+	levels, i = [], 0
+	for share in LEVELS:
+		levels.append(["_T-BENCH-BOM-{0:06d}".format(i + j) for j in range(int(boms * share))])
+		i += len(levels[-1])
+
+	for level, names in enumerate(levels):
+		for name in names:
+			fg_item = name.replace("BOM", "FG")
+			items.append((fg_item, 0))
+			bom_rows.append((name, timestamp, timestamp, user, user, 1, fg_item, fg_item, COMPANY, currency,
+				1, 1, 1, 0, "Valuation Rate", 1, "Nos"))
+
+			rows = [(get_raw_material(d), None) for d in random.sample(range(raw_materials), 3 if not level else 2)]
+			if level:
+				rows += [(d.replace("BOM", "FG"), d) for d in random.sample(levels[level - 1], 2)]
+
+			exploded[name] = {}
+			for idx, (item_code, bom_no) in enumerate(rows):
+				qty = random.randint(1, 5)
+				bom_item_rows.append((frappe.generate_hash(length=10), timestamp, timestamp, user, user, 1,
+					name, "BOM", "items", idx + 1, item_code, item_code, bom_no, qty, qty, 1, "Nos", "Nos", qty))
+
+				for child_item, child_qty in (exploded[bom_no].items() if bom_no else [(item_code, 1)]):
+					exploded[name][child_item] = exploded[name].get(child_item, 0) + child_qty * qty
+
+			for idx, (item_code, qty) in enumerate(sorted(exploded[name].items())):
+				explosion_rows.append((frappe.generate_hash(length=10), timestamp, timestamp, user, user, 1,
+					name, "BOM", "exploded_items", idx + 1, item_code, item_code, qty, qty, "Nos"))
+
+	insert_rows("Item", ("name", "creation", "modified", "owner", "modified_by", "item_code", "item_name",
+		"description", "item_group", "stock_uom", "is_stock_item", "valuation_rate"),
+		[(d[0], timestamp, timestamp, user, user, d[0], d[0], d[0], "Products", "Nos", 1, d[1]) for d in items])
+	insert_rows("BOM", ("name", "creation", "modified", "owner", "modified_by", "docstatus", "item", "item_name",
+		"company", "currency", "conversion_rate", "quantity", "is_active", "is_default", "rm_cost_as_per",
+		"set_rate_of_sub_assembly_item_based_on_bom", "uom"), bom_rows)
+	insert_rows("BOM Item", ("name", "creation", "modified", "owner", "modified_by", "docstatus", "parent",
+		"parenttype", "parentfield", "idx", "item_code", "item_name", "bom_no", "qty", "stock_qty",
+		"conversion_factor", "uom", "stock_uom", "qty_consumed_per_unit"), bom_item_rows)
+	insert_rows("BOM Explosion Item", ("name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"parent", "parenttype", "parentfield", "idx", "item_code", "item_name", "stock_qty",
+		"qty_consumed_per_unit", "stock_uom"), explosion_rows)
+
+def change_raw_material_rates(raw_materials):
+	frappe.db.sql("""update `tabItem` set valuation_rate = valuation_rate + 1
+		where name between %s and %s""", (get_raw_material(0), get_raw_material(raw_materials - 1)))
+
+def insert_rows(doctype, columns, rows, chunk_size=5000):
+	"""insert rows directly, skipping controller validations"""
+	for i in range(0, len(rows), chunk_size):
+		chunk = rows[i:i + chunk_size]
+		frappe.db.sql("""insert into `tab{0}` ({1}) values {2}""".format(doctype,
+			", ".join("`{0}`".format(d) for d in columns),
+			", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(chunk))),
+			tuple(value for row in chunk for value in row))
@@ -0,0 +1,121 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+MRP run over all open demand of a synthetic, reproducible (seeded) dataset: finished goods,
+two levels of sub-assemblies and raw materials with default BOMs, stock, open Sales Orders
+and warehouse reorder levels.
+
+Run on a test site (all changes are rolled back):
+
+	bench --site test_site execute erpnext.manufacturing.tests.benchmark_mrp.run
+	bench --site test_site execute erpnext.manufacturing.tests.benchmark_mrp.run --kwargs "{'skus': 5000}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import random
+import time
+import frappe
+import erpnext
+from frappe.utils import add_days, now, nowdate
+from erpnext.manufacturing.mrp import run_mrp
+from erpnext.manufacturing.tests.benchmark_bom_cost_rollup import insert_rows
+
+COMPANY = "_Test Company"
+WAREHOUSE = "_Test Warehouse - _TC"
+
+# share of the SKUs that are finished goods, sub-assemblies (level 1 and 2) and raw materials
+SHARES = (0.1, 0.15, 0.15, 0.6)
+
+def run(skus=20000, sales_orders=5000, seed=1):
+	random.seed(seed)
+
+	try:
+		start = time.time()
+		make_dataset(skus, sales_orders)
+		insert_seconds = time.time() - start
+
+		start = time.time()
+		plan = run_mrp(COMPANY, WAREHOUSE)
+		mrp_seconds = time.time() - start
+	finally:
+		frappe.db.rollback()
+
+	print("{0} SKUs, {1} Sales Orders | insert {2:.1f}s".format(skus, sales_orders, insert_seconds))
+	print("mrp | {0} Work Orders, {1} Material Requests | {2:8.2f}s".format(len(plan.work_orders),
+		len(plan.material_requests), mrp_seconds))
+
+	return frappe._dict(mrp_seconds=mrp_seconds, work_orders=len(plan.work_orders),
+		material_requests=len(plan.material_requests))
+
+def make_dataset(skus, sales_orders):
+	timestamp, user, today = now(), frappe.session.user, nowdate()
+	currency = erpnext.get_company_currency(COMPANY)
+
+	levels, i = [], 0
+	for share in SHARES:
+		levels.append(["_T-BENCH-MRP-{0:06d}".format(i + j) for j in range(int(skus * share))])
+		i += len(levels[-1])
+
+	finished_goods, raw_materials = levels[0], levels[-1]
+	item_rows, bom_rows, bom_item_rows, bin_rows, reorder_rows = [], [], [], [], []
+
+	for level, item_codes in enumerate(levels):
+		is_raw_material = level == len(levels) - 1
+		for item_code in item_codes:
+			item_rows.append((item_code, timestamp, timestamp, user, user, item_code, item_code, item_code,
+				"Products", "Nos", 1, random.randint(0, 15), random.choice((0, 0, 10, 50)), "Purchase"))
+			bin_rows.append((frappe.generate_hash(length=10), timestamp, timestamp, user, user, item_code, WAREHOUSE,
+				"Nos", random.randint(0, 200), random.randint(0, 50) if is_raw_material else 0))
+
+			if is_raw_material:
+				if not random.randint(0, 4):
+					reorder_rows.append((frappe.generate_hash(length=10), timestamp, timestamp, user, user,
+						item_code, "Item", "reorder_levels", 1, WAREHOUSE, random.randint(10, 100), 100, "Purchase"))
+				continue
+
+			# four components in each BOM, two sub-assemblies of the next level if any and raw materials
+			bom = item_code.replace("MRP", "MRP-BOM")
+			bom_rows.append((bom, timestamp, timestamp, user, user, 1, item_code, item_code, COMPANY, currency,
+				1, 1, 1, 1, "Valuation Rate", "Nos"))
+
+			components = random.sample(levels[level + 1], 2) if level + 1 < len(levels) - 1 else []
+			components += random.sample(raw_materials, 4 - len(components))
+			for idx, component in enumerate(components):
+				qty = random.randint(1, 4)
+				bom_item_rows.append((frappe.generate_hash(length=10), timestamp, timestamp, user, user, 1, bom,
+					"BOM", "items", idx + 1, component, component, qty, qty, 1, "Nos", "Nos", qty))
+
+	so_rows, so_item_rows = [], []
+	for i in range(sales_orders):
+		name = "_T-BENCH-MRP-SO-{0:06d}".format(i)
+		delivery_date = add_days(today, random.randint(0, 90))
+		so_rows.append((name, timestamp, timestamp, user, user, 1, "_Test Customer", COMPANY, currency,
+			today, delivery_date, "To Deliver and Bill"))
+
+		for idx, item_code in enumerate(random.sample(finished_goods, random.randint(1, 5))):
+			qty = random.randint(1, 20)
+			so_item_rows.append((frappe.generate_hash(length=10), timestamp, timestamp, user, user, 1, name,
+				"Sales Order", "items", idx + 1, item_code, item_code, item_code, qty, qty, 0, 1, "Nos", "Nos",
+				WAREHOUSE, delivery_date))
+
+	insert_rows("Item", ("name", "creation", "modified", "owner", "modified_by", "item_code", "item_name",
+		"description", "item_group", "stock_uom", "is_stock_item", "lead_time_days", "min_order_qty",
+		"default_material_request_type"), item_rows)
+	insert_rows("Bin", ("name", "creation", "modified", "owner", "modified_by", "item_code", "warehouse",
+		"stock_uom", "actual_qty", "ordered_qty"), bin_rows)
+	insert_rows("Item Reorder", ("name", "creation", "modified", "owner", "modified_by", "parent", "parenttype",
+		"parentfield", "idx", "warehouse", "warehouse_reorder_level", "warehouse_reorder_qty",
+		"material_request_type"), reorder_rows)
+	insert_rows("BOM", ("name", "creation", "modified", "owner", "modified_by", "docstatus", "item", "item_name",
+		"company", "currency", "conversion_rate", "quantity", "is_active", "is_default", "rm_cost_as_per", "uom"),
+		bom_rows)
+	insert_rows("BOM Item", ("name", "creation", "modified", "owner", "modified_by", "docstatus", "parent",
+		"parenttype", "parentfield", "idx", "item_code", "item_name", "qty", "stock_qty", "conversion_factor",
+		"uom", "stock_uom", "qty_consumed_per_unit"), bom_item_rows)
+	insert_rows("Sales Order", ("name", "creation", "modified", "owner", "modified_by", "docstatus", "customer",
+		"company", "currency", "transaction_date", "delivery_date", "status"), so_rows)
+	insert_rows("Sales Order Item", ("name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"parent", "parenttype", "parentfield", "idx", "item_code", "item_name", "description", "qty", "stock_qty",
+		"delivered_qty", "conversion_factor", "uom", "stock_uom", "warehouse", "delivery_date"), so_item_rows)
@@ -0,0 +1,7 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.accounts.doctype.payment_ledger_entry.payment_ledger_entry import backfill_payment_ledger
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "payment_ledger_entry")
+	backfill_payment_ledger()
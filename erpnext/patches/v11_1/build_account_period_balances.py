@@ -0,0 +1,9 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.accounts.doctype.account_period_balance.account_period_balance import rebuild_account_period_balances
+
+def execute():
+	frappe.reload_doc("accounts", "doctype", "account_period_balance")
+
+	for company in frappe.db.sql_list("select name from `tabCompany`"):
+		rebuild_account_period_balances(company)
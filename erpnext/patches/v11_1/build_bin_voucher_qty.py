@@ -0,0 +1,7 @@
+from __future__ import unicode_literals
+import frappe
+from erpnext.stock.stock_balance import rebuild_voucher_bin_qty
+
+def execute():
+	frappe.reload_doc("stock", "doctype", "bin_voucher_qty")
+	rebuild_voucher_bin_qty()
@@ -6,6 +6,7 @@ import frappe, json
 from frappe.utils.nestedset import get_root_of
 from frappe.utils import cint
 from erpnext.accounts.doctype.pos_profile.pos_profile import get_item_groups
+from erpnext.stock.doctype.item_search_token.item_search_token import get_item_search_query
 
 from six import string_types
 
@@ -29,10 +30,23 @@ def get_items(start, page_length, price_list, item_group, search_value="", pos_p
 	batch_no = data.get("batch_no") if data.get("batch_no") else ""
 	barcode = data.get("barcode") if data.get("barcode") else ""
 
-	condition = get_conditions(item_code, serial_no, batch_no, barcode)
+	search_query, search_values = None, None
+	if item_code and not (serial_no or batch_no or barcode):
+		search_query, search_values = get_item_search_query(item_code)
+
+	if search_query:
+		condition, values = "1=1", search_values
+		search_join = "inner join ({0}) item_search on item_search.item_code = `tabItem`.name".format(search_query)
+		order_by = "item_search.score desc, idx desc"
+	else:
+		condition, values = get_conditions(item_code, serial_no, batch_no, barcode)
+		search_join = ""
+		order_by = "idx desc"
 
 	if pos_profile:
-		condition += get_item_group_condition(pos_profile)
+		item_group_condition, item_group_values = get_item_group_condition(pos_profile)
+		condition += item_group_condition
+		values.update(item_group_values)
 
 	lft, rgt = frappe.db.get_value('Item Group', item_group, ['lft', 'rgt'])
 	# locate function is used to sort by closest match from the beginning of the value
@@ -43,16 +57,18 @@ def get_items(start, page_length, price_list, item_group, search_value="", pos_p
 	items_data = frappe.db.sql(""" SELECT name as item_code,
 			item_name, image as item_image, idx as idx,is_stock_item
 		FROM
-			`tabItem`
+			`tabItem` {search_join}
 		WHERE
 			disabled = 0 and has_variants = 0 and is_sales_item = 1
 			and item_group in (select name from `tabItem Group` where lft >= {lft} and rgt <= {rgt})
-			and {condition} order by idx desc limit {start}, {page_length}"""
+			and {condition} order by {order_by} limit {start}, {page_length}"""
 		.format(
 			start=start, page_length=page_length,
 			lft=lft, rgt=rgt,
-			condition=condition
-		), as_dict=1)
+			condition=condition,
+			search_join=search_join,
+			order_by=order_by
+		), values, as_dict=1)
 
 	if items_data:
 		items = [d.item_code for d in items_data]
@@ -130,19 +146,19 @@ def search_serial_or_batch_or_barcode_number(search_value):
 	return {}
 
 def get_conditions(item_code, serial_no, batch_no, barcode):
+	"""Returns the condition on the item, and its values"""
 	if serial_no or batch_no or barcode:
-		return "name = '{0}'".format(frappe.db.escape(item_code))
+		return "name = %(item_code)s", {"item_code": item_code}
 
-	return """(name like '{item_code}'
-		or item_name like '{item_code}')""".format(item_code = frappe.db.escape('%' + item_code + '%'))
+	return "(name like %(item_code)s or item_name like %(item_code)s)", {"item_code": "%" + item_code + "%"}
 
 def get_item_group_condition(pos_profile):
-	cond = "and 1=1"
+	"""Returns the condition on the item groups of the POS Profile, and its values"""
 	item_groups = get_item_groups(pos_profile)
 	if item_groups:
-		cond = "and item_group in (%s)"%(', '.join(['%s']*len(item_groups)))
+		return " and item_group in %(pos_item_groups)s", {"pos_item_groups": item_groups}
 
-	return cond % tuple(item_groups)
+	return "", {}
 
 def item_group_query(doctype, txt, searchfield, start, page_len, filters):
 	item_groups = []
@@ -0,0 +1,81 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Quantities of Bins by (item_code, warehouse), cached for the request and, if enabled
+in Stock Settings (Cache Bin Quantities), in Redis between requests.
+
+Bins clear their cache whenever they are updated. The request cache only lasts for the
+transaction, so that jobs committing many times read what other workers committed.
+"""
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import cint, flt
+
+BIN_QTY_FIELDS = ("actual_qty", "projected_qty", "reserved_qty", "ordered_qty", "indented_qty",
+	"planned_qty", "reserved_qty_for_production", "reserved_qty_for_sub_contract", "valuation_rate")
+
+# a Bin read while another transaction updates it can be cached before that transaction commits,
+# Redis entries expire so such values are not kept for long
+REDIS_EXPIRY = 300
+
+class BinQtyCacheObserver(object):
+	"""Clears the request cache when the transaction is rolled back. Commits remove the
+		observers, so without one the request cache is of an earlier transaction"""
+	def on_rollback(self):
+		frappe.flags.bin_qty_cache = None
+
+def get_bin_qty(item_code, warehouse):
+	return get_bins_qty([(item_code, warehouse)])[(item_code, warehouse)]
+
+def get_bins_qty(item_warehouses):
+	"""Returns {(item_code, warehouse): quantities}, zero for Bins that do not exist"""
+	cache = get_request_cache()
+	missing = [key for key in set(item_warehouses) if key not in cache]
+
+	redis = missing and use_redis()
+	if redis:
+		for key in missing:
+			value = frappe.cache().get_value(get_redis_key(*key))
+			if value is not None:
+				cache[key] = value
+
+		missing = [key for key in missing if key not in cache]
+
+	if missing:
+		bins = {}
+		for d in frappe.db.sql("""select item_code, warehouse, {0} from `tabBin`
+			where item_code in %(item_codes)s and warehouse in %(warehouses)s""".format(", ".join(BIN_QTY_FIELDS)),
+			{"item_codes": list(set(d[0] for d in missing)), "warehouses": list(set(d[1] for d in missing))},
+			as_dict=1):
+			bins[(d.item_code, d.warehouse)] = dict((field, flt(d[field])) for field in BIN_QTY_FIELDS)
+
+		# values read after writes of this transaction are not committed yet, not shared through Redis
+		set_in_redis = redis and not frappe.db.transaction_writes
+		for key in missing:
+			cache[key] = bins.get(key) or dict((field, 0.0) for field in BIN_QTY_FIELDS)
+			if set_in_redis:
+				frappe.cache().set_value(get_redis_key(*key), cache[key], expires_in_sec=REDIS_EXPIRY)
+
+	return dict((key, frappe._dict(cache[key])) for key in item_warehouses)
+
+def clear_bin_qty_cache(item_code, warehouse):
+	if frappe.flags.bin_qty_cache:
+		frappe.flags.bin_qty_cache.pop((item_code, warehouse), None)
+
+	frappe.cache().delete_value(get_redis_key(item_code, warehouse))
+
+def get_request_cache():
+	if frappe.flags.bin_qty_cache is None or \
+		not any(isinstance(d, BinQtyCacheObserver) for d in frappe.local.rollback_observers):
+		frappe.flags.bin_qty_cache = {}
+		frappe.local.rollback_observers.append(BinQtyCacheObserver())
+
+	return frappe.flags.bin_qty_cache
+
+def use_redis():
+	return cint(frappe.db.get_single_value("Stock Settings", "cache_bin_qty"))
+
+def get_redis_key(item_code, warehouse):
+	return "bin_qty:{0}:{1}".format(item_code, warehouse)
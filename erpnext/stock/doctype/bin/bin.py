@@ -6,6 +6,7 @@ import frappe
 from frappe.utils import flt, nowdate
 import frappe.defaults
 from frappe.model.document import Document
+from erpnext.stock.bin_cache import clear_bin_qty_cache
 
 class Bin(Document):
 	def before_save(self):
@@ -13,12 +14,16 @@ class Bin(Document):
 			self.stock_uom = frappe.get_cached_value('Item', self.item_code, 'stock_uom')
 		self.set_projected_qty()
 
+	def on_update(self):
+		clear_bin_qty_cache(self.item_code, self.warehouse)
+
 	def update_stock(self, args, allow_negative_stock=False, via_landed_cost_voucher=False):
 		'''Called from erpnext.stock.utils.update_bin'''
 		self.update_qty(args)
 
 		if args.get("actual_qty") or args.get("voucher_type") == "Stock Reconciliation":
-			from erpnext.stock.stock_ledger import update_entries_after
+			from erpnext.stock.stock_ledger import (update_entries_after,
+				repost_future_sle_in_background, future_sle_exists)
 
 			if not args.get("posting_date"):
 				args["posting_date"] = nowdate()
@@ -26,13 +31,27 @@ class Bin(Document):
 			# update valuation and qty after transaction for post dated entry
 			if args.get("is_cancelled") == "Yes" and via_landed_cost_voucher:
 				return
-			update_entries_after({
+
+			repost_args = {
 				"item_code": self.item_code,
 				"warehouse": self.warehouse,
 				"posting_date": args.get("posting_date"),
 				"posting_time": args.get("posting_time"),
-				"voucher_no": args.get("voucher_no")
-			}, allow_negative_stock=allow_negative_stock, via_landed_cost_voucher=via_landed_cost_voucher)
+				"voucher_type": args.get("voucher_type"),
+				"voucher_no": args.get("voucher_no"),
+				"actual_qty": args.get("actual_qty")
+			}
+
+			if repost_future_sle_in_background() and future_sle_exists(repost_args):
+				from erpnext.stock.doctype.repost_item_valuation.repost_item_valuation import enqueue_repost
+
+				# post the current entries now, future entries are reposted by a background job
+				update_entries_after(repost_args, allow_negative_stock=allow_negative_stock,
+					via_landed_cost_voucher=via_landed_cost_voucher, repost_future=False)
+				enqueue_repost(repost_args, allow_negative_stock, via_landed_cost_voucher)
+			else:
+				update_entries_after(repost_args, allow_negative_stock=allow_negative_stock,
+					via_landed_cost_voucher=via_landed_cost_voucher)
 
 	def update_qty(self, args):
 		# update the stock values (for current quantities)
@@ -49,6 +68,7 @@ class Bin(Document):
 
 		self.set_projected_qty()
 		self.db_update()
+		clear_bin_qty_cache(self.item_code, self.warehouse)
 
 	def set_projected_qty(self):
 		self.projected_qty = (flt(self.actual_qty) + flt(self.ordered_qty)
@@ -83,6 +103,7 @@ class Bin(Document):
 
 		self.db_set('reserved_qty_for_production', flt(self.reserved_qty_for_production))
 		self.db_set('projected_qty', self.projected_qty)
+		clear_bin_qty_cache(self.item_code, self.warehouse)
 
 	def update_reserved_qty_for_sub_contracting(self):
 		#reserved qty
@@ -125,6 +146,7 @@ class Bin(Document):
 		self.db_set('reserved_qty_for_sub_contract', reserved_qty_for_sub_contract)
 		self.set_projected_qty()
 		self.db_set('projected_qty', self.projected_qty)
+		clear_bin_qty_cache(self.item_code, self.warehouse)
 
 def on_doctype_update():
 	frappe.db.add_index("Bin", ["item_code", "warehouse"])
@@ -5,8 +5,66 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from erpnext.stock.bin_cache import get_bin_qty, get_request_cache
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.stock_balance import repair_bin_qty
 
 # test_records = frappe.get_test_records('Bin')
 
 class TestBin(unittest.TestCase):
-	pass
+	def test_bin_qty_cache(self):
+		item_code, warehouse = "_Test Item", "_Test Warehouse - _TC"
+
+		def get_actual_qty():
+			return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}, "actual_qty")
+
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100)
+		self.assertEqual(get_bin_qty(item_code, warehouse).actual_qty, get_actual_qty())
+
+		# cleared on update
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100)
+		self.assertEqual(get_bin_qty(item_code, warehouse).actual_qty, get_actual_qty())
+
+		# and on rollback
+		frappe.db.commit()
+		actual_qty = get_actual_qty()
+		make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100)
+		self.assertEqual(get_bin_qty(item_code, warehouse).actual_qty, actual_qty + 5)
+
+		frappe.db.rollback()
+		self.assertEqual(get_bin_qty(item_code, warehouse).actual_qty, actual_qty)
+
+		# and on commit, other workers may update the Bin after it
+		frappe.db.commit()
+		self.assertFalse((item_code, warehouse) in get_request_cache())
+
+		self.assertEqual(get_bin_qty(item_code, "_Test Warehouse 2 - _TC").actual_qty,
+			frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": "_Test Warehouse 2 - _TC"},
+				"actual_qty") or 0)
+
+	def test_voucher_qty_deltas(self):
+		from erpnext.buying.doctype.purchase_order.test_purchase_order import create_purchase_order
+
+		item_code, warehouse = "_Test Item", "_Test Warehouse - _TC"
+
+		def get_bin():
+			return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
+				["ordered_qty", "projected_qty"], as_dict=1)
+
+		repair_bin_qty([(item_code, warehouse)])
+		before = get_bin()
+
+		po = create_purchase_order(item_code=item_code, warehouse=warehouse, qty=7)
+		self.assertEqual(get_bin().ordered_qty, before.ordered_qty + 7)
+		self.assertEqual(get_bin().projected_qty, before.projected_qty + 7)
+		self.assertEqual(repair_bin_qty([(item_code, warehouse)], verify_only=True), [])
+
+		po.cancel()
+		self.assertEqual(get_bin(), before)
+
+		# repair recomputes from the open vouchers
+		frappe.db.sql("""update tabBin set ordered_qty = ordered_qty + 3
+			where item_code=%s and warehouse=%s""", (item_code, warehouse))
+		mismatches = repair_bin_qty([(item_code, warehouse)])
+		self.assertEqual(len(mismatches), 1)
+		self.assertEqual(get_bin(), before)
@@ -11,6 +11,8 @@ import copy
 from erpnext.controllers.item_variant import (ItemVariantExistsError,
 		copy_attributes_to_variant, get_variant, make_variant_item_code, validate_item_variant_attributes)
 from erpnext.setup.doctype.item_group.item_group import (get_parent_item_groups, invalidate_cache_for)
+from erpnext.stock.doctype.item_search_token.item_search_token import (update_item_search_index,
+	delete_item_search_tokens)
 from frappe import _, msgprint
 from frappe.utils import (cint, cstr, flt, formatdate, get_timestamp, getdate,
 						  now_datetime, random_string, strip)
@@ -148,6 +150,7 @@ class Item(WebsiteGenerator):
 		self.update_variants()
 		self.update_item_price()
 		self.update_template_item()
+		update_item_search_index([self.name])
 
 	def validate_description(self):
 		'''Clean HTML description if set'''
@@ -694,6 +697,7 @@ class Item(WebsiteGenerator):
 		super(Item, self).on_trash()
 		frappe.db.sql("""delete from tabBin where item_code=%s""", self.name)
 		frappe.db.sql("delete from `tabItem Price` where item_code=%s", self.name)
+		delete_item_search_tokens([self.name])
 		for variant_of in frappe.get_all("Item", filters={"variant_of": self.name}):
 			frappe.delete_doc("Item", variant_of.name)
 
@@ -718,6 +722,7 @@ class Item(WebsiteGenerator):
 			clear_cache(self.route)
 
 		frappe.db.set_value("Item", new_name, "item_code", new_name)
+		update_item_search_index([new_name])
 
 		if merge:
 			self.set_last_purchase_rate(new_name)
@@ -1067,8 +1072,9 @@ def check_stock_uom_with_bin(item, stock_uom):
 		frappe.throw(
 			_("Default Unit of Measure for Item {0} cannot be changed directly because you have already made some transaction(s) with another UOM. You will need to create a new Item to use a different Default UOM.").format(item))
 
-def get_item_defaults(item_code, company):
-	item = frappe.get_cached_doc('Item', item_code)
+def get_item_defaults(item_code, company, item=None):
+	if not item:
+		item = frappe.get_cached_doc('Item', item_code)
 
 	out = item.as_dict()
 
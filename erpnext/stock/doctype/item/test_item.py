@@ -13,7 +13,7 @@ from erpnext.stock.doctype.item.item import StockExistsForTemplate, InvalidBarco
 from erpnext.stock.doctype.item.item import get_uom_conv_factor
 from frappe.model.rename_doc import rename_doc
 from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
-from erpnext.stock.get_item_details import get_item_details
+from erpnext.stock.get_item_details import get_item_details, get_item_details_for_items
 
 from six import iteritems
 
@@ -105,6 +105,34 @@ class TestItem(unittest.TestCase):
 		for key, value in iteritems(to_check):
 			self.assertEqual(value, details.get(key))
 
+	def test_get_item_details_for_items(self):
+		make_test_objects("Item Price")
+
+		args = {
+			"company": "_Test Company",
+			"price_list": "_Test Price List",
+			"currency": "_Test Currency",
+			"doctype": "Sales Order",
+			"conversion_rate": 1,
+			"price_list_currency": "_Test Currency",
+			"plc_conversion_rate": 1,
+			"order_type": "Sales",
+			"customer": "_Test Customer",
+			"price_list_uom_dependant": 1,
+			"ignore_pricing_rule": 1
+		}
+		items = [{"item_code": "_Test Item", "qty": 5}, {"item_code": "_Test Item 2"},
+			{"item_code": "_Test Item", "qty": 2, "warehouse": "_Test Warehouse 1 - _TC"}]
+
+		details = get_item_details_for_items(args, items)
+		self.assertEqual(len(details), 3)
+
+		for row, item_details in zip(items, details):
+			expected = get_item_details(dict(args, **row))
+			for key in ("item_code", "warehouse", "income_account", "expense_account", "cost_center", "qty",
+				"price_list_rate", "uom", "conversion_factor", "valuation_rate", "projected_qty", "actual_qty"):
+				self.assertEqual(item_details.get(key), expected.get(key))
+
 	def test_item_defaults(self):
 		frappe.delete_doc_if_exists("Item", "Test Item With Defaults", force=1)
 		make_item("Test Item With Defaults", {
@@ -656,6 +684,27 @@ class TestItem(unittest.TestCase):
 		new_barcode.barcode_type = 'EAN'
 		self.assertRaises(InvalidBarcode, item_doc.save)
 
+	def test_item_search_index(self):
+		from erpnext.controllers.queries import item_query
+
+		item = make_item("_Test Search Item SKU-84213", {"description": "<p>Bolt for <b>outdoor</b> use</p>"})
+		item.item_name = "Stainless Hex Bolt"
+		if not item.barcodes:
+			item.append("barcodes", {"barcode": "ARBITRARY_84213977"})
+		item.save()
+
+		def search(txt):
+			return [d[0] for d in item_query("Item", txt, "name", 0, 20, {})]
+
+		for txt in ("SKU-84213", "84213", "hex bolt", "stainless outdoor", "84213977"):
+			self.assertTrue(item.name in search(txt), txt)
+
+		self.assertFalse(item.name in search("hex screw"))
+
+		item.item_name = "Stainless Hex Screw"
+		item.save()
+		self.assertTrue(item.name in search("hex screw"))
+
 def set_item_variant_settings(fields):
 	doc = frappe.get_doc('Item Variant Settings')
 	doc.set('fields', fields)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import re
+import hashlib
+import frappe
+from frappe.utils import cstr, strip_html
+from frappe.model.document import Document
+
+# weight of a token by the field it is from, an exact word match adds `EXACT_MATCH_WEIGHT`
+FIELD_WEIGHTS = {"item_code": 10, "barcode": 9, "supplier_part_no": 8, "item_name": 6, "description": 1}
+EXACT_MATCH_WEIGHT = 2
+
+# codes are indexed from every position too, so that a part of a code matches,
+# with `INFIX_PENALTY` less weight than from the start
+CODE_FIELDS = ("item_code", "barcode", "supplier_part_no")
+INFIX_PENALTY = 3
+
+TOKEN_LENGTH = 40
+DESCRIPTION_TOKENS = 100
+
+class ItemSearchToken(Document):
+	pass
+
+def tokenize(text):
+	"""Lowercase words of the text"""
+	return [d[:TOKEN_LENGTH] for d in re.split(r"\W+", cstr(text).lower(), flags=re.UNICODE) if d]
+
+def get_item_search_tokens(item, barcodes=None, supplier_part_nos=None):
+	"""Returns {token: weight} of the item, the best weight of a token counts"""
+	tokens = {}
+
+	def add(token, weight):
+		if weight > tokens.get(token, 0):
+			tokens[token] = weight
+
+	values = {"item_code": [item.item_code or item.name], "barcode": barcodes or [],
+		"supplier_part_no": supplier_part_nos or [], "item_name": [item.item_name]}
+
+	for fieldname in CODE_FIELDS:
+		for value in values[fieldname]:
+			code = "".join(tokenize(value))
+			for i in range(max(len(code) - 1, 1) if code else 0):
+				add(code[i:i + TOKEN_LENGTH], FIELD_WEIGHTS[fieldname] - (INFIX_PENALTY if i else 0))
+
+	for token in tokenize(item.item_name):
+		add(token, FIELD_WEIGHTS["item_name"])
+
+	description_tokens = []
+	for token in tokenize(strip_html(cstr(item.description))):
+		if token not in description_tokens:
+			description_tokens.append(token)
+
+	for token in description_tokens[:DESCRIPTION_TOKENS]:
+		add(token, FIELD_WEIGHTS["description"])
+
+	return tokens
+
+def update_item_search_index(item_codes):
+	"""Rebuilds the search tokens of the items"""
+	if not item_codes:
+		return
+
+	items = frappe.db.sql("""select name, item_code, item_name, description from `tabItem`
+		where name in %s""", [item_codes], as_dict=1)
+
+	barcodes, supplier_part_nos = {}, {}
+	for d in frappe.db.sql("""select parent, barcode from `tabItem Barcode`
+		where parenttype = 'Item' and parent in %s""", [item_codes], as_dict=1):
+		barcodes.setdefault(d.parent, []).append(d.barcode)
+
+	for d in frappe.db.sql("""select parent, supplier_part_no from `tabItem Supplier`
+		where parenttype = 'Item' and parent in %s and ifnull(supplier_part_no, '') != ''""",
+		[item_codes], as_dict=1):
+		supplier_part_nos.setdefault(d.parent, []).append(d.supplier_part_no)
+
+	rows = []
+	for item in items:
+		tokens = get_item_search_tokens(item, barcodes.get(item.name), supplier_part_nos.get(item.name))
+		for token, weight in tokens.items():
+			# one row per item and token
+			name = hashlib.md5((item.name + "\n" + token).encode("utf-8")).hexdigest()[:20]
+			rows.append((name, item.name, token, weight))
+
+	delete_item_search_tokens(item_codes)
+
+	for i in range(0, len(rows), 1000):
+		chunk = rows[i:i + 1000]
+		frappe.db.sql("""insert into `tabItem Search Token` (name, item_code, token, weight)
+			values {0}""".format(", ".join(["(%s, %s, %s, %s)"] * len(chunk))),
+			tuple(value for row in chunk for value in row))
+
+def delete_item_search_tokens(item_codes):
+	frappe.db.sql("delete from `tabItem Search Token` where item_code in %s", [item_codes])
+
+def rebuild_item_search_index(chunk_size=1000):
+	item_codes = frappe.db.sql_list("select name from `tabItem` order by name")
+	for i in range(0, len(item_codes), chunk_size):
+		update_item_search_index(item_codes[i:i + chunk_size])
+		frappe.db.commit()
+
+def get_item_search_query(txt):
+	"""Returns the query of the items (`item_code`, `score`) matching all the words of txt
+		from the start of a token, and its values. None if txt has no words"""
+	words = []
+	for word in tokenize(txt):
+		if word not in words:
+			words.append(word)
+
+	if not words:
+		return None, None
+
+	subqueries, values = [], {}
+	for i, word in enumerate(words[:5]):
+		values["search_word_{0}".format(i)] = word
+		values["search_prefix_{0}".format(i)] = word.replace("_", "\\_") + "%"
+		subqueries.append("""select item_code, max(weight + if(token = %(search_word_{0})s, {1}, 0)) as score
+			from `tabItem Search Token` where token like %(search_prefix_{0})s
+			group by item_code""".format(i, EXACT_MATCH_WEIGHT))
+
+	query = """select item_code, sum(score) as score from ({0}) item_search_words
+		group by item_code having count(*) = {1}""".format(" union all ".join(subqueries), len(subqueries))
+
+	return query, values
+
+def on_doctype_update():
+	frappe.db.add_index("Item Search Token", ["token", "item_code"])
+	frappe.db.add_index("Item Search Token", ["item_code"])
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe, erpnext
+from frappe.utils import cint, cstr, get_datetime, add_to_date, now_datetime
+from frappe.model.document import Document
+
+# an entry still In Progress this long after it was claimed has lost its job (killed or timed out)
+REPOST_JOB_TIMEOUT = 3000
+STALE_REPOST_SECONDS = REPOST_JOB_TIMEOUT + 600
+
+class RepostItemValuation(Document):
+	def validate(self):
+		if not self.company:
+			self.company = frappe.db.get_value("Warehouse", self.warehouse, "company")
+
+		if not self.posting_time:
+			self.posting_time = "00:00"
+
+def enqueue_repost(args, allow_negative_stock=False, via_landed_cost_voucher=False):
+	"""Queue reposting of future entries for an item and warehouse from the given posting datetime.
+
+	A queued (not yet started) repost for the same item and warehouse is reused
+	and moved back to the earlier posting datetime instead of adding a new one."""
+	existing = frappe.db.sql("""select name, posting_date, posting_time
+		from `tabRepost Item Valuation`
+		where item_code=%s and warehouse=%s and status='Queued'
+		limit 1 for update""", (args.get("item_code"), args.get("warehouse")), as_dict=1)
+
+	if existing:
+		existing = existing[0]
+		if get_timestamp(args) < get_timestamp(existing):
+			frappe.db.set_value("Repost Item Valuation", existing.name, {
+				"posting_date": args.get("posting_date"),
+				"posting_time": args.get("posting_time") or "00:00"
+			}, update_modified=False)
+		return existing.name
+
+	doc = frappe.get_doc({
+		"doctype": "Repost Item Valuation",
+		"item_code": args.get("item_code"),
+		"warehouse": args.get("warehouse"),
+		"posting_date": args.get("posting_date"),
+		"posting_time": args.get("posting_time"),
+		"voucher_type": args.get("voucher_type"),
+		"voucher_no": args.get("voucher_no"),
+		"allow_negative_stock": cint(allow_negative_stock),
+		"via_landed_cost_voucher": cint(via_landed_cost_voucher)
+	})
+	doc.flags.ignore_permissions = True
+	doc.flags.ignore_links = True
+	doc.insert()
+
+	return doc.name
+
+def repost_entries():
+	"""Scheduled: start one background job per queued repost so that
+	different item and warehouse pairs are reposted in parallel.
+
+	Entries already waiting in the queue, and those whose item and warehouse
+	is being reposted, are left for a later run."""
+	from frappe.utils.background_jobs import get_jobs
+
+	reset_stale_reposts()
+
+	enqueued = set(d.get("name") for d in get_jobs(site=frappe.local.site, queue="long",
+		key="kwargs").get(frappe.local.site, []))
+
+	for name in frappe.db.sql_list("""select name from `tabRepost Item Valuation` riv
+		where status='Queued' and not exists(select name from `tabRepost Item Valuation`
+			where item_code=riv.item_code and warehouse=riv.warehouse and status='In Progress')
+		order by posting_date, posting_time, creation"""):
+		if name not in enqueued:
+			frappe.enqueue("erpnext.stock.doctype.repost_item_valuation.repost_item_valuation.repost",
+				queue="long", timeout=REPOST_JOB_TIMEOUT, name=name)
+
+def reset_stale_reposts():
+	"""Queues the entries left In Progress by a lost job again, so that they do not block
+	their item and warehouse"""
+	frappe.db.sql("""update `tabRepost Item Valuation` set status='Queued'
+		where status='In Progress' and modified < %s""", add_to_date(now_datetime(), seconds=-STALE_REPOST_SECONDS))
+	frappe.db.commit()
+
+def repost(name):
+	if not claim(name):
+		return
+
+	doc = frappe.get_doc("Repost Item Valuation", name)
+	try:
+		repost_sl_entries(doc)
+		repost_gl_entries(doc)
+		doc.db_set("status", "Completed")
+	except Exception:
+		frappe.db.rollback()
+		doc.db_set("status", "Failed")
+		doc.db_set("error_log", frappe.get_traceback())
+
+	frappe.db.commit()
+
+def claim(name):
+	"""Mark the entry as In Progress if it is still queued and no other
+	repost is running for the same item and warehouse. `modified` is the time it was claimed"""
+	doc = frappe.db.sql("""select name, item_code, warehouse, status
+		from `tabRepost Item Valuation` where name=%s for update""", name, as_dict=1)
+
+	if not doc or doc[0].status != "Queued":
+		frappe.db.rollback()
+		return False
+
+	if frappe.db.sql("""select name from `tabRepost Item Valuation`
+		where item_code=%s and warehouse=%s and status='In Progress' and name!=%s limit 1""",
+		(doc[0].item_code, doc[0].warehouse, name)):
+		# picked up by the next scheduled run
+		frappe.db.rollback()
+		return False
+
+	frappe.db.set_value("Repost Item Valuation", name, "status", "In Progress")
+	frappe.db.commit()
+
+	return True
+
+def repost_sl_entries(doc):
+	from erpnext.stock.stock_ledger import update_entries_after
+
+	update_entries_after({
+		"item_code": doc.item_code,
+		"warehouse": doc.warehouse,
+		"posting_date": doc.posting_date,
+		"posting_time": doc.posting_time
+	}, allow_negative_stock=doc.allow_negative_stock, via_landed_cost_voucher=doc.via_landed_cost_voucher,
+		verbose=0, bulk_update=True)
+
+def repost_gl_entries(doc):
+	if not cint(erpnext.is_perpetual_inventory_enabled(doc.company)):
+		return
+
+	from erpnext.controllers.stock_controller import update_gl_entries_after
+
+	update_gl_entries_after(doc.posting_date, doc.posting_time, [doc.warehouse], [doc.item_code],
+		company=doc.company, bulk=True)
+
+def get_timestamp(args):
+	return get_datetime("{0} {1}".format(cstr(args.get("posting_date")), cstr(args.get("posting_time") or "00:00")))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_to_date, now_datetime
+from erpnext.stock.doctype.repost_item_valuation.repost_item_valuation import enqueue_repost, \
+	reset_stale_reposts, STALE_REPOST_SECONDS
+
+class TestRepostItemValuation(unittest.TestCase):
+	def setUp(self):
+		frappe.db.sql("delete from `tabRepost Item Valuation`")
+
+	def test_queued_reposts_are_coalesced_to_earliest_timestamp(self):
+		args = {"item_code": "_Test Item", "warehouse": "_Test Warehouse - _TC",
+			"posting_date": "2019-10-10", "posting_time": "10:00:00"}
+
+		first = enqueue_repost(args)
+		second = enqueue_repost(dict(args, posting_date="2019-10-05"))
+		third = enqueue_repost(dict(args, posting_date="2019-10-08"))
+
+		self.assertEqual(first, second)
+		self.assertEqual(first, third)
+		self.assertEqual(str(frappe.db.get_value("Repost Item Valuation", first, "posting_date")), "2019-10-05")
+
+		# a running repost is not extended, a new entry is queued instead
+		frappe.db.set_value("Repost Item Valuation", first, "status", "In Progress")
+		self.assertNotEqual(enqueue_repost(args), first)
+
+	def test_stale_reposts_are_queued_again(self):
+		name = enqueue_repost({"item_code": "_Test Item", "warehouse": "_Test Warehouse - _TC",
+			"posting_date": "2019-10-10", "posting_time": "10:00:00"})
+
+		# still running
+		frappe.db.set_value("Repost Item Valuation", name, "status", "In Progress")
+		reset_stale_reposts()
+		self.assertEqual(frappe.db.get_value("Repost Item Valuation", name, "status"), "In Progress")
+
+		# claimed longer ago than its job can run
+		frappe.db.set_value("Repost Item Valuation", name, "modified",
+			add_to_date(now_datetime(), seconds=-STALE_REPOST_SECONDS - 60), update_modified=False)
+		reset_stale_reposts()
+		self.assertEqual(frappe.db.get_value("Repost Item Valuation", name, "status"), "Queued")
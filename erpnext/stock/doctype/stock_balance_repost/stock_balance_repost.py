@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import json
+import frappe
+from frappe.utils import cint, flt, now_datetime, time_diff_in_seconds
+from frappe.model.document import Document
+from erpnext.stock.stock_balance import repost_stock
+
+class StockBalanceRepost(Document):
+	pass
+
+def start_stock_balance_repost(from_date=None, only_actual=False, only_bin=False, allow_negative_stock=False,
+	allow_zero_rate=False, partition_size=50):
+	"""Reposts stock of all item and warehouse pairs, or of those with Stock Ledger Entries
+	posted or made since `from_date`.
+
+	The pairs are split in partitions reposted by background jobs in parallel. Each partition
+	records the pairs done, so that an interrupted repost can be resumed with `resume_stock_balance_repost`."""
+	doc = frappe.get_doc({
+		"doctype": "Stock Balance Repost",
+		"from_date": from_date,
+		"only_actual": cint(only_actual),
+		"only_bin": cint(only_bin),
+		"allow_negative_stock": cint(allow_negative_stock),
+		"allow_zero_rate": cint(allow_zero_rate),
+		"partition_size": cint(partition_size) or 50
+	})
+	doc.flags.ignore_permissions = True
+	doc.insert()
+
+	item_warehouses = get_item_warehouses(from_date)
+	for i in range(0, len(item_warehouses), doc.partition_size):
+		frappe.get_doc({
+			"doctype": "Stock Balance Repost Partition",
+			"stock_balance_repost": doc.name,
+			"status": "Queued",
+			"item_warehouses": json.dumps(item_warehouses[i:i + doc.partition_size])
+		}).db_insert()
+
+	doc.db_set("total_item_warehouses", len(item_warehouses))
+	if not item_warehouses:
+		doc.db_set("status", "Completed")
+
+	frappe.db.commit()
+	enqueue_partitions(doc.name)
+
+	return doc
+
+def resume_stock_balance_repost(name):
+	"""Queues the partitions not completed, and those with failed pairs, again.
+	To be used once no background job is reposting them"""
+	frappe.db.sql("""update `tabStock Balance Repost Partition` set status='Queued'
+		where stock_balance_repost=%s and status='In Progress'""", name)
+
+	# failed pairs are only recorded in the error log, so their whole partition is reposted again
+	frappe.db.sql("""update `tabStock Balance Repost Partition` set status='Queued', processed=0, failed=0, error_log=''
+		where stock_balance_repost=%s and status='Completed' and failed > 0""", name)
+	frappe.db.sql("""update `tabStock Balance Repost` set status='In Progress'
+		where name=%s and status='Failed'""", name)
+	frappe.db.commit()
+
+	if not enqueue_partitions(name):
+		update_progress(name)
+
+def get_item_warehouses(from_date=None):
+	if from_date:
+		item_warehouses = frappe.db.sql("""select distinct item_code, warehouse from `tabStock Ledger Entry`
+			where posting_date >= %(from_date)s or creation >= %(from_date)s""", {"from_date": from_date})
+	else:
+		item_warehouses = frappe.db.sql("""
+			select distinct item_code, warehouse
+			from
+				(select item_code, warehouse from tabBin
+				union
+				select item_code, warehouse from `tabStock Ledger Entry`) a""")
+
+	return sorted([list(d) for d in item_warehouses])
+
+def enqueue_partitions(name):
+	"""Enqueues the queued partitions, returns their number"""
+	partitions = frappe.db.sql_list("""select name from `tabStock Balance Repost Partition`
+		where stock_balance_repost=%s and status='Queued' order by creation, name""", name)
+
+	for partition in partitions:
+		frappe.enqueue("erpnext.stock.doctype.stock_balance_repost.stock_balance_repost.repost_partition",
+			queue="long", timeout=6000, now=frappe.flags.in_test, name=partition)
+
+	return len(partitions)
+
+def repost_partition(name):
+	if not claim_partition(name):
+		return
+
+	partition = frappe.get_doc("Stock Balance Repost Partition", name)
+	doc = frappe.get_doc("Stock Balance Repost", partition.stock_balance_repost)
+
+	frappe.db.sql("""update `tabStock Balance Repost` set status='In Progress', started_at=%s
+		where name=%s and status='Queued'""", (now_datetime(), doc.name))
+	frappe.db.commit()
+
+	processed, failed, error_log = cint(partition.processed), cint(partition.failed), partition.error_log or ""
+
+	# resumes after the pairs already done
+	for item_code, warehouse in json.loads(partition.item_warehouses)[processed:]:
+		try:
+			repost_stock(item_code, warehouse, doc.allow_zero_rate, doc.only_actual, doc.only_bin,
+				doc.allow_negative_stock)
+		except Exception:
+			frappe.db.rollback()
+			failed += 1
+			error_log += "{0}, {1}:\n{2}\n".format(item_code, warehouse, frappe.get_traceback())
+
+		processed += 1
+		frappe.db.set_value("Stock Balance Repost Partition", name, {
+			"processed": processed,
+			"failed": failed,
+			"error_log": error_log
+		}, update_modified=False)
+		frappe.db.commit()
+
+	frappe.db.set_value("Stock Balance Repost Partition", name, "status", "Completed", update_modified=False)
+	frappe.db.commit()
+
+	update_progress(doc.name)
+
+def claim_partition(name):
+	"""Mark the partition as In Progress if it is still queued"""
+	status = frappe.db.sql("""select status from `tabStock Balance Repost Partition`
+		where name=%s for update""", name)
+
+	if not status or status[0][0] != "Queued":
+		frappe.db.rollback()
+		return False
+
+	frappe.db.set_value("Stock Balance Repost Partition", name, "status", "In Progress", update_modified=False)
+	frappe.db.commit()
+
+	return True
+
+def update_progress(name):
+	"""Updates the pairs done and the throughput, and completes the repost once all partitions are"""
+	processed, failed, pending = frappe.db.sql("""select sum(processed), sum(failed), sum(status != 'Completed')
+		from `tabStock Balance Repost Partition` where stock_balance_repost=%s""", name)[0]
+
+	started_at = frappe.db.get_value("Stock Balance Repost", name, "started_at")
+	seconds = time_diff_in_seconds(now_datetime(), started_at) if started_at else 0
+
+	values = {
+		"completed_item_warehouses": cint(processed) - cint(failed),
+		"failed_item_warehouses": cint(failed),
+		"item_warehouses_per_minute": flt(cint(processed) * 60.0 / seconds, 2) if seconds else 0
+	}
+
+	if not cint(pending):
+		values.update({
+			"status": "Failed" if cint(failed) else "Completed",
+			"completed_at": now_datetime()
+		})
+
+	frappe.db.set_value("Stock Balance Repost", name, values)
+	frappe.db.commit()
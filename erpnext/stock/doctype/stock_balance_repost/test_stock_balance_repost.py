@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import json
+import frappe
+import unittest
+from frappe.utils import nowdate
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.stock_balance import get_balance_qty_from_sle, repost_stock
+from erpnext.stock.doctype.stock_balance_repost.stock_balance_repost import (start_stock_balance_repost,
+	resume_stock_balance_repost, claim_partition)
+
+ITEM_WAREHOUSES = [["_Test Item", "_Test Warehouse - _TC"], ["_Test Item", "_Test Warehouse 1 - _TC"]]
+
+class TestStockBalanceRepost(unittest.TestCase):
+	def setUp(self):
+		for item_code, warehouse in ITEM_WAREHOUSES:
+			make_stock_entry(item_code=item_code, target=warehouse, qty=5, basic_rate=100)
+
+	def tearDown(self):
+		for item_code, warehouse in ITEM_WAREHOUSES:
+			repost_stock(item_code, warehouse, only_bin=True)
+		frappe.db.commit()
+
+	def test_stock_balance_repost(self):
+		item_code, warehouse = ITEM_WAREHOUSES[0]
+		set_wrong_actual_qty(item_code, warehouse)
+
+		doc = start_stock_balance_repost(from_date=nowdate(), only_bin=True)
+		doc.reload()
+
+		self.assertEqual(doc.status, "Completed")
+		self.assertTrue(doc.total_item_warehouses)
+		self.assertEqual(doc.completed_item_warehouses, doc.total_item_warehouses)
+		self.assertEqual(get_actual_qty(item_code, warehouse), get_balance_qty_from_sle(item_code, warehouse))
+
+	def test_claim_partition(self):
+		doc, partition = make_stock_balance_repost(ITEM_WAREHOUSES)
+
+		self.assertTrue(claim_partition(partition))
+		self.assertFalse(claim_partition(partition))
+
+	def test_resume_after_interruption(self):
+		for item_code, warehouse in ITEM_WAREHOUSES:
+			set_wrong_actual_qty(item_code, warehouse)
+
+		# interrupted after the first pair
+		doc, partition = make_stock_balance_repost(ITEM_WAREHOUSES, status="In Progress", processed=1)
+		resume_stock_balance_repost(doc.name)
+
+		for (item_code, warehouse), reposted in zip(ITEM_WAREHOUSES, (False, True)):
+			self.assertEqual(get_actual_qty(item_code, warehouse) == get_balance_qty_from_sle(item_code, warehouse),
+				reposted)
+
+		self.assertEqual(frappe.db.get_value("Stock Balance Repost Partition", partition, "processed"), 2)
+		self.assertEqual(frappe.db.get_value("Stock Balance Repost", doc.name, "status"), "Completed")
+
+	def test_resume_failed_repost(self):
+		item_code, warehouse = ITEM_WAREHOUSES[0]
+		set_wrong_actual_qty(item_code, warehouse)
+
+		doc, partition = make_stock_balance_repost(ITEM_WAREHOUSES[:1], status="Completed", processed=1, failed=1)
+		frappe.db.set_value("Stock Balance Repost", doc.name, "status", "Failed")
+		resume_stock_balance_repost(doc.name)
+
+		doc.reload()
+		self.assertEqual(doc.status, "Completed")
+		self.assertEqual(doc.failed_item_warehouses, 0)
+		self.assertEqual(get_actual_qty(item_code, warehouse), get_balance_qty_from_sle(item_code, warehouse))
+
+		# completed without any failed pair
+		frappe.db.set_value("Stock Balance Repost", doc.name, "status", "Failed")
+		resume_stock_balance_repost(doc.name)
+		self.assertEqual(frappe.db.get_value("Stock Balance Repost", doc.name, "status"), "Completed")
+
+def make_stock_balance_repost(item_warehouses, status="Queued", processed=0, failed=0):
+	doc = frappe.get_doc({
+		"doctype": "Stock Balance Repost",
+		"only_bin": 1,
+		"partition_size": len(item_warehouses),
+		"total_item_warehouses": len(item_warehouses)
+	})
+	doc.flags.ignore_permissions = True
+	doc.insert()
+
+	partition = frappe.get_doc({
+		"doctype": "Stock Balance Repost Partition",
+		"stock_balance_repost": doc.name,
+		"status": status,
+		"processed": processed,
+		"failed": failed,
+		"item_warehouses": json.dumps(item_warehouses)
+	})
+	partition.db_insert()
+	frappe.db.commit()
+
+	return doc, partition.name
+
+def set_wrong_actual_qty(item_code, warehouse):
+	frappe.db.sql("""update tabBin set actual_qty = actual_qty + 10
+		where item_code=%s and warehouse=%s""", (item_code, warehouse))
+
+def get_actual_qty(item_code, warehouse):
+	return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}, "actual_qty")
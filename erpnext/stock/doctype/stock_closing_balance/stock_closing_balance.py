@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from __future__ import unicode_literals
+import frappe
+from frappe.utils import add_months, get_last_day, getdate, nowdate
+from frappe.model.document import Document
+
+# month ends for which closing balances are kept up to date
+CLOSING_BALANCE_MONTHS = 12
+
+class StockClosingBalance(Document):
+	pass
+
+def get_closing_balance(item_code, warehouse, posting_date):
+	"""Returns the latest closing balance of the item and warehouse, before the posting date"""
+	closing_balance = frappe.db.sql("""select name, period_end_date, stock_ledger_entry,
+			qty_after_transaction, valuation_rate, stock_value, stock_queue
+		from `tabStock Closing Balance`
+		where item_code=%s and warehouse=%s and period_end_date < %s
+		order by period_end_date desc
+		limit 1""", (item_code, warehouse, posting_date), as_dict=1)
+
+	return closing_balance[0] if closing_balance else None
+
+def get_closing_balances(period_end_date, items=None):
+	"""Returns closing balances on the period end date as dict keyed on (item_code, warehouse)"""
+	conditions = ""
+	if items:
+		conditions = " and item_code in ({0})".format(", ".join(['"' + frappe.db.escape(d, percent=False) + '"' for d in items]))
+
+	closing_balances = {}
+	for d in frappe.db.sql("""select item_code, warehouse, company,
+			qty_after_transaction, valuation_rate, stock_value
+		from `tabStock Closing Balance`
+		where period_end_date=%s {0}""".format(conditions), period_end_date, as_dict=1):
+		closing_balances[(d.item_code, d.warehouse)] = d
+
+	return closing_balances
+
+def invalidate_closing_balances(item_code, warehouse, posting_date=None):
+	"""Delete closing balances on or after the posting date, called when
+	entries are posted or reposted from that date"""
+	frappe.db.sql("""delete from `tabStock Closing Balance`
+		where item_code=%s and warehouse=%s and period_end_date >= %s""",
+		(item_code, warehouse, posting_date or "1900-01-01"))
+
+def update_closing_balances():
+	"""Scheduled: create missing closing balances for the recent month ends,
+	oldest first so that each month starts from the previous one"""
+	last_month_end = get_last_day(add_months(nowdate(), -1))
+
+	for months in range(CLOSING_BALANCE_MONTHS - 1, -1, -1):
+		create_closing_balances(get_last_day(add_months(last_month_end, -months)))
+		frappe.db.commit()
+
+def create_closing_balances(period_end_date):
+	from erpnext.stock.stock_ledger import get_previous_sle
+
+	period_end_date = getdate(period_end_date)
+	for item_code, warehouse in frappe.db.sql("""select distinct item_code, warehouse
+		from `tabStock Ledger Entry` sle
+		where posting_date <= %(period_end_date)s and ifnull(is_cancelled, 'No')='No'
+		and not exists(select name from `tabStock Closing Balance` cb
+			where cb.item_code = sle.item_code and cb.warehouse = sle.warehouse
+			and cb.period_end_date = %(period_end_date)s)""", {"period_end_date": period_end_date}):
+
+		sle = get_previous_sle({
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"posting_date": period_end_date,
+			"posting_time": "23:59:59.999999"
+		})
+		if not sle:
+			continue
+
+		doc = frappe.get_doc({
+			"doctype": "Stock Closing Balance",
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"company": sle.company,
+			"period_end_date": period_end_date,
+			"stock_ledger_entry": sle.name,
+			"qty_after_transaction": sle.qty_after_transaction,
+			"valuation_rate": sle.valuation_rate,
+			"stock_value": sle.stock_value,
+			"stock_queue": sle.stock_queue
+		})
+		doc.flags.ignore_permissions = True
+		doc.flags.ignore_links = True
+		doc.insert()
+
+def on_doctype_update():
+	frappe.db.add_index("Stock Closing Balance", ["item_code", "warehouse", "period_end_date"])
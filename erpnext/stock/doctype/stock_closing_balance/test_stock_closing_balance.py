@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# See license.txt
+from __future__ import unicode_literals
+
+import frappe
+import unittest
+from frappe.utils import add_days, add_months, get_last_day, nowdate
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.doctype.stock_closing_balance.stock_closing_balance import create_closing_balances
+from erpnext.stock.utils import get_stock_balance
+
+class TestStockClosingBalance(unittest.TestCase):
+	def test_closing_balance_is_used_and_invalidated(self):
+		item_code = make_item("_Test Item For Closing Balance", {"is_stock_item": 1}).name
+		warehouse = "_Test Warehouse - _TC"
+		period_end_date = get_last_day(add_months(nowdate(), -2))
+
+		make_stock_entry(item_code=item_code, to_warehouse=warehouse, qty=10, rate=100,
+			posting_date=add_days(period_end_date, -5))
+		create_closing_balances(period_end_date)
+
+		closing_balance = frappe.db.get_value("Stock Closing Balance",
+			{"item_code": item_code, "warehouse": warehouse, "period_end_date": period_end_date},
+			["qty_after_transaction", "stock_value"], as_dict=1)
+		self.assertEqual(closing_balance.qty_after_transaction, 10)
+		self.assertEqual(closing_balance.stock_value, 1000)
+
+		self.assertEqual(get_stock_balance(item_code, warehouse, nowdate()), 10)
+
+		# back-dated entry before the period end removes the closing balance
+		make_stock_entry(item_code=item_code, to_warehouse=warehouse, qty=5, rate=100,
+			posting_date=add_days(period_end_date, -10))
+
+		self.assertFalse(frappe.db.exists("Stock Closing Balance",
+			{"item_code": item_code, "warehouse": warehouse, "period_end_date": period_end_date}))
+		self.assertEqual(get_stock_balance(item_code, warehouse, nowdate()), 15)
@@ -736,6 +736,37 @@ class TestStockEntry(unittest.TestCase):
 			filters={"voucher_type": "Stock Entry", "voucher_no": mr.name}, fieldname="is_opening")
 		self.assertEqual(is_opening, "Yes")
 
+	def test_bulk_gl_repost(self):
+		from erpnext.stock import get_warehouse_account_map
+		from erpnext.controllers.stock_controller import (update_gl_entries_after,
+			get_vouchers_with_unmatched_stock_gle)
+
+		company = frappe.db.get_value('Warehouse', '_Test Warehouse - _TC', 'company')
+		set_perpetual_inventory(1, company)
+
+		mr = make_stock_entry(item_code="_Test Item", target="_Test Warehouse - _TC",
+			qty=50, basic_rate=100, expense_account="Stock Adjustment - _TC")
+		stock_in_hand_account = get_inventory_account(mr.company, mr.get("items")[0].t_warehouse)
+		warehouse_account = get_warehouse_account_map(company)
+
+		self.assertEqual(get_vouchers_with_unmatched_stock_gle([["Stock Entry", mr.name]], mr.posting_date,
+			warehouse_account), [])
+
+		frappe.db.sql("""update `tabGL Entry` set debit = 4000, debit_in_account_currency = 4000
+			where voucher_type='Stock Entry' and voucher_no=%s and account=%s""", (mr.name, stock_in_hand_account))
+		self.assertEqual(get_vouchers_with_unmatched_stock_gle([["Stock Entry", mr.name]], mr.posting_date,
+			warehouse_account), [["Stock Entry", mr.name]])
+
+		update_gl_entries_after(mr.posting_date, mr.posting_time, ["_Test Warehouse - _TC"], ["_Test Item"],
+			company=company, bulk=True)
+
+		self.check_gl_entries("Stock Entry", mr.name,
+			sorted([
+				[stock_in_hand_account, 5000.0, 0.0],
+				["Stock Adjustment - _TC", 0.0, 5000.0]
+			])
+		)
+
 def make_serialized_item(item_code=None, serial_no=None, target_warehouse=None):
 	se = frappe.copy_doc(test_records[0])
 	se.get("items")[0].item_code = item_code or "_Test Serialized Item With Series"
@@ -5,8 +5,38 @@ from __future__ import unicode_literals
 
 import frappe
 import unittest
+from frappe.utils import add_days, nowdate
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from erpnext.stock.stock_ledger import update_entries_after, SLE_REPOST_FIELDS
 
 # test_records = frappe.get_test_records('Stock Ledger Entry')
 
 class TestStockLedgerEntry(unittest.TestCase):
-	pass
+	def test_bulk_update_matches_row_by_row_repost(self):
+		item_code = make_item("_Test Item For Bulk Repost", {"is_stock_item": 1}).name
+		warehouse = "_Test Warehouse - _TC"
+
+		for days, qty, rate in ((-5, 10, 100), (-4, 5, 120), (-3, -8, 0), (-2, 20, 90), (-1, -12, 0)):
+			make_stock_entry(item_code=item_code, qty=abs(qty), rate=rate,
+				to_warehouse=warehouse if qty > 0 else None,
+				from_warehouse=warehouse if qty < 0 else None,
+				posting_date=add_days(nowdate(), days))
+
+		args = {"item_code": item_code, "warehouse": warehouse}
+
+		update_entries_after(args)
+		expected = get_sle_values(item_code, warehouse)
+
+		frappe.db.sql("""update `tabStock Ledger Entry` set qty_after_transaction=0, valuation_rate=0,
+			stock_value=0, stock_value_difference=0, stock_queue='[]'
+			where item_code=%s and warehouse=%s""", (item_code, warehouse))
+
+		update_entries_after(args, bulk_update=True)
+		self.assertEqual(get_sle_values(item_code, warehouse), expected)
+
+def get_sle_values(item_code, warehouse):
+	return frappe.db.sql("""select name, {0} from `tabStock Ledger Entry`
+		where item_code=%s and warehouse=%s
+		order by posting_date, posting_time, name""".format(", ".join(SLE_REPOST_FIELDS)),
+		(item_code, warehouse))
@@ -4,7 +4,7 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _, throw
-from frappe.utils import flt, cint, add_days, cstr, add_months
+from frappe.utils import flt, cint, add_days, cstr, add_months, getdate
 import json
 from erpnext.accounts.doctype.pricing_rule.pricing_rule import get_pricing_rule_for_item, set_transaction_type
 from erpnext.setup.utils import get_exchange_rate
@@ -15,6 +15,7 @@ from erpnext.stock.doctype.item.item import get_item_defaults, get_uom_conv_fact
 from erpnext.setup.doctype.item_group.item_group import get_item_group_defaults
 from erpnext.setup.doctype.brand.brand import get_brand_defaults
 from erpnext.selling.doctype.transaction_type.transaction_type import get_transaction_type_defaults
+from erpnext.stock.bin_cache import get_bin_qty
 
 from six import string_types, iteritems
 
@@ -44,36 +45,40 @@ def get_item_details(args):
 			"set_warehouse": ""
 		}
 	"""
+	return _get_item_details(args)
+
+def _get_item_details(args, prefetched=None):
+	"""`get_item_details`, with `prefetched` as returned by `get_prefetched_details` when called for many items"""
 	args = process_args(args)
-	item = frappe.get_cached_doc("Item", args.item_code)
+	item = get_item_doc(args.item_code, prefetched)
 	validate_item_details(args, item)
 
-	out = get_basic_details(args, item)
+	out = get_basic_details(args, item, prefetched)
 
 	get_item_tax_template(args, item, out)
-	out["item_tax_rate"] = get_item_tax_map(args.company, args.get("item_tax_template") if out.get("item_tax_template") is None \
-		else out.get("item_tax_template"), as_json=True)
+	out["item_tax_rate"] = _get_item_tax_map(args.company, args.get("item_tax_template") if out.get("item_tax_template") is None \
+		else out.get("item_tax_template"), as_json=True, prefetched=prefetched)
 
 	get_party_item_code(args, item, out)
 
-	set_valuation_rate(out, args)
+	set_valuation_rate(out, args, prefetched)
 
-	update_party_blanket_order(args, out)
+	update_party_blanket_order(args, out, prefetched)
 
-	get_price_list_rate(args, item, out)
+	get_price_list_rate(args, item, out, prefetched)
 
 	if args.customer and cint(args.is_pos):
 		out.update(get_pos_profile_item_details(args.company, args))
 
 	if out.get("warehouse"):
-		out.update(get_bin_details(args.item_code, out.warehouse))
+		out.update(_get_bin_details(args.item_code, out.warehouse, prefetched))
 
 	# update args with out, if key or value not exists
 	for key, value in iteritems(out):
 		if args.get(key) is None:
 			args[key] = value
 
-	out.update(get_pricing_rule_for_item(args))
+	out.update(get_pricing_rule_for_item(args, prefetched.pricing_rule_index if prefetched else None))
 
 	update_stock(args, out)
 
@@ -91,6 +96,113 @@ def get_item_details(args):
 
 	return out
 
+@frappe.whitelist()
+def get_item_details_for_items(args, items):
+	"""
+		Returns item details for all rows of a document at once. Items, their defaults,
+		prices, UOM conversions, bins and blanket orders are fetched for all rows together.
+
+		:param args: same as `get_item_details`, without the row values
+		:param items: [{"item_code": "", "name": "", "qty": 1, "uom": "", "warehouse": "", ...}, ...]
+		:return: list of item details, in the order of items
+	"""
+	if isinstance(args, string_types):
+		args = json.loads(args)
+	if isinstance(items, string_types):
+		items = json.loads(items)
+
+	rows = []
+	for d in items:
+		row_args = frappe._dict(args)
+		row_args.update(d)
+		rows.append(process_args(row_args))
+
+	prefetched = get_prefetched_details(process_args(frappe._dict(args)),
+		list(set([d.item_code for d in rows if d.item_code])))
+
+	return [_get_item_details(d, prefetched) for d in rows]
+
+def get_prefetched_details(args, item_codes):
+	"""Fetches the details needed by `get_item_details` for all items, with one query per table"""
+	from erpnext.accounts.doctype.pricing_rule.utils import get_pricing_rule_index
+
+	prefetched = frappe._dict(items=get_item_docs(item_codes), defaults={}, item_tax_maps={},
+		pricing_rule_index=get_pricing_rule_index())
+
+	all_item_codes = list(set(item_codes + [d.variant_of for d in prefetched.items.values() if d.variant_of]))
+
+	prefetched.conversion_factors = {}
+	prefetched.bins = {}
+	prefetched.item_prices = {}
+	prefetched.blanket_orders = {}
+	if not all_item_codes:
+		return prefetched
+
+	for d in frappe.get_all("UOM Conversion Detail", fields=["parent", "uom", "conversion_factor"],
+		filters={"parenttype": "Item", "parent": ("in", all_item_codes)}):
+		prefetched.conversion_factors.setdefault((d.parent, d.uom), d.conversion_factor)
+
+	for d in frappe.get_all("Bin", fields=["item_code", "warehouse", "projected_qty", "actual_qty",
+		"reserved_qty", "valuation_rate"], filters={"item_code": ("in", item_codes)}):
+		prefetched.bins[(d.item_code, d.warehouse)] = d
+
+	if args.price_list:
+		for d in frappe.get_all("Item Price", fields=["name", "item_code", "price_list_rate", "uom",
+			"customer", "supplier", "min_qty", "valid_from", "valid_upto", "packing_unit"],
+			filters={"price_list": args.price_list, "item_code": ("in", all_item_codes)}):
+			prefetched.item_prices.setdefault(d.item_code, []).append(d)
+
+	if args.company:
+		for d in get_blanket_order_details(frappe._dict(args, item_code=item_codes), as_list=True) or []:
+			prefetched.blanket_orders.setdefault(d.item_code, frappe._dict(blanket_order_rate=d.blanket_order_rate,
+				blanket_order=d.blanket_order))
+
+	return prefetched
+
+def get_item_docs(item_codes):
+	"""Returns Items with their child tables, loaded with one query per table"""
+	if not item_codes:
+		return {}
+
+	items = dict((d.name, d) for d in frappe.get_all("Item", fields=["*"], filters={"name": ("in", item_codes)}))
+	if not items:
+		return {}
+
+	for df in frappe.get_meta("Item").get_table_fields():
+		for d in frappe.get_all(df.options, fields=["*"], order_by="idx",
+			filters={"parenttype": "Item", "parentfield": df.fieldname, "parent": ("in", list(items))}):
+			items[d.parent].setdefault(df.fieldname, []).append(d)
+
+	return dict((name, frappe.get_doc(dict(d, doctype="Item"))) for name, d in iteritems(items))
+
+def get_item_doc(item_code, prefetched=None):
+	if prefetched and item_code in prefetched.items:
+		return prefetched.items[item_code]
+
+	return frappe.get_cached_doc("Item", item_code)
+
+def get_defaults(args, item, prefetched=None):
+	"""Returns item, item group, brand and transaction type defaults for the company"""
+	if not prefetched:
+		return (get_item_defaults(item.name, args.company), get_item_group_defaults(item.name, args.company),
+			get_brand_defaults(item.name, args.company),
+			get_transaction_type_defaults(args.transaction_type_name, args.company))
+
+	# item group and brand defaults only depend on the item group and brand
+	for key, get_value in (
+		(("Item", item.name, args.company), lambda: get_item_defaults(item.name, args.company, item)),
+		(("Item Group", item.item_group, args.company), lambda: get_item_group_defaults(item.name, args.company)),
+		(("Brand", item.brand, args.company), lambda: get_brand_defaults(item.name, args.company)),
+		(("Transaction Type", args.transaction_type_name, args.company),
+			lambda: get_transaction_type_defaults(args.transaction_type_name, args.company))):
+		if key not in prefetched.defaults:
+			prefetched.defaults[key] = get_value()
+
+	return (prefetched.defaults[("Item", item.name, args.company)],
+		prefetched.defaults[("Item Group", item.item_group, args.company)],
+		prefetched.defaults[("Brand", item.brand, args.company)],
+		prefetched.defaults[("Transaction Type", args.transaction_type_name, args.company)])
+
 def update_stock(args, out):
 	if (args.get("doctype") == "Delivery Note" or
 		(args.get("doctype") == "Sales Invoice" and args.get('update_stock'))) \
@@ -112,7 +224,7 @@ def update_stock(args, out):
 			out.serial_no = get_serial_no(out, args.serial_no, sales_order=reserved_so)
 
 
-def set_valuation_rate(out, args):
+def set_valuation_rate(out, args, prefetched=None):
 	if frappe.db.exists("Product Bundle", args.item_code, cache=True):
 		valuation_rate = 0.0
 		bundled_items = frappe.get_doc("Product Bundle", args.item_code)
@@ -127,7 +239,8 @@ def set_valuation_rate(out, args):
 		})
 
 	else:
-		out.update(get_valuation_rate(args.item_code, args.company, out.get("warehouse"), args.transaction_type_name))
+		out.update(get_valuation_rate(args.item_code, args.company, out.get("warehouse"), args.transaction_type_name,
+			prefetched))
 
 
 def process_args(args):
@@ -177,7 +290,7 @@ def validate_item_details(args, item):
 			throw(_("Item {0} must be a Sub-contracted Item").format(item.name))
 
 
-def get_basic_details(args, item):
+def get_basic_details(args, item, prefetched=None):
 	"""
 	:param args: {
 			"item_code": "",
@@ -218,18 +331,17 @@ def get_basic_details(args, item):
 	if not item:
 		item = frappe.get_doc("Item", args.get("item_code"))
 
-	if item.variant_of:
+	if item.variant_of and not item.flags.template_tables_updated:
 		item.update_template_tables()
+		item.flags.template_tables_updated = True
 
 	from frappe.defaults import get_user_default_as_list
 	user_default_warehouse_list = get_user_default_as_list('Warehouse')
 	user_default_warehouse = user_default_warehouse_list[0] \
 		if len(user_default_warehouse_list) == 1 else ""
 
-	item_defaults = get_item_defaults(item.name, args.company)
-	item_group_defaults = get_item_group_defaults(item.name, args.company)
-	brand_defaults = get_brand_defaults(item.name, args.company)
-	transaction_type_defaults = get_transaction_type_defaults(args.transaction_type_name, args.company)
+	item_defaults, item_group_defaults, brand_defaults, transaction_type_defaults = \
+		get_defaults(args, item, prefetched)
 
 	warehouse = args.get("set_warehouse") or user_default_warehouse\
 		or transaction_type_defaults.get("default_warehouse") or item_defaults.get("default_warehouse")\
@@ -293,7 +405,7 @@ def get_basic_details(args, item):
 		out.conversion_factor = 1.0
 	else:
 		out.conversion_factor = args.conversion_factor or \
-			get_conversion_factor(item.name, args.uom).get("conversion_factor")
+			_get_conversion_factor(item.name, args.uom, prefetched).get("conversion_factor")
 
 	args.conversion_factor = out.conversion_factor
 	out.stock_qty = out.qty * out.conversion_factor
@@ -323,13 +435,16 @@ def get_basic_details(args, item):
 	child_doctype = args.doctype + ' Item'
 	meta = frappe.get_meta(child_doctype)
 	if meta.get_field("barcode"):
-		update_barcode_value(out)
+		update_barcode_value(out, item if prefetched else None)
 
 	return out
 
-def update_barcode_value(out):
-	from erpnext.accounts.doctype.sales_invoice.pos import get_barcode_data
-	barcode_data = get_barcode_data([out])
+def update_barcode_value(out, item=None):
+	if item:
+		barcode_data = {out.item_code: [d.barcode for d in item.barcodes]}
+	else:
+		from erpnext.accounts.doctype.sales_invoice.pos import get_barcode_data
+		barcode_data = get_barcode_data([out])
 
 	# If item has one barcode then update the value of the barcode field
 	if barcode_data and len(barcode_data.get(out.item_code)) == 1:
@@ -381,6 +496,15 @@ def _get_item_tax_template(args, taxes, out):
 			return tax.item_tax_template
 	return None
 
+def _get_item_tax_map(company, item_tax_template, as_json=True, prefetched=None):
+	if not prefetched:
+		return get_item_tax_map(company, item_tax_template, as_json)
+
+	key = (company, item_tax_template, as_json)
+	if key not in prefetched.item_tax_maps:
+		prefetched.item_tax_maps[key] = get_item_tax_map(company, item_tax_template, as_json)
+	return prefetched.item_tax_maps[key]
+
 @frappe.whitelist()
 def get_item_tax_map(company, item_tax_template, as_json=True):
 	item_tax_map = {}
@@ -604,21 +728,28 @@ def get_item_defaults_details(args, item_defaults, item_group_defaults, brand_de
 		"allow_zero_valuation_rate": get_default_allow_zero_valuation_rate(args, item_defaults, item_group_defaults, brand_defaults, transaction_type_defaults)
 	}
 
-def get_price_list_rate(args, item_doc, out):
+def get_price_list_rate(args, item_doc, out, prefetched=None):
 	meta = frappe.get_meta(args.parenttype or args.doctype)
 
 	if meta.get_field("currency") or args.get('currency'):
-		pl_details = get_price_list_currency_and_exchange_rate(args)
-		args.update(pl_details)
-		validate_price_list(args)
+		if prefetched:
+			# price list is the same for all items
+			if "price_list_details" not in prefetched:
+				prefetched.price_list_details = get_price_list_currency_and_exchange_rate(args)
+				validate_price_list(frappe._dict(args, **prefetched.price_list_details))
+			args.update(prefetched.price_list_details)
+		else:
+			pl_details = get_price_list_currency_and_exchange_rate(args)
+			args.update(pl_details)
+			validate_price_list(args)
 		if meta.get_field("currency"):
 			validate_conversion_rate(args, meta)
 
-		price_list_rate = get_price_list_rate_for(args, item_doc.name) or 0
+		price_list_rate = get_price_list_rate_for(args, item_doc.name, prefetched) or 0
 
 		# variant
 		if not price_list_rate and item_doc.variant_of:
-			price_list_rate = get_price_list_rate_for(args, item_doc.variant_of)
+			price_list_rate = get_price_list_rate_for(args, item_doc.variant_of, prefetched)
 
 		# insert in database
 		if not price_list_rate:
@@ -662,7 +793,7 @@ def insert_item_price(args):
 				frappe.msgprint(_("Item Price added for {0} in Price List {1}").format(args.item_code,
 					args.price_list), alert=True)
 
-def get_item_price(args, item_code, ignore_party=False):
+def get_item_price(args, item_code, ignore_party=False, prefetched=None):
 	"""
 		Get name, price_list_rate from Item Price based on conditions
 			Check if the Derised qty is within the increment of the packing list.
@@ -673,6 +804,10 @@ def get_item_price(args, item_code, ignore_party=False):
 
 	args['item_code'] = item_code
 
+	if prefetched and args.get('period') != 'future':
+		out = get_prefetched_item_prices(args, item_code, ignore_party, prefetched)
+		return filter_item_prices_by_uom(args, item_code, out)
+
 	conditions = """where item_code=%(item_code)s
 		and price_list=%(price_list)s"""
 	order_by = "order by ifnull(valid_from, '2000-01-01') desc, uom desc, min_qty desc"
@@ -704,6 +839,35 @@ def get_item_price(args, item_code, ignore_party=False):
 		{conditions} {order_by}
 	""".format(conditions=conditions, order_by=order_by), args, as_list=1)
 
+	return filter_item_prices_by_uom(args, item_code, out)
+
+def get_prefetched_item_prices(args, item_code, ignore_party, prefetched):
+	"""Same as the Item Price query of `get_item_price`, on the prefetched Item Prices"""
+	transaction_date = getdate(args.get('transaction_date')) if args.get('transaction_date') else None
+
+	item_prices = []
+	for d in prefetched.item_prices.get(item_code, []):
+		if not ignore_party:
+			if args.get("customer"):
+				if d.customer != args.get("customer"): continue
+			elif args.get("supplier"):
+				if d.supplier != args.get("supplier"): continue
+			elif d.customer or d.supplier:
+				continue
+
+		if args.get('min_qty') and flt(d.min_qty) > flt(args.get('min_qty')):
+			continue
+
+		valid_from, valid_upto = getdate(d.valid_from or '2000-01-01'), getdate(d.valid_upto or '2500-12-31')
+		if transaction_date and not (valid_from <= transaction_date <= valid_upto):
+			continue
+
+		item_prices.append((d, valid_from, valid_upto))
+
+	item_prices.sort(key=lambda d: (d[1], cstr(d[0].uom), flt(d[0].min_qty)), reverse=True)
+	return [[d.name, d.price_list_rate, d.uom, valid_from, valid_upto] for d, valid_from, valid_upto in item_prices]
+
+def filter_item_prices_by_uom(args, item_code, out):
 	matches_uom = filter(lambda d: cstr(d[2]) == cstr(args.get('uom')), out)
 	if matches_uom:
 		return list(matches_uom)
@@ -725,7 +889,7 @@ def get_item_price(args, item_code, ignore_party=False):
 
 	return list(out)
 
-def get_price_list_rate_for(args, item_code):
+def get_price_list_rate_for(args, item_code, prefetched=None):
 	"""
 		Return Price Rate based on min_qty of each Item Price Rate.\
 		For example, desired qty is 10 and Item Price Rates exists
@@ -750,19 +914,21 @@ def get_price_list_rate_for(args, item_code):
 	}
 
 	item_price_data = 0
-	price_list_rate = get_item_price(item_price_args, item_code)
+	price_list_rate = get_item_price(item_price_args, item_code, prefetched=prefetched)
 	if price_list_rate:
 		desired_qty = args.get("qty")
-		if desired_qty and check_packing_list(price_list_rate[0][0], desired_qty, item_code):
+		if desired_qty and check_packing_list(price_list_rate[0][0], desired_qty, item_code, prefetched):
 			item_price_data = price_list_rate
 	else:
 		for field in ["customer", "supplier", "min_qty"]:
 			del item_price_args[field]
 
-		general_price_list_rate = get_item_price(item_price_args, item_code, ignore_party=args.get("ignore_party"))
+		general_price_list_rate = get_item_price(item_price_args, item_code,
+			ignore_party=args.get("ignore_party"), prefetched=prefetched)
 		if not general_price_list_rate and args.get("uom") != args.get("stock_uom"):
 			item_price_args["uom"] = args.get("stock_uom")
-			general_price_list_rate = get_item_price(item_price_args, item_code, ignore_party=args.get("ignore_party"))
+			general_price_list_rate = get_item_price(item_price_args, item_code,
+				ignore_party=args.get("ignore_party"), prefetched=prefetched)
 
 		if general_price_list_rate:
 			item_price_data = general_price_list_rate
@@ -776,7 +942,7 @@ def get_price_list_rate_for(args, item_code):
 		else:
 			return item_price_data[0][1]
 
-def check_packing_list(price_list_rate_name, desired_qty, item_code):
+def check_packing_list(price_list_rate_name, desired_qty, item_code, prefetched=None):
 	"""
 		Check if the desired qty is within the increment of the packing list.
 		:param price_list_rate_name: Name of Item Price
@@ -786,7 +952,10 @@ def check_packing_list(price_list_rate_name, desired_qty, item_code):
 	"""
 
 	flag = True
-	item_price = frappe.get_doc("Item Price", price_list_rate_name)
+	if prefetched:
+		item_price = [d for d in prefetched.item_prices.get(item_code, []) if d.name == price_list_rate_name][0]
+	else:
+		item_price = frappe.get_doc("Item Price", price_list_rate_name)
 	if item_price.packing_unit:
 		packing_increment = desired_qty % item_price.packing_unit
 
@@ -938,6 +1107,16 @@ def get_serial_no_batchwise(args, sales_order=None):
 				"sales_order": sales_order
 			}))
 
+def _get_conversion_factor(item_code, uom, prefetched=None):
+	if not (prefetched and item_code in prefetched.items):
+		return get_conversion_factor(item_code, uom)
+
+	item = prefetched.items[item_code]
+	conversion_factor = (prefetched.conversion_factors.get((item_code, uom))
+		or prefetched.conversion_factors.get((item.variant_of, uom))
+		or get_uom_conv_factor(uom, item.stock_uom))
+	return {"conversion_factor": conversion_factor or 1.0}
+
 @frappe.whitelist()
 def get_conversion_factor(item_code, uom):
 	variant_of = frappe.db.get_value("Item", item_code, "variant_of", cache=True)
@@ -953,14 +1132,20 @@ def get_conversion_factor(item_code, uom):
 
 @frappe.whitelist()
 def get_projected_qty(item_code, warehouse):
-	return {"projected_qty": frappe.db.get_value("Bin",
-		{"item_code": item_code, "warehouse": warehouse}, "projected_qty")}
+	return {"projected_qty": get_bin_qty(item_code, warehouse).projected_qty}
+
+def _get_bin_details(item_code, warehouse, prefetched=None):
+	if not prefetched:
+		return get_bin_details(item_code, warehouse)
+
+	bin = prefetched.bins.get((item_code, warehouse)) or {}
+	return {"projected_qty": bin.get("projected_qty") or 0, "actual_qty": bin.get("actual_qty") or 0,
+		"reserved_qty": bin.get("reserved_qty") or 0}
 
 @frappe.whitelist()
 def get_bin_details(item_code, warehouse):
-	return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
-		["projected_qty", "actual_qty", "reserved_qty"], as_dict=True, cache=True) \
-			or {"projected_qty": 0, "actual_qty": 0, "reserved_qty": 0}
+	bin = get_bin_qty(item_code, warehouse)
+	return {"projected_qty": bin.projected_qty, "actual_qty": bin.actual_qty, "reserved_qty": bin.reserved_qty}
 
 @frappe.whitelist()
 def get_serial_no_details(item_code, warehouse, stock_qty, serial_no):
@@ -1120,19 +1305,21 @@ def get_default_bom(item_code=None):
 		if bom:
 			return bom
 
-def get_valuation_rate(item_code, company, warehouse=None, transaction_type_name=None):
-	transaction_type = get_transaction_type_defaults(transaction_type_name, company)
-	item = get_item_defaults(item_code, company)
-	item_group = get_item_group_defaults(item_code, company)
-	brand = get_brand_defaults(item_code, company)
+def get_valuation_rate(item_code, company, warehouse=None, transaction_type_name=None, prefetched=None):
+	item, item_group, brand, transaction_type = get_defaults(
+		frappe._dict(company=company, transaction_type_name=transaction_type_name),
+		get_item_doc(item_code, prefetched), prefetched)
 	# item = frappe.get_doc("Item", item_code)
 	if item.get("is_stock_item"):
 		if not warehouse:
 			warehouse = transaction_type.get("default_warehouse") or item.get("default_warehouse")\
 				or brand.get("default_warehouse") or item_group.get("default_warehouse")
 
-		return frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse},
-			["valuation_rate"], as_dict=True) or {"valuation_rate": 0}
+		if prefetched:
+			bin = prefetched.bins.get((item_code, warehouse))
+			return {"valuation_rate": bin.valuation_rate if bin else 0}
+
+		return {"valuation_rate": get_bin_qty(item_code, warehouse).valuation_rate}
 
 	elif not item.get("is_stock_item"):
 		valuation_rate =frappe.db.sql("""select sum(base_net_amount) / sum(qty*conversion_factor)
@@ -1176,13 +1363,19 @@ def get_serial_no(args, serial_nos=None, sales_order=None):
 	return serial_no
 
 
-def update_party_blanket_order(args, out):
-	blanket_order_details = get_blanket_order_details(args)
+def update_party_blanket_order(args, out, prefetched=None):
+	# prefetched rates are of any Blanket Order, not of the one set in the row
+	if prefetched and not args.blanket_order:
+		blanket_order_details = prefetched.blanket_orders.get(args.item_code)
+	else:
+		blanket_order_details = get_blanket_order_details(args)
 	if blanket_order_details:
 		out.update(blanket_order_details)
 
 @frappe.whitelist()
-def get_blanket_order_details(args):
+def get_blanket_order_details(args, as_list=False):
+	"""Returns the first Blanket Order rate for the item,
+		or all Blanket Order rates if `as_list` (item_code may be a list)"""
 	if isinstance(args, string_types):
 		args = frappe._dict(json.loads(args))
 
@@ -1199,11 +1392,15 @@ def get_blanket_order_details(args):
 			condition += ' and bo.to_date>=%(transaction_date)s'
 
 		blanket_order_details = frappe.db.sql('''
-				select boi.rate as blanket_order_rate, bo.name as blanket_order
+				select boi.item_code, boi.rate as blanket_order_rate, bo.name as blanket_order
 				from `tabBlanket Order` bo, `tabBlanket Order Item` boi
-				where bo.company=%(company)s and boi.item_code=%(item_code)s
+				where bo.company=%(company)s and boi.item_code in %(item_codes)s
 					and bo.docstatus=1 and bo.name = boi.parent {0}
-			'''.format(condition), args, as_dict=True)
+			'''.format(condition), dict(args, item_codes=tuple(args.item_code)
+				if isinstance(args.item_code, list) else (args.item_code,)), as_dict=True)
+
+		if as_list:
+			return blanket_order_details
 
 		blanket_order_details = blanket_order_details[0] if blanket_order_details else ''
 	return blanket_order_details
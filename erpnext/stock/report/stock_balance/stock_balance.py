@@ -4,9 +4,9 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _
-from frappe.utils import flt, cint, getdate, now
+from frappe.utils import flt, cint, getdate, now, add_months, get_last_day
 from erpnext.stock.utils import update_included_uom_in_dict_report
-from erpnext.stock.report.stock_ledger.stock_ledger import get_item_group_condition
+from erpnext.stock.report.stock_ledger.stock_ledger import get_item_group_condition, get_warehouse_condition
 
 from six import iteritems
 
@@ -36,14 +36,16 @@ def execute(filters=None):
 	if isinstance(items, list) and not items:
 		return columns, []
 
-	sle = get_stock_ledger_entries(filters, items)
+	closing_balance_date = get_last_day(add_months(filters.get("from_date"), -1))
+	closing_balances = get_closing_balances(filters, items, closing_balance_date)
+	sle = get_stock_ledger_entries(filters, items, closing_balance_date)
 
 	# if no stock ledger entry found return
-	if not sle:
+	if not sle and not closing_balances:
 		return columns, []
 
-	iwb_map = get_item_warehouse_map(filters, sle)
-	item_map = get_item_details(items, sle, filters)
+	iwb_map = get_item_warehouse_map(filters, sle, closing_balances)
+	item_map = get_item_details(items, sle + closing_balances, filters)
 	item_reorder_detail_map = get_item_reorder_details(item_map.keys())
 
 	data = []
@@ -163,7 +165,7 @@ def get_conditions(filters):
 
 	return conditions
 
-def get_stock_ledger_entries(filters, items):
+def get_stock_ledger_entries(filters, items, closing_balance_date=None):
 	item_conditions_sql = ''
 	if items:
 		item_conditions_sql = ' and sle.item_code in ({})'\
@@ -171,6 +173,12 @@ def get_stock_ledger_entries(filters, items):
 
 	conditions = get_conditions(filters)
 
+	if closing_balance_date:
+		# entries up to the closing balance are already summed up in it
+		conditions += """ and (sle.posting_date > '{0}' or not exists(select name from `tabStock Closing Balance` cb
+			where cb.item_code = sle.item_code and cb.warehouse = sle.warehouse
+			and cb.period_end_date = '{0}'))""".format(frappe.db.escape(str(closing_balance_date)))
+
 	return frappe.db.sql("""
 		select
 			sle.item_code, warehouse, sle.posting_date, sle.actual_qty, sle.valuation_rate,
@@ -181,11 +189,37 @@ def get_stock_ledger_entries(filters, items):
 		order by sle.posting_date, sle.posting_time, sle.name""" %
 		(item_conditions_sql, conditions), as_dict=1)
 
-def get_item_warehouse_map(filters, sle):
+def get_closing_balances(filters, items, closing_balance_date):
+	"""closing balances of the month end before from date, the opening is built from them"""
+	conditions = ""
+	if items:
+		conditions += " and item_code in ({})"\
+			.format(', '.join(['"' + frappe.db.escape(i, percent=False) + '"' for i in items]))
+
+	if filters.get("warehouse"):
+		warehouse_condition = get_warehouse_condition(filters.get("warehouse"))
+		if warehouse_condition:
+			conditions += " and " + warehouse_condition
+
+	return frappe.db.sql("""
+		select item_code, warehouse, company, qty_after_transaction, valuation_rate, stock_value
+		from `tabStock Closing Balance`
+		where period_end_date = %s {0}""".format(conditions), closing_balance_date, as_dict=1)
+
+def get_item_warehouse_map(filters, sle, closing_balances=None):
 	iwb_map = {}
 	from_date = getdate(filters.get("from_date"))
 	to_date = getdate(filters.get("to_date"))
 
+	for d in closing_balances or []:
+		iwb_map[(d.company, d.item_code, d.warehouse)] = frappe._dict(template.copy(), **{
+			"opening_qty": flt(d.qty_after_transaction),
+			"opening_val": flt(d.stock_value),
+			"bal_qty": flt(d.qty_after_transaction),
+			"bal_val": flt(d.stock_value),
+			"val_rate": flt(d.valuation_rate)
+		})
+
 	for d in sle:
 		key = (d.company, d.item_code, d.warehouse)
 		if key not in iwb_map:
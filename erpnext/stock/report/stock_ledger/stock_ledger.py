@@ -199,12 +199,19 @@ def get_opening_balance(item_code, warehouse, from_date, from_time="00:00:00"):
 		return frappe._dict()
 
 	from erpnext.stock.stock_ledger import get_previous_sle
-	last_entry = get_previous_sle({
+	args = {
 		"item_code": item_code,
-		"warehouse_condition": get_warehouse_condition(warehouse),
 		"posting_date": from_date,
 		"posting_time": from_time
-	})
+	}
+
+	# for a single warehouse, the scan starts from its closing balance
+	if frappe.db.get_value("Warehouse", warehouse, "is_group"):
+		args["warehouse_condition"] = get_warehouse_condition(warehouse)
+	else:
+		args["warehouse"] = warehouse
+
+	last_entry = get_previous_sle(args)
 	row = frappe._dict()
 	row["voucher_type"] = _("Opening")
 	for f in ('qty_after_transaction', 'valuation_rate', 'stock_value'):
@@ -2,9 +2,11 @@
 # License: GNU General Public License v3. See license.txt
 
 from __future__ import print_function, unicode_literals
+import json
 import frappe
 from frappe.utils import flt, cstr, nowdate, nowtime
 from erpnext.stock.utils import update_bin
+from erpnext.stock.bin_cache import clear_bin_qty_cache
 from erpnext.stock.stock_ledger import update_entries_after
 from erpnext.controllers.stock_controller import update_gl_entries_after
 
@@ -43,12 +45,8 @@ def repost_stock(item_code, warehouse, allow_zero_rate=False,
 		repost_actual_qty(item_code, warehouse, allow_zero_rate, allow_negative_stock)
 
 	if item_code and warehouse and not only_actual:
-		qty_dict = {
-			"reserved_qty": get_reserved_qty(item_code, warehouse),
-			"indented_qty": get_indented_qty(item_code, warehouse),
-			"ordered_qty": get_ordered_qty(item_code, warehouse),
-			"planned_qty": get_planned_qty(item_code, warehouse)
-		}
+		qty_dict = rebuild_voucher_bin_qty([(item_code, warehouse)]).get((item_code, warehouse)) \
+			or dict((qty_field, 0) for qty_field in VOUCHER_QTY_FIELDS)
 		if only_bin:
 			qty_dict.update({
 				"actual_qty": get_balance_qty_from_sle(item_code, warehouse)
@@ -56,8 +54,9 @@ def repost_stock(item_code, warehouse, allow_zero_rate=False,
 
 		update_bin_qty(item_code, warehouse, qty_dict)
 
-def repost_actual_qty(item_code, warehouse, allow_zero_rate=False, allow_negative_stock=False):		update_entries_after({ "item_code": item_code, "warehouse": warehouse },
-		allow_zero_rate=allow_zero_rate, allow_negative_stock=allow_negative_stock)
+def repost_actual_qty(item_code, warehouse, allow_zero_rate=False, allow_negative_stock=False):
+	update_entries_after({ "item_code": item_code, "warehouse": warehouse },
+		allow_zero_rate=allow_zero_rate, allow_negative_stock=allow_negative_stock, bulk_update=True)
 
 def get_balance_qty_from_sle(item_code, warehouse):
 	balance_qty = frappe.db.sql("""select qty_after_transaction from `tabStock Ledger Entry`
@@ -141,6 +140,224 @@ def get_planned_qty(item_code, warehouse):
 	return flt(planned_qty[0][0]) if planned_qty else 0
 
 
+# queries of the quantities open vouchers add to the Bins, by voucher, item and warehouse.
+# `{condition}` filters on the columns of voucher_no, item_code and warehouse
+VOUCHER_BIN_QTY_QUERIES = (
+	("reserved_qty", "Sales Order", """
+		select so_item.parent as voucher_no, so_item.item_code, so_item.warehouse,
+			sum(so_item.stock_qty * (so_item.qty - so_item.delivered_qty) / so_item.qty) as qty
+		from `tabSales Order Item` so_item, `tabSales Order` so
+		where so.name = so_item.parent and so.docstatus = 1 and so.status != 'Closed'
+			and ifnull(so_item.delivered_by_supplier, 0) = 0 and so_item.qty >= so_item.delivered_qty
+			and {condition}
+		group by so_item.parent, so_item.item_code, so_item.warehouse""",
+		("so_item.parent", "so_item.item_code", "so_item.warehouse")),
+	("reserved_qty", "Sales Order", """
+		select packed_item.parent as voucher_no, packed_item.item_code, packed_item.warehouse,
+			sum(packed_item.qty * (so_item.qty - so_item.delivered_qty) / so_item.qty) as qty
+		from `tabPacked Item` packed_item, `tabSales Order Item` so_item, `tabSales Order` so
+		where packed_item.parenttype = 'Sales Order' and packed_item.item_code != packed_item.parent_item
+			and so_item.name = packed_item.parent_detail_docname and so.name = packed_item.parent
+			and so.docstatus = 1 and so.status != 'Closed'
+			and ifnull(so_item.delivered_by_supplier, 0) = 0 and so_item.qty >= so_item.delivered_qty
+			and {condition}
+		group by packed_item.parent, packed_item.item_code, packed_item.warehouse""",
+		("packed_item.parent", "packed_item.item_code", "packed_item.warehouse")),
+	("ordered_qty", "Purchase Order", """
+		select po_item.parent as voucher_no, po_item.item_code, po_item.warehouse,
+			sum((po_item.qty - po_item.received_qty) * po_item.conversion_factor) as qty
+		from `tabPurchase Order Item` po_item, `tabPurchase Order` po
+		where po_item.parent = po.name and po.docstatus = 1 and po.status not in ('Closed', 'Delivered')
+			and po_item.qty > po_item.received_qty and po_item.delivered_by_supplier = 0
+			and {condition}
+		group by po_item.parent, po_item.item_code, po_item.warehouse""",
+		("po_item.parent", "po_item.item_code", "po_item.warehouse")),
+	("indented_qty", "Material Request", """
+		select mr_item.parent as voucher_no, mr_item.item_code, mr_item.warehouse,
+			sum((mr_item.qty - mr_item.ordered_qty) * mr_item.conversion_factor) as qty
+		from `tabMaterial Request Item` mr_item, `tabMaterial Request` mr
+		where mr_item.parent = mr.name and mr.docstatus = 1 and mr.status != 'Stopped'
+			and mr_item.qty > mr_item.ordered_qty
+			and {condition}
+		group by mr_item.parent, mr_item.item_code, mr_item.warehouse""",
+		("mr_item.parent", "mr_item.item_code", "mr_item.warehouse")),
+	("planned_qty", "Work Order", """
+		select name as voucher_no, production_item as item_code, fg_warehouse as warehouse,
+			qty - produced_qty as qty
+		from `tabWork Order`
+		where docstatus = 1 and status not in ('Stopped', 'Completed') and qty > produced_qty
+			and {condition}""",
+		("name", "production_item", "fg_warehouse"))
+)
+
+VOUCHER_QTY_FIELDS = ("reserved_qty", "ordered_qty", "indented_qty", "planned_qty")
+
+def update_bin_qty_for_voucher(voucher_type, voucher_no):
+	"""Applies the change in the quantities the voucher adds to the Bins since the last update,
+		as recorded in Bin Voucher Qty"""
+	# transactions updating the same voucher (as Delivery Notes against one Sales Order) wait for each other,
+	# and locking reads see what the earlier ones committed instead of the snapshot of this transaction
+	frappe.db.sql("""select name from `tab{0}` where name=%s for update""".format(voucher_type), voucher_no)
+
+	new_qty = get_voucher_bin_qty(voucher_type, voucher_no, for_update=True)
+
+	old_qty = {}
+	for d in frappe.db.sql("""select item_code, warehouse, qty_field, qty from `tabBin Voucher Qty`
+		where voucher_type=%s and voucher_no=%s for update""", (voucher_type, voucher_no), as_dict=1):
+		old_qty[(voucher_type, voucher_no, d.item_code, d.warehouse, d.qty_field)] = d.qty
+
+	if new_qty == old_qty:
+		return
+
+	for key in set(new_qty) | set(old_qty):
+		qty = flt(flt(new_qty.get(key)) - flt(old_qty.get(key)), 9)
+		if qty:
+			add_bin_qty(key[2], key[3], key[4], qty)
+
+	frappe.db.sql("""delete from `tabBin Voucher Qty` where voucher_type=%s and voucher_no=%s""",
+		(voucher_type, voucher_no))
+	insert_voucher_bin_qty(new_qty)
+
+def add_bin_qty(item_code, warehouse, qty_field, qty):
+	"""Adds to the Bin quantity in one update, so that vouchers updating the Bin at the same time
+		do not overwrite each other"""
+	from erpnext.stock.utils import get_bin
+
+	bin_name = frappe.db.get_value("Bin", {"item_code": item_code, "warehouse": warehouse}) \
+		or get_bin(item_code, warehouse).name
+
+	frappe.db.sql("""update `tabBin`
+		set `{0}` = ifnull(`{0}`, 0) + %(qty)s, projected_qty = ifnull(projected_qty, 0) + %(projected_qty)s
+		where name = %(name)s""".format(qty_field),
+		{"qty": qty, "projected_qty": -qty if qty_field == "reserved_qty" else qty, "name": bin_name})
+
+	clear_bin_qty_cache(item_code, warehouse)
+
+def get_voucher_bin_qty(voucher_type=None, voucher_no=None, item_warehouses=None, for_update=False):
+	"""Returns {(voucher_type, voucher_no, item_code, warehouse, qty_field): qty} of the open vouchers,
+		for the voucher, for the (item_code, warehouse) pairs or for all. Read with locking reads if `for_update`"""
+	values, out = {}, {}
+	if item_warehouses is not None:
+		if not item_warehouses:
+			return out
+
+		values = {"item_codes": list(set(d[0] for d in item_warehouses)),
+			"warehouses": list(set(d[1] for d in item_warehouses))}
+		item_warehouses = set(item_warehouses)
+
+	for qty_field, query_voucher_type, query, columns in VOUCHER_BIN_QTY_QUERIES:
+		if voucher_type and voucher_type != query_voucher_type:
+			continue
+
+		if voucher_no:
+			condition = "{0} = %(voucher_no)s".format(columns[0])
+			values["voucher_no"] = voucher_no
+		elif item_warehouses is not None:
+			condition = "{0} in %(item_codes)s and {1} in %(warehouses)s".format(columns[1], columns[2])
+		else:
+			condition = "1=1"
+
+		query = query.format(condition=condition)
+		if for_update:
+			query += " for update"
+
+		for d in frappe.db.sql(query, values, as_dict=1):
+			if not d.warehouse or not frappe.get_cached_value("Item", d.item_code, "is_stock_item") \
+				or (item_warehouses is not None and (d.item_code, d.warehouse) not in item_warehouses):
+				continue
+
+			key = (query_voucher_type, d.voucher_no, d.item_code, d.warehouse, qty_field)
+			out[key] = flt(out.get(key)) + flt(d.qty)
+
+	return out
+
+def insert_voucher_bin_qty(voucher_qty):
+	rows = [(frappe.generate_hash("Bin Voucher Qty", 10),) + key + (qty,)
+		for key, qty in voucher_qty.items() if flt(qty, 9)]
+
+	for i in range(0, len(rows), 1000):
+		chunk = rows[i:i + 1000]
+		frappe.db.sql("""insert into `tabBin Voucher Qty`
+			(name, voucher_type, voucher_no, item_code, warehouse, qty_field, qty)
+			values {0}""".format(", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(chunk))),
+			tuple(value for row in chunk for value in row))
+
+def rebuild_voucher_bin_qty(item_warehouses=None):
+	"""Rebuilds Bin Voucher Qty of the (item_code, warehouse) pairs, or of all,
+		and returns {(item_code, warehouse): {qty_field: qty}}"""
+	if item_warehouses is not None and not item_warehouses:
+		return {}
+
+	voucher_qty = get_voucher_bin_qty(item_warehouses=item_warehouses)
+
+	if item_warehouses:
+		frappe.db.sql("""delete from `tabBin Voucher Qty` where (item_code, warehouse) in ({0})""".format(
+			", ".join(["(%s, %s)"] * len(item_warehouses))), tuple(v for d in item_warehouses for v in d))
+	else:
+		frappe.db.sql("delete from `tabBin Voucher Qty`")
+
+	insert_voucher_bin_qty(voucher_qty)
+
+	totals = {}
+	for (voucher_type, voucher_no, item_code, warehouse, qty_field), qty in voucher_qty.items():
+		bin_qty = totals.setdefault((item_code, warehouse), dict((d, 0) for d in VOUCHER_QTY_FIELDS))
+		bin_qty[qty_field] += qty
+
+	return totals
+
+def repair_bin_qty(item_warehouses, verify_only=False):
+	"""Recomputes the reserved, ordered, indented and planned quantities of the Bins from the open vouchers.
+		Returns the Bins that did not match, which are corrected unless `verify_only`"""
+	if not item_warehouses:
+		return []
+
+	if verify_only:
+		totals = {}
+		for (voucher_type, voucher_no, item_code, warehouse, qty_field), qty in \
+			get_voucher_bin_qty(item_warehouses=item_warehouses).items():
+			bin_qty = totals.setdefault((item_code, warehouse), {})
+			bin_qty[qty_field] = flt(bin_qty.get(qty_field)) + qty
+	else:
+		totals = rebuild_voucher_bin_qty(item_warehouses)
+
+	item_warehouses = set(item_warehouses)
+	mismatches = []
+	for d in frappe.db.sql("""select item_code, warehouse, {0} from `tabBin`
+		where item_code in %(item_codes)s and warehouse in %(warehouses)s""".format(", ".join(VOUCHER_QTY_FIELDS)),
+		{"item_codes": list(set(d[0] for d in item_warehouses)),
+			"warehouses": list(set(d[1] for d in item_warehouses))}, as_dict=1):
+		if (d.item_code, d.warehouse) not in item_warehouses:
+			continue
+
+		qty_dict = dict((qty_field, flt(totals.get((d.item_code, d.warehouse), {}).get(qty_field)))
+			for qty_field in VOUCHER_QTY_FIELDS)
+
+		if any(flt(d[qty_field], 6) != flt(qty_dict[qty_field], 6) for qty_field in VOUCHER_QTY_FIELDS):
+			mismatches.append(frappe._dict(item_code=d.item_code, warehouse=d.warehouse,
+				bin=dict((qty_field, flt(d[qty_field])) for qty_field in VOUCHER_QTY_FIELDS), vouchers=qty_dict))
+
+			if not verify_only:
+				update_bin_qty(d.item_code, d.warehouse, qty_dict)
+
+	return mismatches
+
+def enqueue_bin_qty_repair(verify_only=False, chunk_size=500):
+	"""Checks all Bins against the open vouchers in background jobs of `chunk_size` Bins,
+		which can run in parallel. Mismatches are logged in the Error Log"""
+	bins = [tuple(d) for d in frappe.db.sql("""select item_code, warehouse from `tabBin`
+		order by item_code, warehouse""")]
+
+	for i in range(0, len(bins), chunk_size):
+		frappe.enqueue(repair_bin_qty_in_background, queue="long", timeout=3000,
+			item_warehouses=bins[i:i + chunk_size], verify_only=verify_only)
+
+def repair_bin_qty_in_background(item_warehouses, verify_only=False):
+	mismatches = repair_bin_qty([tuple(d) for d in item_warehouses], verify_only)
+	frappe.db.commit()
+
+	if mismatches:
+		frappe.log_error(json.dumps(mismatches, indent=1), "Bin quantities do not match open vouchers")
+
 def update_bin_qty(item_code, warehouse, qty_dict=None):
 	from erpnext.stock.utils import get_bin
 	bin = get_bin(item_code, warehouse)
@@ -154,6 +371,7 @@ def update_bin_qty(item_code, warehouse, qty_dict=None):
 		bin.set_projected_qty()
 		bin.db_update()
 		bin.clear_cache()
+		clear_bin_qty_cache(item_code, warehouse)
 
 def set_stock_balance_as_per_serial_no(item_code=None, posting_date=None, posting_time=None,
 	 	fiscal_year=None):
@@ -230,7 +448,7 @@ def reset_serial_no_status_and_warehouse(serial_nos=None):
 			except:
 				pass
 
-def repost_gle_for_stock_transactions(posting_date=None, posting_time=None, for_warehouses=None):
+def repost_gle_for_stock_transactions(posting_date=None, posting_time=None, for_warehouses=None, bulk=False):
 	frappe.db.auto_commit_on_many_writes = 1
 
 	if not posting_date:
@@ -238,6 +456,6 @@ def repost_gle_for_stock_transactions(posting_date=None, posting_time=None, for_
 	if not posting_time:
 		posting_time = "00:00"
 
-	update_gl_entries_after(posting_date, posting_time, for_warehouses=for_warehouses)
+	update_gl_entries_after(posting_date, posting_time, for_warehouses=for_warehouses, bulk=bulk)
 
 	frappe.db.auto_commit_on_many_writes = 0
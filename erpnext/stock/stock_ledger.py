@@ -6,7 +6,9 @@ import frappe, erpnext
 from frappe import _
 from frappe.utils import cint, flt, cstr, now
 from erpnext.stock.utils import get_valuation_method
-import json
+from erpnext.stock.valuation import FIFOQueue
+from erpnext.stock.doctype.stock_closing_balance.stock_closing_balance import (get_closing_balance,
+	invalidate_closing_balances)
 
 from six import iteritems
 
@@ -16,6 +18,11 @@ class NegativeStockError(frappe.ValidationError): pass
 _exceptions = frappe.local('stockledger_exceptions')
 # _exceptions = []
 
+# valuation fields rewritten for every future entry while reposting
+SLE_REPOST_FIELDS = ("qty_after_transaction", "valuation_rate", "stock_value",
+	"stock_queue", "stock_value_difference")
+SLE_UPDATE_BATCH_SIZE = 1000
+
 def make_sl_entries(sl_entries, is_amended=None, allow_negative_stock=False, via_landed_cost_voucher=False):
 	if sl_entries:
 		from erpnext.stock.utils import update_bin
@@ -76,11 +83,15 @@ class update_entries_after(object):
 				"posting_time": "12:00"
 			}
 	"""
-	def __init__(self, args, allow_zero_rate=False, allow_negative_stock=None, via_landed_cost_voucher=False, verbose=1):
+	def __init__(self, args, allow_zero_rate=False, allow_negative_stock=None, via_landed_cost_voucher=False,
+		verbose=1, bulk_update=False, repost_future=True):
 		from frappe.model.meta import get_field_precision
 
 		self.exceptions = []
 		self.verbose = verbose
+		self.bulk_update = bulk_update
+		self.repost_future = repost_future
+		self.sle_updates = []
 		self.allow_zero_rate = allow_zero_rate
 		self.allow_negative_stock = allow_negative_stock
 		self.via_landed_cost_voucher = via_landed_cost_voucher
@@ -94,6 +105,8 @@ class update_entries_after(object):
 		for key, value in iteritems(args):
 			setattr(self, key, value)
 
+		invalidate_closing_balances(self.item_code, self.warehouse, args.get("posting_date"))
+
 		self.previous_sle = self.get_sle_before_datetime()
 		self.previous_sle = self.previous_sle[0] if self.previous_sle else frappe._dict()
 
@@ -105,7 +118,7 @@ class update_entries_after(object):
 			currency=frappe.get_cached_value('Company',  self.company,  "default_currency"))
 
 		self.prev_stock_value = self.previous_sle.stock_value or 0.0
-		self.stock_queue = json.loads(self.previous_sle.stock_queue or "[]")
+		self.stock_queue = FIFOQueue.loads(self.previous_sle.stock_queue)
 		self.valuation_method = get_valuation_method(self.item_code)
 		self.stock_value_difference = 0.0
 		self.build()
@@ -117,10 +130,17 @@ class update_entries_after(object):
 		for sle in entries_to_fix:
 			self.process_sle(sle)
 
+		if not self.repost_future:
+			self.validate_future_negative_stock()
+
 		if self.exceptions:
 			self.raise_exceptions()
 
-		self.update_bin()
+		self.flush_sle_updates()
+
+		# bin is updated by the background repost of future entries
+		if self.repost_future:
+			self.update_bin()
 
 	def update_bin(self):
 		# update bin
@@ -165,7 +185,7 @@ class update_entries_after(object):
 				# assert
 				self.valuation_rate = sle.valuation_rate
 				self.qty_after_transaction = sle.qty_after_transaction
-				self.stock_queue = [[self.qty_after_transaction, self.valuation_rate]]
+				self.stock_queue = FIFOQueue([[self.qty_after_transaction, self.valuation_rate]])
 				self.stock_value = flt(self.qty_after_transaction) * flt(self.valuation_rate)
 			else:
 				if self.valuation_method == "Moving Average":
@@ -175,7 +195,7 @@ class update_entries_after(object):
 				else:
 					self.get_fifo_values(sle)
 					self.qty_after_transaction += flt(sle.actual_qty)
-					self.stock_value = sum((flt(batch[0]) * flt(batch[1]) for batch in self.stock_queue))
+					self.stock_value = self.stock_queue.total_value
 
 		# rounding as per precision
 		self.stock_value = flt(self.stock_value, self.precision)
@@ -188,10 +208,22 @@ class update_entries_after(object):
 		sle.qty_after_transaction = self.qty_after_transaction
 		sle.valuation_rate = self.valuation_rate
 		sle.stock_value = self.stock_value
-		sle.stock_queue = json.dumps(self.stock_queue)
+		sle.stock_queue = self.stock_queue.dumps()
 		sle.stock_value_difference = stock_value_difference
-		sle.doctype="Stock Ledger Entry"
-		frappe.get_doc(sle).db_update()
+
+		if self.bulk_update:
+			self.sle_updates.append(sle)
+			if len(self.sle_updates) >= SLE_UPDATE_BATCH_SIZE:
+				self.flush_sle_updates()
+		else:
+			sle.doctype="Stock Ledger Entry"
+			frappe.get_doc(sle).db_update()
+
+	def flush_sle_updates(self):
+		"""write the valuation values of pending entries as one multi-row update"""
+		if self.sle_updates:
+			bulk_update_sle_values(self.sle_updates)
+			self.sle_updates = []
 
 	def validate_negative_stock(self, sle):
 		"""
@@ -208,6 +240,36 @@ class update_entries_after(object):
 		else:
 			return True
 
+	def validate_future_negative_stock(self):
+		"""
+			entries after the current time-bucket are not reposted now,
+			check that the qty change of the current entry does not make them negative
+		"""
+		qty_change = flt(self.args.get("actual_qty"))
+		if qty_change >= 0 or cint(self.allow_negative_stock) \
+			or self.args.get("voucher_type") == "Stock Reconciliation":
+			return
+
+		future_sle = frappe.db.sql("""select voucher_type, voucher_no, posting_date, posting_time, qty_after_transaction
+			from `tabStock Ledger Entry`
+			where item_code = %(item_code)s and warehouse = %(warehouse)s
+			and ifnull(is_cancelled, 'No')='No'
+			and timestamp(posting_date, posting_time) > timestamp(%(posting_date)s, %(posting_time)s)
+			order by qty_after_transaction asc limit 1""", self.get_timestamp_args(), as_dict=1)
+
+		if future_sle:
+			diff = flt(future_sle[0].qty_after_transaction) + qty_change
+			if diff < 0 and abs(diff) > 0.0001:
+				self.exceptions.append(future_sle[0].update({"diff": diff}))
+
+	def get_timestamp_args(self):
+		return {
+			"item_code": self.args.get("item_code"),
+			"warehouse": self.args.get("warehouse"),
+			"posting_date": self.args.get("posting_date") or "1900-01-01",
+			"posting_time": self.args.get("posting_time") or "00:00"
+		}
+
 	def get_serialized_values(self, sle):
 		incoming_rate = flt(sle.incoming_rate)
 		actual_qty = flt(sle.actual_qty)
@@ -287,76 +349,27 @@ class update_entries_after(object):
 		outgoing_rate = flt(sle.outgoing_rate)
 
 		if actual_qty > 0:
-			if not self.stock_queue:
-				self.stock_queue.append([0, 0])
-
-			# last row has the same rate, just updated the qty
-			if self.stock_queue[-1][1]==incoming_rate:
-				self.stock_queue[-1][0] += actual_qty
-			else:
-				if self.stock_queue[-1][0] > 0:
-					self.stock_queue.append([actual_qty, incoming_rate])
-				else:
-					qty = self.stock_queue[-1][0] + actual_qty
-					self.stock_queue[-1] = [qty, incoming_rate]
+			self.stock_queue.add_stock(actual_qty, incoming_rate)
 		else:
-			qty_to_pop = abs(actual_qty)
-			while qty_to_pop:
-				if not self.stock_queue:
-					# Get valuation rate from last sle if exists or from valuation rate field in item master
-					allow_zero_valuation_rate = self.check_if_allow_zero_valuation_rate(sle.voucher_type, sle.voucher_detail_no)
-					if not allow_zero_valuation_rate:
-						_rate = get_valuation_rate(sle.item_code, sle.warehouse,
-							sle.voucher_type, sle.voucher_no, self.allow_zero_rate,
-							currency=erpnext.get_company_currency(sle.company))
-					else:
-						_rate = 0
-
-					self.stock_queue.append([0, _rate])
-
-				index = None
-				if outgoing_rate > 0:
-					# Find the entry where rate matched with outgoing rate
-					for i, v in enumerate(self.stock_queue):
-						if v[1] == outgoing_rate:
-							index = i
-							break
-
-					# If no entry found with outgoing rate, collapse stack
-					if index == None:
-						new_stock_value = sum((d[0]*d[1] for d in self.stock_queue)) - qty_to_pop*outgoing_rate
-						new_stock_qty = sum((d[0] for d in self.stock_queue)) - qty_to_pop
-						self.stock_queue = [[new_stock_qty, new_stock_value/new_stock_qty if new_stock_qty > 0 else outgoing_rate]]
-						break
-				else:
-					index = 0
-
-				# select first batch or the batch with same rate
-				batch = self.stock_queue[index]
-				if qty_to_pop >= batch[0]:
-					# consume current batch
-					qty_to_pop = qty_to_pop - batch[0]
-					self.stock_queue.pop(index)
-					if not self.stock_queue and qty_to_pop:
-						# stock finished, qty still remains to be withdrawn
-						# negative stock, keep in as a negative batch
-						self.stock_queue.append([-qty_to_pop, outgoing_rate or batch[1]])
-						break
+			def rate_for_empty_queue():
+				# Get valuation rate from last sle if exists or from valuation rate field in item master
+				allow_zero_valuation_rate = self.check_if_allow_zero_valuation_rate(sle.voucher_type, sle.voucher_detail_no)
+				if not allow_zero_valuation_rate:
+					return get_valuation_rate(sle.item_code, sle.warehouse,
+						sle.voucher_type, sle.voucher_no, self.allow_zero_rate,
+						currency=erpnext.get_company_currency(sle.company))
+				return 0
 
-				else:
-					# qty found in current batch
-					# consume it and exit
-					batch[0] = batch[0] - qty_to_pop
-					qty_to_pop = 0
+			self.stock_queue.remove_stock(actual_qty, outgoing_rate, rate_for_empty_queue)
 
-		stock_value = sum((flt(batch[0]) * flt(batch[1]) for batch in self.stock_queue))
-		stock_qty = sum((flt(batch[0]) for batch in self.stock_queue))
+		stock_value = self.stock_queue.total_value
+		stock_qty = self.stock_queue.total_qty
 
 		if stock_qty:
 			self.valuation_rate = stock_value / flt(stock_qty)
 
 		if not self.stock_queue:
-			self.stock_queue.append([0, sle.incoming_rate or sle.outgoing_rate or self.valuation_rate])
+			self.stock_queue.append_layer(0, sle.incoming_rate or sle.outgoing_rate or self.valuation_rate)
 
 	def check_if_allow_zero_valuation_rate(self, voucher_type, voucher_detail_no):
 		ref_item_dt = ""
@@ -373,13 +386,20 @@ class update_entries_after(object):
 
 	def get_sle_before_datetime(self):
 		"""get previous stock ledger entry before current time-bucket"""
-		return get_stock_ledger_entries(self.args, "<", "desc", "limit 1", for_update=False)
+		return get_last_sle(self.args, "<")
 
 	def get_sle_after_datetime(self):
 		"""get Stock Ledger Entries after a particular datetime, for reposting"""
-		return get_stock_ledger_entries(self.previous_sle or frappe._dict({
-				"item_code": self.args.get("item_code"), "warehouse": self.args.get("warehouse") }),
-			">", "asc", for_update=True)
+		previous_sle = self.previous_sle or frappe._dict({
+			"item_code": self.args.get("item_code"), "warehouse": self.args.get("warehouse") })
+
+		if not self.repost_future:
+			# only the current time-bucket, later entries are reposted in background
+			timestamp_args = self.get_timestamp_args()
+			previous_sle = frappe._dict(previous_sle, to_posting_date=timestamp_args["posting_date"],
+				to_posting_time=timestamp_args["posting_time"])
+
+		return get_stock_ledger_entries(previous_sle, ">", "asc", for_update=True)
 
 	def raise_exceptions(self):
 		deficiency = min(e["diff"] for e in self.exceptions)
@@ -402,6 +422,50 @@ class update_entries_after(object):
 		else:
 			raise NegativeStockError(msg)
 
+def repost_future_sle_in_background():
+	return cint(frappe.db.get_single_value("Stock Settings", "repost_future_entries_in_background"))
+
+def future_sle_exists(args):
+	"""check if there are entries after the given posting datetime, other than of the same voucher"""
+	return frappe.db.sql("""select name from `tabStock Ledger Entry`
+		where item_code = %(item_code)s and warehouse = %(warehouse)s
+		and ifnull(is_cancelled, 'No')='No'
+		and timestamp(posting_date, posting_time) > timestamp(%(posting_date)s, %(posting_time)s)
+		and voucher_no != %(voucher_no)s
+		limit 1""", {
+			"item_code": args.get("item_code"),
+			"warehouse": args.get("warehouse"),
+			"posting_date": args.get("posting_date"),
+			"posting_time": args.get("posting_time") or "00:00",
+			"voucher_no": args.get("voucher_no") or ""
+		})
+
+def bulk_update_sle_values(sle_list):
+	"""
+		update reposted valuation fields of multiple Stock Ledger Entries
+		with a single statement, instead of one `db_update` per entry
+	"""
+	values, name_values = {}, {}
+	case_conditions = dict((fieldname, []) for fieldname in SLE_REPOST_FIELDS)
+
+	for i, sle in enumerate(sle_list):
+		name_key = "name_{0}".format(i)
+		name_values[name_key] = sle.name
+
+		for fieldname in SLE_REPOST_FIELDS:
+			value_key = "{0}_{1}".format(fieldname, i)
+			values[value_key] = sle.get(fieldname)
+			case_conditions[fieldname].append("when %({0})s then %({1})s".format(name_key, value_key))
+
+	values.update(name_values)
+
+	frappe.db.sql("""update `tabStock Ledger Entry` set {set_values}
+		where name in ({names})""".format(
+			set_values=", ".join("`{0}` = case name {1} end".format(fieldname, " ".join(conditions))
+				for fieldname, conditions in iteritems(case_conditions)),
+			names=", ".join("%({0})s".format(key) for key in name_values)
+		), values)
+
 def get_previous_sle(args, for_update=False):
 	"""
 		get the last sle on or before the current time-bucket,
@@ -417,9 +481,33 @@ def get_previous_sle(args, for_update=False):
 		}
 	"""
 	args["name"] = args.get("sle", None) or ""
-	sle = get_stock_ledger_entries(args, "<=", "desc", "limit 1", for_update=for_update)
+	sle = get_last_sle(args, "<=", for_update=for_update)
 	return sle and sle[0] or {}
 
+def get_last_sle(args, operator, for_update=False):
+	"""
+		get the last sle before (or on) the current time-bucket,
+		scanning only the entries after the nearest closing balance of the item and warehouse
+	"""
+	closing_balance = None
+	if args.get("warehouse") and args.get("posting_date"):
+		closing_balance = get_closing_balance(args.get("item_code"), args.get("warehouse"), args.get("posting_date"))
+
+	if not closing_balance:
+		return get_stock_ledger_entries(args, operator, "desc", "limit 1", for_update=for_update)
+
+	sle = get_stock_ledger_entries(frappe._dict(args, from_posting_date=closing_balance.period_end_date),
+		operator, "desc", "limit 1", for_update=for_update)
+
+	if not sle:
+		# no entries since the closing balance, last entry is the one it was made from
+		sle = frappe.db.sql("""select *, timestamp(posting_date, posting_time) as "timestamp"
+			from `tabStock Ledger Entry`
+			where name = %s and ifnull(is_cancelled, 'No')='No' {0}""".format(for_update and "for update" or ""),
+			closing_balance.stock_ledger_entry, as_dict=1)
+
+	return sle or get_stock_ledger_entries(args, operator, "desc", "limit 1", for_update=for_update)
+
 def get_stock_ledger_entries(previous_sle, operator=None, order="desc", limit=None, for_update=False, debug=False):
 	"""get stock ledger entries filtered by specific posting datetime conditions"""
 	conditions = " and timestamp(posting_date, posting_time) {0} timestamp(%(posting_date)s, %(posting_time)s)".format(operator)
@@ -436,6 +524,12 @@ def get_stock_ledger_entries(previous_sle, operator=None, order="desc", limit=No
 	if operator in (">", "<=") and previous_sle.get("name"):
 		conditions += " and name!=%(name)s"
 
+	if previous_sle.get("from_posting_date"):
+		conditions += " and posting_date > %(from_posting_date)s"
+
+	if previous_sle.get("to_posting_date"):
+		conditions += " and timestamp(posting_date, posting_time) <= timestamp(%(to_posting_date)s, %(to_posting_time)s)"
+
 	return frappe.db.sql("""select *, timestamp(posting_date, posting_time) as "timestamp" from `tabStock Ledger Entry`
 		where item_code = %%(item_code)s
 		and ifnull(is_cancelled, 'No')='No'
@@ -0,0 +1,139 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Latency of item search (`item_query`) with `LIKE '%txt%'` scans and with the Item Search Tokens.
+
+Run on a test site (all changes are rolled back):
+
+	bench --site test_site execute erpnext.stock.tests.benchmark_item_search.run
+	bench --site test_site execute erpnext.stock.tests.benchmark_item_search.run --kwargs "{'items': 300000}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import random
+import time
+import frappe
+from frappe.utils import nowdate
+from erpnext.controllers.queries import item_query
+from erpnext.stock.doctype.item_search_token.item_search_token import update_item_search_index
+
+ADJECTIVES = ["stainless", "galvanized", "brass", "plastic", "heavy", "light", "coated", "black", "white", "red"]
+NOUNS = ["bolt", "screw", "washer", "nut", "hinge", "bracket", "pipe", "valve", "cable", "switch"]
+
+def run(items=20000, queries=200, seed=1):
+	random.seed(seed)
+
+	try:
+		start = time.time()
+		make_items(items)
+		insert_seconds = time.time() - start
+
+		start = time.time()
+		item_codes = [get_item_code(i) for i in range(items)]
+		for i in range(0, items, 1000):
+			update_item_search_index(item_codes[i:i + 1000])
+		index_seconds = time.time() - start
+
+		searches = [get_search(random.randrange(items)) for i in range(queries)]
+
+		results = frappe._dict()
+		for label, method in (("like", item_query_by_like), ("index", item_query)):
+			latencies, found = [], 0
+			for txt, item_code in searches:
+				start = time.time()
+				names = [d[0] for d in method("Item", txt, "name", 0, 20, {})]
+				latencies.append(time.time() - start)
+				found += item_code in names
+
+			latencies.sort()
+			results[label] = frappe._dict(mean=sum(latencies) / len(latencies),
+				p95=latencies[int(len(latencies) * 0.95) - 1], found=found)
+	finally:
+		frappe.db.rollback()
+
+	print("{0} items | insert {1:.1f}s | index {2:.1f}s ({3:.0f} items/s)".format(items, insert_seconds,
+		index_seconds, items / index_seconds if index_seconds else 0))
+	for label in ("like", "index"):
+		print("{0:<6} | mean {1:8.2f}ms | p95 {2:8.2f}ms | searched item in first page {3}/{4}".format(label,
+			results[label].mean * 1000, results[label].p95 * 1000, results[label].found, queries))
+
+	return results
+
+def get_item_code(i):
+	return "_T-BENCH-SEARCH-{0:06d}".format(i)
+
+def get_item_name(i):
+	return "{0} {1} {2}".format(ADJECTIVES[i % len(ADJECTIVES)], NOUNS[i // len(ADJECTIVES) % len(NOUNS)], i)
+
+def get_barcode(i):
+	return "89{0:011d}".format(i * 7919)
+
+def make_items(items):
+	for i in range(items):
+		item_code = get_item_code(i)
+		frappe.get_doc({
+			"doctype": "Item",
+			"name": item_code,
+			"item_code": item_code,
+			"item_name": get_item_name(i),
+			"description": "{0} for general use, grade {1}".format(get_item_name(i), i % 7),
+			"item_group": "Products",
+			"stock_uom": "Nos",
+			"is_stock_item": 1,
+			"is_sales_item": 1,
+			"disabled": 0,
+			"has_variants": 0
+		}).db_insert()
+
+		frappe.get_doc({
+			"doctype": "Item Barcode",
+			"parent": item_code,
+			"parenttype": "Item",
+			"parentfield": "barcodes",
+			"barcode": get_barcode(i)
+		}).db_insert()
+
+def get_search(i):
+	"""Search text (part of code, name or barcode) and the item it is meant to find"""
+	txt = random.choice([get_item_code(i)[-6:], get_item_name(i), get_barcode(i)])
+	return txt, get_item_code(i)
+
+def item_query_by_like(doctype, txt, searchfield, start, page_len, filters):
+	"""previous implementation of `item_query`, as reference"""
+	description_cond = ''
+	if frappe.db.count('Item', cache=True) < 50000:
+		# scan description only if items are less than 50000
+		description_cond = 'or tabItem.description LIKE %(txt)s'
+
+	return frappe.db.sql("""select tabItem.name,
+		if(length(tabItem.item_name) > 40,
+			concat(substr(tabItem.item_name, 1, 40), "..."), item_name) as item_name,
+		tabItem.brand, tabItem.item_group,
+		if(length(tabItem.description) > 40, \
+			concat(substr(tabItem.description, 1, 40), "..."), description) as decription
+		from tabItem
+		where tabItem.docstatus < 2
+			and tabItem.has_variants=0
+			and tabItem.disabled=0
+			and (tabItem.end_of_life > %(today)s or ifnull(tabItem.end_of_life, '0000-00-00')='0000-00-00')
+			and (tabItem.`{key}` LIKE %(txt)s
+				or tabItem.item_code LIKE %(txt)s
+				or tabItem.item_group LIKE %(txt)s
+				or tabItem.item_name LIKE %(txt)s
+				or tabItem.item_code IN (select parent from `tabItem Barcode` where barcode LIKE %(txt)s)
+				{description_cond})
+		order by
+			if(locate(%(_txt)s, name), locate(%(_txt)s, name), 99999),
+			if(locate(%(_txt)s, item_name), locate(%(_txt)s, item_name), 99999),
+			idx desc,
+			name, item_name
+		limit %(start)s, %(page_len)s """.format(key=searchfield, description_cond=description_cond),
+		{
+			"today": nowdate(),
+			"txt": "%%%s%%" % txt,
+			"_txt": txt.replace("%", ""),
+			"start": start,
+			"page_len": page_len
+		})
@@ -0,0 +1,78 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Benchmark for reposting future Stock Ledger Entries.
+
+Run on a test site (all changes are rolled back):
+
+	bench --site test_site execute erpnext.stock.tests.benchmark_stock_ledger.run
+	bench --site test_site execute erpnext.stock.tests.benchmark_stock_ledger.run --kwargs "{'sizes': [10000]}"
+"""
+
+from __future__ import unicode_literals, print_function
+
+import time
+import frappe
+from frappe.utils import add_days, getdate, now
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.stock.stock_ledger import update_entries_after
+
+BENCHMARK_ITEM = "_Test Item For Repost Benchmark"
+BENCHMARK_WAREHOUSE = "_Test Warehouse - _TC"
+
+def run(sizes=(10000, 100000)):
+	results = []
+	for size in sizes:
+		for bulk_update in (False, True):
+			try:
+				results.append(benchmark_repost(size, bulk_update))
+			finally:
+				frappe.db.rollback()
+
+	for d in results:
+		print("{0:>7} SLEs | {1:<10} | {2:8.2f}s | {3:10.0f} rows/s".format(d.size,
+			"bulk" if d.bulk_update else "row-by-row", d.seconds, d.rows_per_second))
+
+	return results
+
+def benchmark_repost(size, bulk_update):
+	item_code = make_item(BENCHMARK_ITEM, {"is_stock_item": 1, "valuation_method": "FIFO"}).name
+	company = frappe.db.get_value("Warehouse", BENCHMARK_WAREHOUSE, "company")
+	make_sle_rows(item_code, BENCHMARK_WAREHOUSE, company, size)
+
+	start = time.time()
+	update_entries_after({"item_code": item_code, "warehouse": BENCHMARK_WAREHOUSE},
+		allow_negative_stock=True, bulk_update=bulk_update)
+	seconds = time.time() - start
+
+	return frappe._dict(size=size, bulk_update=bulk_update, seconds=seconds,
+		rows_per_second=size / seconds if seconds else 0)
+
+def make_sle_rows(item_code, warehouse, company, size, chunk_size=5000):
+	"""insert alternating receipts and issues directly, skipping controller validations"""
+	posting_date = add_days(getdate(), -(size // 100) - 1)
+	timestamp, user = now(), frappe.session.user
+	rows = []
+
+	for i in range(size):
+		incoming = i % 3 != 2
+		rows.append((frappe.generate_hash(length=12), timestamp, timestamp, user, user, 1,
+			item_code, warehouse, company, add_days(posting_date, i // 100), "10:00:00",
+			"Stock Entry", "_Benchmark Entry {0}".format(i // 10),
+			10 if incoming else -15, 100 + (i % 50) if incoming else 0, "Nos", "No"))
+
+		if len(rows) >= chunk_size:
+			insert_sle_rows(rows)
+			rows = []
+
+	if rows:
+		insert_sle_rows(rows)
+
+def insert_sle_rows(rows):
+	frappe.db.sql("""insert into `tabStock Ledger Entry`
+		(name, creation, modified, owner, modified_by, docstatus,
+		item_code, warehouse, company, posting_date, posting_time,
+		voucher_type, voucher_no, actual_qty, incoming_rate, stock_uom, is_cancelled)
+		values {0}""".format(", ".join(["(" + ", ".join(["%s"] * len(rows[0])) + ")"] * len(rows))),
+		tuple(value for row in rows for value in row))
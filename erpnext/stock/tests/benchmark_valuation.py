@@ -0,0 +1,71 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+"""
+Micro-benchmark of FIFO queue handling while reposting: the list of [qty, rate]
+layers (summed and serialized after every transaction) vs `FIFOQueue`.
+
+	bench execute erpnext.stock.tests.benchmark_valuation.run
+"""
+
+from __future__ import unicode_literals, print_function
+
+import json
+import time
+from frappe.utils import flt
+from erpnext.stock.valuation import FIFOQueue
+from erpnext.stock.tests.test_valuation import add_stock, remove_stock
+
+def run(layers=10000, transactions=5000):
+	initial_layers = [[10, 100 + i] for i in range(layers)]
+	operations = get_operations(layers, transactions)
+
+	results = []
+	for label, method in (("list", run_list_queue), ("FIFOQueue", run_fifo_queue)):
+		start = time.time()
+		method(initial_layers, operations)
+		seconds = time.time() - start
+		results.append((label, seconds))
+		print("{0:<10} | {1} layers, {2} transactions | {3:8.3f}s | {4:8.0f} transactions/s".format(
+			label, layers, transactions, seconds, transactions / seconds if seconds else 0))
+
+	return results
+
+def get_operations(layers, transactions):
+	"""receipts at new rates, alternating with issues from the head
+		and issues matching the rate of a layer deep in the queue"""
+	operations = []
+	for i in range(transactions):
+		if i % 2:
+			operations.append((1, 10, 100 + layers + i))
+		else:
+			operations.append((-1, 5, 100 + layers // 2 + i if i % 4 else 0))
+
+	return operations
+
+def run_list_queue(initial_layers, operations):
+	stock_queue = [list(d) for d in initial_layers]
+	for direction, qty, rate in operations:
+		if direction > 0:
+			add_stock(stock_queue, qty, rate)
+		else:
+			remove_stock(stock_queue, qty, rate)
+
+		sum(flt(d[0]) * flt(d[1]) for d in stock_queue)
+		sum(flt(d[0]) for d in stock_queue)
+		json.dumps(stock_queue)
+
+def run_fifo_queue(initial_layers, operations):
+	stock_queue = FIFOQueue(initial_layers)
+	for direction, qty, rate in operations:
+		if direction > 0:
+			stock_queue.add_stock(qty, rate)
+		else:
+			stock_queue.remove_stock(-qty, rate)
+
+		stock_queue.total_value
+		stock_queue.total_qty
+		stock_queue.dumps()
+
+if __name__ == "__main__":
+	run()
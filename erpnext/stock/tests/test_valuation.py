@@ -0,0 +1,114 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import json
+import random
+import unittest
+
+from erpnext.stock.valuation import FIFOQueue
+
+class TestFIFOQueue(unittest.TestCase):
+	def test_incoming_merges_same_rate(self):
+		queue = FIFOQueue()
+		queue.add_stock(10, 100)
+		queue.add_stock(5, 100)
+		queue.add_stock(5, 110)
+
+		self.assertEqual(queue.get_layers(), [[15, 100], [5, 110]])
+		self.assertEqual(queue.total_qty, 20)
+		self.assertEqual(queue.total_value, 2050)
+
+	def test_outgoing_consumes_oldest_layers(self):
+		queue = FIFOQueue([[10, 100], [10, 110], [10, 120]])
+		queue.remove_stock(-15)
+
+		self.assertEqual(queue.get_layers(), [[5, 110], [10, 120]])
+		self.assertEqual(queue.total_value, 1750)
+
+	def test_outgoing_rate_matches_layer(self):
+		queue = FIFOQueue([[10, 100], [10, 110], [10, 120]])
+		queue.remove_stock(-10, outgoing_rate=110)
+		self.assertEqual(queue.get_layers(), [[10, 100], [10, 120]])
+
+		# no layer with the outgoing rate, queue collapses
+		queue.remove_stock(-5, outgoing_rate=90)
+		self.assertEqual(queue.get_layers(), [[15, (2200 - 450) / 15.0]])
+
+	def test_negative_stock(self):
+		queue = FIFOQueue([[5, 100]])
+		queue.remove_stock(-8)
+		self.assertEqual(queue.get_layers(), [[-3, 100]])
+
+		queue.add_stock(10, 120)
+		self.assertEqual(queue.get_layers(), [[7, 120]])
+
+	def test_empty_queue_rate(self):
+		queue = FIFOQueue()
+		queue.remove_stock(-2, get_rate_for_empty_queue=lambda: 50)
+		self.assertEqual(queue.get_layers(), [[-2, 50]])
+
+	def test_serialization(self):
+		layers = [[10, 100.5], [2, 90]]
+		queue = FIFOQueue.loads(json.dumps(layers))
+		self.assertEqual(queue.dumps(), "[[10,100.5],[2,90]]")
+		self.assertEqual(json.loads(queue.dumps()), layers)
+
+	def test_matches_list_implementation(self):
+		rand = random.Random(1)
+		rates = [90, 100, 110, 120, 130]
+
+		for size in (50, 500):
+			queue, reference = FIFOQueue(), []
+			for i in range(size):
+				qty = rand.randint(1, 20)
+				if rand.random() < 0.55:
+					rate = rand.choice(rates) + i
+					queue.add_stock(qty, rate)
+					add_stock(reference, qty, rate)
+				else:
+					outgoing_rate = rand.choice(rates + [0, 0, 0])
+					queue.remove_stock(-qty, outgoing_rate)
+					remove_stock(reference, qty, outgoing_rate)
+
+				self.assertEqual(queue.get_layers(), reference)
+				self.assertAlmostEqual(queue.total_qty, sum(d[0] for d in reference))
+				self.assertAlmostEqual(queue.total_value, sum(d[0] * d[1] for d in reference), places=4)
+
+def add_stock(stock_queue, qty, rate):
+	"""stock queue as list of [qty, rate], as it was handled in `update_entries_after`"""
+	if not stock_queue:
+		stock_queue.append([0, 0])
+
+	if stock_queue[-1][1] == rate:
+		stock_queue[-1][0] += qty
+	elif stock_queue[-1][0] > 0:
+		stock_queue.append([qty, rate])
+	else:
+		stock_queue[-1] = [stock_queue[-1][0] + qty, rate]
+
+def remove_stock(stock_queue, qty_to_pop, outgoing_rate):
+	while qty_to_pop:
+		if not stock_queue:
+			stock_queue.append([0, 0])
+
+		index = 0
+		if outgoing_rate > 0:
+			index = next((i for i, d in enumerate(stock_queue) if d[1] == outgoing_rate), None)
+			if index is None:
+				new_stock_value = sum(d[0] * d[1] for d in stock_queue) - qty_to_pop * outgoing_rate
+				new_stock_qty = sum(d[0] for d in stock_queue) - qty_to_pop
+				stock_queue[:] = [[new_stock_qty, new_stock_value / new_stock_qty if new_stock_qty > 0 else outgoing_rate]]
+				break
+
+		batch = stock_queue[index]
+		if qty_to_pop >= batch[0]:
+			qty_to_pop = qty_to_pop - batch[0]
+			stock_queue.pop(index)
+			if not stock_queue and qty_to_pop:
+				stock_queue.append([-qty_to_pop, outgoing_rate or batch[1]])
+				break
+		else:
+			batch[0] = batch[0] - qty_to_pop
+			qty_to_pop = 0
@@ -8,6 +8,7 @@ import json
 from frappe.utils import flt, cstr, nowdate, nowtime
 
 from six import string_types, iteritems
+from erpnext.stock.bin_cache import get_bin_qty
 
 class InvalidWarehouseCompany(frappe.ValidationError): pass
 
@@ -108,8 +109,7 @@ def get_latest_stock_qty(item_code, warehouse=None):
 				and wh.lft >= %s and wh.rgt <= %s)"
 
 		else:
-			values.append(warehouse)
-			condition += " AND warehouse = %s"
+			return get_bin_qty(item_code, warehouse).actual_qty
 
 	actual_qty = frappe.db.sql("""select sum(actual_qty) from tabBin
 		where item_code=%s {0}""".format(condition), values)[0][0]
@@ -0,0 +1,214 @@
+# Copyright (c) 2019, Frappe Technologies Pvt. Ltd. and Contributors
+# License: GNU General Public License v3. See license.txt
+
+from __future__ import unicode_literals
+
+import json
+from collections import deque
+from frappe.utils import flt
+
+# up to this many layers, totals are summed afresh after every transaction
+# (same results as summing the serialized queue), above it they are kept as running totals
+EXACT_TOTALS_MAX_LAYERS = 64
+
+class StockLayer(object):
+	__slots__ = ("qty", "rate", "removed", "serialized")
+
+	def __init__(self, qty, rate):
+		self.qty = qty
+		self.rate = rate
+		self.removed = False
+		self.serialized = None
+
+	def dumps(self):
+		if self.serialized is None:
+			self.serialized = json.dumps([self.qty, self.rate], separators=(",", ":"))
+		return self.serialized
+
+class FIFOQueue(object):
+	"""
+		FIFO stock queue of [qty, rate] layers, oldest first.
+
+		Keeps running totals of qty and value and an index of layers by rate, so that
+		consuming from the head or from the first layer of a given (outgoing) rate
+		does not scan the whole queue. Layers consumed from the middle are only
+		flagged and dropped once they reach either end of the queue.
+
+		Serialized as the usual `stock_queue` JSON list: [[qty, rate], ...], without
+		whitespace and reusing the serialized form of layers that did not change.
+	"""
+	def __init__(self, layers=None):
+		self.set_layers(layers or [])
+
+	@classmethod
+	def loads(cls, stock_queue):
+		return cls(json.loads(stock_queue or "[]"))
+
+	def dumps(self):
+		return "[" + ",".join([layer.dumps() for layer in self.layers if not layer.removed]) + "]"
+
+	def get_layers(self):
+		return [[layer.qty, layer.rate] for layer in self.layers if not layer.removed]
+
+	def set_layers(self, layers):
+		self.layers = deque()
+		self.layers_by_rate = {}
+		self.removed_count = 0
+		for qty, rate in layers:
+			self.append_layer(qty, rate)
+		self.update_totals(force=True)
+
+	def __len__(self):
+		return len(self.layers) - self.removed_count
+
+	def __iter__(self):
+		return iter(self.get_layers())
+
+	@property
+	def total_qty(self):
+		return self._total_qty
+
+	@property
+	def total_value(self):
+		return self._total_value
+
+	def add_stock(self, qty, rate):
+		"""add incoming qty, merging into the last layer if it has the same rate
+			or if the last layer is negative"""
+		if not len(self):
+			self.append_layer(0, 0)
+
+		last_layer = self.get_last_layer()
+		if last_layer.rate == rate:
+			self.set_layer_qty(last_layer, last_layer.qty + qty)
+		elif last_layer.qty > 0:
+			self.append_layer(qty, rate)
+			self.add_to_totals(qty, rate)
+		else:
+			self.set_last_layer(last_layer.qty + qty, rate)
+
+		self.update_totals()
+
+	def remove_stock(self, qty, outgoing_rate=0, get_rate_for_empty_queue=None):
+		"""consume outgoing qty from the oldest layers, or from the layers having
+			the outgoing rate if given. If no layer has the outgoing rate, the queue
+			is collapsed into a single layer"""
+		qty_to_pop = abs(qty)
+		while qty_to_pop:
+			if not len(self):
+				rate = get_rate_for_empty_queue() if get_rate_for_empty_queue else 0
+				self.append_layer(0, rate)
+
+			if outgoing_rate > 0:
+				layer = self.get_first_layer_with_rate(outgoing_rate)
+
+				# If no entry found with outgoing rate, collapse stack
+				if not layer:
+					layers = self.get_layers()
+					new_stock_value = sum((d[0] * d[1] for d in layers)) - qty_to_pop * outgoing_rate
+					new_stock_qty = sum((d[0] for d in layers)) - qty_to_pop
+					self.set_layers([[new_stock_qty,
+						new_stock_value / new_stock_qty if new_stock_qty > 0 else outgoing_rate]])
+					break
+			else:
+				layer = self.get_first_layer()
+
+			if qty_to_pop >= layer.qty:
+				# consume current layer
+				qty_to_pop = qty_to_pop - layer.qty
+				self.remove_layer(layer)
+				if not len(self) and qty_to_pop:
+					# stock finished, qty still remains to be withdrawn
+					# negative stock, keep in as a negative layer
+					self.append_layer(-qty_to_pop, outgoing_rate or layer.rate)
+					self.add_to_totals(-qty_to_pop, outgoing_rate or layer.rate)
+					break
+			else:
+				# qty found in current layer, consume it and exit
+				self.set_layer_qty(layer, layer.qty - qty_to_pop)
+				qty_to_pop = 0
+
+		self.update_totals()
+
+	def append_layer(self, qty, rate):
+		layer = StockLayer(qty, rate)
+		self.layers.append(layer)
+		self.layers_by_rate.setdefault(rate, deque()).append(layer)
+		return layer
+
+	def get_first_layer(self):
+		self.drop_removed_layers()
+		return self.layers[0]
+
+	def get_last_layer(self):
+		self.drop_removed_layers()
+		return self.layers[-1]
+
+	def get_first_layer_with_rate(self, rate):
+		layers = self.layers_by_rate.get(rate)
+		return layers[0] if layers else None
+
+	def set_layer_qty(self, layer, qty):
+		self._total_qty += qty - layer.qty
+		self._total_value += (flt(qty) - flt(layer.qty)) * flt(layer.rate)
+		layer.qty = qty
+		layer.serialized = None
+
+	def set_last_layer(self, qty, rate):
+		last_layer = self.get_last_layer()
+		self.add_to_totals(-last_layer.qty, last_layer.rate)
+		self.remove_from_rate_index(last_layer, last=True)
+
+		last_layer.qty, last_layer.rate = qty, rate
+		last_layer.serialized = None
+		self.layers_by_rate.setdefault(rate, deque()).append(last_layer)
+		self.add_to_totals(qty, rate)
+
+	def remove_layer(self, layer):
+		"""remove the first layer, or the first layer of its rate"""
+		self.add_to_totals(-layer.qty, layer.rate)
+		self.remove_from_rate_index(layer)
+
+		if self.layers[0] is layer:
+			self.layers.popleft()
+		else:
+			layer.removed = True
+			self.removed_count += 1
+
+		self.drop_removed_layers()
+
+	def remove_from_rate_index(self, layer, last=False):
+		layers = self.layers_by_rate[layer.rate]
+		if last:
+			layers.pop()
+		else:
+			layers.popleft()
+
+		if not layers:
+			del self.layers_by_rate[layer.rate]
+
+	def drop_removed_layers(self):
+		if not self.removed_count:
+			return
+
+		while self.layers and self.layers[0].removed:
+			self.layers.popleft()
+			self.removed_count -= 1
+
+		while self.layers and self.layers[-1].removed:
+			self.layers.pop()
+			self.removed_count -= 1
+
+		if self.removed_count > len(self):
+			self.layers = deque(layer for layer in self.layers if not layer.removed)
+			self.removed_count = 0
+
+	def add_to_totals(self, qty, rate):
+		self._total_qty += qty
+		self._total_value += flt(qty) * flt(rate)
+
+	def update_totals(self, force=False):
+		if force or len(self) <= EXACT_TOTALS_MAX_LAYERS:
+			layers = [layer for layer in self.layers if not layer.removed]
+			self._total_qty = sum((flt(layer.qty) for layer in layers))
+			self._total_value = sum((flt(layer.qty) * flt(layer.rate) for layer in layers))